@@ -17,7 +17,9 @@
 import numpy
 from numbers import Number
 import functools
-from cil.framework import DataContainer
+import ctypes
+from cil.framework import DataContainer, cilacc
+from cil.framework.LazyExpression import LazyExpression, BlockLazyExpression
 from cil.utilities.multiprocessing import NUM_THREADS
 
 class BlockDataContainer(object):
@@ -82,6 +84,75 @@ class BlockDataContainer(object):
                     'Dimension and size do not match: expected {} got {}'
                     .format(n_elements, len(args)))
 
+        # flat buffer viewed by the containers, set by BlockGeometry.allocate(contiguous=True)
+        self._buffer = None
+        self._flat_container = None
+
+    def _flat(self):
+        '''Returns a 1D DataContainer viewing the buffer of a contiguous BlockDataContainer
+
+        Returns None if the BlockDataContainer was not allocated contiguous, or if the data 
+        of any container is no longer a view of the buffer.'''
+        buffer = self._buffer
+        if buffer is None:
+            return None
+        root = buffer if buffer.base is None else buffer.base
+        for el in self.containers:
+            if isinstance(el, BlockDataContainer):
+                if el._flat() is None:
+                    return None
+            else:
+                arr = getattr(el, 'array', None)
+                if arr is None or arr.base is not root or not arr.flags['C_CONTIGUOUS']:
+                    return None
+        if self._flat_container is None:
+            self._flat_container = DataContainer(buffer, False)
+        return self._flat_container
+
+    def _layout(self):
+        return tuple(el._layout() if isinstance(el, BlockDataContainer) else el.shape for el in self.containers)
+
+    def _flat_operands(self, *others):
+        '''Returns the flat DataContainers of self and of the BlockDataContainers in others
+
+        Numbers and None are returned as they are. Returns None if any BlockDataContainer is
+        not contiguous or has a different layout than self, or others contains other types.'''
+        flat = self._flat()
+        if flat is None:
+            return None
+        res = [flat]
+        layout = None
+        for other in others:
+            if other is None or isinstance(other, Number):
+                res.append(other)
+            elif isinstance(other, BlockDataContainer):
+                ot = other._flat()
+                if ot is None:
+                    return None
+                if layout is None:
+                    layout = self._layout()
+                if other._layout() != layout:
+                    return None
+                res.append(ot)
+            else:
+                return None
+        return res
+
+    def _like_flat(self, array, offset=0):
+        '''Returns a contiguous BlockDataContainer with the structure of self viewing the 1D array, 
+        and the offset of its end'''
+        start = offset
+        containers = []
+        for el in self.containers:
+            if isinstance(el, BlockDataContainer):
+                container, offset = el._like_flat(array, offset)
+            else:
+                container = el._new_like(array[offset:offset + el.size].reshape(el.shape))
+                offset += el.size
+            containers.append(container)
+        out = type(self)(*containers, shape=self.shape)
+        out._buffer = array[start:offset]
+        return out, offset
         
     def __iter__(self):
         '''BlockDataContainer is Iterable'''
@@ -212,7 +283,7 @@ class BlockDataContainer(object):
         else:
             return self.binary_operations(BlockDataContainer.MINIMUM, other, *args, **kwargs)
 
-    def axpby(self, a, b, y, out, dtype=numpy.float32, num_threads = NUM_THREADS):
+    def axpby(self, a, b, y, out, dtype=None, num_threads = NUM_THREADS):
         r'''performs axpby element-wise on the BlockDataContainer containers
         
         Does the operation .. math:: a*x+b*y and stores the result in out, where x is self
@@ -221,11 +292,11 @@ class BlockDataContainer(object):
         :param b: scalar
         :param y: compatible (Block)DataContainer
         :param out: (Block)DataContainer to store the result
-        :param dtype: optional, data type of the DataContainers
+        :param dtype: optional, data type of the DataContainers, default the type of out
         '''
         if out is None:
             raise ValueError("out container cannot be None")
-        kwargs = {'a':a, 'b':b, 'out':out, 'dtype': dtype, 'num_threads': NUM_THREADS}
+        kwargs = {'a':a, 'b':b, 'out':out, 'dtype': dtype, 'num_threads': num_threads}
         self.binary_operations(BlockDataContainer.AXPBY, y, **kwargs)
 
 
@@ -241,6 +312,23 @@ class BlockDataContainer(object):
         if not self.is_compatible(other):
             raise ValueError('Incompatible for operation {}'.format(operation))
         out = kwargs.get('out', None)
+
+        # contiguous BlockDataContainers are processed as a single DataContainer
+        if operation == BlockDataContainer.AXPBY:
+            flat = self._flat_operands(other, out, kwargs['a'], kwargs['b'])
+        else:
+            flat = self._flat_operands(other, out)
+        if flat is not None:
+            if operation == BlockDataContainer.AXPBY:
+                flat[0].axpby(flat[3], flat[4], flat[1], flat[2], dtype=kwargs['dtype'], num_threads=kwargs['num_threads'])
+                return
+            kw = kwargs.copy()
+            kw['out'] = flat[2]
+            res = getattr(flat[0], operation)(flat[1], *args, **kw)
+            if out is None:
+                return self._like_flat(res.as_array())[0]
+            return
+
         if isinstance(other, Number):
             # try to do algebra with one DataContainer. Will raise error if not compatible
             kw = kwargs.copy()
@@ -391,6 +479,15 @@ class BlockDataContainer(object):
         '''
         out = kwargs.get('out', None)
         kw = kwargs.copy()
+
+        flat = self._flat_operands(out)
+        if flat is not None:
+            kw['out'] = flat[1]
+            res = getattr(flat[0], operation)(*args, **kw)
+            if out is None:
+                return self._like_flat(res.as_array())[0]
+            return
+
         if out is None:
             res = []
             for el in self.containers:
@@ -438,9 +535,15 @@ class BlockDataContainer(object):
     ## reductions
     
     def sum(self, *args, **kwargs):
+        flat = self._flat()
+        if flat is not None and not args and not kwargs:
+            return flat.sum()
         return numpy.sum([ el.sum(*args, **kwargs) for el in self.containers])
     
     def squared_norm(self):
+        flat = self._flat()
+        if flat is not None:
+            return flat.squared_norm()
         y = numpy.asarray([el.squared_norm() for el in self.containers])
         return y.sum() 
         
@@ -448,39 +551,103 @@ class BlockDataContainer(object):
     def norm(self):
         return numpy.sqrt(self.squared_norm())   
     
-    def pnorm(self, p=2):
+    def pnorm(self, p=2, num_threads=NUM_THREADS):
+        '''Returns the pixel-wise p-norm of the rows of the BlockDataContainer
+
+        For p=2 and float32 or float64 containers, the isotropic norm is computed 
+        in a single pass by the cilacc library.
+
+        :param p: 1 or 2
+        :param num_threads: number of threads to run on
+        :type num_threads: int, optional, default 1/2 CPU of the system
+        '''
                         
         if p==1:            
             return sum(self.abs())        
         elif p==2:                 
+            out = self._pnorm2(num_threads)
+            if out is not None:
+                return out
             tmp = functools.reduce(lambda a,b: a + b.conjugate()*b, self.containers, self.get_item(0) * 0 ).sqrt()            
             return tmp      
         else:
             return ValueError('Not implemented')
+
+    def _pnorm2(self, num_threads):
+        '''isotropic norm with cilacc, returns None if the containers are not supported'''
+        arrays = []
+        for el in self.containers:
+            if not isinstance(el, DataContainer):
+                return None
+            arrays.append(el.as_array())
+        dtype = arrays[0].dtype
+        if dtype not in (numpy.float32, numpy.float64):
+            return None
+        for arr in arrays:
+            if arr.dtype != dtype or arr.shape != arrays[0].shape or not arr.flags['C_CONTIGUOUS']:
+                return None
+
+        first = self.get_item(0)
+        out = type(first)(numpy.empty_like(arrays[0]), deep_copy=False,
+                          dimension_labels=first.dimension_labels,
+                          geometry=None if first.geometry is None else first.geometry.copy(),
+                          suppress_warning=True)
+        if dtype == numpy.float32:
+            c_p = ctypes.POINTER(ctypes.c_float)
+            f = cilacc.spnorm2
+        else:
+            c_p = ctypes.POINTER(ctypes.c_double)
+            f = cilacc.dpnorm2
+        pointers = (c_p * len(arrays))(*[arr.ctypes.data_as(c_p) for arr in arrays])
+        f(pointers, len(arrays), out.as_array().ctypes.data_as(c_p), arrays[0].size, num_threads)
+        return out
                 
     def copy(self):
         '''alias of clone'''    
         return self.clone()
     def clone(self):
+        flat = self._flat()
+        if flat is not None:
+            return self._like_flat(flat.as_array().copy())[0]
         return type(self)(*[el.copy() for el in self.containers], shape=self.shape)
+    def lazy(self):
+        '''Returns a BlockLazyExpression wrapping the containers of the block
+
+        Algebra on the returned object is recorded and evaluated in a single
+        pass per row by :code:`evaluate()` or :code:`fill`.
+        '''
+        return BlockLazyExpression(*[el.lazy() for el in self.containers], shape=self.shape)
+
     def fill(self, other):
-        if isinstance (other, BlockDataContainer):
+        if isinstance(other, BlockLazyExpression):
+            other.evaluate(out=self)
+        elif isinstance (other, BlockDataContainer):
             if not self.is_compatible(other):
                 raise ValueError('Incompatible containers')
+            flat = self._flat_operands(other)
+            if flat is not None:
+                flat[0].fill(flat[1])
+                return
             for el,ot in zip(self.containers, other.containers):
                 el.fill(ot)
         else:
             return ValueError('Cannot fill with object provided {}'.format(type(other)))
     
     def __add__(self, other):
+        if isinstance(other, (LazyExpression, BlockLazyExpression)):
+            return NotImplemented
         return self.add( other )
     # __radd__
     
     def __sub__(self, other):
+        if isinstance(other, (LazyExpression, BlockLazyExpression)):
+            return NotImplemented
         return self.subtract( other )
     # __rsub__
     
     def __mul__(self, other):
+        if isinstance(other, (LazyExpression, BlockLazyExpression)):
+            return NotImplemented
         return self.multiply(other)
     # __rmul__
     
@@ -488,9 +655,13 @@ class BlockDataContainer(object):
         return self.divide(other)
     # __rdiv__
     def __truediv__(self, other):
+        if isinstance(other, (LazyExpression, BlockLazyExpression)):
+            return NotImplemented
         return self.divide(other)
     
     def __pow__(self, other):
+        if isinstance(other, (LazyExpression, BlockLazyExpression)):
+            return NotImplemented
         return self.power(other)
     # reverse operand
     def __radd__(self, other):
@@ -552,6 +723,10 @@ class BlockDataContainer(object):
     
     def __iadd__(self, other):
         '''Inline addition'''
+        flat = self._flat_operands(other)
+        if flat is not None:
+            flat[0].add(flat[1], out=flat[0])
+            return self
         if isinstance (other, BlockDataContainer):
             for el,ot in zip(self.containers, other.containers):
                 el += ot
@@ -568,6 +743,10 @@ class BlockDataContainer(object):
     
     def __isub__(self, other):
         '''Inline subtraction'''
+        flat = self._flat_operands(other)
+        if flat is not None:
+            flat[0].subtract(flat[1], out=flat[0])
+            return self
         if isinstance (other, BlockDataContainer):
             for el,ot in zip(self.containers, other.containers):
                 el -= ot
@@ -584,6 +763,10 @@ class BlockDataContainer(object):
     
     def __imul__(self, other):
         '''Inline multiplication'''
+        flat = self._flat_operands(other)
+        if flat is not None:
+            flat[0].multiply(flat[1], out=flat[0])
+            return self
         if isinstance (other, BlockDataContainer):
             for el,ot in zip(self.containers, other.containers):
                 el *= ot
@@ -600,6 +783,10 @@ class BlockDataContainer(object):
     
     def __idiv__(self, other):
         '''Inline division'''
+        flat = self._flat_operands(other)
+        if flat is not None:
+            flat[0].divide(flat[1], out=flat[0])
+            return self
         if isinstance (other, BlockDataContainer):
             for el,ot in zip(self.containers, other.containers):
                 el /= ot
@@ -623,6 +810,9 @@ class BlockDataContainer(object):
     
     def dot(self, other):
 #        
+        flat = self._flat_operands(other)
+        if flat is not None:
+            return flat[0].dot(flat[1])
         tmp = [ self.containers[i].dot(other.containers[i]) for i in range(self.shape[0])]
         return sum(tmp)
     
@@ -16,6 +16,8 @@
 #   limitations under the License.
 
 import functools
+import numpy
+from numbers import Number
 from cil.framework import BlockDataContainer
 
 class BlockGeometry(object):
@@ -48,9 +50,23 @@ class BlockGeometry(object):
 
     def allocate(self, value=0, **kwargs):
         
-        '''Allocates a BlockDataContainer according to geometries contained in the BlockGeometry'''
+        '''Allocates a BlockDataContainer according to geometries contained in the BlockGeometry
+
+        With contiguous=True the data of all the containers are views of a single buffer, and
+        the algebra, axpby and reductions between such BlockDataContainers with the same 
+        layout run as one operation on the whole buffer. The geometries must have the same dtype.
+
+        :param value: value passed to the allocate of each geometry
+        :param contiguous: allocate the containers in a single buffer
+        :type contiguous: bool, default False
+        '''
         
         symmetry = kwargs.get('symmetry',False)        
+        if kwargs.pop('contiguous', False):
+            if symmetry:
+                raise ValueError('symmetry is not supported by contiguous allocation')
+            return self._allocate_contiguous(value, **kwargs)
+
         containers = [geom.allocate(value, **kwargs) for geom in self.geometries]
         
         if symmetry == True:
@@ -90,3 +106,55 @@ class BlockGeometry(object):
 
         return BlockDataContainer(*containers)
            
+
+    def _leaves(self):
+        for geom in self.geometries:
+            if isinstance(geom, BlockGeometry):
+                for el in geom._leaves():
+                    yield el
+            else:
+                yield geom
+
+    def _allocate_contiguous(self, value, **kwargs):
+        dtypes = set(numpy.dtype(kwargs.get('dtype', geom.dtype)) for geom in self._leaves())
+        if len(dtypes) != 1:
+            raise ValueError('Contiguous allocation requires geometries of the same dtype, got {}'.format(dtypes))
+        dtype = dtypes.pop()
+        size = sum(functools.reduce(lambda x,y: x*y, geom.shape, 1) for geom in self._leaves())
+
+        buffer = numpy.empty(size, dtype=dtype)
+        if isinstance(value, Number):
+            buffer.fill(value)
+        out, _ = self._views(buffer, 0, value, **kwargs)
+        return out
+
+    def _views(self, buffer, offset, value, **kwargs):
+        '''Returns a BlockDataContainer viewing buffer from offset, and the offset of its end'''
+        from cil.framework import ImageGeometry, ImageData, AcquisitionGeometry, AcquisitionData, \
+            VectorGeometry, VectorData
+
+        start = offset
+        containers = []
+        for geom in self.geometries:
+            if isinstance(geom, BlockGeometry):
+                container, offset = geom._views(buffer, offset, value, **kwargs)
+            else:
+                size = functools.reduce(lambda x,y: x*y, geom.shape, 1)
+                view = buffer[offset:offset + size].reshape(geom.shape)
+                if isinstance(geom, ImageGeometry):
+                    container = ImageData(view, deep_copy=False, geometry=geom.copy(), suppress_warning=True)
+                elif isinstance(geom, AcquisitionGeometry):
+                    container = AcquisitionData(view, deep_copy=False, geometry=geom.copy(), suppress_warning=True)
+                elif isinstance(geom, VectorGeometry):
+                    container = VectorData(view, deep_copy=False, geometry=geom.copy())
+                else:
+                    raise ValueError('Contiguous allocation is not supported for {}'.format(type(geom)))
+                if value is not None and not isinstance(value, Number):
+                    # random values are generated by the geometry
+                    view[...] = geom.allocate(value, **kwargs).as_array()
+                offset += size
+            containers.append(container)
+
+        out = BlockDataContainer(*containers)
+        out._buffer = buffer[start:offset]
+        return out, offset
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+#   This work is part of the Core Imaging Library (CIL) developed by CCPi
+#   (Collaborative Computational Project in Tomographic Imaging), with
+#   substantial contributions by UKRI-STFC and University of Manchester.
+
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+
+#   http://www.apache.org/licenses/LICENSE-2.0
+
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import sys
+import threading
+import numpy
+from collections import OrderedDict
+
+
+class BufferPool(object):
+    r'''Pool of memory buffers recycled by the geometry :code:`allocate` methods
+
+    While a BufferPool is active, :code:`ImageGeometry.allocate` and :code:`AcquisitionGeometry.allocate`
+    take their memory from the pool, and the DataContainers they create give their memory back
+    to the pool when they are released. :code:`VectorGeometry.allocate` does not use the pool. Buffers are
+    matched on number of elements and dtype; the least recently released buffers are
+    freed when the memory held exceeds :code:`max_bytes`.
+
+    A buffer is only recycled if nothing else references it, e.g. a view returned by
+    :code:`as_array()` keeps the memory out of the pool.
+
+    The pool is activated as a context manager:
+
+    >>> with BufferPool(max_bytes=4 * 1024**3) as pool:
+    ...     algorithm.run(100)
+    >>> print(pool.statistics())
+
+    :param max_bytes: maximum memory held by the pool in bytes, default None, no limit
+    :type max_bytes: int, optional
+    '''
+
+    _active = []
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        self._free = OrderedDict()
+        self._outstanding = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_held = 0
+        self.bytes_in_use = 0
+        self.peak_bytes = 0
+
+    @staticmethod
+    def active():
+        '''Returns the active BufferPool or None'''
+        if BufferPool._active:
+            return BufferPool._active[-1]
+        return None
+
+    def __enter__(self):
+        BufferPool._active.append(self)
+        return self
+
+    def __exit__(self, *args):
+        BufferPool._active.remove(self)
+        self.clear()
+
+    def __deepcopy__(self, memo):
+        # copies of a pooled DataContainer do not own pooled memory
+        return None
+
+    def acquire(self, shape, dtype):
+        '''Returns an uninitialised array of the requested shape and dtype
+
+        :param shape: shape of the array
+        :param dtype: numpy dtype of the array
+        '''
+        dtype = numpy.dtype(dtype)
+        size = 1
+        for el in shape:
+            size *= el
+        key = (size, dtype)
+
+        with self._lock:
+            buffer = None
+            for idx, (k, el) in reversed(self._free.items()):
+                if k == key:
+                    buffer = el
+                    del self._free[idx]
+                    self.bytes_held -= buffer.nbytes
+                    self.hits += 1
+                    break
+            if buffer is None:
+                buffer = numpy.empty(size, dtype=dtype)
+                self.misses += 1
+
+            self._outstanding[id(buffer)] = key
+            self.bytes_in_use += buffer.nbytes
+            self.peak_bytes = max(self.peak_bytes, self.bytes_in_use + self.bytes_held)
+
+        return buffer.reshape(shape)
+
+    def release(self, array):
+        '''Gives the memory of an array obtained with acquire back to the pool
+
+        The memory is recycled only if the array and its buffer are not referenced
+        anywhere else.
+
+        :param array: numpy array returned by acquire
+        '''
+        buffer = array.base
+        # references to the array: the caller, this frame and getrefcount
+        # references to the buffer: the array, this frame and getrefcount
+        recycle = sys.getrefcount(array) <= 3 and sys.getrefcount(buffer) <= 3
+        with self._lock:
+            key = self._outstanding.pop(id(buffer), None)
+            if key is None:
+                return
+            self.bytes_in_use -= buffer.nbytes
+            if not recycle or key != (buffer.size, buffer.dtype):
+                return
+            if self.max_bytes is not None:
+                if buffer.nbytes > self.max_bytes:
+                    return
+                while self.bytes_held + buffer.nbytes > self.max_bytes:
+                    _, (_, el) = self._free.popitem(last=False)
+                    self.bytes_held -= el.nbytes
+            self._free[id(buffer)] = (key, buffer)
+            self.bytes_held += buffer.nbytes
+
+    def clear(self):
+        '''Frees all the memory held by the pool'''
+        with self._lock:
+            self._free.clear()
+            self._outstanding.clear()
+            self.bytes_held = 0
+            self.bytes_in_use = 0
+
+    def statistics(self):
+        '''Returns a dictionary with hits, misses, bytes_held, bytes_in_use and peak_bytes'''
+        return {'hits': self.hits, 'misses': self.misses, 'bytes_held': self.bytes_held,
+                'bytes_in_use': self.bytes_in_use, 'peak_bytes': self.peak_bytes}
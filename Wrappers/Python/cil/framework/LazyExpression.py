@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+#   This work is part of the Core Imaging Library (CIL) developed by CCPi
+#   (Collaborative Computational Project in Tomographic Imaging), with
+#   substantial contributions by UKRI-STFC and University of Manchester.
+
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+
+#   http://www.apache.org/licenses/LICENSE-2.0
+
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import numpy
+from numbers import Number
+from concurrent.futures import ThreadPoolExecutor
+from cil.utilities.multiprocessing import NUM_THREADS
+
+# number of elements processed per block, chosen so that all the block
+# temporaries of a typical expression stay in the L2 cache
+BLOCK_SIZE = 2**16
+
+
+class LazyExpression(object):
+    r'''Deferred element-wise expression on DataContainers
+
+    A LazyExpression is created with :code:`DataContainer.lazy()`. Algebra on it
+    with numbers, numpy arrays, DataContainers or other LazyExpressions does not
+    compute anything, it records an expression tree. The tree is evaluated in a
+    single pass when the result is materialised with :code:`evaluate()` or
+    written to a DataContainer with :code:`evaluate(out=...)` or :code:`fill`.
+
+    The evaluation splits the data in blocks of :code:`BLOCK_SIZE` elements which
+    are processed in parallel by a pool of threads. Each thread owns a set of
+    block-sized temporaries, so no full size intermediate is ever allocated.
+
+    >>> res = ((x.lazy() - y) * tau + z).evaluate()
+    >>> ((x.lazy() - y) * tau + z).evaluate(out=w)
+    '''
+    __array_priority__ = 3
+
+    def __init__(self, operation, *operands):
+        '''
+        :param operation: numpy ufunc to apply to the operands, or None for a leaf
+        :param operands: the operands of the ufunc, or the DataContainer/numpy array for a leaf
+        '''
+        self.operation = operation
+        self.operands = operands
+
+    @property
+    def container(self):
+        '''Returns the first DataContainer in the expression, used as template for the result'''
+        for leaf in self._leaves():
+            if not isinstance(leaf, numpy.ndarray):
+                return leaf
+        return None
+
+    @property
+    def shape(self):
+        for leaf in self._leaves():
+            return leaf.shape
+
+    def _leaves(self):
+        if self.operation is None:
+            yield self.operands[0]
+        else:
+            for el in self.operands:
+                if isinstance(el, LazyExpression):
+                    for leaf in el._leaves():
+                        yield leaf
+
+    @staticmethod
+    def _as_operand(other):
+        from cil.framework import DataContainer
+        if isinstance(other, LazyExpression):
+            return other
+        elif isinstance(other, (DataContainer, numpy.ndarray)):
+            return LazyExpression(None, other)
+        elif isinstance(other, (Number, numpy.number)):
+            return other
+        return None
+
+    def _binary(self, operation, other, reverse=False):
+        operand = LazyExpression._as_operand(other)
+        if operand is None:
+            return NotImplemented
+        if reverse:
+            return LazyExpression(operation, operand, self)
+        return LazyExpression(operation, self, operand)
+
+    ## algebra
+
+    def __add__(self, other):
+        return self._binary(numpy.add, other)
+    def __sub__(self, other):
+        return self._binary(numpy.subtract, other)
+    def __mul__(self, other):
+        return self._binary(numpy.multiply, other)
+    def __truediv__(self, other):
+        return self._binary(numpy.divide, other)
+    def __pow__(self, other):
+        return self._binary(numpy.power, other)
+    def __radd__(self, other):
+        return self._binary(numpy.add, other, reverse=True)
+    def __rsub__(self, other):
+        return self._binary(numpy.subtract, other, reverse=True)
+    def __rmul__(self, other):
+        return self._binary(numpy.multiply, other, reverse=True)
+    def __rtruediv__(self, other):
+        return self._binary(numpy.divide, other, reverse=True)
+    def __rpow__(self, other):
+        return self._binary(numpy.power, other, reverse=True)
+    def __neg__(self):
+        return LazyExpression(numpy.negative, self)
+
+    def maximum(self, other):
+        return self._binary(numpy.maximum, other)
+    def minimum(self, other):
+        return self._binary(numpy.minimum, other)
+    def abs(self):
+        return LazyExpression(numpy.abs, self)
+    def sign(self):
+        return LazyExpression(numpy.sign, self)
+    def sqrt(self):
+        return LazyExpression(numpy.sqrt, self)
+    def exp(self):
+        return LazyExpression(numpy.exp, self)
+    def log(self):
+        return LazyExpression(numpy.log, self)
+    def conjugate(self):
+        return LazyExpression(numpy.conjugate, self)
+
+    ## evaluation
+
+    def _compile(self):
+        '''Flattens the expression tree in a list of instructions
+
+        Each instruction is a tuple (ufunc, operands, destination), where operands
+        are tuples ('leaf', index), ('tmp', index) or ('const', value) and the
+        destination is the index of a temporary. The last instruction writes
+        to the output.'''
+        leaves = []
+        program = []
+
+        def visit(node):
+            if not isinstance(node, LazyExpression):
+                return ('const', node)
+            if node.operation is None:
+                leaves.append(node.operands[0])
+                return ('leaf', len(leaves) - 1)
+            args = [visit(el) for el in node.operands]
+            program.append((node.operation, args, len(program)))
+            return ('tmp', len(program) - 1)
+
+        visit(self)
+        return leaves, program
+
+    @staticmethod
+    def _run(program, leaves, temporaries, start, stop, out):
+        n = stop - start
+        for i, (operation, args, dest) in enumerate(program):
+            values = []
+            for kind, val in args:
+                if kind == 'leaf':
+                    values.append(leaves[val][start:stop])
+                elif kind == 'tmp':
+                    values.append(temporaries[val][:n])
+                else:
+                    values.append(val)
+            if i == len(program) - 1:
+                operation(*values, out=out[start:stop])
+            else:
+                operation(*values, out=temporaries[dest][:n])
+
+    def evaluate(self, out=None, num_threads=NUM_THREADS, block_size=None):
+        '''Evaluates the expression in a single blocked pass
+
+        :param out: optional DataContainer to store the result
+        :param num_threads: number of threads used for the evaluation
+        :param block_size: number of elements processed per block, default BLOCK_SIZE
+        :return: a new DataContainer, if out is None
+        '''
+        if self.operation is None:
+            self = self * 1
+
+        if block_size is None:
+            block_size = BLOCK_SIZE
+        template = self.container
+        shape = self.shape
+
+        leaves, program = self._compile()
+        for leaf in leaves:
+            if leaf.shape != shape:
+                raise ValueError('Incompatible shapes in expression: {} and {}'.format(shape, leaf.shape))
+        leaves = [numpy.ravel(leaf if isinstance(leaf, numpy.ndarray) else leaf.as_array()) for leaf in leaves]
+
+        # the dtype of each temporary is found running the program on the first element
+        trial = [numpy.empty(1)] * len(program)
+        for i, (operation, args, dest) in enumerate(program):
+            values = [leaves[val][:1] if kind == 'leaf' else trial[val] if kind == 'tmp' else val for kind, val in args]
+            trial[i] = operation(*values)
+        dtypes = [el.dtype for el in trial]
+
+        if out is None:
+            arr = numpy.empty(shape, dtype=dtypes[-1])
+            if template is None:
+                out = arr
+            else:
+                out = type(template)(arr, deep_copy=False,
+                    dimension_labels=template.dimension_labels,
+                    geometry=None if template.geometry is None else template.geometry.copy(),
+                    suppress_warning=True)
+        elif out.shape != shape:
+            raise ValueError('Wrong size for data memory: out {} expected {}'.format(out.shape, shape))
+
+        target = out if isinstance(out, numpy.ndarray) else out.as_array()
+        flat = target.reshape(-1) if target.flags['C_CONTIGUOUS'] else numpy.empty(target.size, dtype=target.dtype)
+
+        size = flat.size
+        num_blocks = (size + block_size - 1) // block_size
+        num_threads = max(1, min(num_threads, num_blocks))
+
+        def work(thread):
+            temporaries = [numpy.empty(min(block_size, size), dtype=dt) for dt in dtypes[:-1]]
+            for block in range(thread, num_blocks, num_threads):
+                start = block * block_size
+                LazyExpression._run(program, leaves, temporaries, start, min(start + block_size, size), flat)
+
+        if num_threads == 1:
+            work(0)
+        else:
+            with ThreadPoolExecutor(max_workers=num_threads) as executor:
+                list(executor.map(work, range(num_threads)))
+
+        if not target.flags['C_CONTIGUOUS']:
+            numpy.copyto(target, flat.reshape(shape))
+        return out
+
+    def as_array(self):
+        '''Evaluates the expression and returns the numpy array'''
+        res = self.evaluate()
+        return res if isinstance(res, numpy.ndarray) else res.as_array()
+
+
+class BlockLazyExpression(object):
+    '''Deferred element-wise expression on BlockDataContainers
+
+    Created with :code:`BlockDataContainer.lazy()`, it holds one expression per
+    container of the block. Algebra is distributed on the rows as for
+    BlockDataContainer and the evaluation returns a BlockDataContainer.
+    '''
+    __array_priority__ = 3
+
+    def __init__(self, *expressions, **kwargs):
+        self.expressions = expressions
+        self.shape = kwargs.get('shape', (len(expressions), 1))
+
+    def _binary(self, operation, other):
+        from cil.framework import BlockDataContainer
+        if isinstance(other, (BlockLazyExpression, BlockDataContainer)):
+            others = other.expressions if isinstance(other, BlockLazyExpression) else other.containers
+            if len(others) != len(self.expressions):
+                raise ValueError('Incompatible for operation {}'.format(operation))
+            res = [operation(el, ot) for el, ot in zip(self.expressions, others)]
+        elif isinstance(other, (list, tuple)):
+            if len(other) != len(self.expressions):
+                raise ValueError('Incompatible for operation {}'.format(operation))
+            res = [operation(el, ot) for el, ot in zip(self.expressions, other)]
+        else:
+            res = [operation(el, other) for el in self.expressions]
+        if any(el is NotImplemented for el in res):
+            return NotImplemented
+        return BlockLazyExpression(*res, shape=self.shape)
+
+    def _unary(self, operation):
+        return BlockLazyExpression(*[operation(el) for el in self.expressions], shape=self.shape)
+
+    def __add__(self, other):
+        return self._binary(lambda a, b: a + b, other)
+    def __sub__(self, other):
+        return self._binary(lambda a, b: a - b, other)
+    def __mul__(self, other):
+        return self._binary(lambda a, b: a * b, other)
+    def __truediv__(self, other):
+        return self._binary(lambda a, b: a / b, other)
+    def __pow__(self, other):
+        return self._binary(lambda a, b: a ** b, other)
+    def __radd__(self, other):
+        return self._binary(lambda a, b: b + a, other)
+    def __rsub__(self, other):
+        return self._binary(lambda a, b: b - a, other)
+    def __rmul__(self, other):
+        return self._binary(lambda a, b: b * a, other)
+    def __rtruediv__(self, other):
+        return self._binary(lambda a, b: b / a, other)
+    def __rpow__(self, other):
+        return self._binary(lambda a, b: b ** a, other)
+    def __neg__(self):
+        return self._unary(lambda a: -a)
+
+    def maximum(self, other):
+        return self._binary(lambda a, b: a.maximum(b), other)
+    def minimum(self, other):
+        return self._binary(lambda a, b: a.minimum(b), other)
+    def abs(self):
+        return self._unary(lambda a: a.abs())
+    def sign(self):
+        return self._unary(lambda a: a.sign())
+    def sqrt(self):
+        return self._unary(lambda a: a.sqrt())
+    def exp(self):
+        return self._unary(lambda a: a.exp())
+    def log(self):
+        return self._unary(lambda a: a.log())
+    def conjugate(self):
+        return self._unary(lambda a: a.conjugate())
+
+    def evaluate(self, out=None, num_threads=NUM_THREADS, block_size=None):
+        '''Evaluates the expression of each row in a single blocked pass
+
+        :param out: optional BlockDataContainer to store the result
+        :param num_threads: number of threads used for the evaluation
+        :param block_size: number of elements processed per block
+        :return: a new BlockDataContainer, if out is None
+        '''
+        from cil.framework import BlockDataContainer
+        if out is None:
+            return BlockDataContainer(*[el.evaluate(num_threads=num_threads, block_size=block_size) \
+                for el in self.expressions], shape=self.shape)
+        if len(out.containers) != len(self.expressions):
+            raise ValueError('Incompatible containers')
+        for el, ot in zip(self.expressions, out.containers):
+            el.evaluate(out=ot, num_threads=num_threads, block_size=block_size)
+        return out
@@ -28,5 +28,7 @@ from .framework import find_key, message
 from .framework import DataProcessor, Processor
 from .framework import AX, PixelByPixelDataProcessor, CastDataContainer
 from .BlockDataContainer import BlockDataContainer
+from .LazyExpression import LazyExpression, BlockLazyExpression
+from .BufferPool import BufferPool
 from .BlockGeometry import BlockGeometry
 from .framework import DataOrder
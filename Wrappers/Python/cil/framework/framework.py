@@ -22,7 +22,12 @@ from numbers import Number
 import ctypes, platform
 from ctypes import util
 import math
+import os
+import tempfile
+import weakref
 from cil.utilities.multiprocessing import NUM_THREADS
+from .LazyExpression import LazyExpression
+from .BufferPool import BufferPool
 # check for the extension
 
 if platform.system() == 'Linux':
@@ -37,6 +42,226 @@ else:
 
 cilacc = ctypes.cdll.LoadLibrary(dll)
 
+c_float_p = ctypes.POINTER(ctypes.c_float)
+c_double_p = ctypes.POINTER(ctypes.c_double)
+
+# reductions, they accumulate in double precision
+for f, p in [(cilacc.sdot, c_float_p), (cilacc.ddot, c_double_p)]:
+    f.argtypes = [p,                              # pointer to the first array
+                  p,                              # pointer to the second array
+                  c_double_p,                     # pointer to the result
+                  ctypes.c_longlong,              # size of the arrays
+                  ctypes.c_int]                   # number of threads
+for f, p in [(cilacc.ssum, c_float_p), (cilacc.dsum, c_double_p),
+             (cilacc.ssquared_norm, c_float_p), (cilacc.dsquared_norm, c_double_p)]:
+    f.argtypes = [p,                              # pointer to the array
+                  c_double_p,                     # pointer to the result
+                  ctypes.c_longlong,              # size of the array
+                  ctypes.c_int]                   # number of threads
+for f, p in [(cilacc.sminmax, c_float_p), (cilacc.dminmax, c_double_p)]:
+    f.argtypes = [p,                              # pointer to the array
+                  p,                              # pointer to the min
+                  p,                              # pointer to the max
+                  ctypes.c_longlong,              # size of the array
+                  ctypes.c_int]                   # number of threads
+for f, p in [(cilacc.ssum_axis, c_float_p), (cilacc.dsum_axis, c_double_p)]:
+    f.argtypes = [p,                              # pointer to the array
+                  p,                              # pointer to the result
+                  ctypes.c_longlong,              # size of the dimensions before the axis
+                  ctypes.c_longlong,              # size of the axis
+                  ctypes.c_longlong,              # size of the dimensions after the axis
+                  ctypes.c_int]                   # number of threads
+for f, p in [(cilacc.spnorm2, c_float_p), (cilacc.dpnorm2, c_double_p)]:
+    f.argtypes = [ctypes.POINTER(p),              # array of pointers to the blocks
+                  ctypes.c_int,                   # number of blocks
+                  p,                              # pointer to the result
+                  ctypes.c_longlong,              # size of each block
+                  ctypes.c_int]                   # number of threads
+
+# reduced precision storage, half (numpy.float16) and bfloat16 data are computed in float32
+for prefix in ['h', 'b']:
+    getattr(cilacc, prefix + 'axpby').argtypes = [ctypes.c_void_p, # pointer to the first array 
+                  ctypes.c_void_p,                # pointer to the second array 
+                  ctypes.c_void_p,                # pointer to the third array 
+                  ctypes.c_void_p,                # pointer to A, float32
+                  ctypes.c_int,                   # type of type of A selector (int)
+                  ctypes.c_void_p,                # pointer to B, float32
+                  ctypes.c_int,                   # type of type of B selector (int)
+                  ctypes.c_longlong,              # type of size of first array 
+                  ctypes.c_int]                   # number of threads
+    getattr(cilacc, prefix + 'dot').argtypes = [ctypes.c_void_p, ctypes.c_void_p, c_double_p, ctypes.c_longlong, ctypes.c_int]
+    getattr(cilacc, prefix + 'sum').argtypes = [ctypes.c_void_p, c_double_p, ctypes.c_longlong, ctypes.c_int]
+    getattr(cilacc, prefix + 'squared_norm').argtypes = [ctypes.c_void_p, c_double_p, ctypes.c_longlong, ctypes.c_int]
+    getattr(cilacc, prefix + 'minmax').argtypes = [ctypes.c_void_p, c_float_p, c_float_p, ctypes.c_longlong, ctypes.c_int]
+    getattr(cilacc, prefix + 'sum_axis').argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_longlong, 
+                  ctypes.c_longlong, ctypes.c_longlong, ctypes.c_int]
+
+def _kernel_prefix(dtype):
+    '''Returns the prefix of the cilacc kernels for dtype, and the ctypes type of the data and of the min/max
+
+    's' float32, 'd' float64, 'h' float16 and 'b' bfloat16, or None if dtype is not supported'''
+    if dtype == numpy.float32:
+        return 's', c_float_p, ctypes.c_float
+    elif dtype == numpy.float64:
+        return 'd', c_double_p, ctypes.c_double
+    elif dtype == numpy.float16:
+        return 'h', ctypes.c_void_p, ctypes.c_float
+    elif getattr(dtype, 'name', None) == 'bfloat16':
+        return 'b', ctypes.c_void_p, ctypes.c_float
+    return None
+
+# axpby, the arrays are passed by address
+for f in [cilacc.saxpby, cilacc.daxpby, cilacc.caxpby, cilacc.zaxpby, 
+          cilacc.saxpby_uint8, cilacc.saxpby_int16, cilacc.saxpby_uint16, cilacc.saxpby_int32]:
+    f.argtypes = [ctypes.c_void_p,                # pointer to the first array 
+                  ctypes.c_void_p,                # pointer to the second array 
+                  ctypes.c_void_p,                # pointer to the third array 
+                  ctypes.c_void_p,                # pointer to A
+                  ctypes.c_int,                   # type of type of A selector (int)
+                  ctypes.c_void_p,                # pointer to B
+                  ctypes.c_int,                   # type of type of B selector (int)
+                  ctypes.c_longlong,              # type of size of first array 
+                  ctypes.c_int]                   # number of threads
+_axpby_kernels = {numpy.dtype(numpy.float32): cilacc.saxpby, numpy.dtype(numpy.float64): cilacc.daxpby,
+                  numpy.dtype(numpy.complex64): cilacc.caxpby, numpy.dtype(numpy.complex128): cilacc.zaxpby}
+# integer x and y with float32 a, b and out
+_axpby_int_kernels = {numpy.dtype(numpy.uint8): cilacc.saxpby_uint8, numpy.dtype(numpy.int16): cilacc.saxpby_int16,
+                      numpy.dtype(numpy.uint16): cilacc.saxpby_uint16, numpy.dtype(numpy.int32): cilacc.saxpby_int32}
+# complex scalars are passed as pairs of real and imaginary parts
+_axpby_scalars = {numpy.dtype(numpy.float32): ctypes.c_float, numpy.dtype(numpy.float64): ctypes.c_double,
+                  numpy.dtype(numpy.complex64): lambda value: (ctypes.c_float * 2)(value.real, value.imag),
+                  numpy.dtype(numpy.complex128): lambda value: (ctypes.c_double * 2)(value.real, value.imag)}
+
+# types accepted as scalars in the algebra of DataContainers
+_scalar_types = (int, float, complex, numpy.number)
+_real_scalar_types = (int, float, numpy.integer, numpy.floating)
+
+# permutation of axes
+for f, p in [(cilacc.stranspose, c_float_p), (cilacc.dtranspose, c_double_p)]:
+    f.argtypes = [p,                              # pointer to the input array
+                  p,                              # pointer to the output array
+                  ctypes.POINTER(ctypes.c_longlong), # shape of the input array
+                  ctypes.POINTER(ctypes.c_int),   # permutation of the axes
+                  ctypes.c_int,                   # number of dimensions
+                  ctypes.c_int]                   # number of threads
+cilacc.transpose_rows_inplace.argtypes = [ctypes.c_void_p,  # pointer to the array
+                  ctypes.POINTER(ctypes.c_longlong), # shape of the array of rows
+                  ctypes.POINTER(ctypes.c_int),   # permutation of the axes of rows
+                  ctypes.c_int,                   # number of dimensions of the array of rows
+                  ctypes.c_longlong]              # size of a row in bytes
+
+def _merge_axes(shape, axes):
+    '''Simplifies a permutation of axes
+
+    Axes of size 1 are dropped and input axes which stay adjacent in the output are merged.
+    Returns the shape of the simplified input and the simplified permutation.'''
+    groups = []
+    for ax in axes:
+        if shape[ax] == 1:
+            continue
+        if groups and groups[-1][-1] + 1 == ax:
+            groups[-1].append(ax)
+        else:
+            groups.append([ax])
+    in_order = sorted(range(len(groups)), key=lambda i: groups[i][0])
+    new_shape = [int(numpy.prod([shape[ax] for ax in groups[i]])) for i in in_order]
+    perm = [in_order.index(i) for i in range(len(groups))]
+    return new_shape, perm
+
+def _transpose(array, axes, out=None, num_threads=NUM_THREADS):
+    '''Returns a C-contiguous copy of array with the axes permuted, as numpy.transpose
+
+    float32 and float64 C-contiguous arrays are permuted by the cache-blocked cilacc kernel.'''
+    new_shape = tuple(array.shape[ax] for ax in axes)
+    if out is None:
+        out = numpy.empty(new_shape, dtype=array.dtype)
+    if array.dtype not in (numpy.float32, numpy.float64) or not array.flags['C_CONTIGUOUS'] \
+        or not out.flags['C_CONTIGUOUS'] or out.dtype != array.dtype:
+        numpy.copyto(out, numpy.transpose(array, axes))
+        return out
+
+    shape, perm = _merge_axes(array.shape, axes)
+    if len(perm) <= 1:
+        numpy.copyto(out, array.reshape(new_shape))
+        return out
+
+    shape = numpy.asarray(shape, dtype=numpy.int64)
+    perm = numpy.asarray(perm, dtype=numpy.int32)
+    if array.dtype == numpy.float32:
+        f, p = cilacc.stranspose, c_float_p
+    else:
+        f, p = cilacc.dtranspose, c_double_p
+    f(array.ctypes.data_as(p), out.ctypes.data_as(p), shape.ctypes.data_as(ctypes.POINTER(ctypes.c_longlong)),
+      perm.ctypes.data_as(ctypes.POINTER(ctypes.c_int)), len(perm), num_threads)
+    return out
+
+def _transpose_in_place(array, axes, num_threads=NUM_THREADS):
+    '''Permutes the axes of a C-contiguous array in its own memory and returns the reshaped array
+
+    If the last axis is unchanged the rows are permuted in place following the cycles of
+    the permutation, if the first axis is unchanged the slabs along it are permuted one 
+    at a time. The extra memory is at most one slab. Otherwise a permuted copy is returned.'''
+    new_shape = tuple(array.shape[ax] for ax in axes)
+    if not array.flags['C_CONTIGUOUS']:
+        return _transpose(array, axes, num_threads=num_threads)
+
+    shape, perm = _merge_axes(array.shape, axes)
+    if len(perm) <= 1:
+        return array.reshape(new_shape)
+
+    if perm[-1] == len(perm) - 1:
+        rows_shape = numpy.asarray(shape[:-1], dtype=numpy.int64)
+        rows_perm = numpy.asarray(perm[:-1], dtype=numpy.int32)
+        cilacc.transpose_rows_inplace(array.ctypes.data, rows_shape.ctypes.data_as(ctypes.POINTER(ctypes.c_longlong)),
+            rows_perm.ctypes.data_as(ctypes.POINTER(ctypes.c_int)), len(rows_perm), shape[-1] * array.itemsize)
+        return array.reshape(new_shape)
+
+    if perm[0] == 0:
+        slabs = array.reshape(shape)
+        slab_axes = [ax - 1 for ax in perm[1:]]
+        buffer = numpy.empty([shape[ax] for ax in perm[1:]], dtype=array.dtype)
+        for i in range(shape[0]):
+            _transpose(slabs[i], slab_axes, out=buffer, num_threads=num_threads)
+            numpy.copyto(slabs[i], buffer.reshape(slabs[i].shape))
+        return array.reshape(new_shape)
+
+    return _transpose(array, axes, num_threads=num_threads)
+
+# maximum size in bytes of the slabs in which memory-mapped containers are processed
+MEMMAP_SLAB_BYTES = 64 * 1024**2
+
+def create_memmap(shape, dtype, path=None, mode='w+', directory=None):
+    '''Returns a numpy.memmap of the requested shape and dtype
+
+    :param path: the file backing the array. If None, a temporary file is created 
+        and deleted when the array is released
+    :param mode: numpy.memmap mode, 'w+' creates or overwrites, 'r+' opens an existing file
+    :param directory: directory of the temporary file, default the system temporary directory
+    '''
+    if path is None:
+        tmp = tempfile.NamedTemporaryFile(prefix='cil_', suffix='.dat', dir=directory)
+        array = numpy.memmap(tmp, dtype=dtype, mode='w+', shape=shape)
+        # the file is deleted when the handle is released with the array
+        array._tmp_file = tmp
+        return array
+    return numpy.memmap(path, dtype=dtype, mode=mode, shape=tuple(shape))
+
+def memmap_slabs(*arrays):
+    '''Yields slices along the first axis so that a slab of every array is at most MEMMAP_SLAB_BYTES'''
+    shape0 = arrays[0].shape[0]
+    row_bytes = max([arr.nbytes // max(arr.shape[0], 1) for arr in arrays] + [1])
+    rows = max(1, MEMMAP_SLAB_BYTES // row_bytes)
+    for start in range(0, shape0, rows):
+        yield slice(start, min(start + rows, shape0))
+
+def copyto(dst, src):
+    '''numpy.copyto, in slabs if either array is memory-mapped'''
+    if isinstance(dst, numpy.memmap) or isinstance(src, numpy.memmap):
+        for sl in memmap_slabs(dst, src):
+            numpy.copyto(dst[sl], src[sl])
+    else:
+        numpy.copyto(dst, src)
+
 def find_key(dic, val):
     """return the key of dictionary dic given the value"""
     return [k for k, v in dic.items() if v == val][0]
@@ -295,6 +520,10 @@ class ImageGeometry(object):
         :type value: number or string, default None allocates empty memory block, default 0
         :param dtype: numerical type to allocate
         :type dtype: numpy type, default numpy.float32
+        :param backing: 'memory' or 'memmap' to store the data in a memory-mapped file
+        :type backing: string, default 'memory'
+        :param path: file backing a 'memmap' container, default None creates a temporary file
+        :type path: string, optional
         '''
 
         dtype = kwargs.get('dtype', self.dtype)
@@ -302,13 +531,25 @@ class ImageGeometry(object):
         if kwargs.get('dimension_labels', None) is not None:
             raise ValueError("Deprecated: 'dimension_labels' cannot be set with 'allocate()'. Use 'geometry.set_labels()' to modify the geometry before using allocate.")
 
-        out = ImageData(geometry=self.copy(), 
+        backing = kwargs.get('backing', 'memory')
+        pool = BufferPool.active() if backing == 'memory' else None
+        out = ImageData(array=None if pool is None else pool.acquire(self.shape, dtype),
+                            geometry=self.copy(), 
                             dtype=dtype, 
+                            backing=backing,
+                            path=kwargs.get('path', None),
+                            mode='w+',
                             suppress_warning=True)
+        out._pool = pool
 
         if isinstance(value, Number):
             # it's created empty, so we make it 0
-            out.array.fill(value)
+            if backing == 'memmap':
+                # a new file is already zero filled
+                if value != 0:
+                    out.fill(value)
+            else:
+                out.array.fill(value)
         else:
             if value == ImageGeometry.RANDOM:
                 seed = kwargs.get('seed', None)
@@ -1979,6 +2220,50 @@ class AcquisitionGeometry(object):
 
         return geometry_new
 
+    def partition_indices(self, num_batches, mode='staggered', seed=None):
+        '''Returns the indices of the angles in each of the num_batches subsets of a partition of the angles
+
+        :param num_batches: number of subsets, between 1 and the number of angles
+        :type num_batches: int
+        :param mode: 'staggered' for every num_batches-th angle, 'sequential' for contiguous blocks of angles,
+            'random_permutation' for the angles in random order split into contiguous blocks, default 'staggered'
+        :type mode: str, optional
+        :param seed: seed of the random permutation, required for 'random_permutation' so that the
+            partitions of the data and of the geometry or operator with the same parameters match
+        :type seed: int, optional
+        :returns: a list of slices for 'staggered' and 'sequential', of sorted index arrays for 'random_permutation'
+        '''
+        num_angles = self.config.angles.num_positions
+        if not isinstance(num_batches, (int, numpy.integer)) or num_batches < 1 or num_batches > num_angles:
+            raise ValueError('num_batches expected an integer between 1 and the number of angles {}, got {}'.format(num_angles, num_batches))
+
+        if mode == 'staggered':
+            return [slice(i, None, num_batches) for i in range(num_batches)]
+
+        # block boundaries of numpy.array_split
+        size, remainder = divmod(num_angles, num_batches)
+        stops = numpy.cumsum([size + 1] * remainder + [size] * (num_batches - remainder))
+        starts = numpy.concatenate(([0], stops[:-1]))
+
+        if mode == 'sequential':
+            return [slice(int(start), int(stop)) for start, stop in zip(starts, stops)]
+        if mode == 'random_permutation':
+            if seed is None:
+                raise ValueError("mode 'random_permutation' requires a seed, so that the partitions of the data and of the operator match")
+            permutation = numpy.random.default_rng(seed).permutation(num_angles)
+            return [numpy.sort(permutation[start:stop]) for start, stop in zip(starts, stops)]
+
+        raise ValueError("mode expected 'staggered', 'sequential' or 'random_permutation', got {}".format(mode))
+
+    def partition(self, num_batches, mode='staggered', seed=None):
+        '''Returns a BlockGeometry of the AcquisitionGeometry of each subset of a partition of the angles
+
+        See :code:`partition_indices` for the parameters. The subsets match those of
+        :code:`AcquisitionData.partition` with the same parameters.
+        '''
+        from cil.framework import BlockGeometry
+        return BlockGeometry(*[self.get_slice(angle=index) for index in self.partition_indices(num_batches, mode, seed)])
+
     def allocate(self, value=0, **kwargs):
         '''allocates an AcquisitionData according to the size expressed in the instance
         
@@ -1986,19 +2271,36 @@ class AcquisitionGeometry(object):
         :type value: number or string, default None allocates empty memory block
         :param dtype: numerical type to allocate
         :type dtype: numpy type, default numpy.float32
+        :param backing: 'memory' or 'memmap' to store the data in a memory-mapped file
+        :type backing: string, default 'memory'
+        :param path: file backing a 'memmap' container, default None creates a temporary file
+        :type path: string, optional
         '''
         dtype = kwargs.get('dtype', self.dtype)
 
         if kwargs.get('dimension_labels', None) is not None:
             raise ValueError("Deprecated: 'dimension_labels' cannot be set with 'allocate()'. Use 'geometry.set_labels()' to modify the geometry before using allocate.")
 
-        out = AcquisitionData(geometry=self.copy(), 
+        backing = kwargs.get('backing', 'memory')
+        pool = BufferPool.active() if backing == 'memory' else None
+        out = AcquisitionData(array=None if pool is None else pool.acquire(self.shape, dtype),
+                                deep_copy=False,
+                                geometry=self.copy(), 
                                 dtype=dtype,
+                                backing=backing,
+                                path=kwargs.get('path', None),
+                                mode='w+',
                                 suppress_warning=True)
+        out._pool = pool
 
         if isinstance(value, Number):
             # it's created empty, so we make it 0
-            out.array.fill(value)
+            if backing == 'memmap':
+                # a new file is already zero filled
+                if value != 0:
+                    out.fill(value)
+            else:
+                out.array.fill(value)
         else:
             if value == AcquisitionGeometry.RANDOM:
                 seed = kwargs.get('seed', None)
@@ -2084,13 +2386,17 @@ class DataContainer(object):
         return self.array.size
 
     __container_priority__ = 1
+    # BufferPool which provided the memory of the container, if any
+    _pool = None
+
     def __init__ (self, array, deep_copy=True, dimension_labels=None, 
                   **kwargs):
         '''Holds the data'''
         
-        if type(array) == numpy.ndarray:
+        if type(array) in (numpy.ndarray, numpy.memmap):
             if deep_copy:
-                self.array = array.copy()
+                # a deep copy is held in memory
+                self.array = numpy.array(array)
             else:
                 self.array = array    
         else:
@@ -2109,6 +2415,42 @@ class DataContainer(object):
             except:
                 pass    
         
+    @staticmethod
+    def _new_array(shape, dtype, backing='memory', path=None, mode=None):
+        '''Creates the data array of a container
+
+        :param backing: 'memory' for a numpy.ndarray or 'memmap' for a numpy.memmap
+        :param path: file of the memmap, default None a temporary file
+        :param mode: memmap mode, default 'r+' if path exists, 'w+' otherwise
+        '''
+        if backing == 'memory':
+            return numpy.empty(shape, dtype=dtype)
+        elif backing == 'memmap':
+            if mode is None:
+                mode = 'r+' if path is not None and os.path.exists(path) else 'w+'
+            return create_memmap(shape, dtype, path=path, mode=mode)
+        raise ValueError("backing must be 'memory' or 'memmap', got {}".format(backing))
+
+    def _data_address(self):
+        '''Returns the address of the data, cached while the container holds the same array'''
+        cache = self.__dict__.get('_address_cache', None)
+        if cache is not None and cache[0]() is self.array:
+            return cache[1]
+        address = self.array.ctypes.data
+        self._address_cache = (weakref.ref(self.array), address)
+        return address
+
+    @property
+    def is_memmap(self):
+        '''True if the data is held in a memory-mapped file'''
+        return isinstance(self.array, numpy.memmap)
+
+    def __del__(self):
+        if self._pool is not None:
+            array = self.__dict__.pop('array', None)
+            if array is not None:
+                self._pool.release(array)
+
     def get_dimension_size(self, dimension_label):
 
         if dimension_label in self.dimension_labels:
@@ -2145,37 +2487,54 @@ class DataContainer(object):
             temp.reorder(dimensions)
             return temp
 
-    def get_slice(self,**kw):
-        '''
-        Returns a new DataContainer containing a single slice of in the requested direction. \
-        Pass keyword arguments <dimension label>=index
-        '''
-        new_array = None
+    def _slice_index(self, **kw):
+        '''Returns the index tuple selecting <dimension label>=index and the remaining labels
 
-        #get ordered list of current dimensions
+        The index can be an integer or a slice, None selects the whole dimension.'''
+        index = [slice(None)] * self.number_of_dimensions
         dimension_labels_list = list(self.dimension_labels)
-
-        #remove axes from array and labels
+        labels = list(dimension_labels_list)
         for key, value in kw.items():
             if value is not None:
                 axis = dimension_labels_list.index(key)
-                dimension_labels_list.remove(key)
-                if new_array is None:
-                    new_array = self.as_array().take(indices=value, axis=axis)
-                else:
-                    new_array = new_array.take(indices=value, axis=axis)
+                index[axis] = value
+                if not isinstance(value, slice):
+                    labels.remove(key)
+        return tuple(index), labels
+
+    def get_slice(self, copy=True, **kw):
+        '''
+        Returns a new DataContainer containing a single slice of in the requested direction. \
+        Pass keyword arguments <dimension label>=index
+
+        :param copy: if False the DataContainer holds a view of the data, which may not be contiguous in memory
+        :type copy: bool, default True
+        '''
+        index, dimension_labels_list = self._slice_index(**kw)
+        new_array = self.as_array()[index]
+        if copy:
+            new_array = numpy.array(new_array)
 
         if new_array.ndim > 1:
             return DataContainer(new_array, False, dimension_labels_list, suppress_warning=True)
         else:
-            return VectorData(new_array, dimension_labels=dimension_labels_list)
+            return VectorData(new_array, dimension_labels=dimension_labels_list, deep_copy=False)
                     
-    def reorder(self, order=None):
+    def reorder(self, order=None, in_place=False, num_threads=NUM_THREADS):
         '''
         reorders the data in memory as requested.
 
+        The data are copied to a new array by a multithreaded cache-blocked transpose. With
+        in_place=True the data are permuted in the memory of the container, using at most 
+        an extra slab along the first axis, if the first or the last axis is unchanged. Views 
+        sharing the memory of the container see the permuted data.
+
         :param order: ordered list of labels from self.dimension_labels, or order for engine 'astra' or 'tigre'
         :type order: list, sting     
+        :param in_place: permute the data in the memory of the container
+        :type in_place: bool, default False
+        :param num_threads: number of threads used by the out of place transpose
+        :type num_threads: int, optional
         '''
 
         if order == 'astra' or order == 'tigre':
@@ -2190,7 +2549,7 @@ class DataContainer(object):
         correct = True
         for el in order:
             correct = correct and el in self.dimension_labels
-        if not correct:
+        if not correct or len(set(order)) != len(order):
             raise ValueError('The axes list for resorting must contain the dimension_labels {0} got {1}'.format(self.dimension_labels, order))
             
         new_order = [0]*len(self.shape)
@@ -2200,20 +2559,40 @@ class DataContainer(object):
             new_order[i] = self.dimension_labels.index(axis)
             dimension_labels_new[i] = axis
 
-        self.array = numpy.ascontiguousarray(numpy.transpose(self.array, new_order))
+        if new_order != list(range(len(new_order))):
+            if in_place:
+                array = self.__dict__.pop('array')
+                self.array = _transpose_in_place(array, new_order, num_threads=num_threads)
+                if self._pool is not None and not numpy.may_share_memory(self.array, array):
+                    # the axes could not be permuted in place, the copy does not belong to the pool
+                    self._pool.release(array)
+                    self._pool = None
+            else:
+                array = self.__dict__.pop('array')
+                self.array = _transpose(array, new_order, num_threads=num_threads)
+                if self._pool is not None:
+                    # the new array does not belong to the pool
+                    self._pool.release(array)
+                    self._pool = None
+        elif not self.array.flags['C_CONTIGUOUS']:
+            self.array = numpy.ascontiguousarray(self.array)
 
         if self.geometry is None:
             self.dimension_labels = dimension_labels_new
         else:
+            # the geometry may be shared with other containers
+            self.geometry = self.geometry.copy()
             self.geometry.set_labels(dimension_labels_new)
     
     def fill(self, array, **dimension):
         '''fills the internal data array with the DataContainer, numpy array or number provided
         
         :param array: number, numpy array or DataContainer to copy into the DataContainer
-        :type array: DataContainer or subclasses, numpy array or number
+        :type array: DataContainer or subclasses, numpy array, number or LazyExpression
         :param dimension: dictionary, optional
         
+        A LazyExpression is evaluated directly into the DataContainer.
+
         if the passed numpy array points to the same array that is contained in the DataContainer,
         it just returns
 
@@ -2233,42 +2612,30 @@ class DataContainer(object):
                     raise ValueError('Cannot fill with the provided array.' + \
                                      'Expecting {0} got {1}'.format(
                                      self.shape,array.shape))
-                numpy.copyto(self.array, array)
+                copyto(self.array, array)
             elif isinstance(array, Number):
-                self.array.fill(array) 
+                if isinstance(self.array, numpy.memmap):
+                    for sl in memmap_slabs(self.array):
+                        self.array[sl].fill(array)
+                else:
+                    self.array.fill(array) 
+            elif isinstance(array, LazyExpression):
+                array.evaluate(out=self)
             elif issubclass(array.__class__ , DataContainer):
-                if hasattr(self, 'geometry') and hasattr(array, 'geometry'):
-                    if self.geometry != array.geometry:
-                        numpy.copyto(self.array, array.subset(dimensions=array.dimension_labels).as_array())
-                        return
-                numpy.copyto(self.array, array.as_array())
+                copyto(self.array, array.as_array())
             else:
                 raise TypeError('Can fill only with number, numpy array or DataContainer and subclasses. Got {}'.format(type(array)))
         else:
             
-            axis = [':']* self.number_of_dimensions
-            dimension_labels = list(self.dimension_labels)
-            for k,v in dimension.items():
-                i = dimension_labels.index(k)
-                axis[i] = v
-
-            command = 'self.array['
-            i = 0
-            for el in axis:
-                if i > 0:
-                    command += ','
-                command += str(el)
-                i+=1
-            
+            index, _ = self._slice_index(**dimension)
             if isinstance(array, numpy.ndarray):
-                command = command + "] = array[:]" 
+                self.array[index] = array
             elif issubclass(array.__class__, DataContainer):
-                command = command + "] = array.as_array()[:]" 
+                self.array[index] = array.as_array()
             elif isinstance (array, Number):
-                command = command + "] = array"
+                self.array[index] = array
             else:
                 raise TypeError('Can fill only with number, numpy array or DataContainer and subclasses. Got {}'.format(type(array)))
-            exec(command)
             
         
     def check_dimensions(self, other):
@@ -2276,17 +2643,28 @@ class DataContainer(object):
     
     ## algebra 
     
+    # algebra with a LazyExpression is left to its reverse operators
     def __add__(self, other):
+        if isinstance(other, LazyExpression):
+            return NotImplemented
         return self.add(other)
     def __mul__(self, other):
+        if isinstance(other, LazyExpression):
+            return NotImplemented
         return self.multiply(other)
     def __sub__(self, other):
+        if isinstance(other, LazyExpression):
+            return NotImplemented
         return self.subtract(other)
     def __div__(self, other):
-        return self.divide(other)
+        return self.__truediv__(other)
     def __truediv__(self, other):
+        if isinstance(other, LazyExpression):
+            return NotImplemented
         return self.divide(other)
     def __pow__(self, other):
+        if isinstance(other, LazyExpression):
+            return NotImplemented
         return self.power(other)
         
     
@@ -2381,70 +2759,117 @@ class DataContainer(object):
                                  .format(len(self.shape),len(new_order)))
         
     def clone(self):
-        '''returns a copy of DataContainer'''
+        '''returns a copy of DataContainer
+        
+        the copy of a memory-mapped DataContainer is stored in a temporary memory-mapped file'''
+        if isinstance(self.array, numpy.memmap):
+            return self._pixel_wise_slabs(numpy.positive, [], None)
         return copy.deepcopy(self)
 
     def copy(self):
         '''alias of clone'''
         return self.clone()
+
+    def lazy(self):
+        '''Returns a LazyExpression wrapping the DataContainer
+
+        Algebra on the returned object records an expression, which is evaluated
+        in a single multithreaded pass by :code:`evaluate()` or when it is passed
+        to :code:`fill`, e.g.
+
+        >>> ((x.lazy() - y) * tau + z).evaluate(out=w)
+        '''
+        return LazyExpression(None, self)
     
     ## binary operations
             
+    def _pixel_wise_slabs(self, pwop, operands, out, *args, **kwargs):
+        '''Applies pwop slab by slab along the first axis, used for memory-mapped data
+
+        If out is None, the result is stored in a temporary memory-mapped file.
+
+        :param operands: the operands following self, numbers or numpy arrays
+        :param out: DataContainer, numpy array or None
+        '''
+        arrays = [self.as_array()] + list(operands)
+        full = [isinstance(el, numpy.ndarray) and el.shape == self.shape for el in arrays]
+
+        if out is None:
+            # the dtype of the result is found on the first element
+            first = [el.reshape(-1)[:1] if f else el for el, f in zip(arrays, full)]
+            dtype = pwop(*first, *args, **kwargs).dtype
+            directory = None
+            for el in arrays:
+                if isinstance(el, numpy.memmap) and el.filename is not None:
+                    directory = os.path.dirname(el.filename)
+                    break
+            result = create_memmap(self.shape, dtype, directory=directory)
+            ret = type(self)(result, deep_copy=False,
+                   dimension_labels=self.dimension_labels,
+                   geometry=None if self.geometry is None else self.geometry.copy(), 
+                   suppress_warning=True)
+        else:
+            result = out if isinstance(out, numpy.ndarray) else out.as_array()
+            if result.shape != self.shape:
+                raise ValueError(message(type(self),"Wrong size for data memory: ", result.shape, self.shape))
+            ret = out
+
+        for sl in memmap_slabs(result, *[el for el, f in zip(arrays, full) if f]):
+            pwop(*[el[sl] if f else el for el, f in zip(arrays, full)], *args, out=result[sl], **kwargs)
+        return ret
+
+    def _new_like(self, array):
+        '''Returns a container of the same class holding array
+
+        The result shares the geometry object of self if the dtype is unchanged, geometries are
+        not modified in place by the algebra. Modifying the geometry of one result in place, e.g.
+        setting its angles, modifies the geometry of self and of the other results too, copy it
+        first with ``geometry.copy()``.'''
+        geometry = self.geometry
+        if geometry is None:
+            return type(self)(array, deep_copy=False, dimension_labels=self.dimension_labels, 
+                              suppress_warning=True)
+        if array.dtype != self.array.dtype:
+            geometry = geometry.copy()
+        return type(self)(array, deep_copy=False, geometry=geometry, suppress_warning=True)
+
     def pixel_wise_binary(self, pwop, x2, *args,  **kwargs):    
         out = kwargs.get('out', None)
+
+        if isinstance(self.array, numpy.memmap) or isinstance(getattr(x2, 'array', None), numpy.memmap) or \
+           isinstance(getattr(out, 'array', out), numpy.memmap):
+            kwargs.pop('out', None)
+            return self._pixel_wise_slabs(pwop, [x2.as_array() if isinstance(x2, DataContainer) else x2], 
+                                          out, *args, **kwargs)
+
+        # the type of x2 is checked once
+        if isinstance(x2, _scalar_types):
+            x2_array = x2
+        elif isinstance(x2, DataContainer):
+            x2_array = x2.as_array()
+        elif isinstance(x2, numpy.ndarray):
+            x2_array = x2
+        else:
+            x2_array = None
         
         if out is None:
-            if isinstance(x2, (int, float, complex, \
-                                 numpy.int, numpy.int8, numpy.int16, numpy.int32, numpy.int64,\
-                                 numpy.float, numpy.float16, numpy.float32, numpy.float64, \
-                                 numpy.complex)):
-                out = pwop(self.as_array() , x2 , *args, **kwargs )
-            elif issubclass(x2.__class__ , DataContainer):
-                out = pwop(self.as_array() , x2.as_array() , *args, **kwargs )
-            elif isinstance(x2, numpy.ndarray):
-                out = pwop(self.as_array() , x2 , *args, **kwargs )
-            else:
+            if x2_array is None:
                 raise TypeError('Expected x2 type as number or DataContainer, got {}'.format(type(x2)))
-            geom = self.geometry
-            if geom is not None:
-                geom = self.geometry.copy()
-            return type(self)(out,
-                   deep_copy=False, 
-                   dimension_labels=self.dimension_labels,
-                   geometry= None if self.geometry is None else self.geometry.copy(), 
-                   suppress_warning=True)
-            
+            return self._new_like(pwop(self.as_array(), x2_array, *args, **kwargs))
         
-        elif issubclass(type(out), DataContainer) and issubclass(type(x2), DataContainer):
-            if self.check_dimensions(out) and self.check_dimensions(x2):
+        elif isinstance(out, DataContainer) and x2_array is not None and not isinstance(x2, numpy.ndarray):
+            if self.shape == out.shape and (x2_array is x2 or self.shape == x2_array.shape):
                 kwargs['out'] = out.as_array()
-                pwop(self.as_array(), x2.as_array(), *args, **kwargs )
-                #return type(self)(out.as_array(),
-                #       deep_copy=False, 
-                #       dimension_labels=self.dimension_labels,
-                #       geometry=self.geometry)
+                pwop(self.as_array(), x2_array, *args, **kwargs )
                 return out
+            elif x2_array is x2:
+                raise ValueError(message(type(self),"Wrong size for data memory: ", out.shape,self.shape))
             else:
                 raise ValueError(message(type(self),"Wrong size for data memory: out {} x2 {} expected {}".format( out.shape,x2.shape ,self.shape)))
-        elif issubclass(type(out), DataContainer) and \
-             isinstance(x2, (int,float,complex, numpy.int, numpy.int8, \
-                             numpy.int16, numpy.int32, numpy.int64,\
-                             numpy.float, numpy.float16, numpy.float32,\
-                             numpy.float64, numpy.complex)):
-            if self.check_dimensions(out):
-                kwargs['out']=out.as_array()
-                pwop(self.as_array(), x2, *args, **kwargs )
-                return out
-            else:
-                raise ValueError(message(type(self),"Wrong size for data memory: ", out.shape,self.shape))
-        elif issubclass(type(out), numpy.ndarray):
+        elif isinstance(out, numpy.ndarray):
             if self.array.shape == out.shape and self.array.dtype == out.dtype:
                 kwargs['out'] = out
                 pwop(self.as_array(), x2, *args, **kwargs)
-                #return type(self)(out,
-                #       deep_copy=False, 
-                #       dimension_labels=self.dimension_labels,
-                #       geometry=self.geometry)
         else:
             raise ValueError (message(type(self),  "incompatible class:" , pwop.__name__, type(out)))
     
@@ -2481,118 +2906,143 @@ class DataContainer(object):
     def minimum(self,x2, out=None, *args, **kwargs):
         return self.pixel_wise_binary(numpy.minimum, x2=x2, out=out, *args, **kwargs)
 
-    def axpby(self, a, b, y, out, dtype=numpy.float32, num_threads=NUM_THREADS):
+    def axpby(self, a, b, y, out, dtype=None, num_threads=NUM_THREADS):
         '''performs axpby with cilacc C library, can be done in-place.
         
         Does the operation .. math:: a*x+b*y and stores the result in out, where x is self
 
-        :param a: scalar
-        :type a: float
-        :param b: scalar
-        :type b: float
+        float32, float64, complex64 and complex128 data are supported. float16 and bfloat16
+        data are computed in float32. uint8, int16, uint16 and int32 x and y are converted to 
+        float32 in the kernel when out is float32.
+
+        :param a: scalar or array
+        :type a: float or complex
+        :param b: scalar or array
+        :type b: float or complex
         :param y: DataContainer
         :param out: DataContainer instance to store the result
-        :param dtype: data type of the DataContainers
-        :type dtype: numpy type, optional, default numpy.float32
+        :param dtype: data type of the computation, must match the type of out
+        :type dtype: numpy type, optional, default the type of out
         :param num_threads: number of threads to run on
         :type num_threads: int, optional, default 1/2 CPU of the system
         '''
 
-        c_float_p = ctypes.POINTER(ctypes.c_float)
-        c_double_p = ctypes.POINTER(ctypes.c_double)
-
-        #convert a and b to numpy arrays and get the reference to the data (length = 1 or ndx.size)
-        try:
-            nda = a.as_array()
-        except:
-            nda = numpy.asarray(a)
-
-        try:
-            ndb = b.as_array()
-        except:
-            ndb = numpy.asarray(b)
-
-        a_vec = 0
-        if nda.size > 1:
-            a_vec = 1
-
-        b_vec = 0
-        if ndb.size > 1:
-            b_vec = 1
-
         # get the reference to the data
         ndx = self.as_array()
         ndy = y.as_array()
         ndout = out.as_array()
 
-        if ndout.dtype != dtype:
-            raise Warning("out array of type {0} does not match requested dtype {1}. Using {0}".format(ndout.dtype, dtype))
+        reduced_precision = ndout.dtype == numpy.float16 or ndout.dtype.name == 'bfloat16'
+        if dtype is None:
             dtype = ndout.dtype
-        if ndx.dtype != dtype:
+        else:
+            dtype = numpy.dtype(dtype)
+            if ndout.dtype != dtype and not (dtype == numpy.float32 and reduced_precision):
+                raise Warning("out array of type {0} does not match requested dtype {1}. Using {0}".format(ndout.dtype, dtype))
+        if reduced_precision:
+            return self._axpby_reduced_precision(a, b, y, out, num_threads)
+
+        f = _axpby_kernels.get(dtype, None)
+        if f is None:
+            raise TypeError('Unsupported type {}. Expecting numpy.float32, numpy.float64, numpy.complex64 or numpy.complex128'.format(dtype))
+        # integer data are converted in the kernel
+        if dtype == numpy.float32 and ndx.dtype == ndy.dtype and ndx.dtype in _axpby_int_kernels:
+            f = _axpby_int_kernels[ndx.dtype]
+            data_dtype = ndx.dtype
+        else:
+            data_dtype = dtype
+
+        # scalars are passed by reference, without creating arrays
+        scalar = _axpby_scalars[dtype]
+        scalar_types = _scalar_types if dtype.kind == 'c' else _real_scalar_types
+        if isinstance(a, scalar_types):
+            nda, a_p, a_vec = None, ctypes.byref(scalar(a)), 0
+        else:
+            nda = a.as_array() if hasattr(a, 'as_array') else numpy.asarray(a)
+            a_vec = 1 if nda.size > 1 else 0
+            if nda.dtype != dtype:
+                nda = nda.astype(dtype)
+        if isinstance(b, scalar_types):
+            ndb, b_p, b_vec = None, ctypes.byref(scalar(b)), 0
+        else:
+            ndb = b.as_array() if hasattr(b, 'as_array') else numpy.asarray(b)
+            b_vec = 1 if ndb.size > 1 else 0
+            if ndb.dtype != dtype:
+                ndb = ndb.astype(dtype)
+
+        if ndx.dtype != data_dtype:
             ndx = ndx.astype(dtype)
-        if ndy.dtype != dtype:
+        if ndy.dtype != data_dtype:
             ndy = ndy.astype(dtype)
-        if nda.dtype != dtype:
-            nda = nda.astype(dtype)
-        if ndb.dtype != dtype:
-            ndb = ndb.astype(dtype)
-
-        if dtype == numpy.float32:
-            x_p = ndx.ctypes.data_as(c_float_p)
-            y_p = ndy.ctypes.data_as(c_float_p)
-            out_p = ndout.ctypes.data_as(c_float_p)
-            a_p = nda.ctypes.data_as(c_float_p)
-            b_p = ndb.ctypes.data_as(c_float_p)
-            f = cilacc.saxpby
-
-        elif dtype == numpy.float64:
-            x_p = ndx.ctypes.data_as(c_double_p)
-            y_p = ndy.ctypes.data_as(c_double_p)
-            out_p = ndout.ctypes.data_as(c_double_p)
-            a_p = nda.ctypes.data_as(c_double_p)
-            b_p = ndb.ctypes.data_as(c_double_p)
-            f = cilacc.daxpby
-
-        else:
-            raise TypeError('Unsupported type {}. Expecting numpy.float32 or numpy.float64'.format(dtype))
-
-        #out = numpy.empty_like(a)
-
-        
-        # int psaxpby(float * x, float * y, float * out, float a, float b, long size)
-        cilacc.saxpby.argtypes = [ctypes.POINTER(ctypes.c_float),  # pointer to the first array 
-                                  ctypes.POINTER(ctypes.c_float),  # pointer to the second array 
-                                  ctypes.POINTER(ctypes.c_float),  # pointer to the third array 
-                                  ctypes.POINTER(ctypes.c_float),  # pointer to A
-                                  ctypes.c_int,                    # type of type of A selector (int)
-                                  ctypes.POINTER(ctypes.c_float),  # pointer to B
-                                  ctypes.c_int,                    # type of type of B selector (int)
-                                  ctypes.c_longlong,               # type of size of first array 
-                                  ctypes.c_int]                    # number of threads
-        cilacc.daxpby.argtypes = [ctypes.POINTER(ctypes.c_double), # pointer to the first array 
-                                  ctypes.POINTER(ctypes.c_double), # pointer to the second array 
-                                  ctypes.POINTER(ctypes.c_double), # pointer to the third array 
-                                  ctypes.POINTER(ctypes.c_double), # type of A (c_double)
-                                  ctypes.c_int,                    # type of type of A selector (int)                                  
-                                  ctypes.POINTER(ctypes.c_double), # type of B (c_double)
-                                  ctypes.c_int,                    # type of type of B selector (int)                                  
-                                  ctypes.c_longlong,               # type of size of first array 
-                                  ctypes.c_int]                    # number of threads
+
+        if isinstance(ndx, numpy.memmap) or isinstance(ndy, numpy.memmap) or isinstance(ndout, numpy.memmap):
+            # memory-mapped data are processed in slabs along the first axis
+            for sl in memmap_slabs(ndx, ndy, ndout):
+                slab_a = numpy.asarray(nda.reshape(ndx.shape)[sl]) if a_vec else a if nda is None else nda
+                slab_b = numpy.asarray(ndb.reshape(ndx.shape)[sl]) if b_vec else b if ndb is None else ndb
+                DataContainer(numpy.asarray(ndx[sl]), False).axpby(slab_a, slab_b, 
+                    DataContainer(numpy.asarray(ndy[sl]), False), DataContainer(numpy.asarray(ndout[sl]), False), 
+                    dtype=dtype, num_threads=num_threads)
+            return
+
+        # views returned by get_slice(copy=False) may not be contiguous
+        if not ndout.flags.c_contiguous:
+            tmp = DataContainer(numpy.empty(ndout.shape, dtype=dtype), False)
+            DataContainer(ndx, False).axpby(a if nda is None else nda, b if ndb is None else ndb, 
+                DataContainer(ndy, False), tmp, dtype=dtype, num_threads=num_threads)
+            numpy.copyto(ndout, tmp.array)
+            return
+
+        # contiguous copies are kept referenced until the kernel returns
+        if nda is not None:
+            nda = numpy.ascontiguousarray(nda)
+            a_p = nda.ctypes.data
+        if ndb is not None:
+            ndb = numpy.ascontiguousarray(ndb)
+            b_p = ndb.ctypes.data
+        if not ndx.flags.c_contiguous:
+            ndx = numpy.ascontiguousarray(ndx)
+        if not ndy.flags.c_contiguous:
+            ndy = numpy.ascontiguousarray(ndy)
+        x_p = self._data_address() if ndx is self.array else ndx.ctypes.data
+        y_p = y._data_address() if ndy is y.array else ndy.ctypes.data
+        out_p = out._data_address()
 
         if f(x_p, y_p, out_p, a_p, a_vec, b_p, b_vec, ndx.size, num_threads) != 0:
             raise RuntimeError('axpby execution failed')
         
 
+    def _axpby_reduced_precision(self, a, b, y, out, num_threads):
+        '''axpby on float16 or bfloat16 data, computed in float32
+
+        The data are read and written in their storage type by cilacc, a and b are float32.'''
+        ndout = out.as_array()
+        ndx = self.as_array()
+        ndy = y.as_array()
+        if ndx.dtype != ndout.dtype:
+            ndx = ndx.astype(ndout.dtype)
+        if ndy.dtype != ndout.dtype:
+            ndy = ndy.astype(ndout.dtype)
+        nda = numpy.ascontiguousarray(a.as_array() if hasattr(a, 'as_array') else a, dtype=numpy.float32)
+        ndb = numpy.ascontiguousarray(b.as_array() if hasattr(b, 'as_array') else b, dtype=numpy.float32)
+
+        if not (ndx.flags.c_contiguous and ndy.flags.c_contiguous and ndout.flags.c_contiguous):
+            numpy.copyto(ndout, nda * ndx.astype(numpy.float32) + ndb * ndy.astype(numpy.float32), casting='unsafe')
+            return
+
+        f = getattr(cilacc, _kernel_prefix(ndout.dtype)[0] + 'axpby')
+        if f(ndx.ctypes.data, ndy.ctypes.data, ndout.ctypes.data, nda.ctypes.data, 1 if nda.size > 1 else 0,
+             ndb.ctypes.data, 1 if ndb.size > 1 else 0, ndx.size, num_threads) != 0:
+            raise RuntimeError('axpby execution failed')
+
     ## unary operations
     def pixel_wise_unary(self, pwop, *args,  **kwargs):
         out = kwargs.get('out', None)
+        if isinstance(self.array, numpy.memmap) or isinstance(getattr(out, 'array', out), numpy.memmap):
+            kwargs.pop('out', None)
+            return self._pixel_wise_slabs(pwop, [], out, *args, **kwargs)
         if out is None:
-            out = pwop(self.as_array() , *args, **kwargs )
-            return type(self)(out,
-                       deep_copy=False, 
-                       dimension_labels=self.dimension_labels,
-                       geometry=self.geometry, 
-                       suppress_warning=True)
+            return self._new_like(pwop(self.as_array() , *args, **kwargs ))
         elif issubclass(type(out), DataContainer):
             if self.check_dimensions(out):
                 kwargs['out'] = out.as_array()
@@ -2627,15 +3077,72 @@ class DataContainer(object):
         return self.pixel_wise_unary(numpy.log, *args, **kwargs)
     
     ## reductions
-    def sum(self, *args, **kwargs):
-        return self.as_array().sum(*args, **kwargs)
+    def _reduction_array(self):
+        '''Returns the data array if it can be reduced by cilacc, None otherwise'''
+        arr = self.as_array()
+        if arr.flags['C_CONTIGUOUS'] and arr.size > 0 and _kernel_prefix(arr.dtype) is not None:
+            return arr
+        return None
+
+    def _axis_index(self, axis):
+        '''Converts dimension labels to axis indices'''
+        if isinstance(axis, str):
+            return self.get_dimension_axis(axis)
+        elif isinstance(axis, (list, tuple)):
+            return tuple(self._axis_index(el) for el in axis)
+        return axis
+
+    def sum(self, axis=None, *args, **kwargs):
+        '''Returns the sum of the DataContainer
+
+        float32, float64 and reduced precision float16 and bfloat16 data are reduced by the cilacc 
+        library accumulating in double precision
+
+        :param axis: optional, dimension label or index of the axis to sum along
+        :type axis: str, int or tuple
+        :param num_threads: number of threads to run on
+        :type num_threads: int, optional, default 1/2 CPU of the system
+        :return: the sum as a float64, or a numpy array if axis is passed
+        '''
+        num_threads = kwargs.pop('num_threads', NUM_THREADS)
+        axis = self._axis_index(axis)
+        arr = self._reduction_array()
+
+        if arr is None or args or kwargs or isinstance(axis, tuple):
+            return self.as_array().sum(axis, *args, **kwargs)
+
+        prefix, p, _ = _kernel_prefix(arr.dtype)
+        if axis is None:
+            res = ctypes.c_double()
+            getattr(cilacc, prefix + 'sum')(arr.ctypes.data_as(p), ctypes.byref(res), arr.size, num_threads)
+            return numpy.float64(res.value)
+
+        if axis < 0:
+            axis += arr.ndim
+        shape = arr.shape
+        out = numpy.empty(shape[:axis] + shape[axis+1:], dtype=arr.dtype)
+        outer = int(numpy.prod(shape[:axis]))
+        inner = int(numpy.prod(shape[axis+1:]))
+        getattr(cilacc, prefix + 'sum_axis')(arr.ctypes.data_as(p), out.ctypes.data_as(p),
+                         outer, shape[axis], inner, num_threads)
+        return out
+
     def squared_norm(self, **kwargs):
-        '''return the squared euclidean norm of the DataContainer viewed as a vector'''
-        #shape = self.shape
-        #size = reduce(lambda x,y:x*y, shape, 1)
-        #y = numpy.reshape(self.as_array(), (size, ))
-        return self.dot(self)
-        #return self.dot(self)
+        '''return the squared euclidean norm of the DataContainer viewed as a vector
+
+        :param num_threads: number of threads to run on
+        :type num_threads: int, optional, default 1/2 CPU of the system
+        '''
+        num_threads = kwargs.get('num_threads', NUM_THREADS)
+        arr = self._reduction_array()
+        if arr is None:
+            return self.dot(self, **kwargs)
+
+        prefix, p, _ = _kernel_prefix(arr.dtype)
+        res = ctypes.c_double()
+        getattr(cilacc, prefix + 'squared_norm')(arr.ctypes.data_as(p), ctypes.byref(res), arr.size, num_threads)
+        return numpy.float64(res.value)
+
     def norm(self, **kwargs):
         '''return the euclidean norm of the DataContainer viewed as a vector'''
         return numpy.sqrt(self.squared_norm(**kwargs))
@@ -2646,40 +3153,93 @@ class DataContainer(object):
         applies to real and complex data. In such case the dot method returns
 
         a.dot(b.conjugate())
+
+        :param method: 'cilacc' (default) and 'reduce' accumulate float32, float64, float16 and 
+            bfloat16 data in double precision with the cilacc library, 'numpy' uses numpy.dot
+        :param num_threads: number of threads to run on
+        :type num_threads: int, optional, default 1/2 CPU of the system
         '''
-        method = kwargs.get('method', 'numpy')
-        if method not in ['numpy','reduce']:
-            raise ValueError('dot: specified method not valid. Expecting numpy or reduce got {} '.format(
+        method = kwargs.get('method', 'cilacc')
+        num_threads = kwargs.get('num_threads', NUM_THREADS)
+        if method not in ['cilacc', 'numpy', 'reduce']:
+            raise ValueError('dot: specified method not valid. Expecting cilacc, numpy or reduce got {} '.format(
                     method))
 
-        if self.shape == other.shape:
-            if method == 'numpy':
-                return numpy.dot(self.as_array().ravel(), other.as_array().ravel().conjugate())
-            elif method == 'reduce':
-                # see https://github.com/vais-ral/CCPi-Framework/pull/273
-                # notice that Python seems to be smart enough to use
-                # the appropriate type to hold the result of the reduction
-                sf = reduce(lambda x,y: x + y[0]*y[1],
-                            zip(self.as_array().ravel(),
-                                other.as_array().ravel().conjugate()),
-                            0)
-                return sf
-        else:
+        if self.shape != other.shape:
             raise ValueError('Shapes are not aligned: {} != {}'.format(self.shape, other.shape))
+
+        if method != 'numpy':
+            arr = self._reduction_array()
+            other_arr = other._reduction_array()
+            if arr is not None and other_arr is not None and arr.dtype == other_arr.dtype:
+                prefix, p, _ = _kernel_prefix(arr.dtype)
+                res = ctypes.c_double()
+                getattr(cilacc, prefix + 'dot')(arr.ctypes.data_as(p), other_arr.ctypes.data_as(p),
+                            ctypes.byref(res), arr.size, num_threads)
+                return numpy.float64(res.value)
+
+        if method == 'reduce':
+            # see https://github.com/vais-ral/CCPi-Framework/pull/273
+            # notice that Python seems to be smart enough to use
+            # the appropriate type to hold the result of the reduction
+            sf = reduce(lambda x,y: x + y[0]*y[1],
+                        zip(self.as_array().ravel(),
+                            other.as_array().ravel().conjugate()),
+                        0)
+            return sf
+        return numpy.dot(self.as_array().ravel(), other.as_array().ravel().conjugate())
+
+    def _minmax(self, num_threads):
+        arr = self._reduction_array()
+        if arr is None:
+            return None
+        prefix, p, value_type = _kernel_prefix(arr.dtype)
+        vmin, vmax = value_type(), value_type()
+        getattr(cilacc, prefix + 'minmax')(arr.ctypes.data_as(p), ctypes.byref(vmin), ctypes.byref(vmax), arr.size, num_threads)
+        return arr.dtype.type(vmin.value), arr.dtype.type(vmax.value)
+
+    def min(self, axis=None, *args, **kwargs):
+        '''Returns the min pixel value in the DataContainer
+
+        :param axis: optional, dimension label or index of the axis to reduce
+        :param num_threads: number of threads to run on
+        :type num_threads: int, optional, default 1/2 CPU of the system
+        '''
+        num_threads = kwargs.pop('num_threads', NUM_THREADS)
+        if axis is None and not args and not kwargs:
+            res = self._minmax(num_threads)
+            if res is not None:
+                return res[0]
+        return numpy.min(self.as_array(), self._axis_index(axis), *args, **kwargs)
     
-    def min(self, *args, **kwargs):
-        '''Returns the min pixel value in the DataContainer'''
-        return numpy.min(self.as_array(), *args, **kwargs)
-    
-    def max(self, *args, **kwargs):
-        '''Returns the max pixel value in the DataContainer'''
-        return numpy.max(self.as_array(), *args, **kwargs)
+    def max(self, axis=None, *args, **kwargs):
+        '''Returns the max pixel value in the DataContainer
+
+        :param axis: optional, dimension label or index of the axis to reduce
+        :param num_threads: number of threads to run on
+        :type num_threads: int, optional, default 1/2 CPU of the system
+        '''
+        num_threads = kwargs.pop('num_threads', NUM_THREADS)
+        if axis is None and not args and not kwargs:
+            res = self._minmax(num_threads)
+            if res is not None:
+                return res[1]
+        return numpy.max(self.as_array(), self._axis_index(axis), *args, **kwargs)
     
-    def mean(self, *args, **kwargs):
-        '''Returns the mean pixel value of the DataContainer'''
+    def mean(self, axis=None, *args, **kwargs):
+        '''Returns the mean pixel value of the DataContainer
+
+        :param axis: optional, dimension label or index of the axis to average along
+        :param num_threads: number of threads to run on
+        :type num_threads: int, optional, default 1/2 CPU of the system
+        '''
+        num_threads = kwargs.pop('num_threads', NUM_THREADS)
         if kwargs.get('dtype', None) is None:
             kwargs['dtype'] = numpy.float64
-        return numpy.mean(self.as_array(), *args, **kwargs)
+        if axis is None and not args and kwargs['dtype'] == numpy.float64 and len(kwargs) == 1 \
+            and self._reduction_array() is not None:
+            return self.sum(num_threads=num_threads) / self.size
+        return numpy.mean(self.as_array(), self._axis_index(axis), *args, **kwargs)
 
 
     # Logic operators between DataContainers and floats    
@@ -2720,7 +3280,12 @@ class DataContainer(object):
         return self.as_array()!=other      
         
 class ImageData(DataContainer):
-    '''DataContainer for holding 2D or 3D DataContainer'''
+    '''DataContainer for holding 2D or 3D DataContainer
+
+    Without array, the data can be stored in a memory-mapped file passing 
+    backing='memmap' and the path of the file. An existing file is opened 
+    and its content used as data, unless mode='w+' is passed.
+    '''
     __container_priority__ = 1
 
     @property
@@ -2762,7 +3327,8 @@ class ImageData(DataContainer):
                 raise ValueError("Deprecated: 'dimension_labels' cannot be set with 'allocate()'. Use 'geometry.set_labels()' to modify the geometry before using allocate.")
 
         if array is None:                                   
-            array = numpy.empty(geometry.shape, dtype=dtype)
+            array = DataContainer._new_array(geometry.shape, dtype, kwargs.get('backing', 'memory'),
+                                             kwargs.get('path', None), kwargs.get('mode', None))
         elif issubclass(type(array) , DataContainer):
             array = array.as_array()
         elif issubclass(type(array) , numpy.ndarray):
@@ -2792,9 +3358,12 @@ class ImageData(DataContainer):
             temp.reorder(dimensions)
             return temp
 
-    def get_slice(self,channel=None, vertical=None, horizontal_x=None, horizontal_y=None, force=False):
+    def get_slice(self,channel=None, vertical=None, horizontal_x=None, horizontal_y=None, force=False, copy=True):
         '''
         Returns a new ImageData of a single slice of in the requested direction.
+
+        :param copy: if False the returned ImageData holds a view of the data, this is ignored for vertical='centre'
+        :type copy: bool, default True
         '''
         try:
             geometry_new = self.geometry.get_slice(channel=channel, vertical=vertical, horizontal_x=horizontal_x, horizontal_y=horizontal_y)
@@ -2817,7 +3386,7 @@ class ImageData(DataContainer):
                 out2 = DataContainer.get_slice(self, channel=channel, vertical=ind0 + 1, horizontal_x=horizontal_x, horizontal_y=horizontal_y)
                 out = out * (1 - w2) + out2 * w2
         else:
-            out = DataContainer.get_slice(self, channel=channel, vertical=vertical, horizontal_x=horizontal_x, horizontal_y=horizontal_y)
+            out = DataContainer.get_slice(self, copy=copy, channel=channel, vertical=vertical, horizontal_x=horizontal_x, horizontal_y=horizontal_y)
 
         if len(out.shape) == 1 or geometry_new is None:
             return out
@@ -2825,7 +3394,12 @@ class ImageData(DataContainer):
             return ImageData(out.array, deep_copy=False, geometry=geometry_new, suppress_warning=True)                            
 
 class AcquisitionData(DataContainer):
-    '''DataContainer for holding 2D or 3D sinogram'''
+    '''DataContainer for holding 2D or 3D sinogram
+
+    Without array, the data can be stored in a memory-mapped file passing 
+    backing='memmap' and the path of the file. An existing file is opened 
+    and its content used as data, unless mode='w+' is passed.
+    '''
     __container_priority__ = 1
 
     @property
@@ -2864,7 +3438,8 @@ class AcquisitionData(DataContainer):
                 raise ValueError("Deprecated: 'dimension_labels' cannot be set with 'allocate()'. Use 'geometry.set_labels()' to modify the geometry before using allocate.")
 
         if array is None:                                   
-            array = numpy.empty(geometry.shape, dtype=dtype)
+            array = DataContainer._new_array(geometry.shape, dtype, kwargs.get('backing', 'memory'),
+                                             kwargs.get('path', None), kwargs.get('mode', None))
         elif issubclass(type(array) , DataContainer):
             array = array.as_array()
         elif issubclass(type(array) , numpy.ndarray):
@@ -2891,9 +3466,12 @@ class AcquisitionData(DataContainer):
             temp.reorder(dimensions)
             return temp
 
-    def get_slice(self,channel=None, angle=None, vertical=None, horizontal=None, force=False):
+    def get_slice(self,channel=None, angle=None, vertical=None, horizontal=None, force=False, copy=True):
         '''
         Returns a new dataset of a single slice of in the requested direction. \
+
+        :param copy: if False the returned AcquisitionData holds a view of the data, this is ignored for vertical='centre'
+        :type copy: bool, default True
         '''
         try:
             geometry_new = self.geometry.get_slice(channel=channel, angle=angle, vertical=vertical, horizontal=horizontal)
@@ -2917,13 +3495,45 @@ class AcquisitionData(DataContainer):
                 out2 = DataContainer.get_slice(self, channel=channel, angle=angle, vertical=ind0 + 1, horizontal=horizontal)
                 out = out * (1 - w2) + out2 * w2
         else:
-            out = DataContainer.get_slice(self, channel=channel, angle=angle, vertical=vertical, horizontal=horizontal)
+            out = DataContainer.get_slice(self, copy=copy, channel=channel, angle=angle, vertical=vertical, horizontal=horizontal)
 
         if len(out.shape) == 1 or geometry_new is None:
             return out
         else:
             return AcquisitionData(out.array, deep_copy=False, geometry=geometry_new, suppress_warning=True)
 
+    def partition(self, num_batches, mode='staggered', seed=None):
+        '''Returns a BlockDataContainer of the AcquisitionData of each subset of a partition of the angles
+
+        The subsets of the 'staggered' and 'sequential' partitions are strided views of the data,
+        which share its memory, so that no data is copied. The subsets of a 'random_permutation'
+        partition are copies of the data, as their angles are not evenly spaced in memory.
+        The geometries of the subsets are those of :code:`geometry.partition` with the same parameters.
+
+        :param num_batches: number of subsets, between 1 and the number of angles
+        :type num_batches: int
+        :param mode: 'staggered' for every num_batches-th angle, 'sequential' for contiguous blocks of angles,
+            'random_permutation' for the angles in random order split into contiguous blocks, default 'staggered'
+        :type mode: str, optional
+        :param seed: seed of the random permutation, required for 'random_permutation'
+        :type seed: int, optional
+        '''
+        from cil.framework import BlockDataContainer
+
+        if AcquisitionGeometry.ANGLE not in self.dimension_labels:
+            raise ValueError('AcquisitionData with a single angle cannot be partitioned')
+        axis = self.dimension_labels.index(AcquisitionGeometry.ANGLE)
+
+        subsets = []
+        for index in self.geometry.partition_indices(num_batches, mode, seed):
+            geometry = self.geometry.get_slice(angle=index)
+            slices = [slice(None)] * len(self.shape)
+            slices[axis] = index
+            # subsets of a single angle drop the angle dimension, which keeps the view
+            array = self.as_array()[tuple(slices)].reshape(geometry.shape)
+            subsets.append(AcquisitionData(array, deep_copy=False, geometry=geometry, suppress_warning=True))
+        return BlockDataContainer(*subsets)
+
 class Processor(object):
 
     '''Defines a generic DataContainer processor
@@ -3215,6 +3825,7 @@ class VectorData(DataContainer):
         self.geometry = kwargs.get('geometry', None)
 
         dtype = kwargs.get('dtype', numpy.float32)
+        deep_copy = kwargs.pop('deep_copy', True)
         
         if self.geometry is None:
             if array is None:
@@ -3235,7 +3846,6 @@ class VectorData(DataContainer):
                     out = array
                 else:
                     raise ValueError('Incompatible size: expecting {} got {}'.format((self.length,), array.shape))
-        deep_copy = True
         # need to pass the geometry, othewise None
         super(VectorData, self).__init__(out, deep_copy, self.geometry.dimension_labels, geometry = self.geometry)
     
@@ -3344,7 +3954,7 @@ class DataOrder():
             else:
                 dim_order = DataOrder.CIL_IG_LABELS
         else:
-            raise ValueError("Unknown engine expected 'tigre' or 'astra' got {}".format(engine))
+            raise ValueError("Unknown engine expected 'tigre', 'astra' or 'cil' got {}".format(engine))
         
         dimensions = []
         for label in dim_order:
@@ -17,6 +17,7 @@
 import numpy as np
 import os
 from cil.framework import AcquisitionData, AcquisitionGeometry, ImageData, ImageGeometry
+from cil.framework.framework import memmap_slabs
 from cil.version import version
 import datetime
 
@@ -142,6 +143,10 @@ class NEXUSDataWriter(object):
 
                 for i in range(self.data.shape[0]):
                     ds_data[i:(i+1)] = self.data.array[i] * scale + offset
+            elif isinstance(self.data.array, np.memmap):
+                # write memory-mapped data in slabs
+                for sl in memmap_slabs(self.data.array):
+                    ds_data[sl] = self.data.array[sl]
             else:
                 ds_data.write_direct(self.data.array)
 
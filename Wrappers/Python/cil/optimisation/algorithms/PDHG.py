@@ -22,6 +22,22 @@ import numpy as np
 from numbers import Number
 
 
+def _reciprocal(sums):
+    '''Returns the reciprocal of the sums of the absolute values of the operator, 1 where the sums are 0
+
+    Used for the step sizes of the diagonal preconditioning. The sums of the operators are exact
+    or upper bounds, never the result of cancellations, so the zero sums are the rows or columns
+    of zeros of the operator, where any step size is valid.
+    '''
+    if isinstance(sums, BlockDataContainer):
+        return BlockDataContainer(*[_reciprocal(el) for el in sums.containers], shape=sums.shape)
+    ret = sums.copy()
+    array = ret.as_array()
+    array[array == 0] = 1
+    np.reciprocal(array, out=array)
+    return ret
+
+
 
 class PDHG(Algorithm):
 
@@ -47,6 +63,9 @@ class PDHG(Algorithm):
         Strongly convex constant if the function g is strongly convex. Allows primal acceleration of the PDHG algorithm.
     gamma_fconj : positive :obj:`float`, optional, default=None
         Strongly convex constant if the convex conjugate of f is strongly convex. Allows dual acceleration of the PDHG algorithm.
+    preconditioning : :obj:`str`, optional, default=None
+        ``'diagonal'`` computes the step sizes ``sigma`` and ``tau`` as arrays from the sums of the absolute values of the operator,
+        the diagonal preconditioning of :cite:`PockChambolle2011`, instead of scalars from its norm.
 
     **kwargs:
         Keyward arguments used from the base class :class:`Algorithm`.    
@@ -145,6 +164,16 @@ class PDHG(Algorithm):
 
         \sigma = \frac{1}{\tau\|K\|^{2}}   
 
+    - With ``preconditioning='diagonal'``, the step sizes are the arrays of the diagonal preconditioning of :cite:`PockChambolle2011` with :math:`\alpha=1`:
+
+      .. math::
+
+        \sigma_{i} = \frac{1}{\sum_{j}|K_{i,j}|},  \tau_{j} = \frac{1}{\sum_{i}|K_{i,j}|}
+
+      which guarantee convergence without computing :math:`\|K\|`. The sums are given by :code:`operator.sum_abs_row()` and
+      :code:`operator.sum_abs_col()` and a step size of 1 is used for the rows and columns of zeros of :math:`K`.
+      The acceleration with ``gamma_g`` or ``gamma_fconj`` is not available with the diagonal preconditioning.
+
 
     - To monitor the convergence of the algorithm, we compute the primal/dual objectives and the primal-dual gap in :meth:`update_objective`.\
     
@@ -331,6 +360,8 @@ class PDHG(Algorithm):
         initial : DataContainer, optional, default=None
             Initial point for the PDHG algorithm.
         theta : Relaxation parameter, Number, default 1.0
+        preconditioning : :obj:`str`, optional, default=None
+            ``'diagonal'`` for the step sizes of the diagonal preconditioning, see :meth:`set_step_sizes`.
         """
         print("{} setting up".format(self.__class__.__name__, ))
         
@@ -339,7 +370,7 @@ class PDHG(Algorithm):
         self.g = g
         self.operator = operator
 
-        self.set_step_sizes(sigma=sigma, tau=tau) 
+        self.set_step_sizes(sigma=sigma, tau=tau, preconditioning=kwargs.get('preconditioning', None))
 
         if initial is None:
             self.x_old = self.operator.domain_geometry().allocate(0)
@@ -418,7 +449,7 @@ class PDHG(Algorithm):
         self.update_step_sizes()
 
 
-    def set_step_sizes(self, sigma=None, tau=None):
+    def set_step_sizes(self, sigma=None, tau=None, preconditioning=None):
         """ Sets sigma and tau step-sizes for the PDHG algorithm. The step sizes can be either scalar or array-objects.
 
         Parameters
@@ -427,12 +458,27 @@ class PDHG(Algorithm):
                 Step size for the dual problem.
             tau : positive :obj:`float`, or `np.ndarray`, `DataContainer`, `BlockDataContainer`, optional, default=None
                 Step size for the primal problem.
+            preconditioning : :obj:`str`, optional, default=None
+                ``'diagonal'`` sets sigma and tau to the reciprocals of :code:`operator.sum_abs_row()` and :code:`operator.sum_abs_col()`.
 
         The user can set either, both or none. Values passed by the user will be accepted as long as they are positive numbers, 
         or correct shape array like objects. Warnings may be given in the case the scalar values passed do not guarantee the algorithm
         convergence.
+
+        With the diagonal preconditioning, the step sizes are computed and cannot be passed, and the norm of the operator is not computed.
         """
-        
+
+        if preconditioning is not None:
+            if preconditioning != 'diagonal':
+                raise ValueError("Expected preconditioning 'diagonal' or None, got {}".format(preconditioning))
+            if sigma is not None or tau is not None:
+                raise ValueError("The step-sizes of PDHG are computed by the diagonal preconditioning, sigma and tau cannot be passed")
+            if self.gamma_g is not None or self.gamma_fconj is not None:
+                raise ValueError("The acceleration of PDHG is not available with the diagonal preconditioning")
+            self._sigma = _reciprocal(self.operator.sum_abs_row())
+            self._tau = _reciprocal(self.operator.sum_abs_col())
+            return
+
         # Compute operator norm
         self.norm_op = self.operator.norm()
 
@@ -97,8 +97,22 @@ class SIRT(Algorithm):
                 self.constraint=IndicatorBox(lower=lower,upper=upper)
                 
         # Set up scaling matrices D and M.
-        self.M = 1/self.operator.direct(self.operator.domain_geometry().allocate(value=1.0))        
-        self.D = 1/self.operator.adjoint(self.operator.range_geometry().allocate(value=1.0))
+        # The row and column sums are stored in the OperatorCache for the operators which support it
+        cache, key = self.operator._cache_key() if hasattr(self.operator, '_cache_key') else (None, None)
+        row_sums = column_sums = None
+        if cache is not None:
+            row_sums = cache.get_container(key, 'row_sums', self.operator.range_geometry())
+            column_sums = cache.get_container(key, 'column_sums', self.operator.domain_geometry())
+        if row_sums is None:
+            row_sums = self.operator.direct(self.operator.domain_geometry().allocate(value=1.0))
+            if cache is not None:
+                cache.put_container(key, 'row_sums', row_sums)
+        if column_sums is None:
+            column_sums = self.operator.adjoint(self.operator.range_geometry().allocate(value=1.0))
+            if cache is not None:
+                cache.put_container(key, 'column_sums', column_sums)
+        self.M = 1/row_sums
+        self.D = 1/column_sums
         self.configured = True
         print("{} configured".format(self.__class__.__name__, ))
 
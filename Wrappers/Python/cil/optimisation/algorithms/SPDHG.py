@@ -15,6 +15,7 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 from cil.optimisation.algorithms import Algorithm
+from cil.optimisation.algorithms.PDHG import _reciprocal
 import numpy as np
 import warnings
 
@@ -34,6 +35,7 @@ class SPDHG(Algorithm):
     :param tau: Step size parameter for Primal problem
     :param initial: Initial guess ( Default initial = 0)
     :param prob: List of probabilities
+    :param preconditioning: 'diagonal' for the step sizes of the diagonal preconditioning [2]
         
     Remark: Convergence is guaranted provided that [2, eq. (12)]:
         
@@ -41,6 +43,14 @@ class SPDHG(Algorithm):
     
       \|\sigma[i]^{1/2} * K[i] * tau^{1/2} \|^2  < p_i for all i
       
+    Remark: With preconditioning='diagonal', sigma and tau are the arrays of [2, eq. (14)],
+            computed from the sums of the absolute values of the operators, and the norms
+            of the operators are not computed:
+
+    .. math::
+
+      \sigma[i] = \frac{\gamma \rho}{|K[i]| 1}, \quad \tau = \frac{\rho}{\gamma} \min_i \frac{p_i}{|K[i]|^T 1}
+
     Remark: Notation for primal and dual step-sizes are reversed with comparison
             to PDGH.py
             
@@ -63,7 +73,7 @@ class SPDHG(Algorithm):
     '''
     def __init__(self, f=None, g=None, operator=None, tau=None, sigma=None,
                  initial=None, prob=None, gamma=1., use_axpby=True, 
-                 norms=None, **kwargs):
+                 norms=None, preconditioning=None, **kwargs):
         '''SPDHG algorithm creator
 
         Parameters
@@ -78,6 +88,8 @@ class SPDHG(Algorithm):
         :param use_axpby: whether to use axpby or not
         :param norms: norms of the operators in operator
         :type norms: list, default None
+        :param preconditioning: 'diagonal' for the step sizes of the diagonal preconditioning
+        :type preconditioning: str, default None
         '''
         super(SPDHG, self).__init__(**kwargs)
 
@@ -93,10 +105,11 @@ class SPDHG(Algorithm):
         self._use_axpby = use_axpby
         if f is not None and operator is not None and g is not None:
             self.set_up(f=f, g=g, operator=operator, tau=tau, sigma=sigma, 
-                        initial=initial, prob=prob, gamma=gamma, norms=norms)
+                        initial=initial, prob=prob, gamma=gamma, norms=norms,
+                        preconditioning=preconditioning)
     
     def set_up(self, f, g, operator, tau=None, sigma=None, \
-               initial=None, prob=None, gamma=1., norms=None):
+               initial=None, prob=None, gamma=1., norms=None, preconditioning=None):
         '''initialisation of the algorithm
 
         :param operator: BlockOperator of Linear Operators
@@ -105,7 +118,8 @@ class SPDHG(Algorithm):
         :param sigma: list of Step size parameters for dual problem
         :param tau: Step size parameter for primal problem
         :param initial: Initial guess ( Default initial = 0)
-        :param prob: List of probabilities'''
+        :param prob: List of probabilities
+        :param preconditioning: 'diagonal' for the step sizes of the diagonal preconditioning'''
         print("{} setting up".format(self.__class__.__name__, ))
                     
         # algorithmic parameters
@@ -122,11 +136,18 @@ class SPDHG(Algorithm):
         if self.prob is None:
             self.prob = [1/self.ndual_subsets] * self.ndual_subsets
 
+
+        if preconditioning is not None:
+            if preconditioning != 'diagonal':
+                raise ValueError("Expected preconditioning 'diagonal' or None, got {}".format(preconditioning))
+            if self.sigma is not None or self.tau is not None:
+                raise ValueError("The step-sizes of SPDHG are computed by the diagonal preconditioning, sigma and tau cannot be passed")
+            self.sigma, self.tau = self._diagonal_step_sizes()
         
         if self.sigma is None:
             if norms is None:
-                # Compute norm of each sub-operator       
-                norms = [operator.get_item(i,0).norm() for i in range(self.ndual_subsets)]
+                # Compute norm of each sub-operator, concurrently for num_workers of the BlockOperator
+                norms = operator.row_norms()
             self.norms = norms
             self.sigma = [self.gamma * self.rho / ni for ni in norms] 
         if self.tau is None:
@@ -151,6 +172,20 @@ class SPDHG(Algorithm):
         self.theta = 1
         self.configured = True
         print("{} configured".format(self.__class__.__name__, ))
+
+    def _diagonal_step_sizes(self):
+        '''Returns the step sizes sigma and tau of the diagonal preconditioning'''
+        sigma = [self.gamma * self.rho * _reciprocal(op.sum_abs_row()) for op in self.operator.operators]
+
+        # the columns of zeros of K[i] do not bound tau, the columns of zeros of all the K[i] get step 1
+        tau = self.operator.domain_geometry().allocate(np.inf)
+        steps = tau.as_array()
+        for p, op in zip(self.prob, self.operator.operators):
+            sums = op.sum_abs_col().as_array()
+            np.minimum(steps, np.divide(p, sums, out=np.full(sums.shape, np.inf, dtype=steps.dtype), where=sums > 0), out=steps)
+        steps[np.isinf(steps)] = 1
+        tau *= self.rho / self.gamma
+        return sigma, tau
         
     def update(self):
         # Gradient descent for the primal variable
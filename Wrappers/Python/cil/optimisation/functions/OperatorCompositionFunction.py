@@ -16,7 +16,8 @@
 #   limitations under the License.
 
 from cil.optimisation.functions import Function
-from cil.optimisation.operators import Operator, ScaledOperator
+from cil.optimisation.functions.MixedL21Norm import MixedL21Norm
+from cil.optimisation.operators import Operator, ScaledOperator, GradientOperator
 
 import warnings
 
@@ -61,6 +62,10 @@ class OperatorCompositionFunction(Function):
         """ Returns :math:`F(Ax)`
         """
     
+        # the MixedL21Norm of the gradient is computed without allocating the gradient
+        if type(self.function) is MixedL21Norm and isinstance(self.operator, GradientOperator):
+            return self.operator.direct_pnorm_sum(x, 2)
+
         return self.function(self.operator.direct(x))  
     
     def gradient(self, x, out=None):
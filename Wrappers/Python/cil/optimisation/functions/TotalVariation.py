@@ -138,10 +138,11 @@ class TotalVariation(Function):
         except:
             self._domain = x
         # evaluate objective function of TV gradient
+        # the norm of the gradient is summed without allocating the gradient
         if self.isotropic:
-            return self.regularisation_parameter * self.gradient.direct(x).pnorm(2).sum()
+            return self.regularisation_parameter * self.gradient.direct_pnorm_sum(x, 2)
         else:
-            return self.regularisation_parameter * self.gradient.direct(x).pnorm(1).sum() 
+            return self.regularisation_parameter * self.gradient.direct_pnorm_sum(x, 1)
     
     
     def projection_C(self, x, out=None):   
@@ -19,13 +19,54 @@ import numpy
 import functools
 from cil.framework import ImageData, BlockDataContainer, DataContainer
 from cil.optimisation.operators import Operator, LinearOperator
+from cil.optimisation.operators.Operator import _workspace_dtype, _allocate_workspace
 from cil.framework import BlockGeometry
+from concurrent.futures import ThreadPoolExecutor
 try:
     from sirf import SIRF
     from sirf.SIRF import DataContainer as SIRFDataContainer
     has_sirf = True
 except ImportError as ie:
     has_sirf = False
+
+
+def _operator_instances(operator):
+    '''Returns the operator and the operators it is made of, e.g. by composition or scaling, each once'''
+    instances = {}
+    stack = [operator]
+    while stack:
+        op = stack.pop()
+        if id(op) in instances:
+            continue
+        instances[id(op)] = op
+        for name in ('operators', 'operator', 'operator1', 'operator2', 'op'):
+            value = getattr(op, name, None)
+            if isinstance(value, (list, tuple)):
+                stack.extend(v for v in value if isinstance(v, Operator))
+            elif isinstance(value, Operator):
+                stack.append(value)
+    return list(instances.values())
+
+
+def _group_tasks(task_operators):
+    '''Returns the groups of the indices of the tasks, joining the tasks which share an operator instance'''
+    parent = list(range(len(task_operators)))
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    owner = {}
+    for i, operators in enumerate(task_operators):
+        for op in operators:
+            for instance in _operator_instances(op):
+                j = owner.setdefault(id(instance), i)
+                parent[find(i)] = find(j)
+    groups = {}
+    for i in range(len(task_operators)):
+        groups.setdefault(find(i), []).append(i)
+    return list(groups.values())
+
        
 class BlockOperator(Operator):
     r'''A Block matrix containing Operators
@@ -47,6 +88,14 @@ class BlockOperator(Operator):
 
     Operators in a Block are required to have the same domain column-wise and the
     same range row-wise.
+
+    The partial sums of the rows in direct and of the columns in adjoint are computed
+    in workspaces allocated at the first call and reused by the following calls. With
+    num_workers > 1 the rows, which are independent, are processed concurrently by a
+    pool of threads, each accumulating its rows of the adjoint in its own workspace.
+    This is effective for operators releasing the GIL, e.g. projectors in native code.
+    An operator instance used in several rows, also inside other operators, is
+    applied by one thread at a time: the rows sharing it are processed in sequence.
     '''
     __array_priority__ = 1
     def __init__(self, *args, **kwargs):
@@ -61,6 +110,7 @@ class BlockOperator(Operator):
             :param: shape (:obj:`tuple`, optional): If shape is passed the Operators in 
                   vararg are considered input in a row-by-row fashion. 
                   Shape and number of Operators must match.
+            :param: num_workers (:obj:`int`, optional): number of rows processed concurrently, default 1
                   
         Example:
             BlockOperator(op0,op1) results in a row block
@@ -71,6 +121,9 @@ class BlockOperator(Operator):
         if shape is None:
             shape = (len(args),1)
         self.shape = shape
+        self.num_workers = max(int(kwargs.get('num_workers', 1)), 1)
+        self._executor = None
+        self._workspaces = {}
         n_elements = functools.reduce(lambda x,y: x*y, shape, 1)
         if len(args) != n_elements:
             raise ValueError(
@@ -152,7 +205,135 @@ class BlockOperator(Operator):
                 else:
                     raise TypeError('Operator {} does not have a norm method and is not linear'.format(op))
         return numpy.sqrt(sum(norm))    
+
+    def exact_norm(self):
+        '''Returns the exact norm of a BlockOperator with one operator, None otherwise'''
+        if len(self.operators) == 1:
+            return self.operators[0].exact_norm()
+        return None
+
+    def norm_bound(self):
+        '''Returns a bound of the norm of the BlockOperator computed without iterative methods
+
+        The bound is the square root of the sum of the squared bounds of the operators, as
+        in :code:`norm`, or None if an operator has no bound.
+        '''
+        bounds = []
+        for op in self.operators:
+            bound = op.norm_bound() if hasattr(op, 'norm_bound') else None
+            if bound is None:
+                return None
+            bounds.append(bound ** 2.)
+        return numpy.sqrt(sum(bounds))
     
+    def row_norms(self, iterations=25, tolerance=1e-6):
+        '''Returns the list of the norms of the operators in the rows of a column BlockOperator
+
+        The norms which are not known, exact, nor stored in the OperatorCache, are estimated by the
+        Lanczos method, for up to num_workers operators concurrently, and are stored by the
+        operators and in the cache, so that their :code:`norm` returns them. Operators with their
+        own norm calculation use it.
+
+        :param iterations: maximum number of iterations of the Lanczos method
+        :type iterations: int, default 25
+        :param tolerance: relative tolerance of the Lanczos method on the change of the estimate
+        :type tolerance: float, default 1e-6
+        '''
+        if self.shape[1] != 1:
+            raise ValueError('row_norms requires a column BlockOperator, got shape {}'.format(self.shape))
+
+        iterative = []
+        for row in range(self.shape[0]):
+            op = self.get_item(row, 0)
+            if isinstance(op, LinearOperator) and op._norm is None:
+                op._norm = op.exact_norm()
+                if op._norm is None and type(op).calculate_norm is LinearOperator.calculate_norm:
+                    op._norm = op._load_norm()
+                    if op._norm is None:
+                        iterative.append(row)
+
+        def estimate(row):
+            op = self.get_item(row, 0)
+            op._norm = LinearOperator.Lanczos(op, iterations, tolerance=tolerance)[0]
+            op._store_norm()
+            return op._norm
+
+        self._map(estimate, iterative, lambda row: [self.get_item(row, 0)])
+        return [self.get_item(row, 0).norm() for row in range(self.shape[0])]
+
+    def _get_workspace(self, key, geometry, x):
+        '''Returns the workspace with the given key for results computed from x, allocated from geometry at the first call
+
+        The dtype of the workspace is that of geometry promoted to that of x.'''
+        if geometry is None:
+            return None
+        dtype = _workspace_dtype(geometry, x)
+        key = key + (dtype,)
+        workspace = self._workspaces.get(key)
+        if workspace is None:
+            workspace = _allocate_workspace(geometry, dtype)
+            self._workspaces[key] = workspace
+        return workspace
+
+    def _map(self, function, tasks, operators):
+        '''Calls function on each task, concurrently if num_workers > 1, and returns the results
+
+        operators(task) returns the operators used by the task. The tasks sharing an operator
+        instance run in sequence in the same thread, so that no operator is applied concurrently.
+        '''
+        tasks = list(tasks)
+        groups = _group_tasks([operators(task) for task in tasks]) if self.num_workers > 1 else []
+        if len(groups) <= 1:
+            return [function(task) for task in tasks]
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.num_workers)
+        results = [None] * len(tasks)
+        def run_group(group):
+            for i in group:
+                results[i] = function(tasks[i])
+        list(self._executor.map(run_group, groups))
+        return results
+
+    def _row_operators(self, row):
+        return [self.get_item(row, col) for col in range(self.shape[1])]
+
+    def _direct_row(self, row, x_b, out):
+        '''Returns the sum of the operators in row applied to x_b, computed in out if not None'''
+        for col in range(self.shape[1]):
+            op = self.get_item(row, col)
+            if col == 0:
+                if out is None:
+                    out = op.direct(x_b.get_item(col))
+                else:
+                    op.direct(x_b.get_item(col), out=out)
+            else:
+                tmp = self._get_workspace(('direct', row), op.range_geometry(), x_b.get_item(col))
+                if tmp is None:
+                    out += op.direct(x_b.get_item(col))
+                else:
+                    op.direct(x_b.get_item(col), out=tmp)
+                    out += tmp
+        return out
+
+    def _adjoint_rows(self, col, rows, x_b, out):
+        '''Returns the sum of the adjoints of the operators in col and rows applied to x_b, computed in out if not None'''
+        for i, row in enumerate(rows):
+            op = self.get_item(row, col)
+            if i == 0:
+                if out is None:
+                    out = op.adjoint(x_b.get_item(row))
+                else:
+                    op.adjoint(x_b.get_item(row), out=out)
+            else:
+                tmp = self._get_workspace(('adjoint', col, rows[0]), op.domain_geometry(), x_b.get_item(row))
+                if tmp is None:
+                    out += op.adjoint(x_b.get_item(row))
+                else:
+                    op.adjoint(x_b.get_item(row), out=tmp)
+                    out += tmp
+        return out
+
     def direct(self, x, out=None):
         '''Direct operation for the BlockOperator
 
@@ -165,34 +346,12 @@ class BlockOperator(Operator):
         else:
             x_b = x
         shape = self.get_output_shape(x_b.shape)
-        res = []
-        
+
         if out is None:
-        
-            for row in range(self.shape[0]):
-                for col in range(self.shape[1]):
-                    if col == 0:
-                        prod = self.get_item(row,col).direct(x_b.get_item(col))
-                    else:
-                        prod += self.get_item(row,col).direct(x_b.get_item(col))
-                res.append(prod)
+            res = self._map(lambda row: self._direct_row(row, x_b, None), range(self.shape[0]), self._row_operators)
             return BlockDataContainer(*res, shape=shape)
-                
         else:
-            
-            tmp = self.range_geometry().allocate()
-            for row in range(self.shape[0]):
-                for col in range(self.shape[1]):
-                    if col == 0:       
-                        self.get_item(row,col).direct(
-                                                      x_b.get_item(col),
-                                                      out=out.get_item(row))                        
-                    else:
-                        a = out.get_item(row)
-                        self.get_item(row,col).direct(
-                                                      x_b.get_item(col), 
-                                                      out=tmp.get_item(row))
-                        a += tmp.get_item(row)
+            self._map(lambda row: self._direct_row(row, x_b, out.get_item(row)), range(self.shape[0]), self._row_operators)
                 
     def adjoint(self, x, out=None):
         '''Adjoint operation for the BlockOperator
@@ -213,45 +372,42 @@ class BlockOperator(Operator):
         else:
             x_b = x
         shape = self.get_output_shape(x_b.shape, adjoint=True)
+
+        # the rows are split in groups, one per thread, and the first group accumulates into out
+        num_groups = min(self.num_workers, self.shape[0])
+        groups = [list(range(self.shape[0]))[g::num_groups] for g in range(num_groups)]
+
+        if out is None:
+            res = [None] * self.shape[1]
+        elif issubclass(out.__class__, DataContainer) or \
+                ( has_sirf and issubclass(out.__class__, SIRFDataContainer) ):
+            res = [out]
+        else:
+            res = [out.get_item(col) for col in range(self.shape[1])]
+
+        def adjoint_group(task):
+            col, g = task
+            if g == 0:
+                return self._adjoint_rows(col, groups[g], x_b, res[col])
+            acc = self._get_workspace(('adjoint_sum', col, g), self.get_item(groups[g][0], col).domain_geometry(),
+                                      x_b.get_item(groups[g][0]))
+            return self._adjoint_rows(col, groups[g], x_b, acc)
+
+        tasks = [(col, g) for col in range(self.shape[1]) for g in range(num_groups)]
+        partial = self._map(adjoint_group, tasks, lambda task: [self.get_item(row, task[0]) for row in groups[task[1]]])
+
+        for col in range(self.shape[1]):
+            res[col] = partial[col * num_groups]
+            for g in range(1, num_groups):
+                res[col] += partial[col * num_groups + g]
+
         if out is None:
-            res = []
-            for col in range(self.shape[1]):
-                for row in range(self.shape[0]):
-                    if row == 0:
-                        prod = self.get_item(row, col).adjoint(x_b.get_item(row))
-                    else:
-                        prod += self.get_item(row, col).adjoint(x_b.get_item(row))
-                res.append(prod)
             if self.shape[1]==1:
                 # the output is a single DataContainer, so we can take it out
                 return res[0]
             else:
                 return BlockDataContainer(*res, shape=shape)
-        else:
 
-            for col in range(self.shape[1]):
-                for row in range(self.shape[0]):
-                    if row == 0:
-                        if issubclass(out.__class__, DataContainer) or \
-                ( has_sirf and issubclass(out.__class__, SIRFDataContainer) ):
-                            self.get_item(row, col).adjoint(
-                                                x_b.get_item(row),
-                                                out=out)
-                        else:
-                            op = self.get_item(row,col)
-                            self.get_item(row, col).adjoint(
-                                                x_b.get_item(row),
-                                                out=out.get_item(col))
-                    else:
-                        if issubclass(out.__class__, DataContainer) or \
-                ( has_sirf and issubclass(out.__class__, SIRFDataContainer) ):
-                            out += self.get_item(row,col).adjoint(
-                                                        x_b.get_item(row))
-                        else:
-                            a = out.get_item(col)
-                            a += self.get_item(row,col).adjoint(
-                                                        x_b.get_item(row),
-                                                        )
     def is_linear(self):
         '''returns whether all the elements of the BlockOperator are linear'''
         return functools.reduce(lambda x, y: x and y.is_linear(), self.operators, True)
@@ -290,7 +446,7 @@ class BlockOperator(Operator):
         # create a list of ScaledOperator-s
         ops = [ v * op for v,op in zip(scalars, self.operators)]
         #return BlockScaledOperator(self, scalars ,shape=self.shape)
-        return type(self)(*ops, shape=self.shape)
+        return type(self)(*ops, shape=self.shape, num_workers=self.num_workers)
     @property
     def T(self):
         '''Return the transposed of self
@@ -301,7 +457,7 @@ class BlockOperator(Operator):
         for col in range(newshape[1]):
             for row in range(newshape[0]):
                 oplist.append(self.get_item(col,row))
-        return type(self)(*oplist, shape=newshape)
+        return type(self)(*oplist, shape=newshape, num_workers=self.num_workers)
 
     def domain_geometry(self):
         '''returns the domain of the BlockOperator
@@ -339,7 +495,10 @@ class BlockOperator(Operator):
         #            shape=shape)
         
     def sum_abs_row(self):
-        
+        '''Returns the sums of the absolute values of the rows of the BlockOperator, a BlockDataContainer in its range
+
+        The sums of each block row are the sums of the rows of its operators.
+        '''
         res = []
         for row in range(self.shape[0]):
             for col in range(self.shape[1]):                            
@@ -348,25 +507,25 @@ class BlockOperator(Operator):
                 else:
                     prod += self.get_item(row,col).sum_abs_row()
             res.append(prod)
-            
-        if self.shape[1]==1:
-            tmp = sum(res)
-            return ImageData(tmp)
-        else:
-            
-            return BlockDataContainer(*res)
+
+        return BlockDataContainer(*res)
         
     def sum_abs_col(self):
+        '''Returns the sums of the absolute values of the columns of the BlockOperator, in its domain
 
+        The sums of each block column are the sums of the columns of its operators.
+        '''
         res = []
-        for row in range(self.shape[0]):
-            for col in range(self.shape[1]):
-                if col == 0:
+        for col in range(self.shape[1]):
+            for row in range(self.shape[0]):
+                if row == 0:
                     prod = self.get_item(row, col).sum_abs_col()
                 else:
                     prod += self.get_item(row, col).sum_abs_col()
             res.append(prod)
 
+        if self.shape[1] == 1:
+            return res[0]
         return BlockDataContainer(*res)
 
     def __len__(self):
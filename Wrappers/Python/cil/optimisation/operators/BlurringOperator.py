@@ -17,9 +17,12 @@
 
 import numpy as np
 from cil.optimisation.operators import LinearOperator
+from cil.utilities.multiprocessing import NUM_THREADS
+from cil.utilities.cache import operator_hash
 import cil
 
 from scipy.ndimage import convolve, correlate
+import scipy.fft
 
 class BlurringOperator(LinearOperator):
     
@@ -27,12 +30,28 @@ class BlurringOperator(LinearOperator):
     a point spread function for blurring the image. The implementation is 
     generic and naive simply using convolution.
                        
+    With :code:`mode='fft'` the convolution is computed with multithreaded real FFTs,
+    whose cost does not depend on the size of the PSF. The spectrum of the padded PSF
+    is computed once at construction. The adjoint is the exact adjoint of the direct,
+    also at the boundaries.
+
+    The norm of the operator is computed from the spectrum of the PSF, without
+    power iterations, for periodic boundaries and for reflective boundaries with a PSF
+    of odd size symmetric along each axis. The Lanczos method is used otherwise, and
+    :code:`norm_bound` returns a bound from the row and column sums of the matrix.
+
         :param PSF: numpy array with point spread function of blur.
         :param geometry: ImageGeometry of ImageData to work on.
+        :param mode: 'direct' for the convolution with scipy.ndimage, 'fft' for FFT convolution, default 'direct'
+        :type mode: str, optional
+        :param boundary: 'reflect' for reflective boundary conditions, 'periodic' for periodic, default 'reflect'
+        :type boundary: str, optional
+        :param num_threads: number of threads used by the FFTs
+        :type num_threads: int, optional
                        
      '''
     
-    def __init__(self, PSF, geometry):
+    def __init__(self, PSF, geometry, mode='direct', boundary='reflect', num_threads=NUM_THREADS):
         super(BlurringOperator, self).__init__(domain_geometry=geometry, 
                                            range_geometry=geometry)
         if isinstance(PSF,np.ndarray):
@@ -44,6 +63,75 @@ class BlurringOperator(LinearOperator):
                 isinstance(geometry,cil.framework.framework.AcquisitionGeometry)):
             raise TypeError('geometry must be an ImageGeometry or AcquisitionGeometry.')
 
+        if mode not in ['direct', 'fft']:
+            raise ValueError("mode expected 'direct' or 'fft', got {}".format(mode))
+        if boundary not in ['reflect', 'periodic']:
+            raise ValueError("boundary expected 'reflect' or 'periodic', got {}".format(boundary))
+
+        self.mode = mode
+        self.boundary = boundary
+        self.num_threads = num_threads
+
+        if mode == 'fft':
+            if PSF.ndim != len(geometry.shape):
+                raise ValueError('PSF must have the same number of dimensions as geometry, got {} and {}'.format(PSF.ndim, len(geometry.shape)))
+            if any(k > n for k, n in zip(PSF.shape, geometry.shape)):
+                raise ValueError('PSF must not be larger than the geometry, got {} and {}'.format(PSF.shape, geometry.shape))
+
+            # the convolution of scipy.ndimage: y[i] = sum_j PSF[j] x[i + c - j] with c = K // 2
+            centre = [k // 2 for k in PSF.shape]
+            if boundary == 'reflect':
+                self._padding = [(k - 1 - c, c) for k, c in zip(PSF.shape, centre)]
+                self._fft_shape = [scipy.fft.next_fast_len(n + k - 1, real=True) for n, k in zip(geometry.shape, PSF.shape)]
+            else:
+                self._padding = [(0, 0)] * PSF.ndim
+                self._fft_shape = list(geometry.shape)
+
+            dtype = np.float64 if np.dtype(geometry.dtype) == np.float64 else np.float32
+            self._spectrum = self._psf_spectrum(self._fft_shape).astype(np.result_type(dtype, np.complex64))
+
+
+    def _psf_spectrum(self, shape):
+        '''Returns the real FFT of the PSF, centred at the origin of an array of the given shape'''
+        kernel = np.zeros(shape, dtype=np.float64)
+        kernel[tuple(slice(0, k) for k in self.PSF.shape)] = self.PSF
+        kernel = np.roll(kernel, [-(k // 2) for k in self.PSF.shape], axis=tuple(range(self.PSF.ndim)))
+        return scipy.fft.rfftn(kernel, workers=self.num_threads)
+
+
+    def _fft_convolve(self, x, adjoint):
+        '''Returns the convolution of the array x with the PSF, or its adjoint, with FFTs'''
+        shape = x.shape
+        axes = tuple(range(x.ndim))
+        interior = tuple(slice(before, before + n) for (before, _), n in zip(self._padding, shape))
+
+        if adjoint:
+            # the adjoint of the cropping embeds the data in the padded array
+            padded = np.zeros(self._fft_shape, dtype=x.dtype)
+            padded[interior] = x
+            spectrum = scipy.fft.rfftn(padded, workers=self.num_threads)
+            spectrum *= np.conj(self._spectrum)
+        else:
+            if self.boundary == 'reflect':
+                x = np.pad(x, self._padding, mode='symmetric')
+            spectrum = scipy.fft.rfftn(x, s=self._fft_shape, workers=self.num_threads)
+            spectrum *= self._spectrum
+
+        result = scipy.fft.irfftn(spectrum, s=self._fft_shape, axes=axes, workers=self.num_threads)
+
+        if adjoint and self.boundary == 'reflect':
+            # the adjoint of the reflective padding folds the padding back into the image
+            for axis, (before, after) in enumerate(self._padding):
+                n = shape[axis]
+                index = lambda start, stop: tuple([slice(None)] * axis + [slice(start, stop)])
+                if before > 0:
+                    result[index(before, 2 * before)] += np.flip(result[index(0, before)], axis)
+                if after > 0:
+                    result[index(before + n - after, before + n)] += np.flip(result[index(before + n, before + n + after)], axis)
+                result = result[index(0, before + n + after)]
+
+        return result[interior]
+
         
     def direct(self,x,out=None):
         
@@ -51,13 +139,23 @@ class BlurringOperator(LinearOperator):
         image with the specified PSF. Here reflective boundary conditions 
         are selected.'''
         
+        if self.mode == 'fft':
+            if out is None:
+                result = self.range_geometry().allocate(None)
+                result.fill(self._fft_convolve(x.as_array(), False))
+                return result
+            else:
+                out.fill(self._fft_convolve(x.as_array(), False))
+                return
+
+        scipy_mode = 'reflect' if self.boundary == 'reflect' else 'wrap'
         if out is None:
             result = self.range_geometry().allocate()
-            result.fill(convolve(x.as_array(),self.PSF, mode='reflect'))
+            result.fill(convolve(x.as_array(),self.PSF, mode=scipy_mode))
             return result
         else:
             outarr = out.as_array()
-            convolve(x.as_array(),self.PSF, output=outarr, mode='reflect')
+            convolve(x.as_array(),self.PSF, output=outarr, mode=scipy_mode)
             out.fill(outarr)
     
     def adjoint(self,x, out=None):
@@ -66,12 +164,87 @@ class BlurringOperator(LinearOperator):
         the PSF rotated by 180 degrees, or equivalently correlation by the PSF
         itself.'''
         
+        if self.mode == 'fft':
+            if out is None:
+                result = self.domain_geometry().allocate(None)
+                result.fill(self._fft_convolve(x.as_array(), True))
+                return result
+            else:
+                out.fill(self._fft_convolve(x.as_array(), True))
+                return
+
+        scipy_mode = 'reflect' if self.boundary == 'reflect' else 'wrap'
         if out is None:
             result = self.domain_geometry().allocate()
-            result.fill(correlate(x.as_array(),self.PSF, mode='reflect'))
+            result.fill(correlate(x.as_array(),self.PSF, mode=scipy_mode))
             return result
         else:
             outarr = out.as_array()
-            correlate(x.as_array(),self.PSF, output=outarr, mode='reflect')
+            correlate(x.as_array(),self.PSF, output=outarr, mode=scipy_mode)
             out.fill(outarr)
 
+    def _operator_hash(self):
+        return operator_hash(self, self.PSF, self.boundary)
+
+    def calculate_norm(self, **kwargs):
+        '''Returns the norm of the operator, computed from the spectrum of the PSF when it is
+        diagonalised by the FFT or the DCT, with the Lanczos method otherwise'''
+
+        norm = self.exact_norm()
+        if norm is None:
+            return LinearOperator.calculate_norm(self, **kwargs)
+        return norm
+
+    def exact_norm(self):
+        '''Returns the norm of the operator from the spectrum of the PSF with periodic boundaries,
+        or with reflective boundaries and an odd symmetric PSF, None otherwise'''
+
+        shape = self.domain_geometry().shape
+        if self.PSF.ndim == len(shape) and all(k <= n for k, n in zip(self.PSF.shape, shape)):
+            if self.boundary == 'periodic':
+                # the circulant matrix is diagonalised by the FFT
+                return float(np.abs(self._psf_spectrum(shape)).max())
+
+            symmetric = all(k % 2 == 1 for k in self.PSF.shape) and \
+                all(np.array_equal(self.PSF, np.flip(self.PSF, axis)) for axis in range(self.PSF.ndim))
+            if symmetric:
+                # the eigenvalues with reflective boundaries are the DCT of the PSF,
+                # i.e. the FFT on twice the image size at the first n frequencies along each axis
+                spectrum = self._psf_spectrum([2 * n for n in shape])
+                return float(np.abs(spectrum[tuple(slice(0, n) for n in shape)]).max())
+
+        return None
+
+    def norm_bound(self):
+        '''Returns the exact norm if available, otherwise the bound of Schur's test,
+        the square root of the product of the maximum row and column sums of the absolute
+        values of the matrix, computed with one convolution and one exact adjoint convolution'''
+
+        norm = self.exact_norm()
+        if norm is not None:
+            return norm
+
+        shape = self.domain_geometry().shape
+        if self.PSF.ndim != len(shape) or any(k > n for k, n in zip(self.PSF.shape, shape)):
+            return None
+        return float(np.sqrt(self.sum_abs_row().max() * self.sum_abs_col().max()))
+
+    def _absolute(self):
+        '''Returns the BlurringOperator of the absolute values of the PSF, with FFTs for the exact adjoint when possible'''
+        shape = self.domain_geometry().shape
+        mode = 'fft' if self.PSF.ndim == len(shape) and all(k <= n for k, n in zip(self.PSF.shape, shape)) else self.mode
+        return BlurringOperator(np.abs(self.PSF), self.domain_geometry(), mode=mode,
+                                boundary=self.boundary, num_threads=self.num_threads)
+
+    def sum_abs_row(self):
+        '''Returns the sums of the absolute values of the rows, the convolution of ones with the absolute values of the PSF
+
+        With reflective boundaries and a PSF of mixed signs, the entries of the rows close to the boundaries
+        add several values of the PSF and the sums are upper bounds, exact otherwise.'''
+        return self._absolute().direct(self.domain_geometry().allocate(1))
+
+    def sum_abs_col(self):
+        '''Returns the sums of the absolute values of the columns, the adjoint convolution of ones with the absolute values of the PSF
+
+        Upper bounds close to the boundaries, as for :code:`sum_abs_row`.'''
+        return self._absolute().adjoint(self.range_geometry().allocate(1))
@@ -18,8 +18,36 @@
 import numpy as np
 from cil.framework import ImageData
 from cil.optimisation.operators import LinearOperator
+from cil.optimisation.operators.BlockOperator import _operator_instances
+from cil.optimisation.operators.Operator import _workspace_dtype, _allocate_workspace
 
 from cil.framework import ImageGeometry, AcquisitionGeometry, BlockGeometry
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import threading
+
+# single-channel operator of the worker processes of the 'process' backend
+_worker_operator = None
+
+def _set_worker_operator(op):
+    global _worker_operator
+    _worker_operator = op
+
+def _thread_safe(op):
+    '''Returns whether op and the operators it is made of can be applied concurrently by several threads
+
+    The operators of CIL keep no state shared by the threads, other operators declare it with
+    a :code:`thread_safe` attribute.
+    '''
+    return all(getattr(o, 'thread_safe', type(o).__module__.startswith('cil.optimisation.operators'))
+               for o in _operator_instances(op))
+
+def _apply_in_worker(method, array):
+    if method == 'direct':
+        x = _worker_operator.domain_geometry().allocate(None)
+    else:
+        x = _worker_operator.range_geometry().allocate(None)
+    x.fill(array)
+    return getattr(_worker_operator, method)(x).as_array()
 
 class ChannelwiseOperator(LinearOperator):
     
@@ -31,14 +59,25 @@ class ChannelwiseOperator(LinearOperator):
     ChannelwiseOperator supports simple operators as input but not 
     BlockOperators. Typically if such behaviour is desired, it can be achieved  
     by creating instead a BlockOperator of ChannelwiseOperators.
+
+    The single-channel operator is applied to views of the channels, without
+    copies, and writes into views of the output when they are contiguous in
+    memory, otherwise into a workspace kept for each thread and dtype of the output. With num_workers > 1
+    the channels are processed concurrently by a pool of threads, which is effective
+    for operators releasing the GIL, e.g. in cilacc or numpy. This requires op to be
+    thread safe, as the operators of CIL are: other operators must declare it with a
+    :code:`thread_safe = True` attribute, otherwise ValueError is raised. The 'process' backend sends op to each worker process once and
+    the data of the channels at each call, for operators holding the GIL.
                        
         :param op: Single-channel operator
         :param channels: Number of channels
         :param dimension: 'prepend' (default) or 'append' channel dimension onto existing dimensions
+        :param num_workers: number of channels processed concurrently, default 1
+        :param backend: 'thread' (default) to process the channels in a pool of threads, 'process' in a pool of processes
                        
      '''
     
-    def __init__(self, op, channels, dimension='prepend'):
+    def __init__(self, op, channels, dimension='prepend', num_workers=1, backend='thread'):
         
         dom_op = op.domain_geometry()
         ran_op = op.range_geometry()
@@ -79,48 +118,132 @@ class ChannelwiseOperator(LinearOperator):
         
         self.op = op
         self.channels = channels
-        
+
+        if backend not in ['thread', 'process']:
+            raise ValueError("backend expected 'thread' or 'process', got {}".format(backend))
+        self.num_workers = max(int(num_workers), 1)
+        self.backend = backend
+        if backend == 'thread' and self.num_workers > 1 and not _thread_safe(op):
+            raise ValueError("{} is not declared thread safe, use num_workers=1, backend='process' or set its thread_safe attribute to True"
+                             .format(op.__class__.__name__))
+        self._executor = None
+        # single-channel outputs of each thread, used when the channel of out is not contiguous
+        self._workspaces = {}
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.backend == 'thread':
+                self._executor = ThreadPoolExecutor(max_workers=self.num_workers)
+            else:
+                self._executor = ProcessPoolExecutor(max_workers=self.num_workers,
+                    initializer=_set_worker_operator, initargs=(self.op,))
+        return self._executor
+
+    def _apply(self, method, x, out):
+        '''Applies the single-channel operator's direct or adjoint to each channel of x, writing into out'''
+
+        if method == 'direct':
+            geometry = self.op.range_geometry()
+        else:
+            geometry = self.op.domain_geometry()
+
+        if self.backend == 'process' and self.num_workers > 1:
+            # the data of each channel is sent to the worker processes and the result sent back
+            executor = self._get_executor()
+            futures = [executor.submit(_apply_in_worker, method, x.get_slice(channel=k, copy=False).as_array())
+                       for k in range(self.channels)]
+            for k, future in enumerate(futures):
+                out.get_slice(channel=k, copy=False).as_array()[...] = future.result()
+            return
+
+        def apply_channel(k):
+            x_k = x.get_slice(channel=k, copy=False)
+            out_k = out.get_slice(channel=k, copy=False)
+            if out_k.as_array().flags['C_CONTIGUOUS']:
+                getattr(self.op, method)(x_k, out_k)
+            else:
+                dtype = _workspace_dtype(geometry, out)
+                key = (method, threading.get_ident(), dtype)
+                workspace = self._workspaces.get(key)
+                if workspace is None:
+                    workspace = _allocate_workspace(geometry, dtype)
+                    self._workspaces[key] = workspace
+                getattr(self.op, method)(x_k, workspace)
+                out_k.as_array()[...] = workspace.as_array()
+
+        if self.num_workers > 1 and self.channels > 1:
+            list(self._get_executor().map(apply_channel, range(self.channels)))
+        else:
+            for k in range(self.channels):
+                apply_channel(k)
+
     def direct(self,x,out=None):
         
         '''Returns D(x)'''
         
-        # Loop over channels, extract single-channel data, apply single-channel
-        # operator's direct method and fill into multi-channel output data set.
+        # Apply single-channel operator's direct method to views of each channel
+        # of the input, writing into views of the multi-channel output data set.
         if out is None:
-            output = self.range_geometry().allocate()
-            cury = self.op.range_geometry().allocate()
-            for k in range(self.channels):
-                self.op.direct(x.subset(channel=k),cury)
-                output.fill(cury.as_array(),channel=k)
+            output = self.range_geometry().allocate(None)
+            self._apply('direct', x, output)
             return output
         else:
-            cury = self.op.range_geometry().allocate()
-            for k in range(self.channels):
-                self.op.direct(x.subset(channel=k),cury)
-                out.fill(cury.as_array(),channel=k)
+            self._apply('direct', x, out)
     
     def adjoint(self,x, out=None):
         
         '''Returns D^{*}(y)'''        
         
-        # Loop over channels, extract single-channel data, apply single-channel
-        # operator's adjoint method and fill into multi-channel output data set.
+        # Apply single-channel operator's adjoint method to views of each channel
+        # of the input, writing into views of the multi-channel output data set.
         if out is None:
-            output = self.domain_geometry().allocate()
-            cury = self.op.domain_geometry().allocate()
-            for k in range(self.channels):
-                self.op.adjoint(x.subset(channel=k),cury)
-                output.fill(cury.as_array(),channel=k)
+            output = self.domain_geometry().allocate(None)
+            self._apply('adjoint', x, output)
             return output
         else:
-            cury = self.op.domain_geometry().allocate()
-            for k in range(self.channels):
-                self.op.adjoint(x.subset(channel=k),cury)
-                out.fill(cury.as_array(),channel=k)
+            self._apply('adjoint', x, out)
         
     def calculate_norm(self, **kwargs):
         
-        '''Evaluates operator norm of DiagonalOperator'''
+        '''Evaluates operator norm of ChannelwiseOperator'''
         
         return self.op.norm()
 
+    def exact_norm(self):
+
+        '''Returns the exact norm of the single-channel operator, None if it has no exact norm'''
+
+        return self.op.exact_norm()
+
+    def norm_bound(self):
+
+        '''Returns the bound of the norm of the single-channel operator'''
+
+        return self.op.norm_bound()
+
+
+    @property
+    def nonnegative(self):
+
+        '''Returns whether the matrix of the single-channel operator is nonnegative'''
+
+        return self.op.nonnegative
+
+    def _channelwise(self, sums, geometry):
+        '''Returns the container in geometry with the sums of the single-channel operator in each channel'''
+        ret = geometry.allocate(None)
+        for k in range(self.channels):
+            ret.get_slice(channel=k, copy=False).as_array()[...] = sums.as_array()
+        return ret
+
+    def sum_abs_row(self):
+
+        '''Returns the sums of the absolute values of the rows, those of the single-channel operator in each channel'''
+
+        return self._channelwise(self.op.sum_abs_row(), self.range_geometry())
+
+    def sum_abs_col(self):
+
+        '''Returns the sums of the absolute values of the columns, those of the single-channel operator in each channel'''
+
+        return self._channelwise(self.op.sum_abs_col(), self.domain_geometry())
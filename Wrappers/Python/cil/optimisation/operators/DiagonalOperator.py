@@ -58,4 +58,26 @@ class DiagonalOperator(LinearOperator):
         
         '''Evaluates operator norm of DiagonalOperator'''
         
-        return self.diagonal.max()
+        return self.exact_norm()
+
+    def exact_norm(self):
+
+        '''Returns the norm of DiagonalOperator, the maximum absolute value of the diagonal'''
+
+        return self.diagonal.abs().max()
+
+    def sum_abs_row(self):
+
+        '''Returns the absolute values of the diagonal, in the range geometry'''
+
+        ret = self.range_geometry().allocate(None)
+        ret.fill(np.abs(self.diagonal.as_array()))
+        return ret
+
+    def sum_abs_col(self):
+
+        '''Returns the absolute values of the diagonal, in the domain geometry'''
+
+        ret = self.domain_geometry().allocate(None)
+        ret.fill(np.abs(self.diagonal.as_array()))
+        return ret
@@ -16,8 +16,92 @@
 #   limitations under the License.
 
 import numpy as np
+import ctypes
+from functools import reduce
 
+from cil.framework import cilacc
 from cil.optimisation.operators import LinearOperator
+from cil.utilities.multiprocessing import NUM_THREADS
+from cil.utilities.cache import operator_hash
+
+for _name, _type in [('fdiff_direction', ctypes.c_float), ('dfdiff_direction', ctypes.c_double)]:
+    getattr(cilacc, _name).argtypes = [ctypes.POINTER(_type),  # pointer to the input array
+                                       ctypes.POINTER(_type),  # pointer to the output array
+                                       ctypes.c_long, ctypes.c_long, ctypes.c_long,  # size before, along and after the direction
+                                       ctypes.c_int32,  # method, 0 forward, 1 backward, 2 centered
+                                       ctypes.c_int32,  # boundary condition, 0 Neumann, 1 Periodic
+                                       ctypes.c_int32,  # 1 for the adjoint
+                                       _type,  # voxel size
+                                       ctypes.c_int32,  # 1 to add to the output
+                                       ctypes.c_int32]  # number of threads
+
+_METHODS = {'forward' : 0, 'backward' : 1, 'centered' : 2}
+_BOUNDARY_CONDITIONS = {'Neumann' : 0, 'Periodic' : 1}
+
+
+def fdiff_direction(x, out, direction, method='forward', bnd_cond='Neumann', adjoint=False, voxel_size=1, accumulate=False, num_threads=NUM_THREADS):
+    '''Computes the finite differences of the array x along an axis with cilacc, or their adjoint
+
+    The result is written, or added if accumulate is True, to the array out.
+    Returns False, without computing anything, if the arrays are not supported:
+    float32 or float64 C-contiguous arrays of the same type are required.'''
+
+    if x.dtype not in (np.float32, np.float64) or out.dtype != x.dtype or x.shape != out.shape:
+        return False
+    if not x.flags['C_CONTIGUOUS'] or not out.flags['C_CONTIGUOUS']:
+        return False
+    if method not in _METHODS or bnd_cond not in _BOUNDARY_CONDITIONS:
+        return False
+
+    if x.dtype == np.float32:
+        function, c_type = cilacc.fdiff_direction, ctypes.c_float
+    else:
+        function, c_type = cilacc.dfdiff_direction, ctypes.c_double
+
+    outer = reduce(lambda a, b: a * b, x.shape[:direction], 1)
+    inner = reduce(lambda a, b: a * b, x.shape[direction + 1:], 1)
+
+    function(x.ctypes.data_as(ctypes.POINTER(c_type)), out.ctypes.data_as(ctypes.POINTER(c_type)),
+             outer, x.shape[direction], inner, _METHODS[method], _BOUNDARY_CONDITIONS[bnd_cond],
+             int(adjoint), voxel_size, int(accumulate), num_threads)
+    return True
+
+
+def fdiff_norm(size, method='forward', bnd_cond='Neumann', voxel_size=1):
+    '''Returns the norm of the finite differences along an axis of the given size and whether it is exact
+
+    The differences are diagonalised by the DCT for forward and backward differences with
+    Neumann boundary conditions, and by the DFT with Periodic boundary conditions, which gives
+    their exact norm. The norm of centered differences with Neumann boundary conditions is
+    bounded by 1/voxel_size.'''
+
+    if method in ('forward', 'backward'):
+        if bnd_cond == 'Periodic':
+            return 2 * abs(np.sin(np.pi * (size // 2) / size)) / voxel_size, True
+        return 2 * np.cos(np.pi / (2 * size)) / voxel_size, True
+    if bnd_cond == 'Periodic':
+        return np.abs(np.sin(2 * np.pi * np.arange(size) / size)).max() / voxel_size, True
+    return 1. / voxel_size, False
+
+
+def fdiff_abs_sums(size, method='forward', bnd_cond='Neumann', voxel_size=1):
+    '''Returns the sums of the absolute values of the rows and of the columns of the matrix
+    of the finite differences along an axis of the given size, two 1D arrays'''
+
+    rows = np.full(size, 2. / voxel_size)
+    columns = np.full(size, 2. / voxel_size)
+    if method == 'centered':
+        rows[:] = columns[:] = 1. / voxel_size
+        if size == 2 and bnd_cond == 'Periodic':
+            # the neighbours of each pixel are the same pixel
+            rows[:] = columns[:] = 0
+    elif bnd_cond == 'Neumann':
+        # the difference at the last, or first for backward differences, pixel is 0
+        rows[-1 if method == 'forward' else 0] = 0
+        columns[[0, -1]] = 1. / voxel_size
+    if size == 1:
+        rows[:] = columns[:] = 0
+    return rows, columns
 
 ###############################################################################
 ###############################################################################
@@ -40,6 +124,11 @@ class FiniteDifferenceOperator(LinearOperator):
         :param method: Method for finite differences
         :type method: 'forward', 'backward', 'centered'
         :param bnd_cond: 'Neumann', 'Periodic'
+        :param num_threads: number of threads used for float32 and float64 data
+        :type num_threads: int, optional
+
+        float32 and float64 data are processed in one multithreaded pass by cilacc,
+        other types, e.g. complex data, with NumPy.
         
      '''        
     
@@ -47,7 +136,8 @@ class FiniteDifferenceOperator(LinearOperator):
                        range_geometry=None, 
                        direction = None, 
                        method = 'forward',
-                       bnd_cond = 'Neumann'):
+                       bnd_cond = 'Neumann',
+                       num_threads = NUM_THREADS):
         
         if isinstance(direction, int):
             if direction > len(domain_geometry.shape) or direction<0:
@@ -68,6 +158,7 @@ class FiniteDifferenceOperator(LinearOperator):
         
         self.boundary_condition = bnd_cond
         self.method = method
+        self.num_threads = num_threads
                 
         # Domain Geometry = Range Geometry if not stated
         if range_geometry is None:
@@ -91,7 +182,73 @@ class FiniteDifferenceOperator(LinearOperator):
         tmp[self.direction] = slice(start, stop, end)
         return tmp       
 
+    def _fdiff_c(self, x, out, geometry, adjoint):
+        '''Computes the differences with cilacc, returns False if the data are not supported'''
+        x_asarr = x.as_array()
+        if x_asarr.dtype not in (np.float32, np.float64) or not x_asarr.flags['C_CONTIGUOUS'] \
+            or self.method not in _METHODS or self.boundary_condition not in _BOUNDARY_CONDITIONS:
+            return False
+
+        if out is None:
+            ret = geometry.allocate(None)
+        else:
+            ret = out
+        outa = ret.as_array()
+        if outa.dtype != x_asarr.dtype or not outa.flags['C_CONTIGUOUS']:
+            outa = np.empty(x_asarr.shape, dtype=x_asarr.dtype)
+
+        fdiff_direction(x_asarr, outa, self.direction, self.method, self.boundary_condition,
+                        adjoint, self.voxel_size, num_threads=self.num_threads)
+        if outa is not ret.as_array():
+            ret.fill(outa)
+        return ret
+
+    def _operator_hash(self):
+        return operator_hash(self, self.direction, self.method, self.boundary_condition)
+
+    def _fdiff_norm(self):
+        return fdiff_norm(self.domain_geometry().shape[self.direction], self.method,
+                          self.boundary_condition, self.voxel_size)
+
+    def calculate_norm(self, **kwargs):
+        '''Returns the exact norm of the finite differences, computed with the Lanczos method for centered differences with Neumann boundary conditions'''
+        norm = self.exact_norm()
+        if norm is None:
+            return LinearOperator.calculate_norm(self, **kwargs)
+        return norm
+
+    def exact_norm(self):
+        '''Returns the norm of the finite differences, None for centered differences with Neumann boundary conditions'''
+        norm, exact = self._fdiff_norm()
+        return norm if exact else None
+
+    def norm_bound(self):
+        '''Returns the norm of the finite differences, or its bound 1/voxel_size for centered differences with Neumann boundary conditions'''
+        return self._fdiff_norm()[0]
+
+    def _abs_sums(self, index, geometry):
+        sums = fdiff_abs_sums(geometry.shape[self.direction], self.method, self.boundary_condition, self.voxel_size)[index]
+        shape = [1] * len(geometry.shape)
+        shape[self.direction] = -1
+        ret = geometry.allocate(None)
+        ret.fill(np.broadcast_to(sums.reshape(shape), ret.shape))
+        return ret
+
+    def sum_abs_row(self):
+        '''Returns the sums of the absolute values of the rows of the finite differences'''
+        return self._abs_sums(0, self.range_geometry())
+
+    def sum_abs_col(self):
+        '''Returns the sums of the absolute values of the columns of the finite differences'''
+        return self._abs_sums(1, self.domain_geometry())
+
     def direct(self, x, out = None):
+
+        ret = self._fdiff_c(x, out, self.domain_geometry(), False)
+        if ret is not False:
+            if out is None:
+                return ret
+            return
         
         x_asarr = x.as_array()
         
@@ -234,6 +391,12 @@ class FiniteDifferenceOperator(LinearOperator):
     def adjoint(self, x, out=None):
         
         # Adjoint operation defined as  
+
+        ret = self._fdiff_c(x, out, self.range_geometry(), True)
+        if ret is not False:
+            if out is None:
+                return ret
+            return
                       
         x_asarr = x.as_array()
 
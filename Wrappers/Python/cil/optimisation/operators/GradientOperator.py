@@ -17,9 +17,11 @@
 
 from cil.optimisation.operators import LinearOperator
 from cil.optimisation.operators import FiniteDifferenceOperator
+from cil.optimisation.operators.FiniteDifferenceOperator import fdiff_direction, fdiff_norm, fdiff_abs_sums
 from cil.framework import BlockGeometry
 import warnings
 from cil.utilities.multiprocessing import NUM_THREADS
+from cil.utilities.cache import operator_hash
 from cil.framework import ImageGeometry
 import numpy as np
 
@@ -30,6 +32,15 @@ NUMPY = 'numpy'
 CORRELATION_SPACE = "Space"
 CORRELATION_SPACECHANNEL = "SpaceChannels"
 
+def _leaves(container):
+    '''Yields the DataContainers of a, possibly nested, BlockDataContainer'''
+    for item in container.containers:
+        if hasattr(item, 'containers'):
+            yield from _leaves(item)
+        else:
+            yield item
+
+
 class GradientOperator(LinearOperator):
 
 
@@ -97,18 +108,84 @@ class GradientOperator(LinearOperator):
             backend = NUMPY
             warnings.warn("Warning: Complex geometries will use `numpy` backend")
         
-        if method != 'forward':
+        # Reduced precision data are differentiated in C with forward differences only
+        if method != 'forward' and np.dtype(domain_geometry.dtype) not in [np.float32, np.float64]:
             backend = NUMPY
-            warnings.warn("Warning: method = {} implemented on `numpy` backend. Other methods are backward/centered.".format(method))            
+            warnings.warn("Warning: method = {} on {} data implemented on `numpy` backend.".format(method, np.dtype(domain_geometry.dtype).name))
             
         if backend == NUMPY:
-            self.operator = Gradient_numpy(domain_geometry, bnd_cond=bnd_cond, **kwargs)
+            self.operator = Gradient_numpy(domain_geometry, method=method, bnd_cond=bnd_cond, **kwargs)
         else:
-            self.operator = Gradient_C(domain_geometry, bnd_cond=bnd_cond, **kwargs)
+            self.operator = Gradient_C(domain_geometry, method=method, bnd_cond=bnd_cond, **kwargs)
         
         super(GradientOperator, self).__init__(domain_geometry=domain_geometry, 
                                        range_geometry=self.operator.range_geometry()) 
 
+    def _operator_hash(self):
+        return operator_hash(self, self.operator.method, self.operator.bnd_cond)
+
+    def _directions(self):
+        '''Returns the boundary condition and the (axis, voxel size) of each direction of the differences'''
+        if isinstance(self.operator, Gradient_numpy):
+            return self.operator.bnd_cond, [(i, self.operator.voxel_size_order[i]) for i in self.operator.ind]
+        return self.operator.bnd_cond_label, [(i, self.operator.voxel_size_order[j]) for j, i in enumerate(self.operator.ind)]
+
+    def _fdiff_norms(self):
+        '''Returns the norms of the finite differences along each direction and whether they are all exact'''
+        shape = self.domain_geometry().shape
+        bnd_cond, directions = self._directions()
+        norms = [fdiff_norm(shape[i], self.operator.method, bnd_cond, voxel_size) for i, voxel_size in directions]
+        return [norm for norm, _ in norms], all(exact for _, exact in norms)
+
+    def _abs_sums(self):
+        '''Returns the sums of the absolute values of the rows and of the columns of the differences
+        along each direction, broadcastable to the shape of the domain'''
+        shape = self.domain_geometry().shape
+        bnd_cond, directions = self._directions()
+        sums = []
+        for i, voxel_size in directions:
+            rows, columns = fdiff_abs_sums(shape[i], self.operator.method, bnd_cond, voxel_size)
+            broadcast = [1] * len(shape)
+            broadcast[i] = -1
+            sums.append((rows.reshape(broadcast), columns.reshape(broadcast)))
+        return sums
+
+    def sum_abs_row(self):
+        '''Returns the sums of the absolute values of the rows of the gradient, a BlockDataContainer in its range'''
+        ret = self.range_geometry().allocate(None)
+        # the components of the gradient, also with split=True, are ordered as the directions
+        for component, (rows, _) in zip(_leaves(ret), self._abs_sums()):
+            component.fill(np.broadcast_to(rows, component.shape))
+        return ret
+
+    def sum_abs_col(self):
+        '''Returns the sums of the absolute values of the columns of the gradient, in its domain'''
+        ret = self.domain_geometry().allocate(None)
+        shape = ret.shape
+        ret.fill(np.broadcast_to(sum(columns for _, columns in self._abs_sums()), shape))
+        return ret
+
+    def calculate_norm(self, **kwargs):
+        '''Returns the exact norm of the gradient, computed with the Lanczos method for centered differences with Neumann boundary conditions'''
+        norm = self.exact_norm()
+        if norm is None:
+            return LinearOperator.calculate_norm(self, **kwargs)
+        return norm
+
+    def exact_norm(self):
+        '''Returns the norm of the gradient, None for centered differences with Neumann boundary conditions
+
+        The differences along the directions commute, so that the squared norm of the gradient
+        is the sum of the squared norms of the finite differences along each direction.'''
+        norms, exact = self._fdiff_norms()
+        if not exact:
+            return None
+        return float(np.sqrt(sum(norm ** 2 for norm in norms)))
+
+    def norm_bound(self):
+        '''Returns the norm of the gradient, or a bound for centered differences with Neumann boundary conditions'''
+        return float(np.sqrt(sum(norm ** 2 for norm in self._fdiff_norms()[0])))
+
     def direct(self, x, out=None):
         """Computes the first-order forward differences
 
@@ -134,6 +211,27 @@ class GradientOperator(LinearOperator):
         """            
         return self.operator.adjoint(x, out=out)
 
+    def direct_pnorm_sum(self, x, p=2):
+        """Returns the sum over the voxels of the pointwise p-norm of the gradient of x,
+        i.e. :code:`self.direct(x).pnorm(p).sum()`, the isotropic (p=2) or anisotropic (p=1)
+        total variation of x.
+
+        With the C backend the value is computed in one pass over x, without storing the gradient.
+
+        :param x: Image data
+        :type x: `ImageData`
+        :param p: 1 or 2
+        :type p: int, optional
+        :return: the sum of the norms
+        :rtype: float
+        """
+        value = None
+        if hasattr(self.operator, 'direct_pnorm_sum'):
+            value = self.operator.direct_pnorm_sum(x, p)
+        if value is None:
+            value = self.direct(x).pnorm(p).sum()
+        return value
+
 class Gradient_numpy(LinearOperator):
     
     def __init__(self, domain_geometry, method = 'forward', bnd_cond = 'Neumann', **kwargs):
@@ -270,16 +368,41 @@ cilacc.fdiff2D.argtypes = [ctypes.POINTER(ctypes.c_float),
                        ctypes.c_int32,
                        ctypes.c_int32]
 
+cilacc.fdiff_norm_sum4D.argtypes = [ctypes.POINTER(ctypes.c_float),
+                       ctypes.POINTER(ctypes.c_float),
+                       ctypes.c_long,
+                       ctypes.c_long,
+                       ctypes.c_long,
+                       ctypes.c_long,
+                       ctypes.c_int32,
+                       ctypes.c_int32,
+                       ctypes.POINTER(ctypes.c_double),
+                       ctypes.c_int32]
+
+# float16 (h) and bfloat16 (b) storage, computed in float32
+for prefix in ['h', 'b']:
+    getattr(cilacc, prefix + 'fdiff_norm_sum4D').argtypes = [ctypes.c_void_p] * 2 + [ctypes.c_long] * 4 + [ctypes.c_int32] * 2 + [ctypes.c_void_p, ctypes.c_int32]
+    getattr(cilacc, prefix + 'fdiff4D').argtypes = [ctypes.c_void_p] * 5 + [ctypes.c_long] * 4 + [ctypes.c_int32] * 3
+    getattr(cilacc, prefix + 'fdiff3D').argtypes = [ctypes.c_void_p] * 4 + [ctypes.c_long] * 3 + [ctypes.c_int32] * 3
+    getattr(cilacc, prefix + 'fdiff2D').argtypes = [ctypes.c_void_p] * 3 + [ctypes.c_long] * 2 + [ctypes.c_int32] * 3
+
 
 class Gradient_C(LinearOperator):
     
     '''Finite Difference Operator:
             
-            Computes first-order forward/backward differences 
+            Computes first-order forward/backward/centered differences 
                      on 2D, 3D, 4D ImageData
-                     under Neumann/Periodic boundary conditions'''
+                     under Neumann/Periodic boundary conditions
+                     
+            float16 and bfloat16 data are differentiated in their storage type,
+            the differences are computed in float32. float64 data are differentiated in float64.
+            Other types are converted to float32.
+            
+            Forward differences of float32 and reduced precision data are computed in one pass
+            for all the directions, the other methods and float64 data one direction at a time.'''
 
-    def __init__(self, domain_geometry,  bnd_cond = NEUMANN, **kwargs):
+    def __init__(self, domain_geometry,  bnd_cond = NEUMANN, method = 'forward', **kwargs):
 
         # Number of threads
         self.num_threads = kwargs.get('num_threads',NUM_THREADS)
@@ -307,6 +430,8 @@ class Gradient_C(LinearOperator):
         
         if bnd_cond == PERIODIC:
             self.bnd_cond = 1
+        self.bnd_cond_label = PERIODIC if bnd_cond == PERIODIC else NEUMANN
+        self.method = method
         
         # Define range geometry
         if self.split is True and 'channel' in domain_geometry.dimension_labels:
@@ -315,14 +440,24 @@ class Gradient_C(LinearOperator):
             range_geometry = BlockGeometry(*[domain_geometry for _ in range(self.ndim)])
             self.split = False
 
-        if self.ndim == 4:
-            self.fd = cilacc.fdiff4D
-        elif self.ndim == 3:
-            self.fd = cilacc.fdiff3D
-        elif self.ndim == 2:
-            self.fd = cilacc.fdiff2D
-        else:
+        if self.ndim not in [2, 3, 4]:
             raise ValueError('Number of dimensions not supported, expected 2, 3 or 4, got {}'.format(len(domain_geometry.shape)))
+
+        # reduced precision data are passed to the kernels in their storage type
+        dtype = np.dtype(domain_geometry.dtype)
+        if dtype == np.float16:
+            prefix = 'h'
+        elif dtype.name == 'bfloat16':
+            prefix = 'b'
+        else:
+            prefix = ''
+            if dtype != np.float64:
+                dtype = np.dtype(np.float32)
+        self.dtype = dtype
+        # the differences are computed one direction at a time
+        self.by_direction = method != 'forward' or dtype == np.float64
+        self.fd = getattr(cilacc, '{}fdiff{}D'.format(prefix, self.ndim))
+        self.fd_norm_sum = getattr(cilacc, '{}fdiff_norm_sum4D'.format(prefix))
         
         super(Gradient_C, self).__init__(domain_geometry=domain_geometry, 
                                          range_geometry=range_geometry) 
@@ -335,11 +470,13 @@ class Gradient_C(LinearOperator):
 
     @staticmethod 
     def ndarray_as_c_pointer(ndx):
+        if ndx.dtype == np.float16 or ndx.dtype.name == 'bfloat16':
+            return ndx.ctypes.data
         return ndx.ctypes.data_as(c_float_p)
         
     def direct(self, x, out=None): 
         
-        ndx = np.asarray(x.as_array(), dtype=np.float32, order='C')
+        ndx = np.asarray(x.as_array(), dtype=self.dtype, order='C')
         x_p = Gradient_C.ndarray_as_c_pointer(ndx)
         
         return_val = False
@@ -354,15 +491,22 @@ class Gradient_C(LinearOperator):
             ndout = [el.as_array() for el in out.get_item(1).containers]
             ndout.insert(ind, out.get_item(0).as_array()) #insert channels dc at correct point for channel data
                 
-        #pass list of all arguments
-        arg1 = [Gradient_C.ndarray_as_c_pointer(ndout[i]) for i in range(len(ndout))]
-        arg2 = [el for el in self.domain_shape]
-        args = arg1 + arg2 + [self.bnd_cond, 1, self.num_threads]
-        self.fd(x_p, *args)
+        if self.by_direction:
+            ndx = ndx.reshape(self.domain_shape)
+            for i, el in enumerate(self.voxel_size_order):
+                ndout[i] = np.asarray(ndout[i], dtype=self.dtype, order='C')
+                fdiff_direction(ndx, ndout[i].reshape(self.domain_shape), i, self.method, self.bnd_cond_label,
+                                False, el, num_threads=self.num_threads)
+        else:
+            #pass list of all arguments
+            arg1 = [Gradient_C.ndarray_as_c_pointer(ndout[i]) for i in range(len(ndout))]
+            arg2 = [el for el in self.domain_shape]
+            args = arg1 + arg2 + [self.bnd_cond, 1, self.num_threads]
+            self.fd(x_p, *args)
 
-        for i, el in enumerate(self.voxel_size_order):
-            if el != 1:
-                ndout[i]/=el
+            for i, el in enumerate(self.voxel_size_order):
+                if el != 1:
+                    ndout[i]/=el
 
         #fill back out in corerct (non-trivial) order
         if self.split is False:
@@ -388,7 +532,7 @@ class Gradient_C(LinearOperator):
             out = self.domain_geometry().allocate(None)
             return_val = True
 
-        ndout = np.asarray(out.as_array(), dtype=np.float32, order='C')          
+        ndout = np.asarray(out.as_array(), dtype=self.dtype, order='C')          
         out_p = Gradient_C.ndarray_as_c_pointer(ndout)
         
         if self.split is False: 
@@ -398,9 +542,25 @@ class Gradient_C(LinearOperator):
             ndx = [el.as_array() for el in x.get_item(1).containers]
             ndx.insert(ind, x.get_item(0).as_array()) 
 
+        if self.by_direction:
+            ndout = ndout.reshape(self.domain_shape)
+            for i, el in enumerate(self.voxel_size_order):
+                ndx_i = np.asarray(ndx[i], dtype=self.dtype, order='C').reshape(self.domain_shape)
+                fdiff_direction(ndx_i, ndout, i, self.method, self.bnd_cond_label,
+                                True, el, accumulate=i > 0, num_threads=self.num_threads)
+            out.fill(ndout.reshape(out.shape))
+            if return_val is True:
+                return out
+            return
+
+        # scaling in place and back is not exact for reduced precision data, which are scaled in a copy
+        in_place = self.dtype == np.float32
         for i, el in enumerate(self.voxel_size_order):
             if el != 1:
-                ndx[i]/=el
+                if in_place:
+                    ndx[i]/=el
+                else:
+                    ndx[i] = ndx[i] / el
 
         arg1 = [Gradient_C.ndarray_as_c_pointer(ndx[i]) for i in range(self.ndim)]
         arg2 = [el for el in self.domain_shape]
@@ -411,9 +571,27 @@ class Gradient_C(LinearOperator):
 
         #reset input data
         for i, el in enumerate(self.voxel_size_order):
-            if el != 1:
+            if el != 1 and in_place:
                 ndx[i]*= el
                 
         if return_val is True:
             return out        
 
+
+    def direct_pnorm_sum(self, x, p=2):
+        '''Returns the sum of the pointwise p-norm of the gradient of x, computed in one pass by cilacc.
+
+        Returns None for split gradients, whose norm is not computed by the kernel.'''
+        if self.split is True or self.by_direction or p not in [1, 2]:
+            return None
+
+        ndx = np.asarray(x.as_array(), dtype=self.dtype, order='C')
+
+        # the kernel takes 4D data, missing dimensions have size 1 and no differences
+        shape = [1] * (4 - self.ndim) + list(self.domain_shape)
+        inverse_voxel_size = np.array([1] * (4 - self.ndim) + [1. / el for el in self.voxel_size_order], dtype=np.float32)
+        value = ctypes.c_double(0)
+
+        self.fd_norm_sum(Gradient_C.ndarray_as_c_pointer(ndx), inverse_voxel_size.ctypes.data_as(c_float_p),
+                         *shape, self.bnd_cond, int(p == 2), ctypes.byref(value), self.num_threads)
+        return value.value
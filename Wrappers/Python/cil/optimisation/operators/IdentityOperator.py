@@ -16,6 +16,7 @@
 #   limitations under the License.
 
 from cil.optimisation.operators import LinearOperator
+from cil.utilities.cache import operator_hash
 import scipy.sparse as sp
 import numpy as np
 
@@ -58,11 +59,20 @@ class IdentityOperator(LinearOperator):
         else:
             out.fill(x)
         
+    def _operator_hash(self):
+        return operator_hash(self)
+
     def calculate_norm(self, **kwargs):
         
         '''Evaluates operator norm of IdentityOperator'''        
         
         return 1.0
+
+    def exact_norm(self):
+
+        '''Returns the norm of IdentityOperator, 1'''
+
+        return 1.0
     
     
     ###########################################################################
@@ -74,10 +84,10 @@ class IdentityOperator(LinearOperator):
     
     def sum_abs_row(self):
         
-        return self.gm_range.allocate(1)
+        return self.range_geometry().allocate(1)
     
     def sum_abs_col(self):
         
-        return self.gm_domain.allocate(1)
+        return self.domain_geometry().allocate(1)
     
     
@@ -66,4 +66,14 @@ class MatrixOperator(LinearOperator):
     def calculate_norm(self, **kwargs):
         # If unknown, compute and store. If known, simply return it.
         return svds(self.A,1,return_singular_vectors=False)[0]
+
+    def sum_abs_row(self):
+        tmp = self.range_geometry().allocate()
+        tmp.fill(numpy.abs(self.A).sum(axis=1))
+        return tmp
+
+    def sum_abs_col(self):
+        tmp = self.domain_geometry().allocate()
+        tmp.fill(numpy.abs(self.A).sum(axis=0))
+        return tmp
     
@@ -18,9 +18,13 @@
 from numbers import Number
 import numpy
 import functools
+import threading
+from cil.utilities.cache import get_operator_cache, operator_hash
 
 class Operator(object):
     '''Operator that maps from a space X -> Y'''
+    # whether the entries of the matrix of the operator are all nonnegative, e.g. for projectors
+    nonnegative = False
     def __init__(self, domain_geometry, **kwargs):
         r'''
         Creator
@@ -47,23 +51,91 @@ class Operator(object):
         a member of the class. If the calculation has already run, following calls to 
         norm just return the saved member. 
         It is possible to force recalculation by setting the optional force parameter. Notice that
-        norm doesn't take notice of how many iterations or of the initialisation of the PowerMethod, 
+        norm doesn't take notice of how many iterations or of the initialisation of the Lanczos method, 
         so in case you want to recalculate by setting a higher number of iterations or changing the
         starting point or both you need to set :code:`force=True`
 
-        :param iterations: number of iterations to run
+        Operators with a closed form norm, see :code:`exact_norm`, return it without iterations.
+        The other norms are also stored in the :code:`OperatorCache`, if it is enabled and the operator defines its key,
+        and read from there by later operators with the same type, geometries and parameters.
+
+        :param iterations: maximum number of iterations to run
         :type iterations: int, optional, default = 25
         :param x_init: starting point for the iteration in the operator domain
         :type x_init: same type as domain, a subclass of :code:`DataContainer`, optional, default None
+        :param tolerance: relative tolerance of the Lanczos method on the change of the estimate
+        :type tolerance: float, optional, default = 1e-6
+        :param method: 'lanczos' or 'power' for the PowerMethod
+        :type method: str, optional, default 'lanczos'
         :parameter force: forces the recalculation of the norm
         :type force: boolean, default :code:`False`
         '''
         if self._norm is None or kwargs.get('force', False):
-            self._norm = self.calculate_norm(**kwargs)
+            # closed form norms are neither iterated nor cached
+            self._norm = self.exact_norm()
+            if self._norm is not None:
+                return self._norm
+            if not kwargs.get('force', False):
+                self._norm = self._load_norm()
+            if self._norm is None or kwargs.get('force', False):
+                self._norm = self.calculate_norm(**kwargs)
+                self._store_norm()
         return self._norm
     def calculate_norm(self, **kwargs):
         '''Calculates the norm of the Operator'''
         raise NotImplementedError
+    def exact_norm(self):
+        '''Returns the norm of the Operator if it has a closed form or a cheap exact calculation, None otherwise'''
+        return None
+    def norm_bound(self):
+        '''Returns an upper bound of the norm of the Operator computed without iterative methods
+
+        The bound is the exact norm, see :code:`exact_norm`, otherwise a bound derived from the
+        structure of the operator, None if there is no such bound. The norm estimated by
+        :code:`norm` is not returned, the iterative estimates are lower bounds.
+        '''
+        return self.exact_norm()
+    def _operator_hash(self):
+        '''Returns the key of the operator in the OperatorCache, None if the operator is not cached
+
+        Operators defined by their type, geometries and a few parameters return
+        :code:`operator_hash(self, *parameters)`.
+        '''
+        return None
+    def _cache_key(self):
+        '''Returns the OperatorCache and the key of the operator, None, None if the operator is not cached'''
+        cache = get_operator_cache()
+        if cache is None:
+            return None, None
+        key = self._operator_hash()
+        if key is None:
+            return None, None
+        return cache, key
+    def _load_norm(self):
+        '''Returns the norm of the operator stored in the OperatorCache, None if not stored'''
+        cache, key = self._cache_key()
+        if cache is None:
+            return None
+        entry = cache.get(key, 'norm')
+        if entry is None or 'norm' not in entry:
+            return None
+        return float(entry['norm'])
+    def _store_norm(self):
+        '''Stores the norm of the operator in the OperatorCache'''
+        cache, key = self._cache_key()
+        if cache is not None and self._norm is not None:
+            cache.put(key, 'norm', norm=numpy.asarray(self._norm, dtype=numpy.float64))
+    def _cached_container(self, name, geometry, compute):
+        '''Returns the container stored with name in the OperatorCache, otherwise computes it with compute() and stores it'''
+        cache, key = self._cache_key()
+        if cache is not None:
+            container = cache.get_container(key, name, geometry)
+            if container is not None:
+                return container
+        container = compute()
+        if cache is not None:
+            cache.put_container(key, name, container)
+        return container
     def range_geometry(self):
         '''Returns the range of the Operator: Y space'''
         return self._range_geometry
@@ -118,7 +190,7 @@ class LinearOperator(Operator):
         raise NotImplementedError
     
     @staticmethod
-    def PowerMethod(operator, iterations, x_init=None):
+    def PowerMethod(operator, iterations, x_init=None, tolerance=None):
         '''Power method to calculate iteratively the Lipschitz constant
         
         :param operator: input operator
@@ -126,6 +198,8 @@ class LinearOperator(Operator):
         :param iterations: number of iterations to run
         :type iteration: int
         :param x_init: starting point for the iteration in the operator domain
+        :param tolerance: stop when the relative change of the estimate is below tolerance, default None runs all the iterations
+        :type tolerance: float, optional
         :returns: tuple with: L, list of L at each iteration, the data the iteration worked on.
         '''
         
@@ -138,34 +212,116 @@ class LinearOperator(Operator):
         x1 = operator.domain_geometry().allocate()
         y_tmp = operator.range_geometry().allocate()
         s = numpy.zeros(iterations)
+        # x0 is normalised at each iteration, so its norm is only computed at the start
+        if hasattr(x0, 'squared_norm'):
+            x0squared_norm = x0.squared_norm()
+        else:
+            x0squared_norm = x0.norm() ** 2
         # Loop
         for it in numpy.arange(iterations):
             operator.direct(x0,out=y_tmp)
             operator.adjoint(y_tmp,out=x1)
             x1norm = x1.norm()
-            if hasattr(x0, 'squared_norm'):
-                s[it] = x1.dot(x0) / x0.squared_norm()
-            else:
-                x0norm = x0.norm()
-                s[it] = x1.dot(x0) / (x0norm * x0norm) 
+            s[it] = x1.dot(x0) / x0squared_norm
             x1.multiply((1.0/x1norm), out=x0)
+            x0squared_norm = 1.
+            if tolerance is not None and it > 0 and abs(s[it] - s[it-1]) <= tolerance * abs(s[it]):
+                s = s[:it+1]
+                break
         return numpy.sqrt(s[-1]), numpy.sqrt(s), x0
 
+    @staticmethod
+    def Lanczos(operator, iterations=25, x_init=None, tolerance=1e-6, compute_vector=False):
+        '''Lanczos method to calculate iteratively the norm of a LinearOperator
+
+        Runs the Golub-Kahan bidiagonalisation of the operator, i.e. the Lanczos method on
+        :math:`A^{T}A`. The largest singular value of the bidiagonal matrix is a lower bound of
+        the norm, which converges in far fewer iterations than the PowerMethod with the same
+        cost per iteration, one direct and one adjoint. The iteration stops when the relative
+        change of the estimate is below tolerance.
+
+        :param operator: input operator
+        :type operator: :code:`LinearOperator`
+        :param iterations: maximum number of iterations to run
+        :type iterations: int, default 25
+        :param x_init: starting point for the iteration in the operator domain, e.g. the singular vector of a previous run
+        :param tolerance: relative tolerance on the change of the estimate, default 1e-6
+        :type tolerance: float
+        :param compute_vector: computes the right singular vector, which costs the same applications of the operator again
+        :type compute_vector: bool, default False
+        :returns: tuple with: the norm, list of the estimates at each iteration, the right singular vector or None.
+        '''
+        bidiagonalisation = _GolubKahanBidiagonalisation(operator, x_init=x_init, keep_start=compute_vector)
+        for it in range(iterations):
+            bidiagonalisation.next()
+            if bidiagonalisation.converged(tolerance):
+                break
+
+        vector = bidiagonalisation.singular_vector() if compute_vector else None
+        estimates = numpy.asarray(bidiagonalisation.estimates)
+        return estimates[-1], estimates, vector
+
     def calculate_norm(self, **kwargs):
-        '''Returns the norm of the LinearOperator as calculated by the PowerMethod
+        '''Returns the norm of the LinearOperator as calculated by the Lanczos method or the PowerMethod
         
-        :param iterations: number of iterations to run
+        :param iterations: maximum number of iterations to run
         :type iterations: int, optional, default = 25
         :param x_init: starting point for the iteration in the operator domain
         :type x_init: same type as domain, a subclass of :code:`DataContainer`, optional, None
+        :param tolerance: relative tolerance of the Lanczos method on the change of the estimate
+        :type tolerance: float, optional, default = 1e-6
+        :param method: 'lanczos' or 'power', default 'lanczos'
+        :type method: str, optional
+        :param compute_vector: computes the singular vector with the Lanczos method, to store it in the OperatorCache
+        :type compute_vector: bool, optional, default False
         :parameter force: forces the recalculation of the norm
         :type force: boolean, default :code:`False`
+
+        Without x_init, the iteration starts from the singular vector stored in the
+        :code:`OperatorCache`, if any. The singular vector computed by the PowerMethod, or by
+        the Lanczos method with compute_vector, is stored in the cache.
         '''
         x0 = kwargs.get('x_init', None)
         iterations = kwargs.get('iterations', 25)
-        s1, sall, svec = LinearOperator.PowerMethod(self, iterations, x_init=x0)
+        method = kwargs.get('method', 'lanczos')
+
+        cache, key = self._cache_key()
+        if x0 is None and cache is not None:
+            x0 = cache.get_container(key, 'singular_vector', self.domain_geometry())
+
+        if method == 'lanczos':
+            s1, sall, svec = LinearOperator.Lanczos(self, iterations, x_init=x0, tolerance=kwargs.get('tolerance', 1e-6),
+                                                    compute_vector=kwargs.get('compute_vector', False))
+        elif method == 'power':
+            s1, sall, svec = LinearOperator.PowerMethod(self, iterations, x_init=x0)
+        else:
+            raise ValueError("method expected 'lanczos' or 'power', got {}".format(method))
+
+        if cache is not None and svec is not None:
+            cache.put_container(key, 'singular_vector', svec)
         return s1
 
+    def sum_abs_row(self):
+        '''Returns the sums of the absolute values of the rows of the matrix of the LinearOperator, in its range
+
+        The sums are computed applying the operator to ones for the operators declaring a
+        nonnegative matrix with the :code:`nonnegative` attribute, e.g. projection operators,
+        and are stored in the :code:`OperatorCache`. Operators with signed matrices override
+        this method, the others raise NotImplementedError.
+        '''
+        _check_nonnegative(self)
+        return self._cached_container('sum_abs_row', self.range_geometry(),
+            lambda: self.direct(self.domain_geometry().allocate(1)))
+
+    def sum_abs_col(self):
+        '''Returns the sums of the absolute values of the columns of the matrix of the LinearOperator, in its domain
+
+        The sums are computed applying the adjoint to ones, see :code:`sum_abs_row`.
+        '''
+        _check_nonnegative(self)
+        return self._cached_container('sum_abs_col', self.domain_geometry(),
+            lambda: self.adjoint(self.range_geometry().allocate(1)))
+
     @staticmethod
     def dot_test(operator, domain_init=None, range_init=None, tolerance=1e-6, **kwargs):
         r'''Does a dot linearity test on the operator
@@ -217,6 +373,153 @@ class LinearOperator(Operator):
             return False    
         
         
+def _check_nonnegative(operator):
+    '''Raises NotImplementedError if the operator does not declare a nonnegative matrix'''
+    if not operator.nonnegative:
+        raise NotImplementedError('The sums of the absolute values of the matrix of {} are not available, '
+            'the operator does not declare a nonnegative matrix'.format(operator.__class__.__name__))
+
+
+def _max(container):
+    '''Returns the maximum of a DataContainer or of a, possibly nested, BlockDataContainer'''
+    if hasattr(container, 'containers'):
+        return max(_max(el) for el in container.containers)
+    return container.max()
+
+
+def _leaf_dtypes(dtype):
+    '''Returns the list of the dtypes in dtype, which is a tuple for blocks, possibly nested'''
+    if dtype is None:
+        return []
+    if isinstance(dtype, tuple):
+        return [el for item in dtype for el in _leaf_dtypes(item)]
+    return [numpy.dtype(dtype)]
+
+
+def _workspace_dtype(geometry, x):
+    '''Returns the dtype of a workspace in geometry for results computed from x
+
+    The dtype of the geometry is promoted to that of x, so that e.g. float64 data flowing
+    through an operator with a float32 or boolean geometry is not rounded in the workspace.
+    '''
+    return numpy.result_type(*(_leaf_dtypes(getattr(geometry, 'dtype', None)) +
+                               _leaf_dtypes(getattr(x, 'dtype', None))))
+
+
+def _allocate_workspace(geometry, dtype):
+    '''Allocates a workspace in geometry with dtype, without value'''
+    if all(el == dtype for el in _leaf_dtypes(getattr(geometry, 'dtype', None))):
+        return geometry.allocate(None)
+    return geometry.allocate(None, dtype=dtype)
+
+
+class _GolubKahanBidiagonalisation(object):
+    r'''Golub-Kahan bidiagonalisation of a LinearOperator :math:`A`
+
+    Computes orthonormal :math:`u_{k}` and :math:`v_{k}` with :math:`A v_{k} = \beta_{k-1} u_{k-1} + \alpha_{k} u_{k}`
+    and :math:`A^{T} u_{k} = \alpha_{k} v_{k} + \beta_{k} v_{k+1}`, one direct and one adjoint per call
+    to :code:`next`. The largest singular value of the bidiagonal matrix of the :math:`\alpha_{k}`
+    and :math:`\beta_{k}` estimates the norm of :math:`A` from below.
+
+    Only the last vectors are stored, two in the domain and two in the range of the operator.
+
+    :param operator: input operator
+    :type operator: :code:`LinearOperator`
+    :param x_init: starting point in the operator domain, default random
+    :param keep_start: keep a copy of the starting point, required by :code:`singular_vector`
+    :type keep_start: bool, default False
+    '''
+    def __init__(self, operator, x_init=None, keep_start=False):
+        self.operator = operator
+        if x_init is None:
+            self.v = operator.domain_geometry().allocate('random')
+        else:
+            self.v = x_init.copy()
+        self.v.multiply(1.0 / self.v.norm(), out=self.v)
+        self._start = self.v.copy() if keep_start else None
+        self._v_next = operator.domain_geometry().allocate()
+        self.u = operator.range_geometry().allocate()
+        self._u_next = operator.range_geometry().allocate()
+        self.alphas = []
+        self.betas = []
+        self.estimates = []
+        self.exact = False
+
+    def _bidiagonal(self):
+        # k x (k+1) matrix with A^T U_k = V_{k+1} C^T
+        k = len(self.alphas)
+        matrix = numpy.zeros((k, k + 1))
+        matrix[numpy.arange(k), numpy.arange(k)] = self.alphas
+        matrix[numpy.arange(k), numpy.arange(1, k + 1)] = self.betas
+        return matrix
+
+    def next(self):
+        '''Runs one step of the bidiagonalisation and returns the new estimate of the norm'''
+        if self.exact:
+            return self.estimates[-1]
+        self.operator.direct(self.v, out=self._u_next)
+        if len(self.betas) > 0:
+            self._u_next.axpby(1., -self.betas[-1], self.u, out=self._u_next)
+        alpha = self._u_next.norm()
+        if alpha > 0:
+            self._u_next.multiply(1.0 / alpha, out=self._u_next)
+        self.u, self._u_next = self._u_next, self.u
+
+        self.operator.adjoint(self.u, out=self._v_next)
+        self._v_next.axpby(1., -alpha, self.v, out=self._v_next)
+        beta = self._v_next.norm()
+        if beta > 0:
+            self._v_next.multiply(1.0 / beta, out=self._v_next)
+        self.v, self._v_next = self._v_next, self.v
+
+        self.alphas.append(alpha)
+        self.betas.append(beta)
+        # a zero alpha or beta, up to rounding, means that the Krylov space is invariant and the estimate exact
+        self.exact = alpha == 0 or beta <= 1e-6 * alpha
+        self.estimates.append(numpy.linalg.norm(self._bidiagonal(), 2))
+        return self.estimates[-1]
+
+    def converged(self, tolerance):
+        '''Returns whether the relative change of the last estimate is below tolerance'''
+        if self.exact:
+            return True
+        if len(self.estimates) < 2:
+            return False
+        return abs(self.estimates[-1] - self.estimates[-2]) <= tolerance * self.estimates[-1]
+
+    def singular_vector(self):
+        '''Returns the estimate of the right singular vector of the largest singular value
+
+        The combination of the :math:`v_{k}` is accumulated by running the recurrence again
+        from the starting point, with the same number of applications of the operator.
+        '''
+        if self._start is None:
+            raise ValueError('The starting point is required, set keep_start=True')
+        k = len(self.alphas)
+        # the right singular vector of C gives the combination of v_1 ... v_{k+1}
+        weights = numpy.linalg.svd(self._bidiagonal())[2][0]
+        if self.exact:
+            weights = weights[:k]
+
+        v = self._start.copy()
+        v_next = self.operator.domain_geometry().allocate()
+        u = self.operator.range_geometry().allocate()
+        u_next = self.operator.range_geometry().allocate()
+        result = v * weights[0]
+        for j in range(len(weights) - 1):
+            self.operator.direct(v, out=u_next)
+            if j > 0:
+                u_next.axpby(1., -self.betas[j-1], u, out=u_next)
+            u_next.multiply(1.0 / self.alphas[j], out=u_next)
+            u, u_next = u_next, u
+            self.operator.adjoint(u, out=v_next)
+            v_next.axpby(1. / self.betas[j], -self.alphas[j] / self.betas[j], v, out=v_next)
+            v, v_next = v_next, v
+            result.axpby(1., weights[j+1], v, out=result)
+        result.multiply(1.0 / result.norm(), out=result)
+        return result
+
+
 class ScaledOperator(Operator):
     
     
@@ -257,6 +560,11 @@ class ScaledOperator(Operator):
             raise TypeError('expected scalar: got {}'.format(type(scalar)))
         self.scalar = scalar
         self.operator = operator
+    def _operator_hash(self):
+        key = self.operator._operator_hash()
+        if key is None:
+            return None
+        return operator_hash(self, key, self.scalar)
     def direct(self, x, out=None):
         '''direct method'''
         if out is None:
@@ -281,7 +589,29 @@ class ScaledOperator(Operator):
     def norm(self, **kwargs):
         '''norm of the operator'''
         return numpy.abs(self.scalar) * self.operator.norm(**kwargs)
+    def exact_norm(self):
+        '''exact norm of the operator, None if the operator has no exact norm'''
+        norm = self.operator.exact_norm()
+        if norm is None:
+            return None
+        return numpy.abs(self.scalar) * norm
+    def norm_bound(self):
+        '''upper bound of the norm of the operator, None if the operator has no bound'''
+        bound = self.operator.norm_bound()
+        if bound is None:
+            return None
+        return numpy.abs(self.scalar) * bound
 
+    @property
+    def nonnegative(self):
+        '''whether the matrix of the operator is nonnegative'''
+        return self.scalar >= 0 and self.operator.nonnegative
+    def sum_abs_row(self):
+        '''sums of the absolute values of the rows of the operator'''
+        return numpy.abs(self.scalar) * self.operator.sum_abs_row()
+    def sum_abs_col(self):
+        '''sums of the absolute values of the columns of the operator'''
+        return numpy.abs(self.scalar) * self.operator.sum_abs_col()
     def is_linear(self):
         '''returns whether the operator is linear
         
@@ -294,9 +624,17 @@ class ScaledOperator(Operator):
 ###############################################################################      
     
 class SumOperator(Operator):
+    r'''Sum of two operators, :math:`(A+B)(x) = A(x) + B(x)`
+
+    The second term is computed in a workspace, allocated at the first call and
+    reused by the following calls, one in the range for direct and one in the
+    domain for adjoint, with the dtype of the geometry promoted to that of the
+    input. Each thread has its own workspaces, so that the operator
+    can be applied concurrently, e.g. in a BlockOperator or a ChannelwiseOperator
+    with num_workers > 1. Set :code:`preallocate=False` to allocate it at each call.
+    '''
     
-    
-    def __init__(self, operator1, operator2):
+    def __init__(self, operator1, operator2, preallocate=True):
                 
         self.operator1 = operator1
         self.operator2 = operator2
@@ -308,28 +646,56 @@ class SumOperator(Operator):
         #     raise ValueError('Range geometry of {} is not equal with range geometry of {}'.format(self.operator1.__class__.__name__,self.operator2.__class__.__name__))    
             
         self.linear_flag = self.operator1.is_linear() and self.operator2.is_linear()            
+        self.preallocate = preallocate
+        self._workspace = {}
         
         super(SumOperator, self).__init__(domain_geometry=self.operator1.domain_geometry(),
                                           range_geometry=self.operator1.range_geometry()) 
+
+    def _get_workspace(self, key, geometry, x):
+        if not self.preallocate or geometry is None:
+            return None
+        dtype = _workspace_dtype(geometry, x)
+        key = (key, threading.get_ident(), dtype)
+        workspace = self._workspace.get(key)
+        if workspace is None:
+            workspace = _allocate_workspace(geometry, dtype)
+            self._workspace[key] = workspace
+        return workspace
                                   
     def direct(self, x, out=None):
         
+        tmp = self._get_workspace('direct', self.operator2.range_geometry(), x)
+        # the second term is computed first, in case out is x
+        if tmp is None:
+            tmp = self.operator2.direct(x)
+        else:
+            self.operator2.direct(x, out=tmp)
+
         if out is None:
-            return self.operator1.direct(x) + self.operator2.direct(x)
+            out = self.operator1.direct(x)
+            out.add(tmp, out=out)
+            return out
         else:
-            #TODO check if allcating with tmp is faster            
             self.operator1.direct(x, out=out)
-            out.add(self.operator2.direct(x), out=out)     
+            out.add(tmp, out=out)
 
     def adjoint(self, x, out=None):
         
         if self.linear_flag:        
+            tmp = self._get_workspace('adjoint', self.operator2.domain_geometry(), x)
+            if tmp is None:
+                tmp = self.operator2.adjoint(x)
+            else:
+                self.operator2.adjoint(x, out=tmp)
+
             if out is None:
-                return self.operator1.adjoint(x) + self.operator2.adjoint(x)
+                out = self.operator1.adjoint(x)
+                out.add(tmp, out=out)
+                return out
             else:
-                #TODO check if allcating with tmp is faster            
                 self.operator1.adjoint(x, out=out)
-                out.add(self.operator2.adjoint(x), out=out) 
+                out.add(tmp, out=out)
         else:
             raise ValueError('No adjoint operation with non-linear operators')
                                         
@@ -340,11 +706,49 @@ class SumOperator(Operator):
         if self.is_linear():
             return LinearOperator.calculate_norm(self, **kwargs)
 
+    def norm_bound(self):
+        '''Returns the sum of the bounds of the norms of the operators, by the triangle inequality'''
+        bounds = [self.operator1.norm_bound(), self.operator2.norm_bound()]
+        if None in bounds:
+            return None
+        return sum(bounds)
+
+    @property
+    def nonnegative(self):
+        '''Returns whether the matrices of both operators are nonnegative'''
+        return self.operator1.nonnegative and self.operator2.nonnegative
+
+    def sum_abs_row(self):
+        '''Returns the sums of the absolute values of the rows of the operators, bounds of those of the sum'''
+        return self.operator1.sum_abs_row() + self.operator2.sum_abs_row()
+
+    def sum_abs_col(self):
+        '''Returns the sums of the absolute values of the columns of the operators, bounds of those of the sum'''
+        return self.operator1.sum_abs_col() + self.operator2.sum_abs_col()
+
+    def _operator_hash(self):
+        keys = [self.operator1._operator_hash(), self.operator2._operator_hash()]
+        if None in keys:
+            return None
+        return operator_hash(self, keys)
+
 ###############################################################################
 ################   Composition  ###########################################
 ###############################################################################             
 
 class CompositionOperator(Operator):
+    r'''Composition of operators, :math:`(A_{0} \circ A_{1} \circ \dots \circ A_{n-1})(x) = A_{0}(A_{1}(\dots A_{n-1}(x)))`
+
+    The intermediate results are computed in workspaces, one between each pair of
+    consecutive operators, allocated at the first call and reused by the following
+    calls. The workspace between :math:`A_{i}` and :math:`A_{i+1}` holds
+    :math:`A_{i+1}(\dots)` in direct and :math:`A_{i}^{*}(\dots)` in adjoint, so
+    direct and adjoint share the same workspaces. Their dtype is that of the geometries
+    promoted to that of the input, with one set of workspaces per dtype. Each thread has its own
+    workspaces, so that the operator can be applied concurrently, e.g. in a
+    BlockOperator or a ChannelwiseOperator with num_workers > 1.
+    Set :code:`preallocate=False` to allocate the intermediate results at each call.
+    '''
     
     def __init__(self, *operators, **kwargs):
         
@@ -353,12 +757,9 @@ class CompositionOperator(Operator):
         
         self.linear_flag = functools.reduce(lambda x,y: x and y.is_linear(),
                                             self.operators, True)
-        # self.preallocate = kwargs.get('preallocate', False)
-        self.preallocate = False
-        if self.preallocate:
-            self.tmp_domain = [op.domain_geometry().allocate() for op in self.operators[:-1]]
-            self.tmp_range = [op.range_geometry().allocate() for op in self.operators[1:]]
-            # pass
+        self.preallocate = kwargs.get('preallocate', True)
+        # workspaces of each thread and dtype of the input
+        self._workspaces = {}
         
         # TODO address the equality of geometries
         # if self.operator2.range_geometry() != self.operator1.domain_geometry():
@@ -367,91 +768,54 @@ class CompositionOperator(Operator):
         super(CompositionOperator, self).__init__(
             domain_geometry=self.operators[-1].domain_geometry(),
             range_geometry=self.operators[0].range_geometry()) 
+
+    def _get_workspaces(self, x):
+        '''Returns the workspaces between consecutive operators for the input x, None if they are not preallocated'''
+        if not self.preallocate:
+            return None
+        geometries = [op.range_geometry() for op in self.operators[1:]]
+        if any(geometry is None for geometry in geometries):
+            return None
+        key = (threading.get_ident(), ) + tuple(_leaf_dtypes(getattr(x, 'dtype', None)))
+        workspaces = self._workspaces.get(key)
+        if workspaces is None:
+            workspaces = [_allocate_workspace(geometry, _workspace_dtype(geometry, x)) for geometry in geometries]
+            self._workspaces[key] = workspaces
+        return workspaces
         
     def direct(self, x, out = None):
 
-        if out is None:
-            #return self.operator1.direct(self.operator2.direct(x))
-            # return functools.reduce(lambda X,operator: operator.direct(X), 
-            #                        self.operators[::-1][1:],
-            #                        self.operators[-1].direct(x))
-            if self.preallocate:
-                pass
+        workspaces = self._get_workspaces(x)
+        step = x
+        for i in range(len(self.operators) - 1, 0, -1):
+            if workspaces is None:
+                step = self.operators[i].direct(step)
             else:
-                for i,operator in enumerate(self.operators[::-1]):
-                    if i == 0:
-                        step = operator.direct(x)
-                    else:
-                        step = operator.direct(step)
-                return step
+                self.operators[i].direct(step, out=workspaces[i-1])
+                step = workspaces[i-1]
 
+        if out is None:
+            return self.operators[0].direct(step)
         else:
-            # tmp = self.operator2.range_geometry().allocate()
-            # self.operator2.direct(x, out = tmp)
-            # self.operator1.direct(tmp, out = out)
-            
-            # out.fill (
-            #     functools.reduce(lambda X,operator: operator.direct(X), 
-            #                        self.operators[::-1][1:],
-            #                        self.operators[-1].direct(x))
-            # )
-            
-            # TODO this is a bit silly but will handle the pre allocation later
-            if self.preallocate:
-
-                for i,operator in enumerate(self.operators[::-1]):
-                    if i == 0:
-                        operator.direct(x, out=self.tmp_range[i])
-                    elif i == len(self.operators) - 1:
-                        operator.direct(self.tmp_range[i-1], out=out)
-                    else:
-                        operator.direct(self.tmp_range[i-1], out=self.tmp_range[i])
-            else:
-                for i,operator in enumerate(self.operators[::-1]):
-                    if i == 0:
-                        step = operator.direct(x)
-                    else:
-                        step = operator.direct(step)
-                out.fill(step)
-
+            self.operators[0].direct(step, out=out)
             
     def adjoint(self, x, out = None):
         
         if self.linear_flag: 
             
-            if out is not None:
-                # return self.operator2.adjoint(self.operator1.adjoint(x))
-                # return functools.reduce(lambda X,operator: operator.adjoint(X), 
-                #                    self.operators[1:],
-                #                    self.operators[0].adjoint(x))
-                if self.preallocate:
-                    for i,operator in enumerate(self.operators):
-                        if i == 0:
-                            operator.adjoint(x, out=self.tmp_domain[i])
-                        elif i == len(self.operators) - 1:
-                            step = operator.adjoint(self.tmp_domain[i-1], out=out)
-                        else:
-                            operator.adjoint(self.tmp_domain[i-1], out=self.tmp_domain[i])
-                    return
+            workspaces = self._get_workspaces(x)
+            step = x
+            for i in range(len(self.operators) - 1):
+                if workspaces is None:
+                    step = self.operators[i].adjoint(step)
                 else:
-                    for i,operator in enumerate(self.operators):
-                        if i == 0:
-                            step = operator.adjoint(x)
-                        else:
-                            step = operator.adjoint(step)
-                    out.fill(step)
-                
+                    self.operators[i].adjoint(step, out=workspaces[i])
+                    step = workspaces[i]
+
+            if out is None:
+                return self.operators[-1].adjoint(step)
             else:
-                if self.preallocate:
-                    pass
-                else:
-                    for i,operator in enumerate(self.operators):
-                        if i == 0:
-                            step = operator.adjoint(x)
-                        else:
-                            step = operator.adjoint(step)
-                    
-                    return step
+                self.operators[-1].adjoint(step, out=out)
         else:
             raise ValueError('No adjoint operation with non-linear operators')
             
@@ -461,11 +825,55 @@ class CompositionOperator(Operator):
             
     def calculate_norm(self, **kwargs):
         if self.is_linear():
-            #return LinearOperator.calculate_norm(self, **kwargs)
-            x0 = kwargs.get('x_init', None)
-            iterations = kwargs.get('iterations', 25)
-            s1, sall, svec = LinearOperator.PowerMethod(self, iterations, x_init=x0)
-            return s1
+            return LinearOperator.calculate_norm(self, **kwargs)
+
+    @property
+    def nonnegative(self):
+        '''Returns whether the matrices of all the operators are nonnegative'''
+        return all(op.nonnegative for op in self.operators)
+
+    def sum_abs_row(self):
+        r'''Returns the sums of the absolute values of the rows of the composition
+
+        The sums are exact for nonnegative matrices, computed applying the composition to ones, see
+        :code:`LinearOperator.sum_abs_row`. Otherwise they are the upper bounds combining the sums of the
+        operators, :math:`\sum_{j}|(AB)_{ij}| \leq \sum_{j}|A_{ij}| \max_{k}\sum_{j}|B_{kj}|`.
+        '''
+        if self.nonnegative:
+            return LinearOperator.sum_abs_row(self)
+        sums = self.operators[0].sum_abs_row()
+        for op in self.operators[1:]:
+            sums = sums * _max(op.sum_abs_row())
+        return sums
+
+    def sum_abs_col(self):
+        r'''Returns the sums of the absolute values of the columns of the composition
+
+        The sums are exact for nonnegative matrices, computed applying the adjoint to ones, otherwise
+        upper bounds, :math:`\sum_{i}|(AB)_{ij}| \leq \sum_{i}|B_{ij}| \max_{k}\sum_{i}|A_{ik}|`.
+        '''
+        if self.nonnegative:
+            return LinearOperator.sum_abs_col(self)
+        sums = self.operators[-1].sum_abs_col()
+        for op in self.operators[:-1]:
+            sums = sums * _max(op.sum_abs_col())
+        return sums
+
+    def norm_bound(self):
+        '''Returns the product of the bounds of the norms of the operators'''
+        bound = 1.
+        for op in self.operators:
+            op_bound = op.norm_bound()
+            if op_bound is None:
+                return None
+            bound *= op_bound
+        return bound
+
+    def _operator_hash(self):
+        keys = [op._operator_hash() for op in self.operators]
+        if None in keys:
+            return None
+        return operator_hash(self, keys)
 
 
 
@@ -27,6 +27,8 @@ class ProjectionMap(LinearOperator):
 
     """
 
+    # the matrix selects the elements of x_{i}
+    nonnegative = True
     
     def __init__(self, domain_geometry, index, range_geometry=None):
         
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+#   This work is part of the Core Imaging Library (CIL) developed by CCPi
+#   (Collaborative Computational Project in Tomographic Imaging), with
+#   substantial contributions by UKRI-STFC and University of Manchester.
+
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+
+#   http://www.apache.org/licenses/LICENSE-2.0
+
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+from cil.framework import cilacc
+from cil.framework import AcquisitionGeometry, ImageGeometry, DataOrder
+from cil.optimisation.operators import LinearOperator, BlockOperator
+from cil.utilities.multiprocessing import NUM_THREADS
+from cil.utilities.cache import operator_hash
+import numpy as np
+import ctypes
+
+c_float_p = ctypes.POINTER(ctypes.c_float)
+c_int_p = ctypes.POINTER(ctypes.c_int32)
+
+for _name in ['parallel_project_joseph', 'parallel_backproject_joseph', 'parallel_backproject_interpolated']:
+    getattr(cilacc, _name).argtypes = [c_float_p,  # pointer to the volume
+                                       c_float_p,  # pointer to the projections
+                                       c_float_p,  # pointer to the angles in radians
+                                       c_int_p,    # first slice (row) interpolated
+                                       c_float_p,  # weight of the second slice (row)
+                                       ctypes.c_long, ctypes.c_long, ctypes.c_long,  # nx, ny, nz
+                                       ctypes.c_float, ctypes.c_float,  # voxel size x, y
+                                       ctypes.c_float, ctypes.c_float,  # centre of the first voxel x, y
+                                       ctypes.c_long, ctypes.c_long, ctypes.c_long,  # num angles, rows, columns
+                                       ctypes.c_float, ctypes.c_float,  # pixel size, centre of the first pixel
+                                       ctypes.c_int32]  # number of threads
+
+
+def _interpolation_weights(positions, origin, spacing):
+    '''Returns the index of the first sample and the weight of the second sample
+    interpolating each position on a regular grid'''
+    index = (np.asarray(positions, dtype=np.float64) - origin) / spacing
+    rounded = np.round(index)
+    index = np.where(np.abs(index - rounded) < 1e-5, rounded, index)
+    first = np.floor(index)
+    return first.astype(np.int32), (index - first).astype(np.float32)
+
+
+class ProjectionOperator(LinearOperator):
+    r'''Parallel-beam projection operator computed on the CPU
+
+    A matched pair of forward and back projectors using Joseph's method, computed by
+    :code:`cilacc` and parallelised with OpenMP across angles and slices. This is the
+    :code:`'cil'` backend of the reconstructors and does not need a GPU.
+
+    2D and 3D parallel-beam geometries with :code:`system_description` 'simple' or 'offset'
+    are supported. The data must be ordered for the :code:`'cil'` engine, see :code:`DataOrder`.
+
+    :param image_geometry: A description of the ImageGeometry of your data
+    :type image_geometry: ImageGeometry
+    :param acquisition_geometry: A description of the AcquisitionGeometry of your data
+    :type acquisition_geometry: AcquisitionGeometry
+    :param adjoint_weights: 'matched' for the exact adjoint of the forward projector, 'FBP' for a voxel-driven interpolated backprojection, default 'matched'
+    :type adjoint_weights: str
+    :param num_threads: number of threads used by the projectors
+    :type num_threads: int, optional
+    '''
+
+    # the interpolation weights are nonnegative, the sums of the rows and columns are projections of ones
+    nonnegative = True
+
+    def __init__(self, image_geometry, acquisition_geometry, adjoint_weights='matched', num_threads=NUM_THREADS):
+
+        DataOrder.check_order_for_engine('cil', image_geometry)
+        DataOrder.check_order_for_engine('cil', acquisition_geometry)
+
+        super(ProjectionOperator, self).__init__(domain_geometry=image_geometry,
+             range_geometry=acquisition_geometry)
+
+        if acquisition_geometry.geom_type != AcquisitionGeometry.PARALLEL:
+            raise NotImplementedError("The 'cil' projector supports parallel-beam geometries only")
+
+        if acquisition_geometry.system_description == 'advanced':
+            raise NotImplementedError("The 'cil' projector cannot process parallel geometries with tilted axes")
+
+        if adjoint_weights not in ['matched', 'FBP']:
+            raise ValueError("adjoint_weights expected 'matched' or 'FBP' got {}".format(adjoint_weights))
+
+        if (acquisition_geometry.dimension == '3D') != (ImageGeometry.VERTICAL in image_geometry.dimension_labels):
+            raise ValueError("ImageGeometry and AcquisitionGeometry must be both 2D or both 3D")
+
+        self.adjoint_weights = adjoint_weights
+        self.num_threads = num_threads
+        self._set_up_geometry(image_geometry, acquisition_geometry)
+
+
+    def _set_up_geometry(self, ig, ag):
+
+        ag = ag.copy()
+        system = ag.config.system
+        system.align_reference_frame()
+
+        angles = np.asarray(ag.config.angles.angle_data, dtype=np.float64) + ag.config.angles.initial_angle
+        if ag.config.angles.angle_unit == AcquisitionGeometry.DEGREE:
+            angles = angles * np.pi / 180.
+        self._angles = np.ascontiguousarray(angles, dtype=np.float32)
+
+        num_u, num_v = ag.config.panel.num_pixels
+        du, dv = ag.config.panel.pixel_size
+        if 'right' in ag.config.panel.origin:
+            du = -du
+        if 'top' in ag.config.panel.origin:
+            dv = -dv
+
+        self._shape_image = (ig.voxel_num_x, ig.voxel_num_y)
+        self._voxel_size = (ig.voxel_size_x, ig.voxel_size_y)
+        self._image_origin = (ig.center_x - 0.5 * (ig.voxel_num_x - 1) * ig.voxel_size_x,
+                              ig.center_y - 0.5 * (ig.voxel_num_y - 1) * ig.voxel_size_y)
+        self._du = du
+        self._s0 = system.detector.position[0] - 0.5 * (num_u - 1) * du
+        self._num_pixels = num_u
+
+        if ag.dimension == '2D':
+            self._num_slices = 1
+            self._num_rows = 1
+            self._row_slice, self._row_weight = np.zeros(1, dtype=np.int32), np.zeros(1, dtype=np.float32)
+            self._slice_row, self._slice_weight = np.zeros(1, dtype=np.int32), np.zeros(1, dtype=np.float32)
+        else:
+            self._num_slices = ig.voxel_num_z
+            self._num_rows = num_v
+            z_rows = system.detector.position[2] + (np.arange(num_v) - 0.5 * (num_v - 1)) * dv
+            z_slices = ig.center_z + (np.arange(ig.voxel_num_z) - 0.5 * (ig.voxel_num_z - 1)) * ig.voxel_size_z
+            self._row_slice, self._row_weight = _interpolation_weights(z_rows, z_slices[0], ig.voxel_size_z)
+            self._slice_row, self._slice_weight = _interpolation_weights(z_slices, z_rows[0], dv)
+
+        self._num_channels = ig.channels
+
+
+    @classmethod
+    def partition(cls, image_geometry, acquisition_geometry, num_batches, mode='staggered', seed=None, **kwargs):
+        '''Returns a column BlockOperator of the projection operators of the subsets of a partition of the angles
+
+        The operators project on the subsets of :code:`AcquisitionData.partition` with the same
+        parameters, e.g. for :code:`SPDHG`. Operators of other backends are built from the
+        geometries of :code:`AcquisitionGeometry.partition` in the same way.
+
+        :param image_geometry: A description of the ImageGeometry of your data
+        :type image_geometry: ImageGeometry
+        :param acquisition_geometry: A description of the AcquisitionGeometry of the full data
+        :type acquisition_geometry: AcquisitionGeometry
+        :param num_batches: number of subsets
+        :type num_batches: int
+        :param mode: 'staggered', 'sequential' or 'random_permutation', default 'staggered'
+        :type mode: str, optional
+        :param seed: seed of the random permutation, required for 'random_permutation'
+        :type seed: int, optional
+        :param kwargs: the other parameters of the operators, e.g. num_threads
+        '''
+        geometries = acquisition_geometry.partition(num_batches, mode, seed)
+        return BlockOperator(*[cls(image_geometry, geometry, **kwargs) for geometry in geometries.geometries])
+
+
+    def _operator_hash(self):
+        return operator_hash(self, self.adjoint_weights)
+
+
+    def _call(self, function, volume, projections, interpolation):
+        rows, weights = interpolation
+        nx, ny = self._shape_image
+        function(volume.ctypes.data_as(c_float_p), projections.ctypes.data_as(c_float_p),
+                 self._angles.ctypes.data_as(c_float_p),
+                 rows.ctypes.data_as(c_int_p), weights.ctypes.data_as(c_float_p),
+                 nx, ny, self._num_slices, self._voxel_size[0], self._voxel_size[1], *self._image_origin,
+                 self._angles.size, self._num_rows, self._num_pixels, self._du, self._s0, self.num_threads)
+
+
+    def direct(self, x, out=None):
+        '''Returns the forward projection of x'''
+
+        volume = np.ascontiguousarray(x.as_array(), dtype=np.float32)
+
+        if out is None:
+            ret = self.range_geometry().allocate(None)
+        else:
+            ret = out
+        projections = ret.as_array()
+        if projections.dtype != np.float32 or not projections.flags['C_CONTIGUOUS']:
+            projections = np.empty(ret.shape, dtype=np.float32)
+
+        volume = volume.reshape(self._num_channels, -1)
+        flat = projections.reshape(self._num_channels, -1)
+        for c in range(self._num_channels):
+            self._call(cilacc.parallel_project_joseph, volume[c], flat[c], (self._row_slice, self._row_weight))
+
+        if projections is not ret.as_array():
+            ret.fill(projections)
+
+        if out is None:
+            return ret
+
+
+    def adjoint(self, x, out=None):
+        '''Returns the backprojection of x'''
+
+        projections = np.ascontiguousarray(x.as_array(), dtype=np.float32)
+
+        if out is None:
+            ret = self.domain_geometry().allocate(None)
+        else:
+            ret = out
+        volume = ret.as_array()
+        if volume.dtype != np.float32 or not volume.flags['C_CONTIGUOUS']:
+            volume = np.empty(ret.shape, dtype=np.float32)
+
+        if self.adjoint_weights == 'matched':
+            function, interpolation = cilacc.parallel_backproject_joseph, (self._row_slice, self._row_weight)
+        else:
+            function, interpolation = cilacc.parallel_backproject_interpolated, (self._slice_row, self._slice_weight)
+
+        projections = projections.reshape(self._num_channels, -1)
+        flat = volume.reshape(self._num_channels, -1)
+        for c in range(self._num_channels):
+            self._call(function, flat[c], projections[c], interpolation)
+
+        if volume is not ret.as_array():
+            ret.fill(volume)
+
+        if out is None:
+            return ret
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+#   This work is part of the Core Imaging Library (CIL) developed by CCPi
+#   (Collaborative Computational Project in Tomographic Imaging), with
+#   substantial contributions by UKRI-STFC and University of Manchester.
+
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+
+#   http://www.apache.org/licenses/LICENSE-2.0
+
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+from cil.framework import cilacc
+from cil.optimisation.operators import ProjectionOperator
+from cil.utilities.multiprocessing import NUM_THREADS
+from cil.utilities.cache import default_cache_dir
+import numpy as np
+import scipy.sparse
+import hashlib
+import ctypes
+import os
+
+cilacc.scsr_matvec.argtypes = [ctypes.POINTER(ctypes.c_int64),  # row pointers
+                               ctypes.POINTER(ctypes.c_int32),  # column indices
+                               ctypes.POINTER(ctypes.c_float),  # values
+                               ctypes.POINTER(ctypes.c_float),  # input vectors
+                               ctypes.POINTER(ctypes.c_float),  # output vectors
+                               ctypes.c_int64, ctypes.c_int64, ctypes.c_int64,  # rows, columns, number of vectors
+                               ctypes.c_int32]  # number of threads
+
+# increase when the matrix changes, so that the cached matrices are not used
+_CACHE_VERSION = 2
+
+
+class SparseProjectionOperator(ProjectionOperator):
+    r'''Parallel-beam projection operator stored as a sparse system matrix
+
+    The CSR system matrix of a slice is computed once from the geometries and the
+    projections are computed as multithreaded sparse matrix-vector products in :code:`cilacc`.
+    The matrix is the one of :code:`ProjectionOperator`, Joseph's method, so the two operators
+    give the same results. 3D data is processed slice by slice, which requires each detector
+    row to match a slice of the volume, as with the default :code:`ImageGeometry`.
+
+    The matrix is saved in :code:`cache_dir`, in a file named after a hash of the geometries, and
+    is loaded from there by any operator with the same geometries. This is worth it for repeated
+    reconstructions on a fixed geometry, at the cost of memory: the matrix and its transpose
+    hold about 16 bytes per voxel crossed by each ray.
+
+    The exact row and column sums of the matrix, :code:`row_sums()` and :code:`column_sums()`,
+    are available for preconditioning.
+
+    :param image_geometry: A description of the ImageGeometry of your data
+    :type image_geometry: ImageGeometry
+    :param acquisition_geometry: A description of the AcquisitionGeometry of your data
+    :type acquisition_geometry: AcquisitionGeometry
+    :param cache_dir: directory of the cached matrices, default `~/.cache/cil`
+    :type cache_dir: str, optional
+    :param use_cache: load and save the matrix in the cache, default True
+    :type use_cache: bool, optional
+    :param num_threads: number of threads used by the matrix-vector products
+    :type num_threads: int, optional
+    '''
+
+    def __init__(self, image_geometry, acquisition_geometry, cache_dir=None, use_cache=True, num_threads=NUM_THREADS):
+
+        super(SparseProjectionOperator, self).__init__(image_geometry, acquisition_geometry, num_threads=num_threads)
+
+        if self._num_slices != self._num_rows or np.any(self._row_weight != 0) \
+            or np.any(self._row_slice != np.arange(self._num_rows)):
+            raise ValueError("SparseProjectionOperator requires each detector row to match a slice of the volume")
+
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+        self.cache_dir = cache_dir
+        self.use_cache = use_cache
+
+        self._matrix = None
+        self._matrix_transpose = None
+        self.matrix = self._load_or_build()
+
+
+    @property
+    def matrix(self):
+        '''The system matrix of a slice, a scipy.sparse.csr_matrix'''
+        return self._matrix
+
+
+    @matrix.setter
+    def matrix(self, value):
+        value = scipy.sparse.csr_matrix(value, dtype=np.float32)
+        value.indptr = value.indptr.astype(np.int64)
+        value.indices = value.indices.astype(np.int32)
+        self._matrix = value
+
+        transpose = value.transpose().tocsr()
+        transpose.indptr = transpose.indptr.astype(np.int64)
+        transpose.indices = transpose.indices.astype(np.int32)
+        self._matrix_transpose = transpose
+
+
+    def geometry_hash(self):
+        '''Returns the hash of the parameters defining the system matrix, used as cache key'''
+        sha = hashlib.sha256()
+        sha.update(repr((_CACHE_VERSION, 'joseph_parallel', self._shape_image, self._voxel_size, self._image_origin,
+                         self._num_pixels, self._du, self._s0)).encode())
+        sha.update(self._angles.tobytes())
+        return sha.hexdigest()
+
+
+    def _cache_file(self):
+        return os.path.join(self.cache_dir, 'projection_matrix_{}.npz'.format(self.geometry_hash()))
+
+
+    def _load_or_build(self):
+        if self.use_cache:
+            filename = self._cache_file()
+            if os.path.isfile(filename):
+                try:
+                    with np.load(filename) as cached:
+                        return scipy.sparse.csr_matrix((cached['data'], cached['indices'], cached['indptr']),
+                                                       shape=tuple(cached['shape']))
+                except (OSError, KeyError, ValueError):
+                    # unreadable cache entry, rebuild it
+                    pass
+
+        matrix = self._build_matrix()
+
+        if self.use_cache:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # write to a temporary file first so that other processes never read a partial matrix
+            temp = '{}.{}.tmp.npz'.format(filename[:-4], os.getpid())
+            np.savez(temp, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr, shape=matrix.shape)
+            os.replace(temp, filename)
+
+        return matrix
+
+
+    def _build_matrix(self):
+        '''Builds the CSR matrix of Joseph's method for one slice, rows ordered (angle, pixel)'''
+        nx, ny = self._shape_image
+        dx, dy = self._voxel_size
+        x0, y0 = self._image_origin
+        nu, du, s0 = self._num_pixels, self._du, self._s0
+        t = np.arange(nu, dtype=np.float64)
+
+        rows, cols, vals = [], [], []
+        for a, theta in enumerate(self._angles.astype(np.float32)):
+            # cosf and sinf in single precision as projector.cpp, so that both choose the same
+            # branch at 45 degrees, where the branches differ with anisotropic voxels
+            c, s = float(np.cos(theta)), float(np.sin(theta))
+            if abs(c) >= abs(s):
+                # step along y, interpolate along x
+                w = dy / abs(c)
+                j = np.arange(ny)
+                frac = du / (c * dx) * t[None, :] + (((s0 + (y0 + j * dy) * s) / c - x0) / dx)[:, None]
+                first = np.floor(frac)
+                f = frac - first
+                first = first.astype(np.int64)
+                ray = np.broadcast_to(a * nu + np.arange(nu), frac.shape)
+                for index, weight in ((first, 1 - f), (first + 1, f)):
+                    valid = (index >= 0) & (index < nx) & (weight > 0)
+                    rows.append(ray[valid])
+                    cols.append((j[:, None] * nx + index)[valid])
+                    vals.append(w * weight[valid])
+            else:
+                # step along x, interpolate along y
+                w = dx / abs(s)
+                i = np.arange(nx)
+                frac = -du / (s * dy) * t[None, :] + ((((x0 + i * dx) * c - s0) / s - y0) / dy)[:, None]
+                first = np.floor(frac)
+                f = frac - first
+                first = first.astype(np.int64)
+                ray = np.broadcast_to(a * nu + np.arange(nu), frac.shape)
+                for index, weight in ((first, 1 - f), (first + 1, f)):
+                    valid = (index >= 0) & (index < ny) & (weight > 0)
+                    rows.append(ray[valid])
+                    cols.append((index * nx + i[:, None])[valid])
+                    vals.append(w * weight[valid])
+
+        shape = (self._angles.size * nu, nx * ny)
+        matrix = scipy.sparse.coo_matrix((np.concatenate(vals).astype(np.float32),
+            (np.concatenate(rows), np.concatenate(cols))), shape=shape).tocsr()
+        matrix.sum_duplicates()
+        return matrix
+
+
+    def _matvec(self, matrix, x, y, nvec):
+        cilacc.scsr_matvec(matrix.indptr.ctypes.data_as(ctypes.POINTER(ctypes.c_int64)),
+                           matrix.indices.ctypes.data_as(ctypes.POINTER(ctypes.c_int32)),
+                           matrix.data.ctypes.data_as(ctypes.POINTER(ctypes.c_float)),
+                           x.ctypes.data_as(ctypes.POINTER(ctypes.c_float)),
+                           y.ctypes.data_as(ctypes.POINTER(ctypes.c_float)),
+                           matrix.shape[0], matrix.shape[1], nvec, self.num_threads)
+
+
+    def _projection_shape(self):
+        # (channel, angle, row, pixel) shape of the projections
+        return (self._num_channels, self._angles.size, self._num_rows, self._num_pixels)
+
+
+    def direct(self, x, out=None):
+        '''Returns the forward projection of x'''
+
+        volume = np.ascontiguousarray(x.as_array(), dtype=np.float32)
+        nvec = self._num_channels * self._num_slices
+
+        # the products give the projections ordered (channel, row, angle, pixel)
+        nc, na, nv, nu = self._projection_shape()
+        projections = np.empty((nc, nv, na, nu), dtype=np.float32)
+        self._matvec(self._matrix, volume, projections, nvec)
+        projections = projections.transpose(0, 2, 1, 3)
+
+        if out is None:
+            ret = self.range_geometry().allocate(None)
+            ret.fill(projections.reshape(ret.shape))
+            return ret
+        else:
+            out.fill(projections.reshape(out.shape))
+
+
+    def adjoint(self, x, out=None):
+        '''Returns the backprojection of x'''
+
+        projections = x.as_array().reshape(self._projection_shape())
+        projections = np.ascontiguousarray(projections.transpose(0, 2, 1, 3), dtype=np.float32)
+        nvec = self._num_channels * self._num_slices
+
+        if out is None:
+            ret = self.domain_geometry().allocate(None)
+        else:
+            ret = out
+        volume = ret.as_array()
+        if volume.dtype != np.float32 or not volume.flags['C_CONTIGUOUS']:
+            volume = np.empty(ret.shape, dtype=np.float32)
+
+        self._matvec(self._matrix_transpose, projections, volume, nvec)
+
+        if volume is not ret.as_array():
+            ret.fill(volume)
+
+        if out is None:
+            return ret
+
+
+    def row_sums(self):
+        '''Returns the sums of the rows of the matrix, the projection of an image of ones, in the range of the operator'''
+        sums = np.asarray(self._matrix.sum(axis=1), dtype=np.float32).reshape(1, self._angles.size, 1, self._num_pixels)
+        ret = self.range_geometry().allocate(None)
+        ret.fill(np.broadcast_to(sums, self._projection_shape()).reshape(ret.shape))
+        return ret
+
+
+    def column_sums(self):
+        '''Returns the sums of the columns of the matrix, the backprojection of projections of ones, in the domain of the operator'''
+        nx, ny = self._shape_image
+        sums = np.asarray(self._matrix.sum(axis=0), dtype=np.float32).reshape(1, ny * nx)
+        ret = self.domain_geometry().allocate(None)
+        ret.fill(np.broadcast_to(sums, (self._num_channels * self._num_slices, ny * nx)).reshape(ret.shape))
+        return ret
+
+
+    def sum_abs_row(self):
+        '''Returns the sums of the rows of the matrix, whose entries are nonnegative, see :code:`row_sums`'''
+        return self.row_sums()
+
+
+    def sum_abs_col(self):
+        '''Returns the sums of the columns of the matrix, whose entries are nonnegative, see :code:`column_sums`'''
+        return self.column_sums()
+
+
+    def norm_bound(self):
+        '''Returns the bound of Schur's test on the norm, the square root of the product of the maximum row and column sums of the matrix'''
+        return float(np.sqrt(self._matrix.sum(axis=1).max() * self._matrix.sum(axis=0).max()))
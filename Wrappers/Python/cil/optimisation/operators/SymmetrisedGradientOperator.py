@@ -16,8 +16,21 @@
 #   limitations under the License.
 
 from cil.optimisation.operators import LinearOperator
-from cil.framework import BlockGeometry, BlockDataContainer
+from cil.framework import BlockGeometry, BlockDataContainer, cilacc
 from cil.optimisation.operators import FiniteDifferenceOperator
+from cil.utilities.multiprocessing import NUM_THREADS
+import numpy as np
+import ctypes
+
+for _name, _type in [('fdiff_symmetrised', ctypes.c_float), ('dfdiff_symmetrised', ctypes.c_double)]:
+    getattr(cilacc, _name).argtypes = [ctypes.POINTER(ctypes.POINTER(_type)),  # pointers to the vector field components
+                                       ctypes.POINTER(ctypes.POINTER(_type)),  # pointers to the tensor field components
+                                       ctypes.POINTER(ctypes.c_long),  # shape of the components
+                                       ctypes.c_int32, ctypes.c_int32,  # number of dimensions and of vector components
+                                       ctypes.c_int32,  # boundary condition, 0 Neumann, 1 Periodic
+                                       _type,  # voxel size
+                                       ctypes.c_int32,  # 1 for direct, 0 for adjoint
+                                       ctypes.c_int32]  # number of threads
 
 
 class SymmetrisedGradientOperator(LinearOperator):
@@ -38,6 +51,9 @@ class SymmetrisedGradientOperator(LinearOperator):
                 \partial_{y} v1 & 0.5 * (\partial_{x} v1 + \partial_{y} v2) \\
                 0.5 * (\partial_{x} v1 + \partial_{y} v2) & \partial_{x} v2 
             \end{matrix}
+
+        float32 and float64 data with 2 or 3 components are processed in a single
+        multithreaded pass by cilacc, writing directly into the output.
                                                                   
     '''
     
@@ -52,9 +68,12 @@ class SymmetrisedGradientOperator(LinearOperator):
         :type bnd_cond: str, optional, default :code:`Neumann`
         :param correlation: :code:`SpaceChannel` or :code:`Channel`
         :type correlation: str, optional, default :code:`Channel`
+        :param num_threads: number of threads used by cilacc
+        :type num_threads: int, optional
         '''
         
         self.bnd_cond = bnd_cond
+        self.num_threads = kwargs.get('num_threads', NUM_THREADS)
         self.correlation = kwargs.get('correlation',SymmetrisedGradientOperator.CORRELATION_SPACE)
                 
         tmp_gm = len(domain_geometry.geometries)*domain_geometry.geometries
@@ -74,9 +93,51 @@ class SymmetrisedGradientOperator(LinearOperator):
                                           range_geometry=BlockGeometry(*tmp_gm))
         
         
+    def _symmetrised_c(self, vector_field, tensor_field, direction):
+        '''Computes E(v), direction 1, or its adjoint, direction 0, with cilacc.
+        
+        Returns False if the containers are not supported.'''
+
+        if self.bnd_cond not in ['Neumann', 'Periodic']:
+            return False
+
+        try:
+            vectors = [el.as_array() for el in vector_field.containers]
+            tensors = [el.as_array() for el in tensor_field.containers]
+        except AttributeError:
+            return False
+
+        num_components = len(vectors)
+        arrays = vectors + tensors
+        dtype = arrays[0].dtype
+        if dtype not in (np.float32, np.float64) or num_components not in [2, 3] \
+            or len(tensors) != num_components ** 2 or not num_components <= arrays[0].ndim <= 4:
+            return False
+        for el in arrays:
+            if el.dtype != dtype or el.shape != arrays[0].shape or not el.flags['C_CONTIGUOUS']:
+                return False
+
+        if dtype == np.float32:
+            function, c_type = cilacc.fdiff_symmetrised, ctypes.c_float
+        else:
+            function, c_type = cilacc.dfdiff_symmetrised, ctypes.c_double
+        c_pointers = lambda l: (ctypes.POINTER(c_type) * len(l))(*[el.ctypes.data_as(ctypes.POINTER(c_type)) for el in l])
+        shape = (ctypes.c_long * arrays[0].ndim)(*arrays[0].shape)
+
+        function(c_pointers(vectors), c_pointers(tensors), shape, arrays[0].ndim, num_components,
+                 int(self.bnd_cond == 'Periodic'), self.FD.voxel_size, direction, self.num_threads)
+        return True
+
     def direct(self, x, out=None):
         
         '''Returns E(v)'''        
+
+        if out is None:
+            res = self.range_geometry().allocate(None)
+            if self._symmetrised_c(x, res, 1):
+                return res
+        elif self._symmetrised_c(x, out, 1):
+            return
         
         if out is None:
             
@@ -105,6 +166,13 @@ class SymmetrisedGradientOperator(LinearOperator):
             
                                                
     def adjoint(self, x, out=None):
+
+        if out is None:
+            res = self.domain_geometry().allocate(None)
+            if self._symmetrised_c(res, x, 0):
+                return res
+        elif self._symmetrised_c(out, x, 0):
+            return
         
         if out is None:
             
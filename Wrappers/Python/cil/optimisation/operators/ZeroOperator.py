@@ -18,6 +18,7 @@
 import numpy as np
 from cil.framework import ImageData
 from cil.optimisation.operators import LinearOperator
+from cil.utilities.cache import operator_hash
 
 class ZeroOperator(LinearOperator):
     
@@ -64,10 +65,27 @@ class ZeroOperator(LinearOperator):
         else:
             out.fill(self.domain_geometry().allocate())
         
+    def _operator_hash(self):
+        return operator_hash(self)
+
     def calculate_norm(self, **kwargs):
         
         '''Evaluates operator norm of ZeroOperator'''
         
         return 0
+
+    def exact_norm(self):
+
+        '''Returns the norm of ZeroOperator, 0'''
+
+        return 0
+
+    def sum_abs_row(self):
+
+        return self.range_geometry().allocate(0)
+
+    def sum_abs_col(self):
+
+        return self.domain_geometry().allocate(0)
     
     
\ No newline at end of file
@@ -30,4 +30,6 @@ from .MaskOperator import MaskOperator
 from .ChannelwiseOperator import ChannelwiseOperator
 from .BlurringOperator import BlurringOperator
 from .ProjectionMap import ProjectionMap
+from .ProjectionOperator import ProjectionOperator
+from .SparseProjectionOperator import SparseProjectionOperator
 
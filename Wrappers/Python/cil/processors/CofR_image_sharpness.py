@@ -37,8 +37,8 @@ class CofR_image_sharpness(Processor):
 
     :param slice_index: An integer defining the vertical slice to run the algorithm on.
     :type slice_index: int, str='centre', optional
-    :param FBP: A CIL FBP class imported from cil.plugins.tigre or cil.plugins.astra  
-    :type FBP: class
+    :param FBP: A CIL FBP class imported from cil.plugins.tigre or cil.plugins.astra, or 'cil' to reconstruct with `cil.recon.FBP` on the CPU
+    :type FBP: class, str
     :param tolerance: The tolerance of the fit in pixels, the default is 1/200 of a pixel. Note this is a stopping critera, not a statement of accuracy of the algorithm.
     :type tolerance: float, default = 0.001    
     :param search_range: The range in pixels to search either side of the panel centre. If `None` the width of the panel/4 is used. 
@@ -51,8 +51,8 @@ class CofR_image_sharpness(Processor):
 
     def __init__(self, slice_index='centre', FBP=None, tolerance=0.005, search_range=None, initial_binning=None):
         
-        if not inspect.isclass(FBP):
-            raise ValueError("Please pass a CIL FBP class from cil.plugins.tigre or cil.plugins.astra")
+        if not inspect.isclass(FBP) and FBP != 'cil':
+            raise ValueError("Please pass a CIL FBP class from cil.plugins.tigre or cil.plugins.astra, or 'cil'")
 
         kwargs = {
                     'slice_index': slice_index,
@@ -165,7 +165,16 @@ class CofR_image_sharpness(Processor):
         ag_shift = data.geometry.copy()
         ag_shift.config.system.rotation_axis.position = [offset, 0]
 
-        reco = self.FBP(ig, ag_shift)(data)
+        if self.FBP == 'cil':
+            from cil.recon import FBP
+            data_shift = ag_shift.allocate(None)
+            data_shift.fill(data)
+            reconstructor = FBP(data_shift, ig)
+            reconstructor.set_backend('cil')
+            reconstructor.set_filter_inplace(True)
+            reco = reconstructor.run(verbose=0)
+        else:
+            reco = self.FBP(ig, ag_shift)(data)
         return (reco*reco).sum()
 
     def plot(self, offsets,values, vox_size):
@@ -18,7 +18,8 @@ from cil.framework import cilacc
 from cil.framework import AcquisitionGeometry
 from cil.recon import Reconstructor
 from scipy.fft import fftfreq
-from cil.plugins.tigre import ProjectionOperator
+from cil.optimisation.operators import ProjectionOperator as CILProjectionOperator
+from cil.utilities.multiprocessing import NUM_THREADS
 
 import numpy as np
 import ctypes
@@ -50,6 +51,141 @@ if has_ipp:
                                     ctypes.c_long, #num_proj
                                     ctypes.c_long] #pix_x
 
+cilacc.fdk_backproject.argtypes = [ctypes.POINTER(ctypes.c_float),  # pointer to the volume
+                                   ctypes.POINTER(ctypes.c_float),  # pointer to the projections
+                                   ctypes.POINTER(ctypes.c_float),  # pointer to the projection matrices
+                                   ctypes.c_long, ctypes.c_long, ctypes.c_long, #nx, ny, nz
+                                   ctypes.c_long, ctypes.c_long, ctypes.c_long, #num_proj, pix_v, pix_x
+                                   ctypes.c_long, #slices per slab
+                                   ctypes.c_int32] #number of threads
+
+
+class _FDKBackprojector(object):
+    """
+    Voxel-driven cone-beam backprojector with FDK weights computed by cilacc
+
+    A projection matrix is computed for each angle from the system description, so
+    simple, offset and advanced geometries are supported. The volume is backprojected
+    in slabs of `slab_size` slices.
+    """
+
+    def __init__(self, image_geometry, acquisition_geometry, slab_size=8, num_threads=NUM_THREADS):
+        if acquisition_geometry.geom_type != AcquisitionGeometry.CONE:
+            raise TypeError("The FDK backprojector is for cone-beam data only.")
+
+        self.image_geometry = image_geometry
+        self.acquisition_geometry = acquisition_geometry
+        self.slab_size = slab_size
+        self.num_threads = num_threads
+        self.matrices = self._projection_matrices(image_geometry, acquisition_geometry)
+
+
+    @staticmethod
+    def _projection_matrices(ig, ag):
+        """
+        Returns the 3x4 matrices mapping the voxel index (i, j, k, 1) to (u * w, v * w, w)
+        where (u, v) is the detector pixel index and w the FDK depth of the voxel
+        """
+        ag = ag.copy()
+        system = ag.config.system
+        system.align_reference_frame()
+
+        angles = np.asarray(ag.config.angles.angle_data, dtype=np.float64) + ag.config.angles.initial_angle
+        if ag.config.angles.angle_unit == AcquisitionGeometry.DEGREE:
+            angles = angles * np.pi / 180.
+
+        num_u, num_v = ag.config.panel.num_pixels
+        du, dv = ag.config.panel.pixel_size
+
+        if ag.dimension == '2D':
+            source = np.append(system.source.position, 0.)
+            detector = np.append(system.detector.position, 0.)
+            direction_u = np.append(system.detector.direction_x, 0.)
+            direction_v = np.array([0., 0., 1.])
+            voxel_size = np.array([ig.voxel_size_x, ig.voxel_size_y, 1.])
+            origin = np.array([ig.center_x - 0.5 * (ig.voxel_num_x - 1) * ig.voxel_size_x,
+                               ig.center_y - 0.5 * (ig.voxel_num_y - 1) * ig.voxel_size_y, 0.])
+        else:
+            source = np.asarray(system.source.position, dtype=np.float64)
+            detector = np.asarray(system.detector.position, dtype=np.float64)
+            direction_u = np.asarray(system.detector.direction_x, dtype=np.float64)
+            direction_v = np.asarray(system.detector.direction_y, dtype=np.float64)
+            voxel_size = np.array([ig.voxel_size_x, ig.voxel_size_y, ig.voxel_size_z])
+            origin = np.array([ig.center_x, ig.center_y, ig.center_z]) - 0.5 * (np.array([ig.voxel_num_x, ig.voxel_num_y, ig.voxel_num_z]) - 1) * voxel_size
+
+        if 'right' in ag.config.panel.origin:
+            direction_u = -direction_u
+        if 'top' in ag.config.panel.origin:
+            direction_v = -direction_v
+
+        # voxel index to position
+        index_to_position = np.zeros((4, 4))
+        index_to_position[:3, :3] = np.diag(voxel_size)
+        index_to_position[:3, 3] = origin
+        index_to_position[3, 3] = 1
+
+        matrices = np.empty((angles.size, 3, 4), dtype=np.float64)
+        for a, theta in enumerate(angles):
+            # the object rotates by theta, i.e. the system rotates by -theta in the object frame
+            rotation = np.array([[np.cos(theta), np.sin(theta), 0], [-np.sin(theta), np.cos(theta), 0], [0, 0, 1]])
+            S = rotation.dot(source)
+            D = rotation.dot(detector)
+            U = rotation.dot(direction_u)
+            V = rotation.dot(direction_v)
+
+            normal = np.cross(U, V)
+            den = (D - S).dot(normal)
+
+            # coefficients of an in-plane vector on the detector directions
+            basis = np.stack([U, V], axis=1)
+            dual = np.linalg.solve(basis.T.dot(basis), basis.T)
+
+            row_w = np.append(normal, -S.dot(normal)) / den
+            rows_uv = np.outer(dual.dot(S - D), row_w) + np.hstack([dual, -dual.dot(S).reshape(2, 1)])
+
+            P = np.empty((3, 4))
+            P[0] = rows_uv[0] / du + 0.5 * (num_u - 1) * row_w
+            P[1] = rows_uv[1] / dv + 0.5 * (num_v - 1) * row_w
+            P[2] = row_w
+
+            # depth relative to the rotation axis
+            P /= -S.dot(normal) / den
+            matrices[a] = P.dot(index_to_position)
+
+        return np.ascontiguousarray(matrices, dtype=np.float32)
+
+
+    def adjoint(self, x, out=None):
+        """
+        Returns the FDK backprojection of the filtered projections x
+        """
+        projections = np.ascontiguousarray(x.as_array(), dtype=np.float32)
+
+        if out is None:
+            ret = self.image_geometry.allocate(None)
+        else:
+            ret = out
+        volume = ret.as_array()
+        if volume.dtype != np.float32 or not volume.flags['C_CONTIGUOUS']:
+            volume = np.empty(ret.shape, dtype=np.float32)
+
+        ig = self.image_geometry
+        ag = self.acquisition_geometry
+        nz = ig.voxel_num_z if ag.dimension == '3D' else 1
+
+        cilacc.fdk_backproject(volume.ctypes.data_as(c_float_p), projections.ctypes.data_as(c_float_p),
+                               self.matrices.ctypes.data_as(c_float_p),
+                               ig.voxel_num_x, ig.voxel_num_y, nz,
+                               ag.num_projections, ag.pixel_num_v if ag.dimension == '3D' else 1, ag.pixel_num_h,
+                               self.slab_size, self.num_threads)
+
+        if volume is not ret.as_array():
+            ret.fill(volume)
+
+        if out is None:
+            return ret
+
+
 class GenericFilteredBackProjection(Reconstructor):
     """
     Abstract Base Class GenericFilteredBackProjection holding common and virtual methods for FBP and FDK
@@ -260,6 +396,19 @@ class GenericFilteredBackProjection(Reconstructor):
             raise ValueError ("The data is not in a compatible order. Try reordering the data with data.reorder({})".format(self.backend))
 
 
+    def _get_projection_operator(self, image_geometry, acquisition_geometry, **kwargs):
+        """
+        Returns the backprojector of the configured backend
+        """
+        if self.backend == 'cil':
+            if acquisition_geometry.geom_type == AcquisitionGeometry.CONE:
+                return _FDKBackprojector(image_geometry, acquisition_geometry)
+            return CILProjectionOperator(image_geometry, acquisition_geometry, adjoint_weights='FBP')
+        else:
+            from cil.plugins.tigre import ProjectionOperator
+            return ProjectionOperator(image_geometry, acquisition_geometry, **kwargs)
+
+
     def reset(self):
         """
         Resets all optional configuration parameters to their default values
@@ -347,7 +496,7 @@ class FDK(GenericFilteredBackProjection):
             proj_filtered = self.input
 
         self._pre_filtering(proj_filtered)
-        operator = ProjectionOperator(self.image_geometry,self.acquisition_geometry,adjoint_weights='FDK')
+        operator = self._get_projection_operator(self.image_geometry,self.acquisition_geometry,adjoint_weights='FDK')
         
         if out is None:
             return operator.adjoint(proj_filtered)
@@ -455,7 +604,7 @@ class FBP(GenericFilteredBackProjection):
                 
         ig_slice = ag_slice.get_ImageGeometry()
         self.data_slice = ag_slice.allocate()
-        self.operator = ProjectionOperator(ig_slice,ag_slice)
+        self.operator = self._get_projection_operator(ig_slice,ag_slice)
 
     def _process_chunk(self, i, step,  out):
         self.data_slice.fill(np.squeeze(self.input.array[:,i:i+step,:]))
@@ -539,7 +688,7 @@ class FBP(GenericFilteredBackProjection):
 
             self._pre_filtering(proj_filtered)
 
-            operator = ProjectionOperator(self.image_geometry,self.acquisition_geometry)
+            operator = self._get_projection_operator(self.image_geometry,self.acquisition_geometry)
 
             if out is None:
                 return operator.adjoint(proj_filtered)
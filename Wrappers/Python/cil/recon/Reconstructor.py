@@ -101,16 +101,17 @@ class Reconstructor(object):
 
     def set_backend(self, backend='tigre'):
         """
-        Sets the backend used for the foward/backward projectors. Currently only TIGRE is supported
+        Sets the backend used for the foward/backward projectors
         
         Parameters
         ----------
         backend: string
-            Set the backend to TIGRE 'tigre'
+            Set the backend to TIGRE 'tigre' or to the CIL CPU projectors 'cil'
         """        
-        supported_backends = ['tigre']
+        supported_backends = ['tigre', 'cil']
         if backend not in supported_backends:
             raise ValueError("Backend unsupported. Supported backends: {}", supported_backends)
+        DataOrder.check_order_for_engine(backend, self.acquisition_geometry)
         self._backend = backend
 
 
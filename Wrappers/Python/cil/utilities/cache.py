@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+#   This work is part of the Core Imaging Library (CIL) developed by CCPi
+#   (Collaborative Computational Project in Tomographic Imaging), with
+#   substantial contributions by UKRI-STFC and University of Manchester.
+
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+
+#   http://www.apache.org/licenses/LICENSE-2.0
+
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import numpy
+import hashlib
+import warnings
+import os
+
+# increase when the content of the cache changes, so that the cached entries are not used
+_CACHE_VERSION = 1
+
+
+def default_cache_dir():
+    '''Returns the directory of the CIL caches, $CIL_CACHE_DIR or ~/.cache/cil'''
+    cache_dir = os.environ.get('CIL_CACHE_DIR', None)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'cil')
+    return cache_dir
+
+
+def _hash_update(sha, value, visited):
+    if isinstance(value, numpy.ndarray):
+        sha.update('ndarray{}{}'.format(value.dtype.str, value.shape).encode())
+        sha.update(numpy.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        sha.update(b'{')
+        for key in sorted(value, key=repr):
+            sha.update(repr(key).encode())
+            _hash_update(sha, value[key], visited)
+        sha.update(b'}')
+    elif isinstance(value, (list, tuple)):
+        sha.update(b'[')
+        for item in value:
+            _hash_update(sha, item, visited)
+        sha.update(b']')
+    elif hasattr(value, '__dict__') and not isinstance(value, type):
+        # geometries and their configuration objects
+        if id(value) in visited:
+            sha.update(b'cycle')
+            return
+        visited.add(id(value))
+        sha.update(type(value).__name__.encode())
+        _hash_update(sha, vars(value), visited)
+    else:
+        sha.update(repr(value).encode())
+
+
+def operator_hash(operator, *parameters):
+    '''Returns the hash of the type and geometries of the operator and of the parameters
+
+    Used by the operators to define the key of their entries in the :code:`OperatorCache`.
+    The parameters must define the operator together with its geometries, e.g. the boundary
+    conditions, and may be numbers, strings, numpy arrays, or lists and dictionaries of them.
+    '''
+    sha = hashlib.sha256()
+    visited = set()
+    sha.update('{}.{}'.format(type(operator).__module__, type(operator).__name__).encode())
+    for value in (_CACHE_VERSION, operator.domain_geometry(), operator.range_geometry()) + parameters:
+        _hash_update(sha, value, visited)
+    return sha.hexdigest()
+
+
+class OperatorCache(object):
+    '''Content-addressed on-disk cache of quantities computed from operators
+
+    The entries, e.g. the norm, the dominant singular vector or the row and column sums of
+    an operator, are stored in files named after the hash of the operator, see
+    :code:`operator_hash`, and of the name of the entry. They can be read by any later
+    operator with the same type, geometries and parameters, also in other processes.
+
+    The least recently used entries are evicted when the size of the cache exceeds max_size.
+
+    :param cache_dir: directory of the cache, default `operators` in :code:`default_cache_dir()`
+    :type cache_dir: str, optional
+    :param max_size: maximum size of the cache in bytes, default 1 GB
+    :type max_size: int, optional
+    '''
+    def __init__(self, cache_dir=None, max_size=2**30):
+        if cache_dir is None:
+            cache_dir = os.path.join(default_cache_dir(), 'operators')
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def _filename(self, key, name):
+        return os.path.join(self.cache_dir, '{}_{}.npz'.format(key, name))
+
+    def get(self, key, name):
+        '''Returns the dictionary of the arrays stored in the entry, None if there is no such entry'''
+        filename = self._filename(key, name)
+        if not os.path.isfile(filename):
+            return None
+        try:
+            with numpy.load(filename) as entry:
+                arrays = {k: entry[k] for k in entry.files}
+            # the access time is recorded in the modification time for the eviction
+            os.utime(filename)
+            return arrays
+        except (OSError, ValueError):
+            # unreadable or evicted entry
+            return None
+
+    def put(self, key, name, **arrays):
+        '''Stores the arrays in the entry, replacing it if it exists'''
+        filename = self._filename(key, name)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # write to a temporary file first so that other processes never read a partial entry
+            temp = '{}.{}.tmp.npz'.format(filename[:-4], os.getpid())
+            numpy.savez(temp, **arrays)
+            os.replace(temp, filename)
+        except OSError as err:
+            warnings.warn('Could not write {} in the operator cache: {}'.format(name, err))
+            return
+        self.evict()
+
+    def get_container(self, key, name, geometry):
+        '''Returns the DataContainer or BlockDataContainer stored in the entry allocated from geometry, None if there is no such entry'''
+        arrays = self.get(key, name)
+        if arrays is None:
+            return None
+        container = geometry.allocate(None)
+        parts = container.containers if hasattr(container, 'containers') else (container,)
+        if len(arrays) != len(parts):
+            return None
+        for i, part in enumerate(parts):
+            array = arrays.get('array_{}'.format(i))
+            if array is None or array.shape != part.shape:
+                return None
+            part.fill(array)
+        return container
+
+    def put_container(self, key, name, container):
+        '''Stores a DataContainer or a BlockDataContainer in the entry'''
+        parts = container.containers if hasattr(container, 'containers') else (container,)
+        self.put(key, name, **{'array_{}'.format(i): part.as_array() for i, part in enumerate(parts)})
+
+    def _entries(self):
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, filename)
+            if filename.endswith('.npz') and not filename.endswith('.tmp.npz'):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def size(self):
+        '''Returns the size of the cache in bytes'''
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, max_size=None):
+        '''Removes the least recently used entries until the size of the cache is below max_size, default self.max_size'''
+        if max_size is None:
+            max_size = self.max_size
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        '''Removes all the entries'''
+        self.evict(max_size=0)
+
+
+_operator_cache = OperatorCache() if os.environ.get('CIL_OPERATOR_CACHE', '0') == '1' else None
+
+
+def get_operator_cache():
+    '''Returns the OperatorCache used by the operators and algorithms, None if disabled'''
+    return _operator_cache
+
+
+def set_operator_cache(cache):
+    '''Sets the OperatorCache used by the operators and algorithms, None disables the cache
+
+    The cache is disabled by default. It is enabled at import if the environment variable
+    CIL_OPERATOR_CACHE is 1, with an OperatorCache in :code:`default_cache_dir()`.
+
+    :param cache: the cache
+    :type cache: OperatorCache or None
+    :returns: the previous cache
+    '''
+    global _operator_cache
+    previous = _operator_cache
+    _operator_cache = cache
+    return previous
@@ -20,6 +20,7 @@ import numpy
 from cil.framework import ImageGeometry, AcquisitionGeometry
 from cil.framework import ImageData, AcquisitionData
 from cil.framework import BlockDataContainer, DataContainer
+from cil.framework import BlockGeometry, VectorGeometry
 import functools
 
 from cil.optimisation.operators import GradientOperator, IdentityOperator, BlockOperator
@@ -587,6 +588,89 @@ class TestBlockDataContainer(BDCUnittest):
         self.assertBlockDataContainerEqual(out, res)
 
 
+    def test_pnorm(self):
+        ig = ImageGeometry(4,5,6)
+        for dtype in [numpy.float32, numpy.float64, numpy.complex64]:
+            a = BlockDataContainer(ig.allocate(1, dtype=dtype), ig.allocate(2, dtype=dtype), ig.allocate(-2, dtype=dtype))
+            res = a.pnorm(2)
+            self.assertIsInstance(res, ImageData)
+            numpy.testing.assert_allclose(res.as_array(), 3)
+            numpy.testing.assert_allclose(a.pnorm(1).as_array(), 5)
+
+    def test_lazy(self):
+        ig0 = ImageGeometry(2,3,4)
+        ig1 = ImageGeometry(2,3,5)
+        a = BlockDataContainer(ig0.allocate(1), ig1.allocate(2))
+        b = BlockDataContainer(ig0.allocate(3), ig1.allocate(4))
+
+        res = (a.lazy() * 2 - b).evaluate()
+        self.assertBlockDataContainerEqual(res, a * 2 - b)
+
+        out = a.copy()
+        (3 / b.lazy() + a).evaluate(out=out)
+        self.assertBlockDataContainerEqual(out, 3 / b + a)
+
+        out.fill((b - a.lazy()).sqrt())
+        self.assertBlockDataContainerEqual(out, (b - a).sqrt())
+
+        nested = BlockDataContainer(a, ig0.allocate(5))
+        res = (nested.lazy() + 1).evaluate()
+        self.assertBlockDataContainerEqual(res, nested + 1)
+
+    def test_contiguous(self):
+        ig0 = ImageGeometry(2,3,4)
+        ig1 = ImageGeometry(2,3,5)
+        bg = BlockGeometry(ig0, BlockGeometry(ig1, ig1), VectorGeometry(7))
+        a = bg.allocate(2, contiguous=True)
+        b = bg.allocate('random', seed=3, contiguous=True)
+        # the same values as the allocate of each geometry
+        self.assertBlockDataContainerEqual(b, bg.allocate('random', seed=3))
+        self.assertIsNotNone(a._flat())
+        self.assertEqual(a._flat().size, 24 + 2 * 30 + 7)
+
+        # reference results on containers in separate buffers
+        ra = a.copy()
+        ra.get_item(0).array = ra.get_item(0).array.copy()
+        self.assertIsNone(ra._flat())
+        rb = BlockDataContainer(*b.containers)
+        self.assertIsNone(rb._flat())
+
+        for op in [lambda x, y: x + y, lambda x, y: x * 2 - y, lambda x, y: (x / y).abs(), 
+                   lambda x, y: x.maximum(y), lambda x, y: y.sqrt()]:
+            res = op(a, b)
+            self.assertIsNotNone(res._flat())
+            self.assertBlockDataContainerAlmostEqual(res, op(ra, rb), decimal=6)
+
+        out = bg.allocate(0, contiguous=True)
+        a.axpby(3, -2, b, out)
+        self.assertBlockDataContainerAlmostEqual(out, 3 * ra - 2 * rb, decimal=6)
+        a.subtract(b, out=out)
+        self.assertBlockDataContainerAlmostEqual(out, ra - rb, decimal=6)
+        b.conjugate(out=out)
+        self.assertBlockDataContainerEqual(out, b)
+
+        numpy.testing.assert_allclose(a.dot(b), ra.dot(rb), rtol=1e-6)
+        numpy.testing.assert_allclose(b.sum(), rb.sum(), rtol=1e-6)
+        numpy.testing.assert_allclose(b.squared_norm(), rb.squared_norm(), rtol=1e-6)
+
+        c = b.copy()
+        self.assertIsNotNone(c._flat())
+        c += a
+        c *= a
+        c -= a
+        c /= a
+        self.assertBlockDataContainerAlmostEqual(c, ((rb + ra) * ra - ra) / ra, decimal=6)
+        c.fill(a)
+        self.assertBlockDataContainerEqual(c, a)
+
+        # different layouts are processed per container
+        other = BlockGeometry(ig1, BlockGeometry(ig0, ig1), VectorGeometry(7)).allocate(1, contiguous=True)
+        self.assertIsNone(a._flat_operands(other))
+
+        with self.assertRaises(ValueError):
+            BlockGeometry(ig0, ImageGeometry(2,3,4, dtype=numpy.float64)).allocate(0, contiguous=True)
+
+
 class TestOutParameter(BDCUnittest):
     def setUp(self):
         ig0 = ImageGeometry(2,3,4)
@@ -22,6 +22,10 @@ from cil.optimisation.operators import IdentityOperator
 from cil.framework import ImageGeometry, ImageData
 import numpy
 from cil.optimisation.operators import FiniteDifferenceOperator
+from cil.optimisation.operators import GradientOperator, BlurringOperator
+from cil.optimisation.operators import LinearOperator, ZeroOperator
+from timeit import default_timer as timer
+import time
 
 
 class TestBlockOperator(unittest.TestCase):
@@ -194,3 +198,101 @@ class TestBlockOperator(unittest.TestCase):
         print(ig1.shape==u1.shape)
         print (G1.norm())
         numpy.testing.assert_allclose(G1.norm(), numpy.sqrt(4), atol=0.1)
+
+    def test_BlockOperator_workers(self):
+        print ("test_BlockOperator_workers")
+        ig = ImageGeometry(12, 10)
+        x = [ig.allocate('random', seed=s) for s in range(3)]
+        ops = [FiniteDifferenceOperator(ig, direction=0), 2 * IdentityOperator(ig),
+               FiniteDifferenceOperator(ig, direction=1), FiniteDifferenceOperator(ig, direction=0, bnd_cond='Periodic'),
+               IdentityOperator(ig), FiniteDifferenceOperator(ig, direction=1, bnd_cond='Periodic')]
+
+        for shape in [(3, 2), (6, 1)]:
+            K = BlockOperator(*ops, shape=shape)
+            X = BlockDataContainer(*x[:shape[1]])
+            Y = BlockDataContainer(*[ig.allocate('random', seed=10 + s) for s in range(shape[0])])
+
+            # reference computed operator by operator
+            direct = [sum(K.get_item(row, col).direct(X.get_item(col)).as_array() for col in range(shape[1]))
+                      for row in range(shape[0])]
+            adjoint = [sum(K.get_item(row, col).adjoint(Y.get_item(row)).as_array() for row in range(shape[0]))
+                       for col in range(shape[1])]
+
+            for num_workers in [1, 2, 4]:
+                K = BlockOperator(*ops, shape=shape, num_workers=num_workers)
+                out_direct = K.range_geometry().allocate(None)
+                out_adjoint = K.domain_geometry().allocate(None)
+                for _ in range(2):
+                    res_direct = K.direct(X)
+                    K.direct(X, out=out_direct)
+                    res_adjoint = K.adjoint(Y)
+                    K.adjoint(Y, out=out_adjoint)
+
+                    for row in range(shape[0]):
+                        numpy.testing.assert_allclose(res_direct.get_item(row).as_array(), direct[row], rtol=1e-6)
+                        numpy.testing.assert_allclose(out_direct.get_item(row).as_array(), direct[row], rtol=1e-6)
+                    if shape[1] == 1:
+                        res_adjoint = BlockDataContainer(res_adjoint)
+                        out_adjoint_b = BlockDataContainer(out_adjoint)
+                    else:
+                        out_adjoint_b = out_adjoint
+                    for col in range(shape[1]):
+                        numpy.testing.assert_allclose(res_adjoint.get_item(col).as_array(), adjoint[col], rtol=1e-5, atol=1e-6)
+                        numpy.testing.assert_allclose(out_adjoint_b.get_item(col).as_array(), adjoint[col], rtol=1e-5, atol=1e-6)
+
+                    if _ == 0:
+                        workspaces = dict(K._workspaces)
+                # the workspaces are allocated at the first call and reused
+                self.assertEqual(len(workspaces), len(K._workspaces))
+                for key in workspaces:
+                    self.assertIs(workspaces[key], K._workspaces[key])
+                self.assertEqual(K.T.num_workers, num_workers)
+
+    def test_BlockOperator_workers_shared_operator(self):
+        print ("test_BlockOperator_workers_shared_operator")
+        ig = ImageGeometry(12, 10)
+        K = StatefulOperator(ig)
+        Z = ZeroOperator(ig)
+        X = BlockDataContainer(ig.allocate('random', seed=1), ig.allocate('random', seed=2))
+
+        # the same instance in several rows, also inside another operator, is not applied concurrently
+        for ops, shape in [((K, Z, Z, K), (2, 2)), ((K, 2 * K, -1 * K), (3, 1))]:
+            reference = BlockOperator(*ops, shape=shape)
+            K_workers = BlockOperator(*ops, shape=shape, num_workers=3)
+            x = X if shape[1] == 2 else X.get_item(0)
+            y = reference.direct(x)
+            for _ in range(3):
+                res = K_workers.direct(x)
+                for row in range(shape[0]):
+                    numpy.testing.assert_array_equal(res.get_item(row).as_array(), y.get_item(row).as_array())
+                res = K_workers.adjoint(y)
+                expected = reference.adjoint(y)
+                if shape[1] == 1:
+                    numpy.testing.assert_array_equal(res.as_array(), expected.as_array())
+                else:
+                    for col in range(shape[1]):
+                        numpy.testing.assert_array_equal(res.get_item(col).as_array(), expected.get_item(col).as_array())
+
+        # rows with distinct operators are still processed concurrently
+        from cil.optimisation.operators.BlockOperator import _group_tasks
+        self.assertEqual(len(_group_tasks([[K], [StatefulOperator(ig)]])), 2)
+        self.assertEqual(len(_group_tasks([[K], [2 * K]])), 1)
+
+
+class StatefulOperator(LinearOperator):
+    '''Scaling by 3 through a buffer of the instance, which is not thread safe'''
+    def __init__(self, geometry):
+        super(StatefulOperator, self).__init__(domain_geometry=geometry, range_geometry=geometry)
+        self.buffer = geometry.allocate(0)
+
+    def direct(self, x, out=None):
+        self.buffer.fill(x)
+        # gives the other threads the time to overwrite the buffer
+        time.sleep(0.002)
+        self.buffer *= 3
+        if out is None:
+            return self.buffer.copy()
+        out.fill(self.buffer)
+
+    def adjoint(self, x, out=None):
+        return self.direct(x, out=out)
@@ -16,13 +16,19 @@
 #   limitations under the License.
 
 import sys
+import os
+import shutil
+import tempfile
 import unittest
 import numpy
 from cil.framework import DataContainer
 from cil.framework import ImageData
 from cil.framework import AcquisitionData
+from cil.framework import VectorData
 from cil.framework import ImageGeometry, BlockGeometry, VectorGeometry
 from cil.framework import AcquisitionGeometry
+from cil.framework import BufferPool
+from cil.framework import framework
 from timeit import default_timer as timer
 
 
@@ -798,8 +804,184 @@ class TestDataContainer(unittest.TestCase):
         mean = data.mean()
         expected = numpy.float64(0+1+2+3)/numpy.float64(4)
         numpy.testing.assert_almost_equal(mean, expected)
+
+    def test_reduction_cilacc(self):
+        ig = ImageGeometry(voxel_num_x=30, voxel_num_y=20, voxel_num_z=10)
+        for dtype in [numpy.float32, numpy.float64]:
+            x = ig.allocate('random', seed=3, dtype=dtype)
+            y = ig.allocate('random', seed=4, dtype=dtype)
+            arr = x.as_array().astype(numpy.float64)
+            # products of float32 data are rounded before the accumulation
+            rtol = 1e-6 if dtype == numpy.float32 else 1e-12
+
+            for num_threads in [1, 4]:
+                numpy.testing.assert_allclose(x.sum(num_threads=num_threads), arr.sum(), rtol=1e-12)
+                numpy.testing.assert_allclose(x.dot(y, num_threads=num_threads), 
+                    arr.ravel().dot(y.as_array().ravel().astype(numpy.float64)), rtol=rtol)
+                numpy.testing.assert_allclose(x.squared_norm(num_threads=num_threads), (arr**2).sum(), rtol=rtol)
+                numpy.testing.assert_allclose(x.mean(num_threads=num_threads), arr.mean(), rtol=1e-12)
+                self.assertEqual(x.min(num_threads=num_threads), x.as_array().min())
+                self.assertEqual(x.max(num_threads=num_threads), x.as_array().max())
+
+            self.assertEqual(x.sum().dtype, numpy.float64)
+            numpy.testing.assert_allclose(x.dot(y, method='reduce'), x.dot(y, method='numpy'), rtol=1e-5)
+
+            # reductions along an axis by label
+            for label in ig.dimension_labels:
+                axis = ig.dimension_labels.index(label)
+                res = x.sum(axis=label)
+                self.assertEqual(res.dtype, dtype)
+                numpy.testing.assert_allclose(res, x.as_array().sum(axis=axis), rtol=1e-5)
+                numpy.testing.assert_allclose(x.mean(axis=label), arr.mean(axis=axis), rtol=1e-6)
+                numpy.testing.assert_array_equal(x.max(axis=label), x.as_array().max(axis=axis))
+                numpy.testing.assert_array_equal(x.min(axis=label), x.as_array().min(axis=axis))
+            numpy.testing.assert_allclose(x.sum(axis=('vertical', 'horizontal_x')), 
+                x.as_array().sum(axis=(0,2)), rtol=1e-5)
+
+        x.as_array()[1,2,3] = numpy.nan
+        self.assertTrue(numpy.isnan(x.min()))
+        self.assertTrue(numpy.isnan(x.max()))
+
+    def test_reduction_accuracy(self):
+        # float32 data accumulate in float64
+        x = ImageGeometry(1000, 1000).allocate(0.1)
+        numpy.testing.assert_allclose(x.sum(), 1e6 * numpy.float64(numpy.float32(0.1)), rtol=1e-12)
         
         
+    def test_reorder_cilacc(self):
+        import itertools
+        ag = AcquisitionGeometry.create_Parallel3D().set_angles(numpy.arange(37)).set_panel([33, 5]).set_channels(3)
+        for dtype in [numpy.float32, numpy.float64, numpy.int32]:
+            data = ag.allocate(None, dtype=dtype)
+            data.fill(numpy.arange(data.size).reshape(data.shape))
+            for order in itertools.permutations(data.dimension_labels):
+                axes = [data.dimension_labels.index(el) for el in order]
+                for in_place in [False, True]:
+                    x = data.copy()
+                    x.reorder(list(order), in_place=in_place)
+                    self.assertEqual(x.dimension_labels, order)
+                    self.assertTrue(x.as_array().flags['C_CONTIGUOUS'])
+                    numpy.testing.assert_array_equal(x.as_array(), numpy.transpose(data.as_array(), axes))
+
+        # rows permuted in the memory of the container
+        x = data.copy()
+        address = aid(x.as_array())
+        x.reorder('astra', in_place=True)
+        self.assertEqual(aid(x.as_array()), address)
+        self.assertEqual(x.dimension_labels, ('channel', 'vertical', 'angle', 'horizontal'))
+
+    def test_shared_geometry(self):
+        ig = ImageGeometry(4, 5, 6)
+        x = ig.allocate(1)
+        y = x + 1
+        self.assertIs(y.geometry, x.geometry)
+        z = x.abs()
+        self.assertIs(z.geometry, x.geometry)
+        # a new dtype needs a new geometry
+        c = x * 1j
+        self.assertIsNot(c.geometry, x.geometry)
+        self.assertEqual(x.dtype, numpy.float32)
+
+        # reorder does not change the containers sharing the geometry
+        y.reorder(['horizontal_x', 'vertical', 'horizontal_y'])
+        self.assertEqual(x.dimension_labels, ('vertical', 'horizontal_y', 'horizontal_x'))
+        self.assertEqual(y.dimension_labels, ('horizontal_x', 'vertical', 'horizontal_y'))
+
+        # the cached address of the data follows the array of the container
+        out = ig.allocate(0)
+        x.axpby(2, numpy.float32(3), x, out)
+        numpy.testing.assert_array_equal(out.as_array(), 5)
+        out.reorder(['horizontal_x', 'vertical', 'horizontal_y'])
+        y.axpby(numpy.int64(1), 1, y, out)
+        numpy.testing.assert_array_equal(out.as_array(), 4)
+        with self.assertRaises(TypeError):
+            x + 'a'
+        with self.assertRaises(ValueError):
+            x.add(ImageGeometry(3, 4).allocate(0), out=out)
+
+    def test_reduced_precision_storage(self):
+        ig = ImageGeometry(30, 20, 10, dtype=numpy.float16)
+        x = ig.allocate('random', seed=3)
+        y = ig.allocate('random', seed=4)
+        out = ig.allocate(0)
+        self.assertEqual(x.dtype, numpy.float16)
+        x32 = x.as_array().astype(numpy.float32)
+        y32 = y.as_array().astype(numpy.float32)
+
+        # computed in float32 and rounded once to float16
+        for a, b in [(2, 3), (-0.5, numpy.float32(1.5))]:
+            x.axpby(a, b, y, out)
+            numpy.testing.assert_array_equal(out.as_array(), 
+                (numpy.float32(a) * x32 + numpy.float32(b) * y32).astype(numpy.float16))
+        a = ig.allocate('random', seed=5)
+        x.axpby(a, 3, y, out)
+        numpy.testing.assert_array_equal(out.as_array(),
+            (a.as_array().astype(numpy.float32) * x32 + 3 * y32).astype(numpy.float16))
+
+        # reductions accumulate in double precision
+        arr = x.as_array().astype(numpy.float64)
+        numpy.testing.assert_allclose(x.sum(), arr.sum(), rtol=1e-12)
+        numpy.testing.assert_allclose(x.squared_norm(), (arr**2).sum(), rtol=1e-7)
+        numpy.testing.assert_allclose(x.dot(y), arr.ravel().dot(y.as_array().ravel().astype(numpy.float64)), rtol=1e-7)
+        self.assertEqual(x.max(), x.as_array().max())
+        self.assertEqual(x.min(), x.as_array().min())
+        self.assertEqual(x.max().dtype, numpy.float16)
+        res = x.sum(axis='horizontal_y')
+        self.assertEqual(res.dtype, numpy.float16)
+        numpy.testing.assert_allclose(res, arr.sum(axis=1), rtol=1e-3)
+
+        # a sum of float16 data which does not fit float16 accumulation
+        z = VectorGeometry(4096, dtype=numpy.float16).allocate(1)
+        self.assertEqual(z.sum(), 4096)
+
+    def test_bfloat16_storage(self):
+        try:
+            from ml_dtypes import bfloat16
+        except ImportError:
+            self.skipTest('ml_dtypes not available')
+        ig = ImageGeometry(30, 20, 10, dtype=bfloat16)
+        x = ig.allocate(0)
+        x.fill(numpy.random.random(x.shape).astype(bfloat16))
+        y = x.copy()
+        out = ig.allocate(0)
+        x.axpby(2, 3, y, out)
+        numpy.testing.assert_array_equal(out.as_array(), (5 * x.as_array().astype(numpy.float32)).astype(bfloat16))
+        numpy.testing.assert_allclose(x.sum(), x.as_array().astype(numpy.float64).sum(), rtol=1e-12)
+        self.assertEqual(x.max(), x.as_array().max())
+
+    def test_axpby_complex(self):
+        ig = ImageGeometry(30, 20, 10)
+        rs = numpy.random.RandomState(1)
+        for dtype in [numpy.complex64, numpy.complex128]:
+            ig.dtype = dtype
+            x, y, out = ig.allocate(0), ig.allocate(0), ig.allocate(0)
+            x.fill((rs.randn(*ig.shape) + 1j * rs.randn(*ig.shape)).astype(dtype))
+            y.fill((rs.randn(*ig.shape) + 1j * rs.randn(*ig.shape)).astype(dtype))
+            a = (rs.randn(*ig.shape) + 1j * rs.randn(*ig.shape)).astype(dtype)
+            rtol = 1e-5 if dtype == numpy.complex64 else 1e-12
+            X, Y = x.as_array().copy(), y.as_array().copy()
+            for sa, sb in [(2, 3), (1 + 2j, numpy.complex64(-0.5j)), (a, 3 - 1j), (2j, a), (a, a)]:
+                x.axpby(sa, sb, y, out)
+                numpy.testing.assert_allclose(out.as_array(), sa * X + sb * Y, rtol=rtol, atol=rtol)
+            x.axpby(1j, 1, y, out=x)
+            numpy.testing.assert_allclose(x.as_array(), 1j * X + Y, rtol=rtol, atol=rtol)
+
+    def test_axpby_integer(self):
+        ig = ImageGeometry(30, 20)
+        rs = numpy.random.RandomState(1)
+        for dtype in [numpy.uint8, numpy.int16, numpy.uint16, numpy.int32]:
+            x = DataContainer(rs.randint(0, 200, ig.shape).astype(dtype))
+            y = DataContainer(rs.randint(0, 100, ig.shape).astype(dtype))
+            out = ig.allocate(0)
+            x.axpby(0.5, -2, y, out)
+            numpy.testing.assert_array_equal(out.as_array(), 
+                0.5 * x.as_array().astype(numpy.float32) - 2 * y.as_array().astype(numpy.float32))
+        # integer data of different types are converted before the kernel
+        x.axpby(1, 1, DataContainer(y.as_array().astype(numpy.int64)), out)
+        numpy.testing.assert_array_equal(out.as_array(), x.as_array() + y.as_array())
+        with self.assertRaises(TypeError):
+            x.axpby(1, 1, y, DataContainer(numpy.zeros(ig.shape, dtype=numpy.int32)))
+
     def test_multiply_out(self):
         print ("test multiply_out")
         import functools
@@ -1056,6 +1238,329 @@ class TestDataContainer(unittest.TestCase):
         b.fill(3)
         u.fill(b, channel=1, vertical=1)
         numpy.testing.assert_array_equal(u.subset(channel=1, vertical=1).as_array(), 3 * a)
+
+
+    def test_get_slice_view(self):
+        ag = AcquisitionGeometry.create_Parallel3D().set_angles(numpy.arange(5)).set_panel([4,3]).set_channels(2)
+        u = ag.allocate('random')
+        data = u.as_array().copy()
+
+        v = u.get_slice(channel=1, copy=False)
+        self.assertIsInstance(v, AcquisitionData)
+        self.assertEqual(v.geometry, ag.get_slice(channel=1))
+        self.assertTrue(numpy.shares_memory(v.as_array(), u.as_array()))
+        numpy.testing.assert_array_equal(v.as_array(), data[1])
+
+        c = u.get_slice(channel=1)
+        self.assertFalse(numpy.shares_memory(c.as_array(), u.as_array()))
+        numpy.testing.assert_array_equal(c.as_array(), v.as_array())
+
+        # filling or operating in-place on the view writes in the parent
+        w = v.get_slice(vertical=2, copy=False)
+        w.fill(7)
+        numpy.testing.assert_array_equal(u.as_array()[1, :, 2, :], 7)
+        w.axpby(2, 1, w, out=w)
+        numpy.testing.assert_array_equal(u.as_array()[1, :, 2, :], 21)
+        numpy.testing.assert_array_equal(u.as_array()[0], data[0])
+
+        ig = ImageGeometry(5, 4, 3)
+        x = ig.allocate('random')
+        y = x.get_slice(vertical=1, horizontal_y=2, copy=False)
+        self.assertIsInstance(y, VectorData)
+        self.assertTrue(numpy.shares_memory(y.as_array(), x.as_array()))
+
+        d = DataContainer(x.as_array(), True, x.dimension_labels)
+        e = d.get_slice(horizontal_x=1, copy=False)
+        self.assertEqual(e.dimension_labels, ('vertical', 'horizontal_y'))
+        numpy.testing.assert_array_equal(e.as_array(), x.as_array()[:, :, 1])
+
+    def test_partition(self):
+        ag = AcquisitionGeometry.create_Parallel3D().set_angles(numpy.arange(10)).set_panel([4,3]).set_channels(2)
+        u = ag.allocate('random', seed=2)
+        data = u.as_array().copy()
+
+        for mode in ['staggered', 'sequential', 'random_permutation']:
+            b = u.partition(3, mode, seed=5)
+            geometries = ag.partition(3, mode, seed=5)
+            indices = ag.partition_indices(3, mode, seed=5)
+            self.assertEqual(len(b.containers), 3)
+
+            angles = []
+            for subset, geometry, index in zip(b.containers, geometries.geometries, indices):
+                self.assertIsInstance(subset, AcquisitionData)
+                self.assertEqual(subset.geometry, geometry)
+                numpy.testing.assert_array_equal(subset.geometry.angles, ag.angles[index])
+                numpy.testing.assert_array_equal(subset.as_array(), data[:, index])
+                self.assertEqual(numpy.shares_memory(subset.as_array(), u.as_array()), mode != 'random_permutation')
+                angles.extend(subset.geometry.angles)
+            # the subsets are a partition of the angles
+            numpy.testing.assert_array_equal(numpy.sort(angles), ag.angles)
+
+        numpy.testing.assert_array_equal([len(ag.angles[i]) for i in ag.partition_indices(3, 'sequential')], [4, 3, 3])
+        numpy.testing.assert_array_equal(ag.angles[ag.partition_indices(3, 'staggered')[1]], [1, 4, 7])
+        for i, j in zip(ag.partition_indices(3, 'random_permutation', seed=1), ag.partition_indices(3, 'random_permutation', seed=1)):
+            numpy.testing.assert_array_equal(i, j)
+        # random partitions without a seed would not match between the data and the geometry
+        with self.assertRaises(ValueError):
+            ag.partition_indices(3, 'random_permutation')
+        with self.assertRaises(ValueError):
+            u.partition(3, 'random_permutation')
+
+        # writing in the subsets writes in the data
+        b = u.partition(2)
+        b.fill(b * 0 + 3)
+        numpy.testing.assert_array_equal(u.as_array(), 3)
+
+        # subsets of a single angle
+        b = u.partition(10, 'sequential')
+        self.assertEqual(b.get_item(4).shape, (2, 3, 4))
+        self.assertTrue(numpy.shares_memory(b.get_item(4).as_array(), u.as_array()))
+        b.get_item(4).fill(1)
+        numpy.testing.assert_array_equal(u.as_array()[:, 4], 1)
+
+        with self.assertRaises(ValueError):
+            u.partition(0)
+        with self.assertRaises(ValueError):
+            u.partition(11)
+        with self.assertRaises(ValueError):
+            u.partition(2, 'interleaved')
+        with self.assertRaises(ValueError):
+            u.get_slice(angle=0).partition(1)
+
+    def test_fill_dimension_slice(self):
+        ig = ImageGeometry(5, 4, 3)
+        u = ig.allocate(0)
+        u.fill(numpy.ones((2, 4, 5)), vertical=slice(1, 3))
+        numpy.testing.assert_array_equal(u.as_array()[1:], 1)
+        numpy.testing.assert_array_equal(u.as_array()[0], 0)
+        with self.assertRaises(TypeError):
+            u.fill('a', vertical=0)
+
+class TestLazyExpression(unittest.TestCase):
+    def setUp(self):
+        self.ig = ImageGeometry(voxel_num_x=64, voxel_num_y=32, voxel_num_z=16)
+        self.x = self.ig.allocate('random', seed=1)
+        self.y = self.ig.allocate('random', seed=2)
+        self.z = self.ig.allocate('random', seed=3)
+
+    def test_evaluate(self):
+        x, y, z = self.x, self.y, self.z
+        expr = (x.lazy() - y) * 0.3 + z
+        res = expr.evaluate(block_size=1000)
+        self.assertIsInstance(res, ImageData)
+        self.assertEqual(res.geometry, self.ig)
+        numpy.testing.assert_allclose(res.as_array(), ((x - y) * 0.3 + z).as_array(), rtol=1e-6)
+
+    def test_evaluate_out(self):
+        x, y, z = self.x, self.y, self.z
+        out = self.ig.allocate(0)
+        ret = (2 - x.lazy() / y).evaluate(out=out, num_threads=3, block_size=999)
+        self.assertIs(ret, out)
+        numpy.testing.assert_allclose(out.as_array(), (2 - x / y).as_array(), rtol=1e-6)
+
+        # the output may be one of the operands
+        expected = (x * 2 + y.sqrt()).as_array()
+        x.fill(x.lazy() * 2 + y.lazy().sqrt())
+        numpy.testing.assert_allclose(x.as_array(), expected, rtol=1e-6)
+
+    def test_reverse_operands(self):
+        x, y, z = self.x, self.y, self.z
+        numpy.testing.assert_allclose((z - x.lazy()).as_array(), (z - x).as_array())
+        numpy.testing.assert_allclose((z / x.lazy()).as_array(), (z / x).as_array(), rtol=1e-6)
+        numpy.testing.assert_allclose((z.as_array() * x.lazy()).as_array(), (z * x).as_array())
+        numpy.testing.assert_allclose((-x.lazy()).abs().maximum(y).as_array(), x.abs().maximum(y).as_array())
+
+    def test_dtype_promotion(self):
+        x = self.ig.allocate(2, dtype=numpy.float64)
+        res = (x.lazy() * self.y).evaluate()
+        self.assertEqual(res.dtype, numpy.float64)
+
+    def test_incompatible_shapes(self):
+        x = ImageGeometry(3, 4).allocate(1)
+        with self.assertRaises(ValueError):
+            (x.lazy() + self.y).evaluate()
+
+
+class TestBufferPool(unittest.TestCase):
+    def setUp(self):
+        self.ig = ImageGeometry(voxel_num_x=20, voxel_num_y=30, voxel_num_z=4)
+        self.ag = AcquisitionGeometry.create_Parallel2D().set_angles([0, 1, 2]).set_panel(10)
+
+    def test_recycle(self):
+        with BufferPool() as pool:
+            x = self.ig.allocate(0)
+            address = aid(x.as_array())
+            del x
+            y = self.ig.allocate(None)
+            self.assertEqual(aid(y.as_array()), address)
+            self.assertEqual(y.geometry, self.ig)
+            z = self.ig.allocate(2)
+            numpy.testing.assert_array_equal(z.as_array(), 2)
+            del y, z
+            a = self.ag.allocate(1)
+            self.assertIsInstance(a, AcquisitionData)
+            del a
+            self.ag.allocate(1)
+            stats = pool.statistics()
+        self.assertEqual(stats['misses'], 3)
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['bytes_in_use'], 0)
+        self.assertEqual(stats['bytes_held'], 2 * 20 * 30 * 4 * 4 + 3 * 10 * 4)
+        self.assertEqual(stats['peak_bytes'], 2 * 20 * 30 * 4 * 4 + 3 * 10 * 4)
+        self.assertIsNone(BufferPool.active())
+
+    def test_referenced_memory_not_recycled(self):
+        with BufferPool() as pool:
+            x = self.ig.allocate(1)
+            arr = x.as_array()
+            view = x.as_array()[0]
+            del x
+            self.assertEqual(pool.bytes_held, 0)
+            y = self.ig.allocate(3)
+            self.assertFalse(numpy.shares_memory(y.as_array(), arr))
+            numpy.testing.assert_array_equal(view, 1)
+
+            # copies do not belong to the pool
+            z = y.copy()
+            del z
+            self.assertEqual(pool.bytes_held, 0)
+
+    def test_dtype_and_size(self):
+        with BufferPool() as pool:
+            x = self.ig.allocate(0)
+            del x
+            y = self.ig.allocate(0, dtype=numpy.float64)
+            self.assertEqual(pool.hits, 0)
+            self.assertEqual(y.dtype, numpy.float64)
+
+    def test_max_bytes(self):
+        nbytes = 20 * 30 * 4 * 4
+        with BufferPool(max_bytes=2 * nbytes) as pool:
+            x = [self.ig.allocate(0) for i in range(4)]
+            del x
+            self.assertEqual(pool.bytes_held, 2 * nbytes)
+            self.assertEqual(pool.peak_bytes, 4 * nbytes)
+            pool.clear()
+            self.assertEqual(pool.bytes_held, 0)
+
+    def test_reorder(self):
+        order = ['horizontal_x', 'horizontal_y', 'vertical']
+        with BufferPool() as pool:
+            for in_place in [False, True]:
+                for i in range(3):
+                    x = self.ig.allocate('random', seed=i)
+                    expected = numpy.transpose(x.as_array(), [2, 1, 0]).copy()
+                    # neither the first nor the last axis is kept, the array is copied
+                    x.reorder(order, in_place=in_place)
+                    numpy.testing.assert_array_equal(x.as_array(), expected)
+                    del x
+            stats = pool.statistics()
+        self.assertEqual(stats['bytes_in_use'], 0)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 5)
+
+
+class TestMemmap(unittest.TestCase):
+    def setUp(self):
+        self.ig = ImageGeometry(voxel_num_x=20, voxel_num_y=30, voxel_num_z=16)
+        self.tmp = tempfile.mkdtemp()
+        # force the processing in several slabs
+        self.slab_bytes = framework.MEMMAP_SLAB_BYTES
+        framework.MEMMAP_SLAB_BYTES = 20 * 30 * 4 * 3
+
+    def tearDown(self):
+        framework.MEMMAP_SLAB_BYTES = self.slab_bytes
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_allocate(self):
+        path = os.path.join(self.tmp, 'x.dat')
+        x = self.ig.allocate(1, backing='memmap', path=path)
+        self.assertTrue(x.is_memmap)
+        self.assertEqual(x.geometry, self.ig)
+        self.assertEqual(os.path.getsize(path), x.size * 4)
+        numpy.testing.assert_array_equal(x.as_array(), 1)
+
+        y = self.ig.allocate('random', backing='memmap')
+        self.assertTrue(y.is_memmap)
+        self.assertFalse(self.ig.allocate(0).is_memmap)
+
+        # reopen the file
+        x.fill(y)
+        x.array.flush()
+        z = ImageData(geometry=self.ig, backing='memmap', path=path)
+        numpy.testing.assert_array_equal(z.as_array(), y.as_array())
+
+        ag = AcquisitionGeometry.create_Parallel3D().set_angles(numpy.arange(16)).set_panel([10, 8])
+        a = ag.allocate(2, backing='memmap', path=os.path.join(self.tmp, 'a.dat'))
+        self.assertTrue(a.is_memmap)
+        self.assertIsInstance(a, AcquisitionData)
+        numpy.testing.assert_array_equal(a.as_array(), 2)
+
+        with self.assertRaises(ValueError):
+            self.ig.allocate(0, backing='disk')
+
+    def test_algebra(self):
+        x = self.ig.allocate('random', backing='memmap')
+        y = self.ig.allocate('random', backing='memmap')
+        xa = x.as_array().copy()
+        ya = y.as_array().copy()
+
+        z = x * y + 1
+        self.assertTrue(z.is_memmap)
+        numpy.testing.assert_allclose(z.as_array(), xa * ya + 1, rtol=1e-6)
+        z = x.exp()
+        self.assertTrue(z.is_memmap)
+        numpy.testing.assert_allclose(z.as_array(), numpy.exp(xa), rtol=1e-6)
+
+        out = self.ig.allocate(0)
+        x.subtract(y, out=out)
+        numpy.testing.assert_allclose(out.as_array(), xa - ya, rtol=1e-6)
+        y.add(out.as_array(), out=y)
+        numpy.testing.assert_allclose(y.as_array(), xa, rtol=1e-6, atol=1e-6)
+        self.assertAlmostEqual(x.norm(), numpy.linalg.norm(xa), places=3)
+
+        c = x.copy()
+        self.assertTrue(c.is_memmap)
+        numpy.testing.assert_array_equal(c.as_array(), xa)
+
+    def test_axpby(self):
+        x = self.ig.allocate('random', backing='memmap')
+        y = self.ig.allocate('random', backing='memmap')
+        xa = x.as_array().copy()
+        ya = y.as_array().copy()
+        a = self.ig.allocate('random')
+
+        out = self.ig.allocate(0, backing='memmap')
+        x.axpby(2, 3, y, out=out)
+        numpy.testing.assert_allclose(out.as_array(), 2 * xa + 3 * ya, rtol=1e-6)
+        x.axpby(a, 3, y, out=out)
+        numpy.testing.assert_allclose(out.as_array(), a.as_array() * xa + 3 * ya, rtol=1e-6)
+        x.axpby(1, -1, y, out=x)
+        numpy.testing.assert_allclose(x.as_array(), xa - ya, rtol=1e-6)
+
+    def test_fill_and_get_slice(self):
+        x = self.ig.allocate(0, backing='memmap')
+        y = self.ig.allocate('random')
+        x.fill(y)
+        numpy.testing.assert_array_equal(x.as_array(), y.as_array())
+        x.fill(3)
+        numpy.testing.assert_array_equal(x.as_array(), 3)
+        x.fill(y.as_array())
+        s = x.get_slice(vertical=5)
+        numpy.testing.assert_array_equal(s.as_array(), y.as_array()[5])
+
+    def test_nexus_writer(self):
+        try:
+            from cil.io import NEXUSDataWriter, NEXUSDataReader
+        except ImportError:
+            self.skipTest('h5py not available')
+        x = self.ig.allocate('random', backing='memmap')
+        fname = os.path.join(self.tmp, 'x.nxs')
+        NEXUSDataWriter(file_name=fname, data=x).write()
+        y = NEXUSDataReader(file_name=fname).read()
+        numpy.testing.assert_array_equal(y.as_array(), x.as_array())
+
+
 if __name__ == '__main__':
     unittest.main()
  
@@ -37,7 +37,7 @@ from cil.processors import Slicer, Binner, MaskGenerator, Masker, Padder
 import wget
 import os
 
-from utils import has_gpu_tigre, has_gpu_astra
+from utils import has_gpu_tigre, has_gpu_astra, has_ipp
 
 
 try:
@@ -780,6 +780,37 @@ class TestCentreOfRotation_parallel(unittest.TestCase):
         self.assertAlmostEqual(6.33, ad_out.geometry.config.system.rotation_axis.position[0],places=2)              
 
 
+class TestCentreOfRotation_parallel_cil(unittest.TestCase):
+
+    def setUp(self):
+        from cil.optimisation.operators import ProjectionOperator as CILProjectionOperator
+
+        angles = numpy.linspace(0, 180, 180, endpoint=False)
+        ag_orig = AcquisitionGeometry.create_Parallel2D()\
+            .set_panel(128, 1.)\
+            .set_angles(angles)
+
+        ig = ag_orig.get_ImageGeometry()
+        x = (numpy.arange(128) - 63.5)
+        xx, yy = numpy.meshgrid(x, x)
+        phantom = ig.allocate(0)
+        phantom.fill(((xx - 10)**2 + (yy + 5)**2 < 30**2) * 1. + ((xx + 20)**2 + (yy - 20)**2 < 8**2) * 2.\
+            + ((numpy.abs(xx - 15) < 6) & (numpy.abs(yy - 25) < 4)) * 1.5)
+
+        ag_offset = AcquisitionGeometry.create_Parallel2D(rotation_axis_position=(3.5, 0))\
+            .set_panel(128, 1.)\
+            .set_angles(angles)
+
+        self.data_offset = CILProjectionOperator(ig, ag_offset).direct(phantom)
+        self.data_offset.geometry = ag_orig
+
+    @unittest.skipUnless(has_ipp, "IPP not installed")
+    def test_CofR_image_sharpness_cil(self):
+        corr = CofR_image_sharpness(search_range=20, FBP='cil')
+        ad_out = corr(self.data_offset)
+        self.assertAlmostEqual(3.5, ad_out.geometry.config.system.rotation_axis.position[0], delta=0.25)
+
+
 class TestCentreOfRotation_conebeam(unittest.TestCase):
 
     def setUp(self):
@@ -111,6 +111,10 @@ class TestGradientOperator(unittest.TestCase):
                                     else:
                                         norm = numpy.sqrt(4 + (2/geom.voxel_size_z)**2 + (2/geom.voxel_size_y)**2 + (2/geom.voxel_size_x)**2)                                      
 
+
+                            # centered differences are half the sum of the forward and backward differences
+                            if method == 'centered':
+                                norm /= 2
                                                 
                             Grad = GradientOperator(geom, 
                                                     bnd_cond = bnd,
@@ -414,4 +418,127 @@ class TestGradientOperator(unittest.TestCase):
 
         # check dot_test
         for sd in [5, 10, 15]:
-            self.assertTrue(LinearOperator.dot_test(Grad, seed=sd))
\ No newline at end of file
+            self.assertTrue(LinearOperator.dot_test(Grad, seed=sd))
+
+    def test_GradientOperator_float16(self):
+
+        for geom in [self.ig_2D_voxel, self.ig_3D_voxel, self.ig_3D_chan_voxel]:
+            ig16 = geom.copy()
+            ig16.dtype = numpy.float16
+            x16 = ig16.allocate('random', seed=3)
+            x = geom.allocate(0)
+            x.fill(x16.as_array().astype(numpy.float32))
+
+            for bnd in self.bconditions:
+                Grad = GradientOperator(geom, bnd_cond=bnd, correlation='SpaceChannels')
+                Grad16 = GradientOperator(ig16, bnd_cond=bnd, correlation='SpaceChannels')
+
+                # the differences are computed in float32 and rounded to float16, 
+                # the voxel size scaling rounds once more
+                res = Grad.direct(x)
+                res16 = Grad16.direct(x16)
+                for el, el16 in zip(res.containers, res16.containers):
+                    self.assertEqual(el16.dtype, numpy.float16)
+                    numpy.testing.assert_allclose(el16.as_array(), el.as_array(), rtol=2e-3, atol=1e-3)
+
+                y16 = res16.copy()
+                for el, el16 in zip(res.containers, res16.containers):
+                    el.fill(el16.as_array().astype(numpy.float32))
+                adj = Grad.adjoint(res)
+                adj16 = ig16.allocate(0)
+                Grad16.adjoint(res16, out=adj16)
+                self.assertEqual(adj16.dtype, numpy.float16)
+                numpy.testing.assert_allclose(adj16.as_array(), adj.as_array(), rtol=2e-3, atol=1e-1)
+                # the input of the adjoint is unchanged
+                for el, el16 in zip(y16.containers, res16.containers):
+                    numpy.testing.assert_array_equal(el.as_array(), el16.as_array())
+
+    def test_GradientOperator_float16_accuracy(self):
+
+        # gradient descent on the H1 regularised denoising of an image, float32 and float16 storage
+        N = 512
+        data = numpy.zeros((N, N), dtype=numpy.float32)
+        data[N//4:3*N//4, N//4:3*N//4] = 1
+        data += 0.1 * numpy.random.RandomState(1).standard_normal((N, N)).astype(numpy.float32)
+
+        alpha, tau = 1., 0.1
+        res = {}
+        for dtype in [numpy.float32, numpy.float16]:
+            ig = ImageGeometry(N, N, dtype=dtype)
+            b = ig.allocate(0)
+            b.fill(data.astype(dtype))
+            x = b.copy()
+            Grad = GradientOperator(ig)
+            grad = Grad.range_geometry().allocate(0)
+            update = ig.allocate(0)
+            for i in range(50):
+                # x = x - tau * ((x - b) + alpha * Grad^T Grad x)
+                Grad.direct(x, out=grad)
+                Grad.adjoint(grad, out=update)
+                x.axpby(1, -alpha * tau, update, x)
+                x.axpby(1 - tau, tau, b, x)
+            res[dtype] = x.as_array().astype(numpy.float64)
+
+        ref = res[numpy.float32]
+        err = numpy.linalg.norm(res[numpy.float16] - ref) / numpy.linalg.norm(ref)
+        print("relative error of float16 storage: {:.2e}".format(err))
+        self.assertLess(err, 1e-2)
+
+    def test_GradientOperator_direct_pnorm_sum(self):
+
+        for geom in self.list_geometries:
+            x = geom.allocate('random', seed=4)
+            for bnd in self.bconditions:
+                for backend in self.backend:
+                    for corr in self.correlation:
+                        Grad = GradientOperator(geom, bnd_cond=bnd, backend=backend, correlation=corr)
+                        res = Grad.direct(x)
+                        for p in [1, 2]:
+                            expected = res.pnorm(p).sum()
+                            value = Grad.direct_pnorm_sum(x, p)
+                            try:
+                                numpy.testing.assert_allclose(value, expected, rtol=1e-5)
+                            except AssertionError:
+                                self.print_assertion_info(geom, bnd, backend, None, corr, None)
+                                raise
+
+        # split gradients are not fused
+        Grad = GradientOperator(self.ig_3D_chan, correlation='SpaceChannels', split=True)
+        x = self.ig_3D_chan.allocate('random', seed=4)
+        numpy.testing.assert_allclose(Grad.direct_pnorm_sum(x), Grad.direct(x).pnorm(2).sum(), rtol=1e-5)
+
+    def test_GradientOperator_methods_c_vs_numpy(self):
+
+        for geom in [self.ig_2D_voxel, self.ig_3D_voxel, self.ig_3D_chan_voxel]:
+            for dtype in [numpy.float32, numpy.float64]:
+                ig = geom.copy()
+                ig.dtype = dtype
+                x = ig.allocate('random', seed=5)
+                for bnd in self.bconditions:
+                    for method in self.method:
+                        Grad_c = GradientOperator(ig, method=method, bnd_cond=bnd, backend='c', correlation='SpaceChannels')
+                        Grad_numpy = GradientOperator(ig, method=method, bnd_cond=bnd, backend='numpy', correlation='SpaceChannels')
+
+                        res_c = Grad_c.direct(x)
+                        res_numpy = Grad_numpy.direct(x)
+                        y = Grad_c.range_geometry().allocate('random', seed=6)
+                        adj_c = Grad_c.domain_geometry().allocate(numpy.nan)
+                        Grad_c.adjoint(y, out=adj_c)
+                        adj_numpy = Grad_numpy.adjoint(y)
+                        try:
+                            for el_c, el_numpy in zip(res_c.containers, res_numpy.containers):
+                                self.assertEqual(el_c.dtype, dtype)
+                                numpy.testing.assert_allclose(el_c.as_array(), el_numpy.as_array(), rtol=1e-5, atol=1e-5)
+                            self.assertEqual(adj_c.dtype, dtype)
+                            numpy.testing.assert_allclose(adj_c.as_array(), adj_numpy.as_array(), rtol=1e-5, atol=1e-4)
+                        except AssertionError:
+                            self.print_assertion_info(geom, bnd, 'c', method, 'SpaceChannels', None)
+                            raise
+
+    def test_GradientOperator_float64_accuracy(self):
+
+        ig = ImageGeometry(voxel_num_x=20, voxel_num_y=30, dtype=numpy.float64)
+        x = ig.allocate(0)
+        x.fill(1e8 + numpy.random.RandomState(2).random_sample(ig.shape))
+        res = GradientOperator(ig).direct(x)
+        numpy.testing.assert_allclose(res.get_item(1).as_array()[:, :-1], numpy.diff(x.as_array(), axis=1), rtol=0, atol=1e-12)
@@ -28,7 +28,15 @@ import numpy
 from cil.optimisation.operators import SumOperator,  ZeroOperator, CompositionOperator, ProjectionMap
 
 from cil.utilities import dataexample
+from cil.utilities.cache import OperatorCache, set_operator_cache
 import os
+import shutil
+import tempfile
+import tracemalloc
+import threading
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from packaging import version
 
 def dt(steps):
@@ -188,6 +196,82 @@ class TestOperator(CCPiTestClass):
                                              (diag*(diag*x.subset(channel=2))).as_array())
             numpy.testing.assert_array_equal(z2.subset(channel=2).as_array(), \
                                              (diag*(diag*x.subset(channel=2))).as_array())
+
+    def test_ChannelwiseOperator_workers(self):
+        print("test_ChannelwiseOperator_workers")
+
+        channels = 5
+        igs = ImageGeometry(6, 7)
+        diag = igs.allocate('random', seed=101)
+        D = DiagonalOperator(diag)
+
+        for dimension in ['prepend', 'append']:
+            for num_workers, backend in [(1, 'thread'), (3, 'thread'), (2, 'process')]:
+                C = ChannelwiseOperator(D, channels, dimension=dimension, num_workers=num_workers, backend=backend)
+                x = C.domain_geometry().allocate('random', seed=100)
+                y = C.direct(x)
+                y2 = C.range_geometry().allocate(0)
+                C.direct(x, out=y2)
+                z = C.adjoint(y)
+
+                for k in range(channels):
+                    x_k = x.get_slice(channel=k)
+                    numpy.testing.assert_allclose(y.get_slice(channel=k).as_array(), (diag * x_k).as_array())
+                    numpy.testing.assert_allclose(y2.get_slice(channel=k).as_array(), (diag * x_k).as_array())
+                    numpy.testing.assert_allclose(z.get_slice(channel=k).as_array(), (diag * diag * x_k).as_array(), rtol=1e-6)
+
+                self.assertTrue(C.dot_test(C))
+                # the workspaces are allocated once per thread
+                if dimension == 'prepend' or backend == 'process':
+                    self.assertEqual(len(C._workspaces), 0)
+                else:
+                    self.assertLessEqual(len(C._workspaces), 2 * num_workers)
+
+        # float64 data is not rounded in the workspaces of the float32 geometry
+        C = ChannelwiseOperator(IdentityOperator(igs), channels, dimension='append')
+        x = C.domain_geometry().allocate(None, dtype=numpy.float64)
+        x.fill(1 + numpy.arange(x.size).reshape(x.shape) * 1e-9)
+        out = C.range_geometry().allocate(None, dtype=numpy.float64)
+        C.direct(x, out=out)
+        numpy.testing.assert_array_equal(out.as_array(), x.as_array())
+
+        with self.assertRaises(ValueError):
+            ChannelwiseOperator(D, channels, backend='mpi')
+
+    def test_ChannelwiseOperator_thread_safety(self):
+        print("test_ChannelwiseOperator_thread_safety")
+
+        channels = 16
+        igs = ImageGeometry(32, 30)
+        B = BlurringOperator(numpy.ones((3, 3)) / 9, igs, mode='fft')
+        # the workspaces of the composition are kept per thread
+        reference = ChannelwiseOperator(CompositionOperator(B, B, B), channels)
+        C = ChannelwiseOperator(CompositionOperator(B, B, B), channels, num_workers=8)
+        x = C.domain_geometry().allocate('random', seed=3)
+        y = reference.direct(x)
+        for _ in range(5):
+            numpy.testing.assert_array_equal(C.direct(x).as_array(), y.as_array())
+            numpy.testing.assert_array_equal(C.adjoint(y).as_array(), reference.adjoint(y).as_array())
+
+        # operators from outside CIL must declare that they are thread safe
+        class ScaledIdentity(LinearOperator):
+            def __init__(self, geometry):
+                super(ScaledIdentity, self).__init__(domain_geometry=geometry, range_geometry=geometry)
+            def direct(self, x, out=None):
+                if out is None:
+                    return 2 * x
+                x.multiply(2, out=out)
+            adjoint = direct
+
+        op = ScaledIdentity(igs)
+        ChannelwiseOperator(op, channels)
+        with self.assertRaises(ValueError):
+            ChannelwiseOperator(op, channels, num_workers=2)
+        with self.assertRaises(ValueError):
+            ChannelwiseOperator(CompositionOperator(B, op), channels, num_workers=2)
+        op.thread_safe = True
+        C = ChannelwiseOperator(CompositionOperator(B, op), channels, num_workers=2)
+        numpy.testing.assert_allclose(C.direct(x).as_array(), 2 * ChannelwiseOperator(B, channels).direct(x).as_array(), rtol=1e-6)
         
         #print(z.subset(channel=2).as_array())
         #print(z2.subset(channel=2).as_array())
@@ -215,6 +299,180 @@ class TestOperator(CCPiTestClass):
         # Run dot test to check validity of adjoint.
         self.assertTrue(BOP.dot_test(BOP))
 
+    def test_BlurringOperator_fft(self):
+        print("test_BlurringOperator_fft")
+
+        numpy.random.seed(1)
+        for shape, ks in [((40, 37), (11, 11)), ((40, 37), (4, 7)), ((12, 10, 9), (3, 4, 5))]:
+            ig = ImageGeometry(*shape[::-1])
+            x = ig.allocate('random', seed=2)
+            PSF = numpy.random.random(ks)
+
+            for boundary in ['reflect', 'periodic']:
+                BOP = BlurringOperator(PSF, ig, boundary=boundary)
+                BOP_fft = BlurringOperator(PSF, ig, mode='fft', boundary=boundary)
+
+                numpy.testing.assert_allclose(BOP_fft.direct(x).as_array(), BOP.direct(x).as_array(), rtol=1e-5, atol=1e-4)
+                out = ig.allocate(0)
+                BOP_fft.direct(x, out=out)
+                numpy.testing.assert_allclose(out.as_array(), BOP.direct(x).as_array(), rtol=1e-5, atol=1e-4)
+
+                # the adjoint is exact also at the boundaries
+                self.assertTrue(BOP_fft.dot_test(BOP_fft, tolerance=4))
+                self.assertEqual(BOP_fft.adjoint(x).dtype, numpy.float32)
+
+    def test_BlurringOperator_norm(self):
+        print("test_BlurringOperator_norm")
+
+        ig = ImageGeometry(30, 24)
+        w = numpy.exp(-numpy.arange(-3, 4)**2 / 8.)
+        PSF = numpy.outer(w, w)
+
+        for boundary in ['reflect', 'periodic']:
+            for mode in ['direct', 'fft']:
+                BOP = BlurringOperator(PSF, ig, mode=mode, boundary=boundary)
+
+                # dense matrix of the operator
+                e = ig.allocate(0)
+                matrix = numpy.zeros((e.size, e.size))
+                for i in range(e.size):
+                    unit = numpy.zeros(e.size, dtype=numpy.float32)
+                    unit[i] = 1
+                    e.fill(unit.reshape(ig.shape))
+                    matrix[:, i] = BOP.direct(e).as_array().ravel()
+
+                numpy.testing.assert_allclose(BOP.norm(), numpy.linalg.norm(matrix, 2), rtol=1e-5)
+
+        # a PSF which is not symmetric uses the PowerMethod with reflective boundaries
+        BOP = BlurringOperator(numpy.random.random((3, 4)), ig, mode='fft')
+        self.assertGreater(BOP.norm(), 0)
+
+    def test_BlurringOperator_errors(self):
+        ig = ImageGeometry(10, 12)
+        with self.assertRaises(ValueError):
+            BlurringOperator(numpy.ones((3, 3)), ig, mode='spectral')
+        with self.assertRaises(ValueError):
+            BlurringOperator(numpy.ones((3, 3)), ig, boundary='zero')
+        with self.assertRaises(ValueError):
+            BlurringOperator(numpy.ones((3, 3, 3)), ig, mode='fft')
+        with self.assertRaises(ValueError):
+            BlurringOperator(numpy.ones((3, 13)), ig, mode='fft')
+
+    def chain_operators(self, ig):
+        mask = ig.allocate(1)
+        mask.as_array()[:10, :] = 0
+        diag = ig.allocate('random', seed=5)
+        PSF = numpy.ones((5, 5)) / 25
+        return MaskOperator(mask), DiagonalOperator(diag), BlurringOperator(PSF, ig)
+
+    def test_CompositionOperator_preallocate(self):
+        ig = ImageGeometry(128, 128)
+        M, D, B = self.chain_operators(ig)
+        data = ig.allocate('random', seed=4)
+
+        c = CompositionOperator(M, D, B)
+        c_alloc = CompositionOperator(M, D, B, preallocate=False)
+        expected = M.direct(D.direct(B.direct(data)))
+
+        for _ in range(2):
+            numpy.testing.assert_array_almost_equal(c.direct(data).as_array(), expected.as_array())
+            out = c.range_geometry().allocate(None, dtype=data.dtype)
+            c.direct(data, out=out)
+            numpy.testing.assert_array_almost_equal(out.as_array(), expected.as_array())
+            numpy.testing.assert_array_almost_equal(c_alloc.direct(data).as_array(), expected.as_array())
+
+            numpy.testing.assert_array_almost_equal(c.adjoint(data).as_array(), c_alloc.adjoint(data).as_array())
+            c.adjoint(data, out=out)
+            numpy.testing.assert_array_almost_equal(out.as_array(), c_alloc.adjoint(data).as_array())
+
+        # direct and adjoint share the workspaces
+        self.assertEqual(len(c._workspaces), 1)
+        self.assertEqual(len(c._workspaces[(threading.get_ident(), numpy.dtype(numpy.float32))]), 2)
+        self.assertEqual(len(c_alloc._workspaces), 0)
+        self.assertTrue(LinearOperator.dot_test(c))
+
+        s = SumOperator(B, D)
+        s_alloc = SumOperator(B, D, preallocate=False)
+        numpy.testing.assert_array_almost_equal(s.direct(data).as_array(), (B.direct(data) + D.direct(data)).as_array())
+        s.direct(data, out=out)
+        numpy.testing.assert_array_almost_equal(out.as_array(), s_alloc.direct(data).as_array())
+        s.adjoint(data, out=out)
+        numpy.testing.assert_array_almost_equal(out.as_array(), s_alloc.adjoint(data).as_array())
+
+        # out may be the input of SumOperator
+        x = data.copy()
+        s.direct(x, out=x)
+        numpy.testing.assert_array_almost_equal(x.as_array(), s_alloc.direct(data).as_array())
+
+        # float64 data is not rounded in the workspaces, also with the boolean geometry of a mask
+        mask = ig.allocate(True, dtype=bool)
+        mask.as_array()[:10, :] = False
+        M = MaskOperator(mask)
+        ig64 = ImageGeometry(128, 128, dtype=numpy.float64)
+        data64 = ig64.allocate(None)
+        data64.fill(1 + numpy.arange(data64.size).reshape(data64.shape) * 1e-9)
+        I64 = IdentityOperator(ig64)
+        for op, op_alloc in [(CompositionOperator(I64, M), CompositionOperator(I64, M, preallocate=False)),
+                             (CompositionOperator(M, I64, M), CompositionOperator(M, I64, M, preallocate=False)),
+                             (SumOperator(I64, M), SumOperator(I64, M, preallocate=False))]:
+            expected = op_alloc.direct(data64)
+            self.assertEqual(expected.dtype, numpy.float64)
+            numpy.testing.assert_array_equal(op.direct(data64).as_array(), expected.as_array())
+            numpy.testing.assert_array_equal(op.adjoint(data64).as_array(), op_alloc.adjoint(data64).as_array())
+            # the float32 workspaces are still used for float32 data
+            numpy.testing.assert_array_equal(op.direct(data).as_array(), op_alloc.direct(data).as_array())
+        # direct and adjoint of float64 data, direct of float32 data
+        self.assertEqual(len(op._workspace), 3)
+
+        K = BlockOperator(I64, M, M, I64, shape=(2, 2))
+        x64 = BlockDataContainer(data64, data64)
+        expected = [(data64 + M.direct(data64)).as_array(), (M.direct(data64) + data64).as_array()]
+        for res in [K.direct(x64), K.adjoint(x64)]:
+            for i in range(2):
+                numpy.testing.assert_array_equal(res.get_item(i).as_array(), expected[i])
+
+    def test_CompositionOperator_threads(self):
+        # one instance applied concurrently to different inputs uses the workspaces of each thread
+        ig = ImageGeometry(64, 64)
+        M, D, B = self.chain_operators(ig)
+        inputs = [ig.allocate('random', seed=seed) for seed in range(16)]
+        for op in [CompositionOperator(M, 2 * D, B), SumOperator(B, D), CompositionOperator(M, SumOperator(B, D))]:
+            expected = [op.direct(x).as_array() for x in inputs]
+            expected_adjoint = [op.adjoint(x).as_array() for x in inputs]
+
+            def apply(i):
+                out = op.range_geometry().allocate(None, dtype=inputs[i].dtype)
+                for _ in range(5):
+                    op.direct(inputs[i], out=out)
+                    numpy.testing.assert_array_equal(out.as_array(), expected[i])
+                    numpy.testing.assert_array_equal(op.adjoint(inputs[i]).as_array(), expected_adjoint[i])
+
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(apply, range(len(inputs))))
+
+    def test_CompositionOperator_no_allocation(self):
+        ig = ImageGeometry(256, 256)
+        M, D, B = self.chain_operators(ig)
+        data = ig.allocate('random', seed=4)
+        volume = data.size * data.dtype.itemsize
+
+        for op in [CompositionOperator(M, D, B), SumOperator(B, D), CompositionOperator(M, SumOperator(B, D))]:
+            out = op.range_geometry().allocate(None, dtype=data.dtype)
+            # the first calls allocate the workspaces
+            op.direct(data, out=out)
+            op.adjoint(data, out=out)
+
+            tracemalloc.start()
+            try:
+                start = tracemalloc.get_traced_memory()[0]
+                op.direct(data, out=out)
+                op.adjoint(data, out=out)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            # only small objects and the fixed size buffers of numpy ufuncs
+            self.assertLess(peak - start, volume / 4)
+
     def test_IdentityOperator(self):
         print ("test_IdentityOperator")
         ig = ImageGeometry(10,20,30)
@@ -308,6 +566,32 @@ class TestOperator(CCPiTestClass):
             numpy.testing.assert_almost_equal(res1.as_array(), res2.as_array())
             numpy.testing.assert_almost_equal(res1b.as_array(), res2b.as_array()) 
             print("Check for 2D chan for FiniteDiff label {}".format(labels[i]))        
+
+    def test_FiniteDifference_c_vs_numpy(self):
+        # float data are differentiated by cilacc, complex data with numpy
+        ig = ImageGeometry(voxel_num_x=7, voxel_num_y=2, voxel_num_z=5, voxel_size_x=0.1, voxel_size_z=0.4)
+        igc = ig.copy()
+        igc.dtype = numpy.complex64
+
+        for dtype in [numpy.float32, numpy.float64]:
+            ig.dtype = dtype
+            x = ig.allocate('random', seed=3)
+            xc = igc.allocate(0)
+            xc.fill(x.as_array())
+
+            for direction in range(3):
+                for method in ['forward', 'backward', 'centered']:
+                    for bnd in ['Neumann', 'Periodic']:
+                        FD = FiniteDifferenceOperator(ig, direction=direction, method=method, bnd_cond=bnd)
+                        FDc = FiniteDifferenceOperator(igc, direction=direction, method=method, bnd_cond=bnd)
+
+                        res = FD.direct(x)
+                        self.assertEqual(res.dtype, dtype)
+                        numpy.testing.assert_allclose(res.as_array(), FDc.direct(xc).as_array().real, rtol=1e-5, atol=1e-5)
+
+                        out = ig.allocate(numpy.nan)
+                        FD.adjoint(x, out=out)
+                        numpy.testing.assert_allclose(out.as_array(), FDc.adjoint(xc).as_array().real, rtol=1e-5, atol=1e-5)
         
     def test_PowerMethod(self):
         print ("test_BlockOperator")
@@ -372,6 +656,80 @@ class TestOperator(CCPiTestClass):
         for n in [norm, norm2, norm3, norm4, norm5]:
             print ("norm {}", format(n))
 
+    def test_Lanczos(self):
+        print ("test_Lanczos")
+        numpy.random.seed(1)
+        A = MatrixOperator(numpy.random.randn(60, 40))
+        expected = numpy.linalg.norm(A.A, 2)
+
+        norm, estimates, vector = LinearOperator.Lanczos(A, 40, tolerance=1e-8, compute_vector=True)
+        numpy.testing.assert_allclose(norm, expected, rtol=1e-6)
+        # the estimates increase towards the norm
+        self.assertTrue(numpy.all(numpy.diff(estimates) >= -1e-6 * expected))
+        self.assertLess(len(estimates), 40)
+
+        # right singular vector and warm start
+        singular_vector = numpy.linalg.svd(A.A)[2][0]
+        numpy.testing.assert_allclose(abs(numpy.dot(singular_vector, vector.as_array())), 1., rtol=1e-5)
+        norm_warm, estimates_warm, _ = LinearOperator.Lanczos(A, 40, x_init=vector, tolerance=1e-8)
+        numpy.testing.assert_allclose(norm_warm, expected, rtol=1e-6)
+        self.assertLessEqual(len(estimates_warm), 3)
+
+        # the Krylov space of the identity has dimension one
+        Id = IdentityOperator(ImageGeometry(10, 12))
+        norm, estimates, _ = LinearOperator.Lanczos(Id)
+        numpy.testing.assert_allclose(norm, 1., rtol=1e-6)
+        self.assertEqual(len(estimates), 1)
+
+        with self.assertRaises(ValueError):
+            LinearOperator.calculate_norm(A, method='svd')
+
+    def test_Lanczos_vs_PowerMethod(self):
+        print ("test_Lanczos_vs_PowerMethod")
+        N, M = 200, 300
+        ig = ImageGeometry(N, M)
+        G = GradientOperator(ig)
+        x_init = ig.allocate('random', seed=1)
+
+        power, power_estimates, _ = LinearOperator.PowerMethod(G, 25, x_init)
+        lanczos, lanczos_estimates, _ = LinearOperator.Lanczos(G, 25, x_init, tolerance=1e-6)
+
+        # both are lower bounds of the norm, sqrt(8), and Lanczos is the closest
+        self.assertLessEqual(power, numpy.sqrt(8) * (1 + 1e-6))
+        self.assertLessEqual(lanczos, numpy.sqrt(8) * (1 + 1e-6))
+        self.assertGreaterEqual(lanczos, power)
+        # Lanczos reaches the estimate of 25 iterations of the PowerMethod in far fewer iterations
+        iterations = numpy.argmax(lanczos_estimates >= power) + 1
+        self.assertLessEqual(iterations, 10)
+
+        # the PowerMethod can stop on the relative change of the estimate
+        power_tol, power_tol_estimates, _ = LinearOperator.PowerMethod(G, 25, x_init, tolerance=1e-2)
+        self.assertLess(len(power_tol_estimates), 25)
+        numpy.testing.assert_allclose(power_tol, power_tol_estimates[-1])
+
+        # the norm computed by default with the Lanczos method agrees with the PowerMethod within 1%
+        numpy.testing.assert_allclose(G.norm(force=True), G.norm(method='power', force=True), rtol=1e-2)
+
+    def test_BlockOperator_row_norms(self):
+        print ("test_BlockOperator_row_norms")
+        numpy.random.seed(1)
+        ops = [MatrixOperator(numpy.random.randn(20 + 5 * i, 30)) for i in range(3)]
+        ops.append(IdentityOperator(ops[0].domain_geometry()))
+        expected = [numpy.linalg.norm(op.A, 2) for op in ops[:3]] + [1.]
+
+        for num_workers in [1, 3]:
+            for op in ops:
+                op._norm = None
+            K = BlockOperator(*ops, num_workers=num_workers)
+            norms = K.row_norms(tolerance=1e-8, iterations=40)
+            numpy.testing.assert_allclose(norms, expected, rtol=1e-5)
+            # the norms are stored by the operators
+            for op, n in zip(ops, norms):
+                self.assertEqual(op.norm(), n)
+
+        with self.assertRaises(ValueError):
+            BlockOperator(*ops, shape=(2, 2)).row_norms()
+
     def test_ProjectionMap(self):
 
         # Check if direct is correct
@@ -447,7 +805,192 @@ class TestOperator(CCPiTestClass):
          
             
     
-class TestGradients(CCPiTestClass): 
+    def flatten(self, x):
+        if isinstance(x, BlockDataContainer):
+            return numpy.concatenate([self.flatten(c) for c in x.containers])
+        return x.as_array().ravel()
+
+    def dense_matrix(self, operator):
+        ig = operator.domain_geometry()
+        e = ig.allocate(0)
+        columns = []
+        for i in range(e.size):
+            unit = numpy.zeros(e.size, dtype=numpy.float32)
+            unit[i] = 1
+            e.fill(unit.reshape(ig.shape))
+            columns.append(self.flatten(operator.direct(e)))
+        return numpy.stack(columns, axis=1)
+
+    def test_FiniteDifferenceOperator_exact_norm(self):
+        for shape in [(7, 4), (8, 5)]:
+            ig = ImageGeometry(*shape, voxel_size_x=0.5)
+            for method in ['forward', 'backward', 'centered']:
+                for bnd_cond in ['Neumann', 'Periodic']:
+                    F = FiniteDifferenceOperator(ig, direction='horizontal_x', method=method, bnd_cond=bnd_cond)
+                    norm = numpy.linalg.norm(self.dense_matrix(F), 2)
+                    if method == 'centered' and bnd_cond == 'Neumann':
+                        self.assertIsNone(F.exact_norm())
+                        self.assertGreaterEqual(F.norm_bound(), norm)
+                        self.assertEqual(F.norm_bound(), 2)
+                    else:
+                        self.assertAlmostEqual(F.exact_norm(), norm, places=5)
+                        self.assertAlmostEqual(F.norm(), norm, places=5)
+
+    def test_GradientOperator_exact_norm(self):
+        ig = ImageGeometry(9, 6, voxel_size_x=0.5, voxel_size_y=2)
+        for backend in ['c', 'numpy']:
+            for bnd_cond in ['Neumann', 'Periodic']:
+                G = GradientOperator(ig, bnd_cond=bnd_cond, backend=backend)
+                norm = numpy.linalg.norm(self.dense_matrix(G), 2)
+                self.assertAlmostEqual(G.exact_norm(), norm, places=5)
+                self.assertAlmostEqual(G.norm(), norm, places=5)
+                self.assertEqual(G.norm_bound(), G.norm())
+
+        # the channels are differentiated with SpaceChannels only
+        ig = ImageGeometry(6, 5, channels=4)
+        G = GradientOperator(ig, correlation='SpaceChannels')
+        self.assertAlmostEqual(G.exact_norm(), numpy.linalg.norm(self.dense_matrix(G), 2), places=5)
+        G = GradientOperator(ig, correlation='Space')
+        self.assertAlmostEqual(G.exact_norm(), numpy.linalg.norm(self.dense_matrix(G), 2), places=5)
+
+        # centered differences with Neumann boundary conditions have a bound only
+        G = GradientOperator(ImageGeometry(9, 6), method='centered')
+        self.assertIsNone(G.exact_norm())
+        self.assertGreaterEqual(G.norm_bound(), numpy.linalg.norm(self.dense_matrix(G), 2))
+
+    def test_norm_bounds(self):
+        ig = ImageGeometry(10, 12)
+        G = GradientOperator(ig)
+        Id = IdentityOperator(ig)
+        diagonal = ig.allocate('random') - 0.8
+        D = DiagonalOperator(diagonal)
+
+        self.assertEqual(Id.exact_norm(), 1)
+        self.assertEqual(ZeroOperator(ig).exact_norm(), 0)
+        self.assertAlmostEqual(D.exact_norm(), numpy.abs(diagonal.as_array()).max())
+        self.assertAlmostEqual(D.norm(), numpy.abs(diagonal.as_array()).max())
+        mask = ig.allocate(True, dtype=bool)
+        mask.as_array()[:5, :] = False
+        self.assertEqual(MaskOperator(mask).exact_norm(), 1)
+        self.assertAlmostEqual((-3 * G).exact_norm(), 3 * G.exact_norm())
+        self.assertAlmostEqual((-3 * G).norm_bound(), 3 * G.exact_norm())
+
+        # bounds combined from the structure of the operators
+        B = BlurringOperator(numpy.random.random((3, 4)), ig, mode='fft')
+        for op in [B + D, CompositionOperator(G, B), CompositionOperator(B, D),
+                   BlockOperator(G, Id, B), B]:
+            self.assertIsNone(op.exact_norm())
+            bound = op.norm_bound()
+            self.assertIsNotNone(bound)
+            self.assertGreaterEqual(bound, LinearOperator.calculate_norm(op, iterations=50) * (1 - 1e-4))
+        self.assertAlmostEqual(BlockOperator(G, Id).norm_bound(), numpy.sqrt(G.norm() ** 2 + 1))
+        self.assertAlmostEqual(BlockOperator(G, Id).norm_bound(), BlockOperator(G, Id).norm())
+        self.assertAlmostEqual(BlockOperator(G).exact_norm(), G.exact_norm())
+
+        # the bound of the blurring is close to the norm, up to the reflective boundaries
+        bound = B.norm_bound()
+        self.assertLess(bound, 1.2 * B.norm())
+        # the estimated norm is a lower bound, not returned as a bound
+        self.assertEqual(B.norm_bound(), bound)
+        self.assertEqual((B + D).norm_bound(), bound + D.exact_norm())
+
+        # operators without bounds
+        M = MatrixOperator(numpy.random.randn(4, 3))
+        self.assertIsNone(M.norm_bound())
+        self.assertIsNone((M + M).norm_bound())
+        M.norm()
+        (M + M).norm()
+        self.assertIsNone(M.norm_bound())
+        self.assertIsNone((M + M).norm_bound())
+
+    def test_norm_no_iterations(self):
+        # the norms of regularisation operators are not iterated nor cached
+        previous = set_operator_cache(None)
+        try:
+            ig = ImageGeometry(64, 64, 64)
+            G = GradientOperator(ig)
+            # an iterative estimate would not agree to 7 decimals
+            norm = BlockOperator(G, 2 * IdentityOperator(ig)).norm()
+            self.assertAlmostEqual(norm, numpy.sqrt(G.exact_norm() ** 2 + 4))
+        finally:
+            set_operator_cache(previous)
+
+    def test_sum_abs(self):
+        ig = ImageGeometry(7, 6, voxel_size_x=0.5, voxel_size_y=2)
+        diagonal = ig.allocate('random') - 0.5
+        mask = ig.allocate(1)
+        mask.as_array()[:3, :] = 0
+        G = GradientOperator(ig, bnd_cond='Periodic', backend='numpy')
+        operators = [G, GradientOperator(ig, backend='c'),
+                     GradientOperator(ig, method='centered', backend='numpy'),
+                     DiagonalOperator(diagonal), MaskOperator(mask), IdentityOperator(ig), ZeroOperator(ig),
+                     BlurringOperator(numpy.random.random((3, 4)), ig, mode='fft'),
+                     BlurringOperator(numpy.random.randn(3, 4), ig, mode='fft', boundary='periodic'), -2 * G,
+                     BlockOperator(G, BlockOperator(3 * IdentityOperator(ig), DiagonalOperator(diagonal)))]
+        for method in ['forward', 'backward', 'centered']:
+            for bnd_cond in ['Neumann', 'Periodic']:
+                operators.append(FiniteDifferenceOperator(ig, direction='horizontal_y', method=method, bnd_cond=bnd_cond))
+        for op in operators:
+            matrix = numpy.abs(self.dense_matrix(op))
+            numpy.testing.assert_allclose(self.flatten(op.sum_abs_row()), matrix.sum(axis=1), rtol=1e-5, atol=1e-5)
+            numpy.testing.assert_allclose(self.flatten(op.sum_abs_col()), matrix.sum(axis=0), rtol=1e-5, atol=1e-5)
+
+        # upper bounds with reflective boundaries and signs
+        B = BlurringOperator(numpy.random.randn(3, 4), ig, mode='fft')
+        matrix = numpy.abs(self.dense_matrix(B))
+        self.assertTrue(numpy.all(self.flatten(B.sum_abs_row()) >= matrix.sum(axis=1) - 1e-5))
+        self.assertTrue(numpy.all(self.flatten(B.sum_abs_col()) >= matrix.sum(axis=0) - 1e-5))
+
+        # the sums over the rows of blocks
+        B = BlockOperator(DiagonalOperator(diagonal), IdentityOperator(ig), G, -2 * G, shape=(2, 2))
+        sums = B.sum_abs_row()
+        numpy.testing.assert_allclose(sums.get_item(0).as_array(), numpy.abs(diagonal.as_array()) + 1)
+        numpy.testing.assert_allclose(self.flatten(sums.get_item(1)), 3 * self.flatten(G.sum_abs_row()))
+        sums = B.sum_abs_col()
+        numpy.testing.assert_allclose(sums.get_item(0).as_array(), numpy.abs(diagonal.as_array()) + G.sum_abs_col().as_array())
+        numpy.testing.assert_allclose(sums.get_item(1).as_array(), 1 + 2 * G.sum_abs_col().as_array())
+
+        M = MatrixOperator(numpy.random.randn(4, 3))
+        numpy.testing.assert_allclose(M.sum_abs_row().as_array(), numpy.abs(M.A).sum(axis=1))
+        numpy.testing.assert_allclose(M.sum_abs_col().as_array(), numpy.abs(M.A).sum(axis=0))
+
+        # the default applies the operator to ones, only for the operators declaring a nonnegative matrix
+        M = MatrixOperator(numpy.abs(M.A))
+        M.nonnegative = True
+        numpy.testing.assert_allclose(LinearOperator.sum_abs_row(M).as_array(), M.A.sum(axis=1), rtol=1e-6)
+        numpy.testing.assert_allclose(LinearOperator.sum_abs_col(M).as_array(), M.A.sum(axis=0), rtol=1e-6)
+        M.nonnegative = False
+        with self.assertRaises(NotImplementedError):
+            LinearOperator.sum_abs_row(M)
+        with self.assertRaises(NotImplementedError):
+            SymmetrisedGradientOperator(BlockGeometry(ig, ig)).sum_abs_col()
+
+        # the sums of the operators made of signed operators are exact or upper bounds, never cancelled
+        F = FiniteDifferenceOperator(ig, direction='horizontal_x')
+        C = ChannelwiseOperator(F, 3)
+        matrix = numpy.abs(self.dense_matrix(C))
+        numpy.testing.assert_allclose(self.flatten(C.sum_abs_row()), matrix.sum(axis=1), rtol=1e-5)
+        numpy.testing.assert_allclose(self.flatten(C.sum_abs_col()), matrix.sum(axis=0), rtol=1e-5)
+        for op in [CompositionOperator(G, IdentityOperator(ig)), CompositionOperator(-2 * IdentityOperator(ig), F, DiagonalOperator(diagonal)),
+                   CompositionOperator(G, BlurringOperator(numpy.random.random((3, 3)), ig, mode='fft'))]:
+            matrix = numpy.abs(self.dense_matrix(op))
+            rows, columns = self.flatten(op.sum_abs_row()), self.flatten(op.sum_abs_col())
+            self.assertTrue(numpy.all(rows >= matrix.sum(axis=1) - 1e-5))
+            self.assertTrue(numpy.all(columns >= matrix.sum(axis=0) - 1e-5))
+            self.assertGreater(rows.min(), 0)
+            self.assertGreater(columns.min(), 0)
+        # exact for nonnegative compositions
+        B = BlurringOperator(numpy.random.random((3, 3)), ig, mode='fft')
+        P = CompositionOperator(B, 2 * B)
+        self.assertFalse(P.nonnegative)
+        B.nonnegative = True
+        self.assertTrue(P.nonnegative)
+        matrix = numpy.abs(self.dense_matrix(P))
+        numpy.testing.assert_allclose(self.flatten(P.sum_abs_row()), matrix.sum(axis=1), rtol=1e-5)
+        numpy.testing.assert_allclose(self.flatten(P.sum_abs_col()), matrix.sum(axis=0), rtol=1e-5)
+
+
+class TestGradients(CCPiTestClass):
     def setUp(self):
         N, M = 20, 30
         K = 20
@@ -550,6 +1093,48 @@ class TestGradients(CCPiTestClass):
         numpy.testing.assert_almost_equal(lhs3, rhs3, decimal=3)  
         print ("*******", lhs3, rhs3, abs((rhs3-lhs3)/rhs3) , 1.5 * 10**(-4), abs((rhs3-lhs3)/rhs3) < 1.5 * 10**(-4))
         self.assertTrue( LinearOperator.dot_test(E3, range_init = w3, domain_init=u3, decimal=3) )
+
+    @staticmethod
+    def symmetrised_gradient_reference(E, v, w):
+        # E(v) and its adjoint on symmetric w from the FiniteDifferenceOperator
+        n = len(v.containers)
+        FD = [FiniteDifferenceOperator(v.get_item(0).geometry, direction=i, bnd_cond=E.bnd_cond) for i in range(n)]
+        for el in FD:
+            el.voxel_size = E.FD.voxel_size
+        direct = [0.5 * (FD[i].adjoint(v.get_item(j)) + FD[j].adjoint(v.get_item(i))) for i in range(n) for j in range(n)]
+        adjoint = [sum([FD[j].direct(w.get_item(k * n + j)) for j in range(n)]) for k in range(n)]
+        return direct, adjoint
+
+    def test_SymmetrisedGradientOperator_c(self):
+
+        geometries = [ImageGeometry(7, 6, voxel_size_x=0.3, voxel_size_y=0.3), ImageGeometry(7, 6, 5, voxel_size_x=0.3, voxel_size_y=0.3, voxel_size_z=0.3),
+                      ImageGeometry(7, 6, 5, channels=2)]
+        for ig in geometries:
+            for dtype in [numpy.float32, numpy.float64]:
+                ig.dtype = dtype
+                for bnd in ['Neumann', 'Periodic']:
+                    Grad = GradientOperator(ig, correlation='SpaceChannels' if ig.channels == 1 else 'Space')
+                    E = SymmetrisedGradientOperator(Grad.range_geometry(), bnd_cond=bnd)
+                    v = E.domain_geometry().allocate('random', seed=1)
+                    w = E.range_geometry().allocate('random', seed=2, symmetry=True)
+                    direct, adjoint = self.symmetrised_gradient_reference(E, v, w)
+
+                    res = E.direct(v)
+                    out = E.range_geometry().allocate(numpy.nan)
+                    E.direct(v, out=out)
+                    for el, el_out, ref in zip(res.containers, out.containers, direct):
+                        self.assertEqual(el.dtype, dtype)
+                        numpy.testing.assert_allclose(el.as_array(), ref.as_array(), rtol=1e-5, atol=1e-5)
+                        numpy.testing.assert_array_equal(el_out.as_array(), el.as_array())
+
+                    res = E.adjoint(w)
+                    out = E.domain_geometry().allocate(numpy.nan)
+                    E.adjoint(w, out=out)
+                    for el, el_out, ref in zip(res.containers, out.containers, adjoint):
+                        self.assertEqual(el.dtype, dtype)
+                        numpy.testing.assert_allclose(el.as_array(), ref.as_array(), rtol=1e-5, atol=1e-4)
+                        numpy.testing.assert_array_equal(el_out.as_array(), el.as_array())
+
     def test_dot_test(self):
         Grad3 = GradientOperator(self.ig3, correlation = 'Space', backend='numpy')
              
@@ -1130,4 +1715,135 @@ class TestOperatorCompositionSum(unittest.TestCase):
 
 
     
-    
\ No newline at end of file
+    
+
+class TestOperatorCache(unittest.TestCase):
+    def setUp(self):
+        numpy.random.seed(1)
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = OperatorCache(self.cache_dir)
+        self.previous = set_operator_cache(self.cache)
+        self.ig = ImageGeometry(20, 30)
+
+    def tearDown(self):
+        set_operator_cache(self.previous)
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_operator_hash(self):
+        G = GradientOperator(self.ig)
+        key = G._operator_hash()
+        self.assertEqual(key, GradientOperator(self.ig.copy())._operator_hash())
+        self.assertNotEqual(key, GradientOperator(ImageGeometry(20, 31))._operator_hash())
+        self.assertNotEqual(key, GradientOperator(self.ig, bnd_cond='Periodic')._operator_hash())
+        self.assertNotEqual(key, (2 * G)._operator_hash())
+        self.assertEqual((2 * G)._operator_hash(), (2 * GradientOperator(self.ig))._operator_hash())
+        # operators defined by data which is not hashed are not cached
+        D = DiagonalOperator(self.ig.allocate(1))
+        self.assertIsNone(D._operator_hash())
+        self.assertIsNone((2 * D)._operator_hash())
+        self.assertIsNone(D._cache_key()[0])
+
+    def test_default_cache(self):
+        # the cache is opt-in, enabled only by CIL_OPERATOR_CACHE=1
+        code = 'from cil.utilities.cache import get_operator_cache; print(get_operator_cache() is None)'
+        for value, disabled in ((None, 'True'), ('0', 'True'), ('1', 'False')):
+            env = dict(os.environ, CIL_CACHE_DIR=self.cache_dir)
+            env.pop('CIL_OPERATOR_CACHE', None)
+            if value is not None:
+                env['CIL_OPERATOR_CACHE'] = value
+            out = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True)
+            self.assertEqual(out.stdout.strip(), disabled)
+
+    def test_norm_cache(self):
+        PSF = numpy.random.random((3, 4))
+        B = BlurringOperator(PSF, self.ig, mode='fft')
+        norm = B.norm()
+        self.assertEqual(self.cache.get(B._operator_hash(), 'norm')['norm'], norm)
+
+        # a new operator reads the norm in the cache
+        B2 = BlurringOperator(PSF, self.ig, mode='fft')
+        self.cache.put(B2._operator_hash(), 'norm', norm=numpy.asarray(1.5))
+        self.assertEqual(B2.norm(), 1.5)
+        # unless forced to recompute it
+        self.assertAlmostEqual(B2.norm(force=True), norm, places=2)
+        self.assertAlmostEqual(BlurringOperator(PSF, self.ig, mode='fft').norm(), B2.norm())
+
+        # exact norms are not stored
+        G = GradientOperator(self.ig)
+        G.norm()
+        self.assertIsNone(self.cache.get(G._operator_hash(), 'norm'))
+
+        # nothing is stored if the cache is disabled
+        set_operator_cache(None)
+        self.cache.clear()
+        self.assertEqual(self.cache.size(), 0)
+        BlurringOperator(PSF, self.ig, mode='fft').norm()
+        self.assertEqual(self.cache.size(), 0)
+
+    def test_singular_vector_cache(self):
+        F = FiniteDifferenceOperator(self.ig, direction=0, method='centered')
+        norm = F.norm(method='power', iterations=20)
+        vector = self.cache.get(F._operator_hash(), 'singular_vector')
+        self.assertIsNotNone(vector)
+
+        # the stored vector is a better starting point than a random one
+        F2 = FiniteDifferenceOperator(self.ig, direction=0, method='centered')
+        warm = LinearOperator.calculate_norm(F2, method='power', iterations=3)
+        cold = LinearOperator.calculate_norm(F2, method='power', iterations=3,
+                                             x_init=self.ig.allocate('random'))
+        self.assertLess(abs(warm - norm), abs(cold - norm))
+
+    def test_container_cache(self):
+        x = self.ig.allocate('random')
+        self.cache.put_container('key', 'x', x)
+        y = self.cache.get_container('key', 'x', self.ig)
+        numpy.testing.assert_array_equal(x.as_array(), y.as_array())
+        self.assertIsNone(self.cache.get_container('key', 'y', self.ig))
+        self.assertIsNone(self.cache.get_container('key', 'x', ImageGeometry(20, 31)))
+
+        bg = BlockGeometry(self.ig, ImageGeometry(5, 6))
+        b = bg.allocate('random')
+        self.cache.put_container('key', 'b', b)
+        c = self.cache.get_container('key', 'b', bg)
+        for i in range(2):
+            numpy.testing.assert_array_equal(b.get_item(i).as_array(), c.get_item(i).as_array())
+
+    def test_eviction(self):
+        x = self.ig.allocate('random')
+        self.cache.put_container('key', 'x', x)
+        entry_size = self.cache.size()
+        self.assertGreater(entry_size, x.size * 4)
+
+        self.cache.max_size = 2 * entry_size
+        self.cache.put_container('key', 'y', x)
+        # the entry read most recently is kept
+        t = os.path.getmtime(os.path.join(self.cache_dir, 'key_x.npz'))
+        os.utime(os.path.join(self.cache_dir, 'key_x.npz'), (t - 10, t - 10))
+        os.utime(os.path.join(self.cache_dir, 'key_y.npz'), (t - 5, t - 5))
+        self.assertIsNotNone(self.cache.get('key', 'x'))
+        self.cache.put_container('key', 'z', x)
+        self.assertEqual(self.cache.size(), 2 * entry_size)
+        self.assertIsNone(self.cache.get('key', 'y'))
+        self.assertIsNotNone(self.cache.get('key', 'x'))
+        self.assertIsNotNone(self.cache.get('key', 'z'))
+
+        self.cache.clear()
+        self.assertEqual(self.cache.size(), 0)
+        self.assertIsNone(self.cache.get('key', 'x'))
+
+    def test_SIRT_cache(self):
+        from cil.optimisation.algorithms import SIRT
+        A = 2 * IdentityOperator(self.ig)
+        b = self.ig.allocate('random')
+        alg = SIRT(initial=self.ig.allocate(0), operator=A, data=b)
+        key = A._operator_hash()
+        numpy.testing.assert_array_almost_equal(
+            self.cache.get_container(key, 'row_sums', self.ig).as_array(), 2)
+        numpy.testing.assert_array_almost_equal(
+            self.cache.get_container(key, 'column_sums', self.ig).as_array(), 2)
+
+        # the weights are read from the cache
+        self.cache.put_container(key, 'row_sums', self.ig.allocate(4))
+        alg2 = SIRT(initial=self.ig.allocate(0), operator=2 * IdentityOperator(self.ig), data=b)
+        numpy.testing.assert_array_almost_equal(alg2.M.as_array(), 0.25)
+        numpy.testing.assert_array_almost_equal(alg2.D.as_array(), alg.D.as_array())
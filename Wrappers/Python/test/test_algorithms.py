@@ -23,10 +23,11 @@ from cil.framework import ImageData
 from cil.framework import AcquisitionData
 from cil.framework import ImageGeometry
 from cil.framework import AcquisitionGeometry
-from cil.framework import BlockDataContainer
+from cil.framework import BlockDataContainer, BlockGeometry
 
 from cil.optimisation.operators import IdentityOperator
-from cil.optimisation.operators import GradientOperator, BlockOperator, FiniteDifferenceOperator
+from cil.optimisation.operators import GradientOperator, BlockOperator, FiniteDifferenceOperator, DiagonalOperator
+from cil.optimisation.operators import CompositionOperator, SymmetrisedGradientOperator
 
 from cil.optimisation.functions import LeastSquares, ZeroFunction, \
    L2NormSquared, OperatorCompositionFunction
@@ -190,6 +191,27 @@ class TestAlgorithms(unittest.TestCase):
         self.assertNumpyArrayAlmostEqual(alg.x.as_array(), b.as_array())
     
         
+    def test_CGLS_complex_and_double(self):
+        # algorithms use the cilacc axpby on complex and double precision data
+        for dtype in [numpy.float64, numpy.complex64, numpy.complex128]:
+            ig = ImageGeometry(10, 12, dtype=dtype)
+            b = ig.allocate(0)
+            data = numpy.random.RandomState(2).standard_normal((2,) + ig.shape)
+            b.fill((data[0] + 1j * data[1] if b.dtype.kind == 'c' else data[0]).astype(dtype))
+
+            alg = CGLS(initial=ig.allocate(0), operator=IdentityOperator(ig), data=b, max_iteration=20)
+            alg.run(5, verbose=0)
+            self.assertEqual(alg.x.dtype, dtype)
+            numpy.testing.assert_allclose(alg.x.as_array(), b.as_array(), rtol=1e-5, atol=1e-6)
+
+            res = []
+            for use_axpby in [True, False]:
+                pdhg = PDHG(f=L2NormSquared(b=b), g=L2NormSquared(), operator=IdentityOperator(ig), 
+                    use_axpby=use_axpby, max_iteration=50)
+                pdhg.run(50, verbose=0)
+                res.append(pdhg.solution.as_array())
+            numpy.testing.assert_allclose(res[0], res[1], rtol=1e-5, atol=1e-6)
+
     def test_FISTA(self):
         print ("Test FISTA")
         ig = ImageGeometry(127,139,149)
@@ -463,6 +485,50 @@ class TestAlgorithms(unittest.TestCase):
             pdhg = PDHG(f=f, g=g, operator=operator, tau = tau, sigma = sigma, max_iteration=10)  
             assert "Convergence criterion" in str(wa[0].message)             
                   
+    def test_PDHG_diagonal_preconditioning(self):
+
+        ig = ImageGeometry(10, 12)
+        data = ig.allocate('random', seed=5)
+        diagonal = ig.allocate('random', seed=6)
+        diagonal.as_array()[0, :] = 0
+        operator = BlockOperator(DiagonalOperator(diagonal), GradientOperator(ig))
+        f = BlockFunction(L2NormSquared(b=data), 0.1 * MixedL21Norm())
+        g = IndicatorBox(lower=0)
+
+        pdhg = PDHG(f=f, g=g, operator=operator, max_iteration=500, update_objective_interval=500, preconditioning='diagonal')
+        # the step sizes are the reciprocals of the sums of the absolute values, 1 for the zero sums
+        rows = operator.sum_abs_row()
+        leaves = [(pdhg.sigma.get_item(0), rows.get_item(0))] + \
+            list(zip(pdhg.sigma.get_item(1).containers, rows.get_item(1).containers))
+        for sigma, sums in leaves:
+            sums = sums.as_array()
+            expected = numpy.divide(1, sums, out=numpy.ones(sums.shape), where=sums > 0)
+            numpy.testing.assert_allclose(sigma.as_array(), expected, rtol=1e-6)
+        numpy.testing.assert_allclose(pdhg.tau.as_array(), 1 / operator.sum_abs_col().as_array(), rtol=1e-6)
+        self.assertEqual(pdhg.sigma.get_item(0).as_array()[0, 0], 1)
+        # the norm of the operator is not computed
+        self.assertFalse(hasattr(pdhg, "norm_op"))
+
+        pdhg.run(verbose=0)
+        reference = PDHG(f=f, g=g, operator=operator, max_iteration=500, update_objective_interval=500)
+        reference.run(verbose=0)
+        numpy.testing.assert_allclose(pdhg.solution.as_array(), reference.solution.as_array(), atol=1e-3)
+
+        with self.assertRaises(ValueError):
+            PDHG(f=f, g=g, operator=operator, sigma=1., preconditioning='diagonal')
+        with self.assertRaises(ValueError):
+            PDHG(f=f, g=g, operator=operator, preconditioning='jacobi')
+        with self.assertRaises(ValueError):
+            PDHG(f=f, g=L2NormSquared(), operator=operator, gamma_g=1., preconditioning='diagonal')
+
+        # the signed operators made of other operators do not get the step sizes of zero rows and columns
+        composition = CompositionOperator(GradientOperator(ig), IdentityOperator(ig))
+        pdhg = PDHG(f=0.1 * MixedL21Norm(), g=L2NormSquared(b=data), operator=composition, preconditioning='diagonal')
+        self.assertLessEqual(pdhg.tau.max(), 0.5)
+        # operators whose sums are not available
+        with self.assertRaises(NotImplementedError):
+            PDHG(f=MixedL21Norm(), g=g, operator=SymmetrisedGradientOperator(BlockGeometry(ig, ig)), preconditioning='diagonal')
+
     def test_PDHG_strongly_convex_gamma_g(self):
 
         ig = ImageGeometry(3,3)
@@ -960,9 +960,10 @@ class TestTotalVariation(unittest.TestCase):
         x_real = self.ig_real.allocate('random', seed=4)  
         
 
+        # the value is summed in double precision without allocating the gradient
         res1 = self.tv_iso(x_real)
         res2 = self.grad.direct(x_real).pnorm(2).sum()
-        np.testing.assert_equal(res1, res2)  
+        np.testing.assert_allclose(res1, res2, rtol=1e-6)  
 
     def test_call_real_anisotropic(self):
 
@@ -970,7 +971,18 @@ class TestTotalVariation(unittest.TestCase):
         
         res1 = self.tv_aniso(x_real)
         res2 = self.grad.direct(x_real).pnorm(1).sum()
-        np.testing.assert_equal(res1, res2)                
+        np.testing.assert_allclose(res1, res2, rtol=1e-6)                
+
+    def test_call_MixedL21Norm_composition(self):
+
+        ig = ImageGeometry(30, 40, 20, voxel_size_x=0.5, voxel_size_z=2)
+        x = ig.allocate('random', seed=4)
+        grad = GradientOperator(ig, bnd_cond='Periodic')
+
+        f = OperatorCompositionFunction(MixedL21Norm(), grad)
+        np.testing.assert_allclose(f(x), MixedL21Norm()(grad.direct(x)), rtol=1e-6)
+        tv = TotalVariation()
+        np.testing.assert_allclose(tv(x), MixedL21Norm()(GradientOperator(ig).direct(x)), rtol=1e-6)
     
     @unittest.skipUnless(has_reg_toolkit, "Regularisation Toolkit not present")
     def test_compare_regularisation_toolkit(self):
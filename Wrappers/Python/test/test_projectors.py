@@ -0,0 +1,443 @@
+# -*- coding: utf-8 -*-
+#   This work is part of the Core Imaging Library (CIL) developed by CCPi
+#   (Collaborative Computational Project in Tomographic Imaging), with
+#   substantial contributions by UKRI-STFC and University of Manchester.
+
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+
+#   http://www.apache.org/licenses/LICENSE-2.0
+
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+from cil.framework import AcquisitionGeometry
+from cil.optimisation.operators import ProjectionOperator, SparseProjectionOperator, LinearOperator
+from utils import has_ipp
+
+if has_ipp:
+    from cil.recon import FBP, FDK
+
+
+def disc(ig, radius, centre):
+    '''Returns a 2D array with a disc of ones on the voxel grid of ig'''
+    x = ig.center_x + (np.arange(ig.voxel_num_x) - 0.5 * (ig.voxel_num_x - 1)) * ig.voxel_size_x
+    y = ig.center_y + (np.arange(ig.voxel_num_y) - 0.5 * (ig.voxel_num_y - 1)) * ig.voxel_size_y
+    xx, yy = np.meshgrid(x, y)
+    return (((xx - centre[0]) ** 2 + (yy - centre[1]) ** 2) < radius ** 2).astype(np.float32)
+
+
+def sphere_projections(ag, centre, radius):
+    '''Returns the cone-beam projections of a sphere of ones centred at centre at angle 0'''
+    system = ag.config.system
+    source = np.asarray(system.source.position, dtype=np.float64)
+    num_u, num_v = ag.config.panel.num_pixels
+    du, dv = ag.config.panel.pixel_size
+    u = (np.arange(num_u) - 0.5 * (num_u - 1)) * du
+    v = (np.arange(num_v) - 0.5 * (num_v - 1)) * dv
+    pixels = system.detector.position + v[:, None, None] * system.detector.direction_y \
+        + u[None, :, None] * system.detector.direction_x
+    rays = pixels - source
+    rays /= np.linalg.norm(rays, axis=-1, keepdims=True)
+
+    data = ag.allocate(None)
+    for i, theta in enumerate(np.deg2rad(ag.angles)):
+        rotation = np.array([[np.cos(theta), -np.sin(theta), 0], [np.sin(theta), np.cos(theta), 0], [0, 0, 1]])
+        to_centre = system.rotation_axis.position + rotation.dot(centre) - source
+        along = (rays * to_centre).sum(axis=-1)
+        distance2 = to_centre.dot(to_centre) - along ** 2
+        data.as_array()[i] = 2 * np.sqrt(np.clip(radius ** 2 - distance2, 0, None))
+    return data
+
+
+class Test_ProjectionOperator(unittest.TestCase):
+
+    def setUp(self):
+        self.angles = np.linspace(0, 180, 60, endpoint=False)
+
+    def test_dot_test_2D(self):
+        ag = AcquisitionGeometry.create_Parallel2D(detector_position=[2, 0], rotation_axis_position=[0.5, 0])\
+            .set_panel(64, 0.5).set_angles(self.angles)
+        ig = ag.get_ImageGeometry()
+        ig.voxel_num_y = 40
+        ig.center_x = 1.5
+
+        A = ProjectionOperator(ig, ag)
+        self.assertTrue(LinearOperator.dot_test(A, tolerance=1e-5))
+
+    def test_dot_test_3D(self):
+        ag = AcquisitionGeometry.create_Parallel3D(detector_position=[0, 0, 0.3])\
+            .set_panel([48, 10], [1, 1]).set_angles(self.angles)
+        ig = ag.get_ImageGeometry()
+        ig.voxel_num_z = 7
+        ig.voxel_size_z = 1.3
+
+        A = ProjectionOperator(ig, ag)
+        self.assertTrue(LinearOperator.dot_test(A, tolerance=1e-5))
+
+        # panel origin on the top right
+        ag.config.panel.origin = 'top-right'
+        A = ProjectionOperator(ig, ag)
+        self.assertTrue(LinearOperator.dot_test(A, tolerance=1e-5))
+
+    def test_dot_test_channels(self):
+        ag = AcquisitionGeometry.create_Parallel2D().set_panel(32).set_angles(self.angles).set_channels(3)
+        ig = ag.get_ImageGeometry()
+
+        A = ProjectionOperator(ig, ag)
+        self.assertTrue(LinearOperator.dot_test(A, tolerance=1e-5))
+
+        x = ig.allocate('random', seed=3)
+        y = A.direct(x)
+        for c in range(3):
+            A_c = ProjectionOperator(ig.get_slice(channel=c), ag.get_slice(channel=c))
+            np.testing.assert_allclose(y.get_slice(channel=c).as_array(),
+                A_c.direct(x.get_slice(channel=c)).as_array(), rtol=1e-6)
+
+    def test_forward_disc(self):
+        # offset rotation axis and detector
+        ag = AcquisitionGeometry.create_Parallel2D(detector_position=[3, 0], rotation_axis_position=[1.5, 0])\
+            .set_panel(100, 1.).set_angles(self.angles)
+        ig = ag.get_ImageGeometry()
+        ig.voxel_num_x = ig.voxel_num_y = 80
+
+        x = ig.allocate(0)
+        x.fill(disc(ig, 15, (5, -3)))
+        proj = ProjectionOperator(ig, ag).direct(x).as_array()
+
+        # position on the detector relative to the rotation axis
+        s = (np.arange(100) - 49.5) + 3 - 1.5
+        theta = np.deg2rad(self.angles)
+        centre = 5 * np.cos(theta) + 3 * np.sin(theta)
+
+        np.testing.assert_allclose(proj.sum(axis=1), x.as_array().sum(), rtol=2e-3)
+        np.testing.assert_allclose((proj * s).sum(axis=1) / proj.sum(axis=1), centre, atol=0.05)
+
+        chord = 2 * np.sqrt(np.clip(15 ** 2 - (s - centre[:, None]) ** 2, 0, None))
+        self.assertLess(np.abs(proj - chord).mean(), 0.2)
+
+    def test_forward_3D_slices(self):
+        # with matching rows and slices each row is the projection of a slice
+        ag = AcquisitionGeometry.create_Parallel3D().set_panel([32, 4]).set_angles(self.angles)
+        ig = ag.get_ImageGeometry()
+        x = ig.allocate('random', seed=2)
+        y = ProjectionOperator(ig, ag).direct(x)
+
+        ag2D = ag.get_slice(vertical=0)
+        A2D = ProjectionOperator(ag2D.get_ImageGeometry(), ag2D)
+        for k in range(4):
+            np.testing.assert_allclose(y.as_array()[:, k, :],
+                A2D.direct(x.get_slice(vertical=k)).as_array(), rtol=1e-5, atol=1e-5)
+
+    def test_out(self):
+        ag = AcquisitionGeometry.create_Parallel3D().set_panel([32, 4]).set_angles(self.angles)
+        ig = ag.get_ImageGeometry()
+        A = ProjectionOperator(ig, ag)
+        x = ig.allocate('random', seed=2)
+        y = ag.allocate('random', seed=3)
+
+        out = ag.allocate(None)
+        A.direct(x, out=out)
+        np.testing.assert_array_equal(out.as_array(), A.direct(x).as_array())
+
+        out = ig.allocate(None)
+        A.adjoint(y, out=out)
+        np.testing.assert_array_equal(out.as_array(), A.adjoint(y).as_array())
+
+    def test_errors(self):
+        ag = AcquisitionGeometry.create_Parallel3D().set_panel([32, 4]).set_angles(self.angles)
+        ig = ag.get_ImageGeometry()
+
+        with self.assertRaises(ValueError):
+            ProjectionOperator(ig, ag, adjoint_weights='FDK')
+        with self.assertRaises(ValueError):
+            ProjectionOperator(ig.get_slice(vertical=0), ag)
+
+        ag_reordered = ag.copy()
+        ag_reordered.set_labels(['vertical', 'angle', 'horizontal'])
+        with self.assertRaises(ValueError):
+            ProjectionOperator(ig, ag_reordered)
+
+        ag_cone = AcquisitionGeometry.create_Cone3D(source_position=[0, -10, 0], detector_position=[0, 10, 0])\
+            .set_panel([32, 4]).set_angles(self.angles)
+        with self.assertRaises(NotImplementedError):
+            ProjectionOperator(ag_cone.get_ImageGeometry(), ag_cone)
+
+    def test_partition(self):
+        ag = AcquisitionGeometry.create_Parallel2D().set_panel(48).set_angles(self.angles)
+        ig = ag.get_ImageGeometry()
+        A = ProjectionOperator(ig, ag)
+        x = ig.allocate('random', seed=3)
+        y = A.direct(x)
+
+        for mode in ['staggered', 'sequential', 'random_permutation']:
+            B = ProjectionOperator.partition(ig, ag, 4, mode, seed=2)
+            self.assertEqual(B.shape, (4, 1))
+            b = y.partition(4, mode, seed=2)
+            z = B.direct(x)
+            for i in range(4):
+                self.assertEqual(B.get_item(i, 0).range_geometry(), b.get_item(i).geometry)
+                np.testing.assert_allclose(z.get_item(i).as_array(), b.get_item(i).as_array(), rtol=1e-5, atol=1e-5)
+            # the back projections of the subsets sum to the back projection of the data
+            np.testing.assert_allclose(B.adjoint(b).as_array(), A.adjoint(y).as_array(), rtol=1e-4, atol=1e-3)
+
+        # SPDHG with the subsets
+        from cil.optimisation.algorithms import SPDHG
+        from cil.optimisation.functions import BlockFunction, L2NormSquared, IndicatorBox
+        b = y.partition(4)
+        B = ProjectionOperator.partition(ig, ag, 4)
+        f = BlockFunction(*[L2NormSquared(b=subset) for subset in b.containers])
+        spdhg = SPDHG(f=f, g=IndicatorBox(lower=0), operator=B, max_iteration=200, update_objective_interval=200)
+        spdhg.run(verbose=0)
+        self.assertLess((spdhg.solution - x).norm(), 0.5 * x.norm())
+
+    def test_diagonal_preconditioning(self):
+        from cil.optimisation.algorithms import PDHG, SPDHG
+        from cil.optimisation.functions import BlockFunction, L2NormSquared, IndicatorBox
+        from cil.utilities.cache import OperatorCache, set_operator_cache
+
+        ag = AcquisitionGeometry.create_Parallel2D().set_panel(48).set_angles(self.angles)
+        ig = ag.get_ImageGeometry()
+        x = ig.allocate(0)
+        x.fill(disc(ig, 15, (3, -2)))
+        y = ProjectionOperator(ig, ag).direct(x)
+
+        cache_dir = tempfile.mkdtemp()
+        previous = set_operator_cache(OperatorCache(cache_dir))
+        try:
+            A = ProjectionOperator(ig, ag)
+            pdhg = PDHG(f=L2NormSquared(b=y), g=IndicatorBox(lower=0), operator=A, max_iteration=100,
+                        update_objective_interval=100, preconditioning='diagonal')
+            # the sums are computed with one projection and one back projection, without the norm
+            self.assertIsNone(A._norm)
+            np.testing.assert_allclose(pdhg.sigma.as_array(), 1 / A.direct(ig.allocate(1)).as_array(), rtol=1e-5)
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+            # and loaded from the cache by the next operators
+            cached = PDHG(f=L2NormSquared(b=y), g=IndicatorBox(lower=0), operator=ProjectionOperator(ig, ag), preconditioning='diagonal')
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+            np.testing.assert_array_equal(cached.sigma.as_array(), pdhg.sigma.as_array())
+            np.testing.assert_array_equal(cached.tau.as_array(), pdhg.tau.as_array())
+
+            pdhg.run(verbose=0)
+            reference = PDHG(f=L2NormSquared(b=y), g=IndicatorBox(lower=0), operator=A, max_iteration=100, update_objective_interval=100)
+            reference.run(verbose=0)
+            self.assertLess((pdhg.solution - x).norm(), 0.1 * x.norm())
+            self.assertLess((pdhg.solution - x).norm(), 1.2 * (reference.solution - x).norm())
+
+            b = y.partition(4)
+            f = BlockFunction(*[L2NormSquared(b=subset) for subset in b.containers])
+            np.random.seed(3)
+            spdhg = SPDHG(f=f, g=IndicatorBox(lower=0), operator=ProjectionOperator.partition(ig, ag, 4),
+                          max_iteration=200, update_objective_interval=200, preconditioning='diagonal')
+            self.assertEqual(len(spdhg.sigma), 4)
+            self.assertEqual(spdhg.tau.shape, ig.shape)
+            spdhg.run(verbose=0)
+            self.assertLess((spdhg.solution - x).norm(), 0.2 * x.norm())
+        finally:
+            set_operator_cache(previous)
+            shutil.rmtree(cache_dir)
+
+    @unittest.skipUnless(has_ipp, "IPP not installed")
+    def test_FBP(self):
+        ag = AcquisitionGeometry.create_Parallel3D().set_panel([128, 4]).set_angles(np.linspace(0, 180, 180, endpoint=False))
+        ig = ag.get_ImageGeometry()
+        x = ig.allocate(0)
+        x.fill(np.broadcast_to(disc(ig, 30, (10, -5)), ig.shape))
+        data = ProjectionOperator(ig, ag).direct(x)
+
+        reconstructor = FBP(data)
+        reconstructor.set_backend('cil')
+        self.assertEqual(reconstructor.backend, 'cil')
+        recon = reconstructor.run(verbose=0)
+
+        inside = disc(ig, 25, (10, -5)) > 0
+        np.testing.assert_allclose(recon.as_array()[:, inside].mean(), 1, atol=0.03)
+        self.assertLess(np.abs(recon.as_array() - x.as_array()).mean(), 0.05)
+
+        reconstructor.set_split_processing(1)
+        np.testing.assert_allclose(reconstructor.run(verbose=0).as_array(), recon.as_array(), atol=1e-5)
+
+        # 2D
+        data2D = data.get_slice(vertical=1)
+        reconstructor = FBP(data2D)
+        reconstructor.set_backend('cil')
+        np.testing.assert_allclose(reconstructor.run(verbose=0).as_array(), recon.as_array()[1], atol=1e-5)
+
+
+@unittest.skipUnless(has_ipp, "IPP not installed")
+class Test_FDK_cil(unittest.TestCase):
+
+    def setUp(self):
+        self.angles = np.linspace(0, 360, 180, endpoint=False)
+        self.centre = np.array([5., -3., 2.])
+        self.radius = 10.
+
+    def check_sphere(self, ag, ig=None):
+        data = sphere_projections(ag, self.centre, self.radius)
+        reconstructor = FDK(data, ig)
+        reconstructor.set_backend('cil')
+        recon = reconstructor.run(verbose=0)
+
+        ig = reconstructor.image_geometry
+        x = ig.center_x + (np.arange(ig.voxel_num_x) - 0.5 * (ig.voxel_num_x - 1)) * ig.voxel_size_x
+        y = ig.center_y + (np.arange(ig.voxel_num_y) - 0.5 * (ig.voxel_num_y - 1)) * ig.voxel_size_y
+        z = ig.center_z + (np.arange(ig.voxel_num_z) - 0.5 * (ig.voxel_num_z - 1)) * ig.voxel_size_z
+        zz, yy, xx = np.meshgrid(z, y, x, indexing='ij')
+        r2 = (xx - self.centre[0]) ** 2 + (yy - self.centre[1]) ** 2 + (zz - self.centre[2]) ** 2
+
+        np.testing.assert_allclose(recon.as_array()[r2 < (0.8 * self.radius) ** 2].mean(), 1, atol=0.05)
+        self.assertLess(np.abs(recon.as_array()[r2 > (1.2 * self.radius) ** 2]).mean(), 0.05)
+        return recon
+
+    def test_simple(self):
+        ag = AcquisitionGeometry.create_Cone3D(source_position=[0, -150, 0], detector_position=[0, 100, 0])\
+            .set_panel([64, 32]).set_angles(self.angles)
+        self.assertEqual(ag.system_description, 'simple')
+        recon = self.check_sphere(ag)
+
+        # out
+        out = ag.get_ImageGeometry().allocate(None)
+        data = sphere_projections(ag, self.centre, self.radius)
+        reconstructor = FDK(data)
+        reconstructor.set_backend('cil')
+        reconstructor.run(out=out, verbose=0)
+        np.testing.assert_allclose(out.as_array(), recon.as_array(), atol=1e-5)
+
+    def test_offset(self):
+        ag = AcquisitionGeometry.create_Cone3D(source_position=[0, -150, 0], detector_position=[0, 100, 0], rotation_axis_position=[2, 0, 0])\
+            .set_panel([64, 32]).set_angles(self.angles)
+        self.assertEqual(ag.system_description, 'offset')
+        self.check_sphere(ag)
+
+    def test_advanced(self):
+        ag = AcquisitionGeometry.create_Cone3D(source_position=[0, -150, 0], detector_position=[0, 100, 0],
+            detector_direction_x=[np.cos(0.05), np.sin(0.05), 0], rotation_axis_position=[1, 0, 0])\
+            .set_panel([64, 32]).set_angles(self.angles)
+        self.assertEqual(ag.system_description, 'advanced')
+        self.check_sphere(ag)
+
+    def test_image_geometry(self):
+        ag = AcquisitionGeometry.create_Cone3D(source_position=[0, -150, 0], detector_position=[0, 100, 0])\
+            .set_panel([64, 32]).set_angles(self.angles)
+        ig = ag.get_ImageGeometry()
+        ig.voxel_num_x = ig.voxel_num_y = 40
+        ig.voxel_num_z = 30
+        ig.center_x = 3
+        ig.center_z = 1
+        self.check_sphere(ag, ig)
+
+    def test_2D(self):
+        ag = AcquisitionGeometry.create_Cone2D(source_position=[0, -150], detector_position=[0, 100])\
+            .set_panel(64).set_angles(self.angles)
+        ag3D = AcquisitionGeometry.create_Cone3D(source_position=[0, -150, 0], detector_position=[0, 100, 0])\
+            .set_panel([64, 1]).set_angles(self.angles)
+        self.centre[2] = 0
+
+        data3D = sphere_projections(ag3D, self.centre, self.radius)
+        data = ag.allocate(None)
+        data.fill(data3D.as_array().reshape(data.shape))
+
+        reconstructor = FDK(data)
+        reconstructor.set_backend('cil')
+        recon = reconstructor.run(verbose=0)
+
+        reconstructor3D = FDK(data3D)
+        reconstructor3D.set_backend('cil')
+        np.testing.assert_allclose(recon.as_array(), reconstructor3D.run(verbose=0).as_array().reshape(recon.shape), atol=1e-4)
+
+
+class Test_SparseProjectionOperator(unittest.TestCase):
+
+    def setUp(self):
+        self.ag = AcquisitionGeometry.create_Parallel2D(detector_position=[0, 10], rotation_axis_position=[1.5, 0])\
+            .set_panel(48, 1.2).set_angles(np.linspace(0, 180, 37))
+        self.ig = self.ag.get_ImageGeometry()
+        self.ig.voxel_num_x = 40
+        self.ig.voxel_num_y = 36
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_matches_ProjectionOperator(self):
+        A = SparseProjectionOperator(self.ig, self.ag, cache_dir=self.cache_dir)
+        B = ProjectionOperator(self.ig, self.ag)
+        x = self.ig.allocate('random', seed=2)
+        y = self.ag.allocate('random', seed=3)
+        np.testing.assert_allclose(A.direct(x).as_array(), B.direct(x).as_array(), rtol=1e-4, atol=1e-4)
+        np.testing.assert_allclose(A.adjoint(y).as_array(), B.adjoint(y).as_array(), rtol=1e-4, atol=1e-4)
+        self.assertTrue(LinearOperator.dot_test(A, tolerance=1e-5))
+
+        # anisotropic voxels, where the two branches of Joseph's method differ at 45 degrees
+        ag = self.ag.copy().set_angles([0, 30, 45, 135, 225, 315])
+        ig = self.ig.copy()
+        ig.voxel_size_y = 1.3
+        A = SparseProjectionOperator(ig, ag, use_cache=False)
+        B = ProjectionOperator(ig, ag)
+        x = ig.allocate('random', seed=2)
+        y = ag.allocate('random', seed=3)
+        np.testing.assert_allclose(A.direct(x).as_array(), B.direct(x).as_array(), rtol=1e-4, atol=1e-4)
+        np.testing.assert_allclose(A.adjoint(y).as_array(), B.adjoint(y).as_array(), rtol=1e-4, atol=1e-4)
+
+    def test_out(self):
+        A = SparseProjectionOperator(self.ig, self.ag, use_cache=False)
+        x = self.ig.allocate('random', seed=2)
+        y = self.ag.allocate('random', seed=3)
+        out_direct = self.ag.allocate(None)
+        out_adjoint = self.ig.allocate(None)
+        A.direct(x, out=out_direct)
+        A.adjoint(y, out=out_adjoint)
+        np.testing.assert_allclose(out_direct.as_array(), A.direct(x).as_array())
+        np.testing.assert_allclose(out_adjoint.as_array(), A.adjoint(y).as_array())
+
+    def test_cache(self):
+        A = SparseProjectionOperator(self.ig, self.ag, cache_dir=self.cache_dir)
+        files = os.listdir(self.cache_dir)
+        self.assertEqual(files, ['projection_matrix_{}.npz'.format(A.geometry_hash())])
+
+        # a second operator loads the cached matrix instead of building it
+        B = SparseProjectionOperator(self.ig, self.ag, cache_dir=self.cache_dir)
+        B._build_matrix = None
+        B.matrix = B._load_or_build()
+        self.assertEqual((A.matrix != B.matrix).nnz, 0)
+
+        # another geometry has another key
+        ag = self.ag.copy()
+        ag.set_angles(np.linspace(0, 180, 36))
+        C = SparseProjectionOperator(self.ig, ag, cache_dir=self.cache_dir)
+        self.assertNotEqual(C.geometry_hash(), A.geometry_hash())
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+        SparseProjectionOperator(self.ig, self.ag, use_cache=False, cache_dir=os.path.join(self.cache_dir, 'unused'))
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, 'unused')))
+
+    def test_sums(self):
+        A = SparseProjectionOperator(self.ig, self.ag, use_cache=False)
+        np.testing.assert_allclose(A.row_sums().as_array(), A.direct(self.ig.allocate(1)).as_array(), rtol=1e-5, atol=1e-5)
+        np.testing.assert_allclose(A.column_sums().as_array(), A.adjoint(self.ag.allocate(1)).as_array(), rtol=1e-5, atol=1e-4)
+
+    def test_3D(self):
+        ag = AcquisitionGeometry.create_Parallel3D().set_panel([32, 5]).set_angles(np.linspace(0, 180, 20, endpoint=False))\
+            .set_channels(2)
+        ig = ag.get_ImageGeometry()
+        A = SparseProjectionOperator(ig, ag, use_cache=False)
+        B = ProjectionOperator(ig, ag)
+        x = ig.allocate('random', seed=2)
+        y = ag.allocate('random', seed=3)
+        np.testing.assert_allclose(A.direct(x).as_array(), B.direct(x).as_array(), rtol=1e-4, atol=1e-4)
+        np.testing.assert_allclose(A.adjoint(y).as_array(), B.adjoint(y).as_array(), rtol=1e-4, atol=1e-4)
+        np.testing.assert_allclose(A.row_sums().as_array(), A.direct(ig.allocate(1)).as_array(), rtol=1e-5, atol=1e-5)
+        np.testing.assert_allclose(A.column_sums().as_array(), A.adjoint(ag.allocate(1)).as_array(), rtol=1e-5, atol=1e-4)
+
+        ig.voxel_num_z = 3
+        with self.assertRaises(ValueError):
+            SparseProjectionOperator(ig, ag, use_cache=False)
@@ -0,0 +1,461 @@
+# -*- coding: utf-8 -*-
+#   This work is part of the Core Imaging Library (CIL) developed by CCPi
+#   (Collaborative Computational Project in Tomographic Imaging), with
+#   substantial contributions by UKRI-STFC and University of Manchester.
+
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+
+#   http://www.apache.org/licenses/LICENSE-2.0
+
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+'''Timings of the DataContainer algebra, the operators and the projectors
+
+Prints the timings of CIL against NumPy or the previous implementations, they are not run
+by the tests. Run all the benchmarks, or those named on the command line:
+
+    python scripts/benchmarks.py
+    python scripts/benchmarks.py dispatch blurring
+    python scripts/benchmarks.py --list
+'''
+
+import argparse
+import shutil
+import tempfile
+from timeit import default_timer as timer
+
+import numpy
+
+from cil.framework import ImageGeometry, AcquisitionGeometry, BlockGeometry, BufferPool
+from cil.optimisation.operators import BlockOperator, BlurringOperator, ChannelwiseOperator, \
+    FiniteDifferenceOperator, GradientOperator, SymmetrisedGradientOperator, ProjectionOperator, \
+    SparseProjectionOperator
+
+
+def dt(steps):
+    return steps[-1] - steps[-2]
+
+
+# DataContainer and BlockDataContainer
+
+def lazy():
+    ig = ImageGeometry(voxel_num_x=256, voxel_num_y=256, voxel_num_z=128)
+    x = ig.allocate('random', seed=1)
+    y = ig.allocate('random', seed=2)
+    z = ig.allocate('random', seed=3)
+    w = ig.allocate(0)
+    tau = 0.3
+
+    steps = [timer()]
+    (x - y) * tau + z
+    steps.append(timer())
+    t_eager = dt(steps)
+    ((x.lazy() - y) * tau + z).evaluate(out=w)
+    steps.append(timer())
+    t_lazy = dt(steps)
+    x.subtract(y, out=w)
+    w.multiply(tau, out=w)
+    w.add(z, out=w)
+    steps.append(timer())
+    print("(x - y) * tau + z on {}: eager {:.4f}s, eager with out {:.4f}s, lazy {:.4f}s".format(
+        ig.shape, t_eager, dt(steps), t_lazy))
+
+
+def reduction():
+    ig = ImageGeometry(voxel_num_x=256, voxel_num_y=256, voxel_num_z=128)
+    x = ig.allocate('random', seed=1)
+    y = ig.allocate('random', seed=2)
+    for name, numpy_call, cil_call in [
+        ('dot', lambda: numpy.dot(x.as_array().ravel(), y.as_array().ravel()), lambda: x.dot(y)),
+        ('sum', lambda: x.as_array().sum(), lambda: x.sum()),
+        ('max', lambda: x.as_array().max(), lambda: x.max()),
+        ('sum axis', lambda: x.as_array().sum(axis=1), lambda: x.sum(axis='horizontal_y'))]:
+        steps = [timer()]
+        numpy_call()
+        steps.append(timer())
+        t_numpy = dt(steps)
+        cil_call()
+        steps.append(timer())
+        print("{} on {}: numpy {:.4f}s, cilacc {:.4f}s".format(name, ig.shape, t_numpy, dt(steps)))
+
+
+def pool():
+    ig = ImageGeometry(voxel_num_x=256, voxel_num_y=256, voxel_num_z=128)
+    x = ig.allocate(1)
+    n = 10
+
+    steps = [timer()]
+    for i in range(n):
+        y = ig.allocate(0)
+        y += x
+        del y
+    steps.append(timer())
+    t_numpy = dt(steps)
+    with BufferPool() as buffer_pool:
+        for i in range(n):
+            y = ig.allocate(0)
+            y += x
+            del y
+    steps.append(timer())
+    print("{} allocations of {}: numpy {:.4f}s, pool {:.4f}s, {}".format(
+        n, ig.shape, t_numpy, dt(steps), buffer_pool.statistics()))
+
+
+def memmap():
+    ig = ImageGeometry(voxel_num_x=256, voxel_num_y=256, voxel_num_z=128)
+    n = 5
+    res = []
+    for backing in ['memory', 'memmap']:
+        x = ig.allocate(1, backing=backing)
+        y = ig.allocate(2, backing=backing)
+        out = ig.allocate(0, backing=backing)
+        steps = [timer()]
+        for i in range(n):
+            x.axpby(2, 3, y, out=out)
+            x.add(out, out=out)
+        steps.append(timer())
+        res.append(2 * n * x.size * 4 / dt(steps) / 1024**2)
+    print("throughput on {}: memory {:.1f} MB/s, memmap {:.1f} MB/s".format(ig.shape, *res))
+
+
+def get_slice():
+    ig = ImageGeometry(64, 64, 2000)
+    u = ig.allocate(1)
+    sl = numpy.ones((64, 64), dtype=numpy.float32)
+
+    steps = [timer()]
+    for i in range(ig.voxel_num_z):
+        u.get_slice(vertical=i)
+    steps.append(timer())
+    t_copy = dt(steps)
+    for i in range(ig.voxel_num_z):
+        u.get_slice(vertical=i, copy=False)
+    steps.append(timer())
+    t_view = dt(steps)
+    for i in range(ig.voxel_num_z):
+        u.fill(sl, vertical=i)
+    steps.append(timer())
+    print("per slice on {} slices: get_slice copy {:.1f}us, view {:.1f}us, fill {:.1f}us".format(
+        ig.voxel_num_z, *[t / ig.voxel_num_z * 1e6 for t in (t_copy, t_view, dt(steps))]))
+
+
+def reorder():
+    ag = AcquisitionGeometry.create_Parallel3D().set_angles(numpy.linspace(0, 180, 360)).set_panel([512, 256])
+    data = ag.allocate(1)
+    gb = data.as_array().nbytes / 1024**3
+    for order in [['vertical', 'angle', 'horizontal'], ['horizontal', 'vertical', 'angle']]:
+        axes = [data.dimension_labels.index(el) for el in order]
+        steps = [timer()]
+        numpy.ascontiguousarray(numpy.transpose(data.as_array(), axes))
+        steps.append(timer())
+        t_numpy = dt(steps)
+        x = data.copy()
+        steps.append(timer())
+        x.reorder(order)
+        steps.append(timer())
+        t_cil = dt(steps)
+        x = data.copy()
+        steps.append(timer())
+        x.reorder(order, in_place=True)
+        steps.append(timer())
+        print("reorder {} to {}: numpy {:.2f} GB/s, cilacc {:.2f} GB/s, in place {:.2f} GB/s".format(
+            data.shape, order, gb / t_numpy, gb / t_cil, gb / dt(steps)))
+
+
+def dispatch():
+    for n in [64, 256, 1024, 4096]:
+        ig = ImageGeometry(n, n)
+        x = ig.allocate(1)
+        y = ig.allocate(2)
+        out = ig.allocate(0)
+        num_calls = max(2, 2**22 // (n * n))
+        res = []
+        for op in [lambda: x + y, lambda: x.add(y, out=out), lambda: x.axpby(2, 3, y, out)]:
+            steps = [timer()]
+            for i in range(num_calls):
+                op()
+            steps.append(timer())
+            res.append(num_calls / dt(steps))
+        print("operations per second on {}x{}: x + y {:.0f}, add out {:.0f}, axpby {:.0f}".format(n, n, *res))
+
+
+def reduced_precision():
+    for dtype in [numpy.float32, numpy.float16]:
+        ig = ImageGeometry(512, 512, 128, dtype=dtype)
+        x = ig.allocate(1)
+        y = ig.allocate(2)
+        out = ig.allocate(0)
+        # bytes read and written by axpby and read by dot
+        gb = x.as_array().nbytes / 1024**3
+        steps = [timer()]
+        x.axpby(2, 3, y, out)
+        steps.append(timer())
+        t_axpby = dt(steps)
+        x.dot(y)
+        steps.append(timer())
+        print("{} storage on {}: axpby {:.4f}s {:.2f} GB/s, dot {:.4f}s {:.2f} GB/s".format(
+            numpy.dtype(dtype).name, ig.shape, t_axpby, 3 * gb / t_axpby, dt(steps), 2 * gb / dt(steps)))
+
+
+def axpby_complex():
+    ig = ImageGeometry(512, 512, 32, dtype=numpy.complex64)
+    x = ig.allocate(1)
+    y = ig.allocate(2)
+    out = ig.allocate(0)
+    steps = [timer()]
+    numpy.add(2 * x.as_array(), 3j * y.as_array(), out=out.as_array())
+    steps.append(timer())
+    t_numpy = dt(steps)
+    x.axpby(2, 3j, y, out)
+    steps.append(timer())
+    print("complex64 axpby on {}: numpy {:.4f}s, cilacc {:.4f}s".format(ig.shape, t_numpy, dt(steps)))
+
+
+def contiguous():
+    ig = ImageGeometry(64, 64)
+    for num_blocks in [3, 30]:
+        bg = BlockGeometry(*[ig for _ in range(num_blocks)])
+        res = []
+        for is_contiguous in [False, True]:
+            x = bg.allocate(1, contiguous=is_contiguous)
+            y = bg.allocate(2, contiguous=is_contiguous)
+            out = bg.allocate(0, contiguous=is_contiguous)
+            steps = [timer()]
+            for i in range(100):
+                x.axpby(2, 3, y, out)
+                x.add(y, out=out)
+                out.dot(x)
+            steps.append(timer())
+            res.append(dt(steps) / 100)
+        print("axpby, add and dot on {} blocks of {}: separate {:.1f}us, contiguous {:.1f}us".format(
+            num_blocks, ig.shape, res[0] * 1e6, res[1] * 1e6))
+
+
+# operators
+
+def gradient():
+    ig = ImageGeometry(256, 256, 128)
+    x = ig.allocate('random', seed=4)
+    for method in ['forward', 'backward', 'centered']:
+        for backend in ['c', 'numpy']:
+            Grad = GradientOperator(ig, method=method, backend=backend)
+            res = Grad.range_geometry().allocate(0)
+            adj = ig.allocate(0)
+            t0 = timer()
+            Grad.direct(x, out=res)
+            t1 = timer()
+            Grad.adjoint(res, out=adj)
+            t2 = timer()
+            print("GradientOperator {} {}: direct {:.3f}s adjoint {:.3f}s".format(method, backend, t1 - t0, t2 - t1))
+
+
+def direct_pnorm_sum():
+    ig = ImageGeometry(256, 256, 128)
+    x = ig.allocate('random', seed=4)
+    Grad = GradientOperator(ig)
+
+    t0 = timer()
+    Grad.direct(x).pnorm(2).sum()
+    t1 = timer()
+    Grad.direct_pnorm_sum(x)
+    t2 = timer()
+    print("TV value {} {:.3f}s, fused {:.3f}s".format(ig.shape, t1 - t0, t2 - t1))
+
+
+def finite_difference():
+    ig = ImageGeometry(256, 256, 128)
+    x = ig.allocate('random', seed=3)
+    out = ig.allocate(0)
+    xa, outa = x.as_array(), out.as_array()
+
+    for method in ['forward', 'centered']:
+        for direction in [0, 2]:
+            FD = FiniteDifferenceOperator(ig, direction=direction, method=method, bnd_cond='Periodic')
+            t0 = timer()
+            FD.direct(x, out=out)
+            t1 = timer()
+
+            # the slicing of the NumPy implementation
+            sl = lambda start, stop: tuple([slice(None)] * direction + [slice(start, stop)])
+            if method == 'forward':
+                numpy.subtract(xa[sl(1, None)], xa[sl(0, -1)], out=outa[sl(0, -1)])
+                numpy.subtract(xa[sl(0, 1)], xa[sl(-1, None)], out=outa[sl(-1, None)])
+            else:
+                numpy.subtract(xa[sl(2, None)], xa[sl(0, -2)], out=outa[sl(1, -1)])
+                outa[sl(1, -1)] /= 2.
+                numpy.subtract(xa[sl(1, 2)], xa[sl(-1, None)], out=outa[sl(0, 1)])
+                outa[sl(0, 1)] /= 2.
+                numpy.subtract(xa[sl(0, 1)], xa[sl(-2, -1)], out=outa[sl(-1, None)])
+                outa[sl(-1, None)] /= 2.
+            t2 = timer()
+            print("FiniteDifference {} direction {}: cilacc {:.4f}s, numpy {:.4f}s".format(method, direction, t1 - t0, t2 - t1))
+
+
+def symmetrised_gradient():
+    ig = ImageGeometry(128, 128, 64)
+    Grad = GradientOperator(ig)
+    E = SymmetrisedGradientOperator(Grad.range_geometry())
+    v = E.domain_geometry().allocate('random', seed=1)
+    w = E.range_geometry().allocate('random', seed=2, symmetry=True)
+    out_direct = E.range_geometry().allocate(0)
+    out_adjoint = E.domain_geometry().allocate(0)
+
+    t0 = timer()
+    E.direct(v, out=out_direct)
+    E.adjoint(w, out=out_adjoint)
+    t1 = timer()
+    # E(v) and its adjoint from loops over FiniteDifferenceOperators
+    n = len(v.containers)
+    FD = [FiniteDifferenceOperator(ig, direction=i, bnd_cond=E.bnd_cond) for i in range(n)]
+    [0.5 * (FD[i].adjoint(v.get_item(j)) + FD[j].adjoint(v.get_item(i))) for i in range(n) for j in range(n)]
+    [sum([FD[j].direct(w.get_item(k * n + j)) for j in range(n)]) for k in range(n)]
+    t2 = timer()
+    print("SymmetrisedGradientOperator {} direct and adjoint {:.3f}s, FiniteDifferenceOperator loops {:.3f}s".format(
+        ig.shape, t1 - t0, t2 - t1))
+
+
+def blurring():
+    ig = ImageGeometry(512, 512)
+    x = ig.allocate('random', seed=3)
+    PSF = numpy.ones((31, 31)) / 31**2
+
+    BOP = BlurringOperator(PSF, ig)
+    BOP_fft = BlurringOperator(PSF, ig, mode='fft')
+
+    t0 = timer()
+    BOP.direct(x)
+    t1 = timer()
+    BOP_fft.direct(x)
+    t2 = timer()
+    print("BlurringOperator 512x512, PSF 31x31: direct {:.3f}s, fft {:.3f}s".format(t1 - t0, t2 - t1))
+
+
+def channelwise():
+    channels = 100
+    B = BlurringOperator(numpy.ones((9, 9)) / 81, ImageGeometry(128, 128))
+    x = ImageGeometry(128, 128, channels=channels).allocate('random', seed=1)
+
+    for num_workers in [1, 4]:
+        C = ChannelwiseOperator(B, channels, num_workers=num_workers)
+        out = C.range_geometry().allocate(None)
+        t0 = timer()
+        C.direct(x, out=out)
+        t1 = timer()
+        print("ChannelwiseOperator BlurringOperator {}x128x128, {} workers: {:.3f}s".format(channels, num_workers, t1 - t0))
+
+
+def block_operator_workers():
+    ig = ImageGeometry(512, 512)
+    x = ig.allocate('random', seed=1)
+    A = BlurringOperator(numpy.ones((15, 15)) / 225, ig, mode='fft')
+    G = GradientOperator(ig)
+
+    for num_workers in [1, 2]:
+        K = BlockOperator(A, G, num_workers=num_workers)
+        y = K.range_geometry().allocate(None)
+        z = K.domain_geometry().allocate(None)
+        K.direct(x, out=y)
+        K.adjoint(y, out=z)
+        t0 = timer()
+        for _ in range(5):
+            K.direct(x, out=y)
+            K.adjoint(y, out=z)
+        t1 = timer()
+        print("BlockOperator([Blurring, Gradient]) 512x512 direct and adjoint, {} workers: {:.4f}s".format(num_workers, (t1 - t0) / 5))
+
+
+# projectors
+
+def projector():
+    ag = AcquisitionGeometry.create_Parallel3D().set_panel([256, 16]).set_angles(numpy.linspace(0, 180, 180, endpoint=False))
+    ig = ag.get_ImageGeometry()
+    A = ProjectionOperator(ig, ag)
+    x = ig.allocate('random', seed=1)
+    y = ag.allocate(None)
+    A.direct(x, out=y)
+
+    N = 3
+    t0 = timer()
+    for _ in range(N):
+        A.direct(x, out=y)
+    t1 = timer()
+    for _ in range(N):
+        A.adjoint(y, out=x)
+    t2 = timer()
+
+    # rays times voxels crossed per second
+    samples = ag.num_projections * ag.pixel_num_v * ag.pixel_num_h * ig.voxel_num_y
+    print("projector forward {:.3f}s, {:.1f} Msamples/s".format((t1 - t0) / N, samples * N / (t1 - t0) / 1e6))
+    print("projector adjoint {:.3f}s, {:.1f} Msamples/s".format((t2 - t1) / N, samples * N / (t2 - t1) / 1e6))
+
+
+def sparse_projector():
+    ag = AcquisitionGeometry.create_Parallel3D().set_panel([256, 16]).set_angles(numpy.linspace(0, 180, 180, endpoint=False))
+    ig = ag.get_ImageGeometry()
+    x = ig.allocate('random', seed=2)
+    y = ag.allocate('random', seed=3)
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        t0 = timer()
+        A = SparseProjectionOperator(ig, ag, cache_dir=cache_dir)
+        t1 = timer()
+        SparseProjectionOperator(ig, ag, cache_dir=cache_dir)
+        t2 = timer()
+    finally:
+        shutil.rmtree(cache_dir)
+    print("SparseProjectionOperator build {:.3f}s, load from cache {:.3f}s, {} non-zeros".format(t1 - t0, t2 - t1, A.matrix.nnz))
+
+    for name, operator in [('ProjectionOperator', ProjectionOperator(ig, ag)), ('SparseProjectionOperator', A)]:
+        t0 = timer()
+        operator.direct(x)
+        t1 = timer()
+        operator.adjoint(y)
+        t2 = timer()
+        print("{} direct {:.3f}s adjoint {:.3f}s".format(name, t1 - t0, t2 - t1))
+
+
+def fdk():
+    from cil.recon.FBP import _FDKBackprojector
+    ag = AcquisitionGeometry.create_Cone3D(source_position=[0, -500, 0], detector_position=[0, 300, 0])\
+        .set_panel([128, 64]).set_angles(numpy.linspace(0, 360, 90, endpoint=False))
+    ig = ag.get_ImageGeometry()
+    data = ag.allocate('random', seed=1)
+    out = ig.allocate(None)
+
+    for slab_size in [0, 8]:
+        backprojector = _FDKBackprojector(ig, ag, slab_size=slab_size)
+        t0 = timer()
+        backprojector.adjoint(data, out=out)
+        t1 = timer()
+        updates = ig.voxel_num_x * ig.voxel_num_y * ig.voxel_num_z * ag.num_projections
+        print("FDK backprojection slab_size {} {:.3f}s, {:.1f} Mupdates/s".format(slab_size, t1 - t0, updates / (t1 - t0) / 1e6))
+
+
+BENCHMARKS = [lazy, reduction, pool, memmap, get_slice, reorder, dispatch, reduced_precision, axpby_complex,
+              contiguous, gradient, direct_pnorm_sum, finite_difference, symmetrised_gradient, blurring,
+              channelwise, block_operator_workers, projector, sparse_projector, fdk]
+
+
+if __name__ == '__main__':
+    names = [benchmark.__name__ for benchmark in BENCHMARKS]
+    parser = argparse.ArgumentParser(description='Timings of CIL, see the docstring of this script')
+    parser.add_argument('names', nargs='*', metavar='name', help='benchmarks to run, default all')
+    parser.add_argument('--list', action='store_true', help='lists the benchmarks')
+    args = parser.parse_args()
+    unknown = set(args.names) - set(names)
+    if unknown:
+        parser.error('unknown benchmarks {}, see --list'.format(', '.join(sorted(unknown))))
+
+    if args.list:
+        print('\n'.join(names))
+    else:
+        for benchmark in BENCHMARKS:
+            if not args.names or benchmark.__name__ in args.names:
+                benchmark()
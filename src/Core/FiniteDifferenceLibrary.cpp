@@ -15,14 +15,15 @@ DLL_EXPORT int openMPtest(int nThreads)
 	return nThreads_running;
 }
 
-int fdiff_direct_neumann(const float *inimagefull, float *outimageXfull, float *outimageYfull, float *outimageZfull, float *outimageCfull, long nx, long ny, long nz, long nc)
+template <typename T>
+int fdiff_direct_neumann(const T *inimagefull, T *outimageXfull, T *outimageYfull, T *outimageZfull, T *outimageCfull, long nx, long ny, long nz, long nc)
 {
 	size_t volume = nx * ny * nz;
 
-	const float *inimage = inimagefull;
-	float *outimageX = outimageXfull;
-	float *outimageY = outimageYfull;
-	float *outimageZ = outimageZfull;
+	const T *inimage = inimagefull;
+	T *outimageX = outimageXfull;
+	T *outimageY = outimageYfull;
+	T *outimageZ = outimageZfull;
 
 	int offset1 = (nz - 1) * nx * ny;	  //ind to beginning of last slice
 	int offset2 = offset1 + (ny - 1) * nx; //ind to beginning of last row
@@ -104,8 +105,8 @@ int fdiff_direct_neumann(const float *inimagefull, float *outimageXfull, float *
 
 		for (c = 0; c < nc - 1; c++)
 		{
-			float *outimageC = outimageCfull + c * volume;
-			const float *inimage = inimagefull + c * volume;
+			T *outimageC = outimageCfull + c * volume;
+			const T *inimage = inimagefull + c * volume;
 
 #pragma omp parallel for
 			for (ind = 0; ind < volume; ind++)
@@ -123,14 +124,15 @@ int fdiff_direct_neumann(const float *inimagefull, float *outimageXfull, float *
 
 	return 0;
 }
-int fdiff_direct_periodic(const float *inimagefull, float *outimageXfull, float *outimageYfull, float *outimageZfull, float *outimageCfull, long nx, long ny, long nz, long nc)
+template <typename T>
+int fdiff_direct_periodic(const T *inimagefull, T *outimageXfull, T *outimageYfull, T *outimageZfull, T *outimageCfull, long nx, long ny, long nz, long nc)
 {
 	size_t volume = nx * ny * nz;
 
-	const float *inimage = inimagefull;
-	float *outimageX = outimageXfull;
-	float *outimageY = outimageYfull;
-	float *outimageZ = outimageZfull;
+	const T *inimage = inimagefull;
+	T *outimageX = outimageXfull;
+	T *outimageY = outimageYfull;
+	T *outimageZ = outimageZfull;
 
 	int offset1 = (nz - 1) * nx * ny;	  //ind to beginning of last slice
 	int offset2 = offset1 + (ny - 1) * nx; //ind to beginning of last row
@@ -219,8 +221,8 @@ int fdiff_direct_periodic(const float *inimagefull, float *outimageXfull, float
 
 		for (c = 0; c < nc - 1; c++)
 		{
-			float *outimageC = outimageCfull + c * volume;
-			const float *inimage = inimagefull + c * volume;
+			T *outimageC = outimageCfull + c * volume;
+			const T *inimage = inimagefull + c * volume;
 
 #pragma omp parallel for
 			for (ind = 0; ind < volume; ind++)
@@ -238,7 +240,8 @@ int fdiff_direct_periodic(const float *inimagefull, float *outimageXfull, float
 
 	return 0;
 }
-int fdiff_adjoint_neumann(float *outimagefull, const float *inimageXfull, const float *inimageYfull, const float *inimageZfull, const float *inimageCfull, long nx, long ny, long nz, long nc)
+template <typename T>
+int fdiff_adjoint_neumann(T *outimagefull, const T *inimageXfull, const T *inimageYfull, const T *inimageZfull, const T *inimageCfull, long nx, long ny, long nz, long nc)
 {
 	//runs over full data in x, y, z. then corrects elements for bounday conditions and sums
 	size_t volume = nx * ny * nz;
@@ -246,10 +249,10 @@ int fdiff_adjoint_neumann(float *outimagefull, const float *inimageXfull, const
 	//assumes nx and ny > 1
 	int z_dim = nz - 1;
 
-	float *outimage = outimagefull;
-	const float *inimageX = inimageXfull;
-	const float *inimageY = inimageYfull;
-	const float *inimageZ = inimageZfull;
+	T *outimage = outimagefull;
+	const T *inimageX = inimageXfull;
+	const T *inimageY = inimageYfull;
+	const T *inimageZ = inimageZfull;
 
 	float *tempX = (float *)malloc(volume * sizeof(float));
 	float *tempY = (float *)malloc(volume * sizeof(float));
@@ -363,7 +366,8 @@ int fdiff_adjoint_neumann(float *outimagefull, const float *inimageXfull, const
 
 	return 0;
 }
-int fdiff_adjoint_periodic(float *outimagefull, const float *inimageXfull, const float *inimageYfull, const float *inimageZfull, const float *inimageCfull, long nx, long ny, long nz, long nc)
+template <typename T>
+int fdiff_adjoint_periodic(T *outimagefull, const T *inimageXfull, const T *inimageYfull, const T *inimageZfull, const T *inimageCfull, long nx, long ny, long nz, long nc)
 {
 	//runs over full data in x, y, z. then correctects elements for bounday conditions and sums
 	size_t volume = nx * ny * nz;
@@ -371,10 +375,10 @@ int fdiff_adjoint_periodic(float *outimagefull, const float *inimageXfull, const
 	//assumes nx and ny > 1
 	int z_dim = nz - 1;
 
-	float *outimage = outimagefull;
-	const float *inimageX = inimageXfull;
-	const float *inimageY = inimageYfull;
-	const float *inimageZ = inimageZfull;
+	T *outimage = outimagefull;
+	const T *inimageX = inimageXfull;
+	const T *inimageY = inimageYfull;
+	const T *inimageZ = inimageZfull;
 
 	float *tempX = (float *)malloc(volume * sizeof(float));
 	float *tempY = (float *)malloc(volume * sizeof(float));
@@ -488,7 +492,8 @@ int fdiff_adjoint_periodic(float *outimagefull, const float *inimageXfull, const
 	return 0;
 }
 
-DLL_EXPORT int fdiff4D(float *imagefull, float *gradCfull, float *gradZfull, float *gradYfull, float *gradXfull, long nc, long nz, long ny, long nx, int boundary, int direction, int nThreads)
+template <typename T>
+int fdiff(T *imagefull, T *gradXfull, T *gradYfull, T *gradZfull, T *gradCfull, long nx, long ny, long nz, long nc, int boundary, int direction, int nThreads)
 {
 	int nThreads_initial;
 	threads_setup(nThreads, &nThreads_initial);
@@ -511,50 +516,430 @@ DLL_EXPORT int fdiff4D(float *imagefull, float *gradCfull, float *gradZfull, flo
 	omp_set_num_threads(nThreads_initial);
 	return 0;
 }
+
+DLL_EXPORT int fdiff4D(float *imagefull, float *gradCfull, float *gradZfull, float *gradYfull, float *gradXfull, long nc, long nz, long ny, long nx, int boundary, int direction, int nThreads)
+{
+	return fdiff(imagefull, gradXfull, gradYfull, gradZfull, gradCfull, nx, ny, nz, nc, boundary, direction, nThreads);
+}
 DLL_EXPORT int fdiff3D(float *imagefull, float *gradZfull, float *gradYfull, float *gradXfull, long nz, long ny, long nx, int boundary, int direction, int nThreads)
 {
+	return fdiff(imagefull, gradXfull, gradYfull, gradZfull, (float *)NULL, nx, ny, nz, 1, boundary, direction, nThreads);
+}
+DLL_EXPORT int fdiff2D(float *imagefull, float *gradYfull, float *gradXfull, long ny, long nx, int boundary, int direction, int nThreads)
+{
+	return fdiff(imagefull, gradXfull, gradYfull, (float *)NULL, (float *)NULL, nx, ny, 1, 1, boundary, direction, nThreads);
+}
+
+// half precision storage, computed in float
+DLL_EXPORT int hfdiff4D(uint16_t *imagefull, uint16_t *gradCfull, uint16_t *gradZfull, uint16_t *gradYfull, uint16_t *gradXfull, long nc, long nz, long ny, long nx, int boundary, int direction, int nThreads)
+{
+	return fdiff((half *)imagefull, (half *)gradXfull, (half *)gradYfull, (half *)gradZfull, (half *)gradCfull, nx, ny, nz, nc, boundary, direction, nThreads);
+}
+DLL_EXPORT int hfdiff3D(uint16_t *imagefull, uint16_t *gradZfull, uint16_t *gradYfull, uint16_t *gradXfull, long nz, long ny, long nx, int boundary, int direction, int nThreads)
+{
+	return fdiff((half *)imagefull, (half *)gradXfull, (half *)gradYfull, (half *)gradZfull, (half *)NULL, nx, ny, nz, 1, boundary, direction, nThreads);
+}
+DLL_EXPORT int hfdiff2D(uint16_t *imagefull, uint16_t *gradYfull, uint16_t *gradXfull, long ny, long nx, int boundary, int direction, int nThreads)
+{
+	return fdiff((half *)imagefull, (half *)gradXfull, (half *)gradYfull, (half *)NULL, (half *)NULL, nx, ny, 1, 1, boundary, direction, nThreads);
+}
+
+// bfloat16 storage, computed in float
+DLL_EXPORT int bfdiff4D(uint16_t *imagefull, uint16_t *gradCfull, uint16_t *gradZfull, uint16_t *gradYfull, uint16_t *gradXfull, long nc, long nz, long ny, long nx, int boundary, int direction, int nThreads)
+{
+	return fdiff((bfloat16 *)imagefull, (bfloat16 *)gradXfull, (bfloat16 *)gradYfull, (bfloat16 *)gradZfull, (bfloat16 *)gradCfull, nx, ny, nz, nc, boundary, direction, nThreads);
+}
+DLL_EXPORT int bfdiff3D(uint16_t *imagefull, uint16_t *gradZfull, uint16_t *gradYfull, uint16_t *gradXfull, long nz, long ny, long nx, int boundary, int direction, int nThreads)
+{
+	return fdiff((bfloat16 *)imagefull, (bfloat16 *)gradXfull, (bfloat16 *)gradYfull, (bfloat16 *)gradZfull, (bfloat16 *)NULL, nx, ny, nz, 1, boundary, direction, nThreads);
+}
+DLL_EXPORT int bfdiff2D(uint16_t *imagefull, uint16_t *gradYfull, uint16_t *gradXfull, long ny, long nx, int boundary, int direction, int nThreads)
+{
+	return fdiff((bfloat16 *)imagefull, (bfloat16 *)gradXfull, (bfloat16 *)gradYfull, (bfloat16 *)NULL, (bfloat16 *)NULL, nx, ny, 1, 1, boundary, direction, nThreads);
+}
+
+template <typename T>
+int fdiff_norm_sum(const T *imagefull, const float *inverse_voxel_size, long nc, long nz, long ny, long nx, int boundary, int isotropic, double *result, int nThreads)
+{
+	// sum over the voxels of the 2-norm (isotropic) or 1-norm (anisotropic) of the forward differences,
+	// without storing the differences. Dimensions of size 1 have zero differences.
 	int nThreads_initial;
 	threads_setup(nThreads, &nThreads_initial);
 
-	if (boundary)
+	const float ic = inverse_voxel_size[0];
+	const float iz = inverse_voxel_size[1];
+	const float iy = inverse_voxel_size[2];
+	const float ix = inverse_voxel_size[3];
+
+	const long sx = 1;
+	const long sy = nx;
+	const long sz = nx * ny;
+	const long sc = nx * ny * nz;
+
+	double sum = 0.0;
+
+#pragma omp parallel for collapse(3) reduction(+:sum)
+	for (long c = 0; c < nc; c++)
 	{
-		if (direction)
-			fdiff_direct_periodic(imagefull, gradXfull, gradYfull, gradZfull, NULL, nx, ny, nz, 1);
-		else
-			fdiff_adjoint_periodic(imagefull, gradXfull, gradYfull, gradZfull, NULL, nx, ny, nz, 1);
+		for (long k = 0; k < nz; k++)
+		{
+			for (long j = 0; j < ny; j++)
+			{
+				const T *row = imagefull + c * sc + k * sz + j * sy;
+
+				// offsets of the next row, slice and channel, 0 at a Neumann boundary
+				long oy = j < ny - 1 ? sy : (boundary ? -(ny - 1) * sy : 0);
+				long oz = k < nz - 1 ? sz : (boundary ? -(nz - 1) * sz : 0);
+				long oc = c < nc - 1 ? sc : (boundary ? -(nc - 1) * sc : 0);
+
+				double row_sum = 0.0;
+				for (long i = 0; i < nx; i++)
+				{
+					long ox = i < nx - 1 ? sx : (boundary ? -(nx - 1) * sx : 0);
+					float pix0 = (float)row[i];
+					float gx = ((float)row[i + ox] - pix0) * ix;
+					float gy = ((float)row[i + oy] - pix0) * iy;
+					float gz = ((float)row[i + oz] - pix0) * iz;
+					float gc = ((float)row[i + oc] - pix0) * ic;
+
+					if (isotropic)
+						row_sum += sqrtf(gx * gx + gy * gy + gz * gz + gc * gc);
+					else
+						row_sum += fabsf(gx) + fabsf(gy) + fabsf(gz) + fabsf(gc);
+				}
+				sum += row_sum;
+			}
+		}
+	}
+
+	*result = sum;
+
+	omp_set_num_threads(nThreads_initial);
+	return 0;
+}
+
+DLL_EXPORT int fdiff_norm_sum4D(float *imagefull, float *inverse_voxel_size, long nc, long nz, long ny, long nx, int boundary, int isotropic, double *result, int nThreads)
+{
+	return fdiff_norm_sum(imagefull, inverse_voxel_size, nc, nz, ny, nx, boundary, isotropic, result, nThreads);
+}
+DLL_EXPORT int hfdiff_norm_sum4D(uint16_t *imagefull, float *inverse_voxel_size, long nc, long nz, long ny, long nx, int boundary, int isotropic, double *result, int nThreads)
+{
+	return fdiff_norm_sum((half *)imagefull, inverse_voxel_size, nc, nz, ny, nx, boundary, isotropic, result, nThreads);
+}
+DLL_EXPORT int bfdiff_norm_sum4D(uint16_t *imagefull, float *inverse_voxel_size, long nc, long nz, long ny, long nx, int boundary, int isotropic, double *result, int nThreads)
+{
+	return fdiff_norm_sum((bfloat16 *)imagefull, inverse_voxel_size, nc, nz, ny, nx, boundary, isotropic, result, nThreads);
+}
+
+template <typename T>
+static void fdiff_stencil(long p, long n, int method, int boundary, int adjoint, T *coefficients, long *offsets)
+{
+	// the value at position p along the direction is
+	// coefficients[0] * x[p + offsets[0]] + coefficients[1] * x[p] + coefficients[2] * x[p + offsets[2]]
+	// as in FiniteDifferenceOperator, the adjoint is returned without its sign
+	T cm = 0, c0 = 0, cp = 0;
+	long om = -1, op = 1;
+	bool first = p == 0;
+	bool last = p == n - 1;
+
+	if (n < 2)
+	{
+	}
+	else if ((method == 0 && !adjoint) || (method == 1 && adjoint))
+	{
+		// x[p + 1] - x[p]
+		if (!last)
+		{
+			c0 = -1;
+			cp = 1;
+		}
+		else if (boundary)
+		{
+			c0 = -1;
+			cp = 1;
+			op = -(n - 1);
+		}
+		else if (adjoint)
+		{
+			c0 = -1;
+		}
+		if (adjoint && first && !boundary)
+		{
+			c0 = 0;
+		}
+	}
+	else if ((method == 1 && !adjoint) || (method == 0 && adjoint))
+	{
+		// x[p] - x[p - 1]
+		if (!first)
+		{
+			cm = -1;
+			c0 = 1;
+		}
+		else if (boundary)
+		{
+			cm = -1;
+			c0 = 1;
+			om = n - 1;
+		}
+		else if (adjoint)
+		{
+			c0 = 1;
+		}
+		if (adjoint && last && !boundary)
+		{
+			c0 = 0;
+		}
 	}
 	else
 	{
-		if (direction)
-			fdiff_direct_neumann(imagefull, gradXfull, gradYfull, gradZfull, NULL, nx, ny, nz, 1);
-		else
-			fdiff_adjoint_neumann(imagefull, gradXfull, gradYfull, gradZfull, NULL, nx, ny, nz, 1);
+		// (x[p + 1] - x[p - 1]) / 2
+		cm = -0.5;
+		cp = 0.5;
+		if (boundary)
+		{
+			if (first)
+				om = n - 1;
+			if (last)
+				op = -(n - 1);
+		}
+		else if (first)
+		{
+			cm = 0;
+			c0 = adjoint ? 0.5 : -0.5;
+		}
+		else if (last)
+		{
+			cp = 0;
+			c0 = adjoint ? -0.5 : 0.5;
+		}
 	}
 
-	omp_set_num_threads(nThreads_initial);
-	return 0;
+	// unused neighbours point to x[p], so that no value outside of the data is read
+	coefficients[0] = cm;
+	coefficients[1] = c0;
+	coefficients[2] = cp;
+	offsets[0] = cm == 0 ? 0 : om;
+	offsets[2] = cp == 0 ? 0 : op;
 }
-DLL_EXPORT int fdiff2D(float *imagefull, float *gradYfull, float *gradXfull, long ny, long nx, int boundary, int direction, int nThreads)
+
+template <typename T>
+int fdiff_axis(const T *in, T *out, long outer, long n, long inner, int method, int boundary, int adjoint, T voxel_size, int accumulate, int nThreads)
 {
+	// finite differences along the middle dimension of data shaped (outer, n, inner)
 	int nThreads_initial;
 	threads_setup(nThreads, &nThreads_initial);
 
-	if (boundary)
+	T scale = (adjoint ? -1 : 1) / voxel_size;
+
+	T interior[3];
+	long interior_offsets[3];
+	fdiff_stencil(1L, 3L, method, boundary, adjoint, interior, interior_offsets);
+	const T cm = interior[0] * scale, c0 = interior[1] * scale, cp = interior[2] * scale;
+
+	if (inner == 1)
 	{
-		if (direction)
-			fdiff_direct_periodic(imagefull, gradXfull, gradYfull, NULL, NULL, nx, ny, 1, 1);
-		else
-			fdiff_adjoint_periodic(imagefull, gradXfull, gradYfull, NULL, NULL, nx, ny, 1, 1);
+#pragma omp parallel for
+		for (long o = 0; o < outer; o++)
+		{
+			const T *line = in + o * n;
+			T *line_out = out + o * n;
+
+			for (long p = 0; p < n; p += (n > 1 ? n - 1 : 1))
+			{
+				T c[3];
+				long off[3];
+				fdiff_stencil(p, n, method, boundary, adjoint, c, off);
+				T val = n < 2 ? 0 : scale * (c[0] * line[p + off[0]] + c[1] * line[p] + c[2] * line[p + off[2]]);
+				line_out[p] = accumulate ? line_out[p] + val : val;
+			}
+
+			if (accumulate)
+			{
+				for (long p = 1; p < n - 1; p++)
+					line_out[p] += cm * line[p - 1] + c0 * line[p] + cp * line[p + 1];
+			}
+			else
+			{
+				for (long p = 1; p < n - 1; p++)
+					line_out[p] = cm * line[p - 1] + c0 * line[p] + cp * line[p + 1];
+			}
+		}
 	}
 	else
 	{
-		if (direction)
-			fdiff_direct_neumann(imagefull, gradXfull, gradYfull, NULL, NULL, nx, ny, 1, 1);
-		else
-			fdiff_adjoint_neumann(imagefull, gradXfull, gradYfull, NULL, NULL, nx, ny, 1, 1);
+#pragma omp parallel for collapse(2)
+		for (long o = 0; o < outer; o++)
+		{
+			for (long p = 0; p < n; p++)
+			{
+				T c[3];
+				long off[3];
+				if (p == 0 || p == n - 1)
+				{
+					fdiff_stencil(p, n, method, boundary, adjoint, c, off);
+					c[0] *= scale;
+					c[1] *= scale;
+					c[2] *= scale;
+				}
+				else
+				{
+					c[0] = cm;
+					c[1] = c0;
+					c[2] = cp;
+					off[0] = -1;
+					off[2] = 1;
+				}
+				if (n < 2)
+				{
+					c[0] = c[1] = c[2] = 0;
+					off[0] = off[2] = 0;
+				}
+
+				const T *xm = in + (o * n + p + off[0]) * inner;
+				const T *x0 = in + (o * n + p) * inner;
+				const T *xp = in + (o * n + p + off[2]) * inner;
+				T *y = out + (o * n + p) * inner;
+
+				if (accumulate)
+				{
+					for (long i = 0; i < inner; i++)
+						y[i] += c[0] * xm[i] + c[1] * x0[i] + c[2] * xp[i];
+				}
+				else
+				{
+					for (long i = 0; i < inner; i++)
+						y[i] = c[0] * xm[i] + c[1] * x0[i] + c[2] * xp[i];
+				}
+			}
+		}
+	}
+
+	omp_set_num_threads(nThreads_initial);
+	return 0;
+}
+
+DLL_EXPORT int fdiff_direction(const float *in, float *out, long outer, long n, long inner, int method, int boundary, int adjoint, float voxel_size, int accumulate, int nThreads)
+{
+	return fdiff_axis(in, out, outer, n, inner, method, boundary, adjoint, voxel_size, accumulate, nThreads);
+}
+DLL_EXPORT int dfdiff_direction(const double *in, double *out, long outer, long n, long inner, int method, int boundary, int adjoint, double voxel_size, int accumulate, int nThreads)
+{
+	return fdiff_axis(in, out, outer, n, inner, method, boundary, adjoint, voxel_size, accumulate, nThreads);
+}
+
+template <typename T, int N>
+int symmetrised_gradient(T **vector_field, T **tensor_field, const long *data_shape, int ndim, int boundary, T voxel_size, int direction, int nThreads)
+{
+	// symmetrised gradient of the N components of vector_field, with ndim dimensions, along their first N dimensions,
+	// into the N * N components of tensor_field (direction = 1), or its adjoint (direction = 0).
+	// Component (i, j) of the tensor is 0.5 * (D_i^T v_j + D_j^T v_i) for the forward differences D,
+	// the adjoint is computed for symmetric tensors as sum_j D_j w_(k, j) for component k.
+	int nThreads_initial;
+	threads_setup(nThreads, &nThreads_initial);
+
+	// the data are processed as 4D, padded with leading dimensions of size 1
+	const int first_axis = 4 - ndim;
+	long shape[4] = {1, 1, 1, 1};
+	for (int a = 0; a < ndim; a++)
+		shape[first_axis + a] = data_shape[a];
+
+	const long n0 = shape[0], n1 = shape[1], n2 = shape[2], n3 = shape[3];
+	const long strides[4] = {n1 * n2 * n3, n2 * n3, n3, 1};
+	const T scale = 1 / voxel_size;
+
+#pragma omp parallel for collapse(3)
+	for (long a0 = 0; a0 < n0; a0++)
+	{
+		for (long a1 = 0; a1 < n1; a1++)
+		{
+			for (long a2 = 0; a2 < n2; a2++)
+			{
+				for (long a3 = 0; a3 < n3; a3++)
+				{
+					const long position[4] = {a0, a1, a2, a3};
+					const long ind = a0 * strides[0] + a1 * strides[1] + a2 * strides[2] + a3;
+
+					if (direction)
+					{
+						// D_d^T v = -(v[p] - v[p - 1]) / h with the boundary conditions of FiniteDifferenceOperator
+						T dv[N][N];
+						for (int d = 0; d < N; d++)
+						{
+							const int axis = first_axis + d;
+							const long p = position[axis], n = shape[axis], s = strides[axis];
+							const bool has_centre = p < n - 1 || boundary;
+							const bool has_previous = p > 0 || boundary;
+							const long previous = p > 0 ? -s : (n - 1) * s;
+							for (int j = 0; j < N; j++)
+							{
+								T val = has_centre ? vector_field[j][ind] : 0;
+								if (has_previous)
+									val -= vector_field[j][ind + previous];
+								dv[d][j] = -scale * val;
+							}
+						}
+						for (int i = 0; i < N; i++)
+						{
+							tensor_field[i * N + i][ind] = dv[i][i];
+							for (int j = i + 1; j < N; j++)
+							{
+								T val = (T)0.5 * (dv[i][j] + dv[j][i]);
+								tensor_field[i * N + j][ind] = val;
+								tensor_field[j * N + i][ind] = val;
+							}
+						}
+					}
+					else
+					{
+						// D_d w = (w[p + 1] - w[p]) / h, 0 at the last voxel with Neumann boundaries
+						long next[N];
+						bool has_next[N];
+						for (int d = 0; d < N; d++)
+						{
+							const int axis = first_axis + d;
+							const long p = position[axis], n = shape[axis], s = strides[axis];
+							has_next[d] = p < n - 1 || boundary;
+							next[d] = p < n - 1 ? s : -(n - 1) * s;
+						}
+						for (int k = 0; k < N; k++)
+						{
+							T val = 0;
+							for (int j = 0; j < N; j++)
+							{
+								const T *w = tensor_field[k * N + j];
+								if (has_next[j])
+									val += w[ind + next[j]] - w[ind];
+							}
+							vector_field[k][ind] = scale * val;
+						}
+					}
+				}
+			}
+		}
 	}
 
 	omp_set_num_threads(nThreads_initial);
 	return 0;
 }
 
+template <typename T>
+int fdiff_symmetrised_dispatch(T **vector_field, T **tensor_field, const long *shape, int ndim, int num_components, int boundary, T voxel_size, int direction, int nThreads)
+{
+	if (ndim < num_components || ndim > 4)
+		return 1;
+	if (num_components == 2)
+		return symmetrised_gradient<T, 2>(vector_field, tensor_field, shape, ndim, boundary, voxel_size, direction, nThreads);
+	else if (num_components == 3)
+		return symmetrised_gradient<T, 3>(vector_field, tensor_field, shape, ndim, boundary, voxel_size, direction, nThreads);
+	return 1;
+}
+
+DLL_EXPORT int fdiff_symmetrised(float **vector_field, float **tensor_field, long *shape, int ndim, int num_components, int boundary, float voxel_size, int direction, int nThreads)
+{
+	return fdiff_symmetrised_dispatch(vector_field, tensor_field, shape, ndim, num_components, boundary, voxel_size, direction, nThreads);
+}
+DLL_EXPORT int dfdiff_symmetrised(double **vector_field, double **tensor_field, long *shape, int ndim, int num_components, int boundary, double voxel_size, int direction, int nThreads)
+{
+	return fdiff_symmetrised_dispatch(vector_field, tensor_field, shape, ndim, num_components, boundary, voxel_size, direction, nThreads);
+}
@@ -130,4 +130,180 @@ DLL_EXPORT int daxpby(const double * x, const double * y, double * out, const do
 	omp_set_num_threads(nThreads_initial);
 
 	return 0;
-}
\ No newline at end of file
+}
+
+// reduced precision storage and integer data: x and y are read in the type TI,
+// a and b and the arithmetic are float, the result is written in the type TO
+template <typename TI, typename TO>
+int axpby_widen_asbs(const TI * x, const TI * y, TO * out, float a, float b, int64 size)
+{
+	int64 i = 0;
+#pragma omp parallel
+	{
+#pragma omp for
+		for (i = 0; i < size; i++)
+		{
+			*(out + i) = a * (float)*(x + i) + b * (float)*(y + i);
+		}
+	}
+	return 0;
+}
+template <typename TI, typename TO>
+int axpby_widen_avbv(const TI * x, const TI * y, TO * out, const float * a, const float * b, int64 size)
+{
+	int64 i = 0;
+#pragma omp parallel
+	{
+#pragma omp for
+		for (i = 0; i < size; i++)
+		{
+			*(out + i) = *(a + i) * (float)*(x + i) + *(b + i) * (float)*(y + i);
+		}
+	}
+	return 0;
+}
+template <typename TI, typename TO>
+int axpby_widen_asbv(const TI * x, const TI * y, TO * out, float a, const float * b, int64 size)
+{
+	int64 i = 0;
+#pragma omp parallel
+	{
+#pragma omp for
+		for (i = 0; i < size; i++)
+		{
+			*(out + i) = a * (float)*(x + i) + *(b + i) * (float)*(y + i);
+		}
+	}
+	return 0;
+}
+template <typename TI, typename TO>
+int axpby_widen(const TI * x, const TI * y, TO * out, const float * a, int a_type, const float * b, int b_type, int64 size, int nThreads)
+{
+	//type = 0 float
+	//type = 1 array of floats
+
+	int nThreads_initial;
+	threads_setup(nThreads, &nThreads_initial);
+
+	if (a_type == 0 && b_type == 0)
+		axpby_widen_asbs(x, y, out, *a, *b, size);
+	else if (a_type == 1 && b_type == 1)
+		axpby_widen_avbv(x, y, out, a, b, size);
+	else if (a_type == 0 && b_type == 1)
+		axpby_widen_asbv(x, y, out, *a, b, size);
+	else if (a_type == 1 && b_type == 0)
+		axpby_widen_asbv(y, x, out, *b, a, size);
+
+	omp_set_num_threads(nThreads_initial);
+
+	return 0;
+}
+DLL_EXPORT int haxpby(const uint16_t * x, const uint16_t * y, uint16_t * out, const float *a, int a_type, const float* b, int b_type, int64 size, int nThreads)
+{
+	return axpby_widen((const half *)x, (const half *)y, (half *)out, a, a_type, b, b_type, size, nThreads);
+}
+DLL_EXPORT int baxpby(const uint16_t * x, const uint16_t * y, uint16_t * out, const float *a, int a_type, const float* b, int b_type, int64 size, int nThreads)
+{
+	return axpby_widen((const bfloat16 *)x, (const bfloat16 *)y, (bfloat16 *)out, a, a_type, b, b_type, size, nThreads);
+}
+DLL_EXPORT int saxpby_uint8(const uint8_t * x, const uint8_t * y, float * out, const float *a, int a_type, const float* b, int b_type, int64 size, int nThreads)
+{
+	return axpby_widen(x, y, out, a, a_type, b, b_type, size, nThreads);
+}
+DLL_EXPORT int saxpby_int16(const int16_t * x, const int16_t * y, float * out, const float *a, int a_type, const float* b, int b_type, int64 size, int nThreads)
+{
+	return axpby_widen(x, y, out, a, a_type, b, b_type, size, nThreads);
+}
+DLL_EXPORT int saxpby_uint16(const uint16_t * x, const uint16_t * y, float * out, const float *a, int a_type, const float* b, int b_type, int64 size, int nThreads)
+{
+	return axpby_widen(x, y, out, a, a_type, b, b_type, size, nThreads);
+}
+DLL_EXPORT int saxpby_int32(const int32_t * x, const int32_t * y, float * out, const float *a, int a_type, const float* b, int b_type, int64 size, int nThreads)
+{
+	return axpby_widen(x, y, out, a, a_type, b, b_type, size, nThreads);
+}
+
+// complex data are interleaved real and imaginary parts of type T, the products
+// are expanded rather than using std::complex, which checks for inf and nan
+template <typename T>
+int axpby_complex_asbs(const T * x, const T * y, T * out, const T * a, const T * b, int64 size)
+{
+	int64 i = 0;
+	T ar = a[0], ai = a[1], br = b[0], bi = b[1];
+#pragma omp parallel
+	{
+#pragma omp for
+		for (i = 0; i < size; i++)
+		{
+			T xr = x[2 * i], xi = x[2 * i + 1], yr = y[2 * i], yi = y[2 * i + 1];
+			out[2 * i] = ar * xr - ai * xi + br * yr - bi * yi;
+			out[2 * i + 1] = ar * xi + ai * xr + br * yi + bi * yr;
+		}
+	}
+	return 0;
+}
+template <typename T>
+int axpby_complex_avbv(const T * x, const T * y, T * out, const T * a, const T * b, int64 size)
+{
+	int64 i = 0;
+#pragma omp parallel
+	{
+#pragma omp for
+		for (i = 0; i < size; i++)
+		{
+			T ar = a[2 * i], ai = a[2 * i + 1], br = b[2 * i], bi = b[2 * i + 1];
+			T xr = x[2 * i], xi = x[2 * i + 1], yr = y[2 * i], yi = y[2 * i + 1];
+			out[2 * i] = ar * xr - ai * xi + br * yr - bi * yi;
+			out[2 * i + 1] = ar * xi + ai * xr + br * yi + bi * yr;
+		}
+	}
+	return 0;
+}
+template <typename T>
+int axpby_complex_asbv(const T * x, const T * y, T * out, const T * a, const T * b, int64 size)
+{
+	int64 i = 0;
+	T ar = a[0], ai = a[1];
+#pragma omp parallel
+	{
+#pragma omp for
+		for (i = 0; i < size; i++)
+		{
+			T br = b[2 * i], bi = b[2 * i + 1];
+			T xr = x[2 * i], xi = x[2 * i + 1], yr = y[2 * i], yi = y[2 * i + 1];
+			out[2 * i] = ar * xr - ai * xi + br * yr - bi * yi;
+			out[2 * i + 1] = ar * xi + ai * xr + br * yi + bi * yr;
+		}
+	}
+	return 0;
+}
+template <typename T>
+int axpby_complex(const T * x, const T * y, T * out, const T * a, int a_type, const T * b, int b_type, int64 size, int nThreads)
+{
+	//type = 0 complex
+	//type = 1 array of complex
+
+	int nThreads_initial;
+	threads_setup(nThreads, &nThreads_initial);
+
+	if (a_type == 0 && b_type == 0)
+		axpby_complex_asbs(x, y, out, a, b, size);
+	else if (a_type == 1 && b_type == 1)
+		axpby_complex_avbv(x, y, out, a, b, size);
+	else if (a_type == 0 && b_type == 1)
+		axpby_complex_asbv(x, y, out, a, b, size);
+	else if (a_type == 1 && b_type == 0)
+		axpby_complex_asbv(y, x, out, b, a, size);
+
+	omp_set_num_threads(nThreads_initial);
+
+	return 0;
+}
+DLL_EXPORT int caxpby(const float * x, const float * y, float * out, const float *a, int a_type, const float* b, int b_type, int64 size, int nThreads)
+{
+	return axpby_complex(x, y, out, a, a_type, b, b_type, size, nThreads);
+}
+DLL_EXPORT int zaxpby(const double * x, const double * y, double * out, const double *a, int a_type, const double* b, int b_type, int64 size, int nThreads)
+{
+	return axpby_complex(x, y, out, a, a_type, b, b_type, size, nThreads);
+}
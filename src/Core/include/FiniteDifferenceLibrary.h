@@ -4,11 +4,22 @@
 #include "omp.h"
 #include "dll_export.h"
 #include "utilities.h"
+#include "half.h"
 
-int fdiff_direct_neumann(const float *inimagefull, float *outimageXfull, float *outimageYfull, float *outimageZfull, float *outimageCfull, long nx, long ny, long nz, long nc);
-int fdiff_direct_periodic(const float *inimagefull, float *outimageXfull, float *outimageYfull, float *outimageZfull, float *outimageCfull, long nx, long ny, long nz, long nc);
-int fdiff_adjoint_neumann(float *outimagefull, const float *inimageXfull, const float *inimageYfull, const float *inimageZfull, const float *inimageCfull, long nx, long ny, long nz, long nc);
-int fdiff_adjoint_periodic(float *outimagefull, const float *inimageXfull, const float *inimageYfull, const float *inimageZfull, const float *inimageCfull, long nx, long ny, long nz, long nc);
+template <typename T>
+int fdiff_direct_neumann(const T *inimagefull, T *outimageXfull, T *outimageYfull, T *outimageZfull, T *outimageCfull, long nx, long ny, long nz, long nc);
+template <typename T>
+int fdiff_direct_periodic(const T *inimagefull, T *outimageXfull, T *outimageYfull, T *outimageZfull, T *outimageCfull, long nx, long ny, long nz, long nc);
+template <typename T>
+int fdiff_adjoint_neumann(T *outimagefull, const T *inimageXfull, const T *inimageYfull, const T *inimageZfull, const T *inimageCfull, long nx, long ny, long nz, long nc);
+template <typename T>
+int fdiff_adjoint_periodic(T *outimagefull, const T *inimageXfull, const T *inimageYfull, const T *inimageZfull, const T *inimageCfull, long nx, long ny, long nz, long nc);
+template <typename T>
+int fdiff_axis(const T *in, T *out, long outer, long n, long inner, int method, int boundary, int adjoint, T voxel_size, int accumulate, int nThreads);
+template <typename T, int N>
+int symmetrised_gradient(T **vector_field, T **tensor_field, const long *data_shape, int ndim, int boundary, T voxel_size, int direction, int nThreads);
+template <typename T>
+int fdiff_norm_sum(const T *imagefull, const float *inverse_voxel_size, long nc, long nz, long ny, long nx, int boundary, int isotropic, double *result, int nThreads);
 
 #ifdef __cplusplus
 extern "C" {
@@ -18,6 +29,19 @@ DLL_EXPORT int openMPtest(int nThreads);
 DLL_EXPORT int fdiff4D(float *imagefull, float *gradCfull, float *gradZfull, float *gradYfull, float *gradXfull, long nc, long nz, long ny, long nx, int boundary, int direction, int nThreads);
 DLL_EXPORT int fdiff3D(float *imagefull, float *gradZfull, float *gradYfull, float *gradXfull, long nz, long ny, long nx, int boundary, int direction, int nThreads);
 DLL_EXPORT int fdiff2D(float *imagefull, float *gradYfull, float *gradXfull, long ny, long nx, int boundary, int direction, int nThreads);
+DLL_EXPORT int hfdiff4D(uint16_t *imagefull, uint16_t *gradCfull, uint16_t *gradZfull, uint16_t *gradYfull, uint16_t *gradXfull, long nc, long nz, long ny, long nx, int boundary, int direction, int nThreads);
+DLL_EXPORT int hfdiff3D(uint16_t *imagefull, uint16_t *gradZfull, uint16_t *gradYfull, uint16_t *gradXfull, long nz, long ny, long nx, int boundary, int direction, int nThreads);
+DLL_EXPORT int hfdiff2D(uint16_t *imagefull, uint16_t *gradYfull, uint16_t *gradXfull, long ny, long nx, int boundary, int direction, int nThreads);
+DLL_EXPORT int bfdiff4D(uint16_t *imagefull, uint16_t *gradCfull, uint16_t *gradZfull, uint16_t *gradYfull, uint16_t *gradXfull, long nc, long nz, long ny, long nx, int boundary, int direction, int nThreads);
+DLL_EXPORT int bfdiff3D(uint16_t *imagefull, uint16_t *gradZfull, uint16_t *gradYfull, uint16_t *gradXfull, long nz, long ny, long nx, int boundary, int direction, int nThreads);
+DLL_EXPORT int bfdiff2D(uint16_t *imagefull, uint16_t *gradYfull, uint16_t *gradXfull, long ny, long nx, int boundary, int direction, int nThreads);
+DLL_EXPORT int fdiff_direction(const float *in, float *out, long outer, long n, long inner, int method, int boundary, int adjoint, float voxel_size, int accumulate, int nThreads);
+DLL_EXPORT int dfdiff_direction(const double *in, double *out, long outer, long n, long inner, int method, int boundary, int adjoint, double voxel_size, int accumulate, int nThreads);
+DLL_EXPORT int fdiff_symmetrised(float **vector_field, float **tensor_field, long *shape, int ndim, int num_components, int boundary, float voxel_size, int direction, int nThreads);
+DLL_EXPORT int dfdiff_symmetrised(double **vector_field, double **tensor_field, long *shape, int ndim, int num_components, int boundary, double voxel_size, int direction, int nThreads);
+DLL_EXPORT int fdiff_norm_sum4D(float *imagefull, float *inverse_voxel_size, long nc, long nz, long ny, long nx, int boundary, int isotropic, double *result, int nThreads);
+DLL_EXPORT int hfdiff_norm_sum4D(uint16_t *imagefull, float *inverse_voxel_size, long nc, long nz, long ny, long nx, int boundary, int isotropic, double *result, int nThreads);
+DLL_EXPORT int bfdiff_norm_sum4D(uint16_t *imagefull, float *inverse_voxel_size, long nc, long nz, long ny, long nx, int boundary, int isotropic, double *result, int nThreads);
 
 #ifdef __cplusplus
 }
@@ -4,6 +4,7 @@
 #include "omp.h"
 #include "dll_export.h"
 #include "utilities.h"
+#include "half.h"
 
 int saxpby_asbs(const float * x, const float * y, float * out, float a, float b, int64 size, int nThreads);
 int saxpby_avbv(const float * x, const float * y, float * out, const float * a, const float * b, int64 size, int nThreads);
@@ -18,6 +19,14 @@ extern "C" {
 
 DLL_EXPORT int saxpby(const float * x, const float * y, float * out, const float * a, int type_a, const float * b, int type_b, int64 size, int nThreads);
 DLL_EXPORT int daxpby(const double * x, const double * y, double * out, const double * a, int type_a, const double * b, int type_b, int64 size, int nThreads);
+DLL_EXPORT int haxpby(const uint16_t * x, const uint16_t * y, uint16_t * out, const float * a, int type_a, const float * b, int type_b, int64 size, int nThreads);
+DLL_EXPORT int baxpby(const uint16_t * x, const uint16_t * y, uint16_t * out, const float * a, int type_a, const float * b, int type_b, int64 size, int nThreads);
+DLL_EXPORT int saxpby_uint8(const uint8_t * x, const uint8_t * y, float * out, const float * a, int type_a, const float * b, int type_b, int64 size, int nThreads);
+DLL_EXPORT int saxpby_int16(const int16_t * x, const int16_t * y, float * out, const float * a, int type_a, const float * b, int type_b, int64 size, int nThreads);
+DLL_EXPORT int saxpby_uint16(const uint16_t * x, const uint16_t * y, float * out, const float * a, int type_a, const float * b, int type_b, int64 size, int nThreads);
+DLL_EXPORT int saxpby_int32(const int32_t * x, const int32_t * y, float * out, const float * a, int type_a, const float * b, int type_b, int64 size, int nThreads);
+DLL_EXPORT int caxpby(const float * x, const float * y, float * out, const float * a, int type_a, const float * b, int type_b, int64 size, int nThreads);
+DLL_EXPORT int zaxpby(const double * x, const double * y, double * out, const double * a, int type_a, const double * b, int type_b, int64 size, int nThreads);
 
 #ifdef __cplusplus
 }
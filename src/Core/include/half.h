@@ -0,0 +1,124 @@
+#pragma once
+#ifndef HALF_H
+#define HALF_H
+
+#include <stdint.h>
+#include <string.h>
+
+// Reduced precision storage types. Values are converted to float when read and
+// rounded to nearest even when written, so the arithmetic of the kernels is
+// done in float while the memory traffic is halved.
+
+// The conversions are branchless, all the cases are computed and selected with
+// masks, so that the compiler vectorises the loops of the kernels.
+
+inline uint32_t select_bits(bool condition, uint32_t if_true, uint32_t if_false)
+{
+	uint32_t mask = 0u - (uint32_t)condition;
+	return (if_true & mask) | (if_false & ~mask);
+}
+
+inline uint32_t float_as_bits(float value)
+{
+	uint32_t res;
+	memcpy(&res, &value, 4);
+	return res;
+}
+
+inline float bits_as_float(uint32_t value)
+{
+	float res;
+	memcpy(&res, &value, 4);
+	return res;
+}
+
+inline float half_to_float(uint16_t h)
+{
+	const uint32_t shifted_exp = 0x7c00u << 13;
+	const float magic = bits_as_float(113u << 23);
+	uint32_t o = (uint32_t)(h & 0x7fffu) << 13;
+	uint32_t exp = shifted_exp & o;
+	o += (uint32_t)(127 - 15) << 23;
+
+	// inf or nan
+	o += select_bits(exp == shifted_exp, (uint32_t)(128 - 16) << 23, 0u);
+	// zero or subnormal
+	uint32_t denorm = float_as_bits(bits_as_float(o + (1u << 23)) - magic);
+	o = select_bits(exp == 0, denorm, o);
+
+	return bits_as_float(o | (uint32_t)(h & 0x8000u) << 16);
+}
+
+inline uint16_t float_to_half(float value)
+{
+	const uint32_t f32infty = 255u << 23;
+	const uint32_t f16max = (127u + 16) << 23;
+	const uint32_t denorm_magic_bits = ((127u - 15) + (23 - 10) + 1) << 23;
+
+	uint32_t f = float_as_bits(value);
+	uint32_t sign = f & 0x80000000u;
+	f ^= sign;
+
+	// overflow to inf, nan stays nan
+	uint32_t overflow = select_bits((int32_t)f > (int32_t)f32infty, 0x7e00u, 0x7c00u);
+	// subnormal or zero
+	uint32_t denorm = float_as_bits(bits_as_float(f) + bits_as_float(denorm_magic_bits)) - denorm_magic_bits;
+	// normal, rounded to nearest even
+	uint32_t normal = (f + ((uint32_t)(15 - 127) << 23) + 0xfffu + ((f >> 13) & 1u)) >> 13;
+
+	// f has no sign bit, the comparisons are signed which vectorise without emulation
+	int32_t fs = (int32_t)f;
+	uint32_t o = select_bits(fs >= (int32_t)f16max, overflow, select_bits(fs < (int32_t)(113u << 23), denorm, normal));
+	return (uint16_t)(o | (sign >> 16));
+}
+
+inline float bfloat16_to_float(uint16_t h)
+{
+	return bits_as_float((uint32_t)h << 16);
+}
+
+inline uint16_t float_to_bfloat16(float value)
+{
+	uint32_t f = float_as_bits(value);
+	// nan stays nan, the others are rounded to nearest even
+	uint32_t nan = (f >> 16) | 0x40u;
+	uint32_t rounded = (f + 0x7fffu + ((f >> 16) & 1u)) >> 16;
+	return (uint16_t)select_bits((int32_t)(f & 0x7fffffffu) > (int32_t)0x7f800000u, nan, rounded);
+}
+
+// IEEE 754 binary16
+struct half
+{
+	uint16_t bits;
+
+	half() {}
+	half(float value) : bits(float_to_half(value)) {}
+	operator float() const { return half_to_float(bits); }
+
+	half & operator+=(float value) { *this = half(float(*this) + value); return *this; }
+	half & operator-=(float value) { *this = half(float(*this) - value); return *this; }
+	half & operator*=(float value) { *this = half(float(*this) * value); return *this; }
+	half & operator/=(float value) { *this = half(float(*this) / value); return *this; }
+};
+
+// bfloat16, the upper half of a float
+struct bfloat16
+{
+	uint16_t bits;
+
+	bfloat16() {}
+	bfloat16(float value) : bits(float_to_bfloat16(value)) {}
+	operator float() const { return bfloat16_to_float(bits); }
+
+	bfloat16 & operator+=(float value) { *this = bfloat16(float(*this) + value); return *this; }
+	bfloat16 & operator-=(float value) { *this = bfloat16(float(*this) - value); return *this; }
+	bfloat16 & operator*=(float value) { *this = bfloat16(float(*this) * value); return *this; }
+	bfloat16 & operator/=(float value) { *this = bfloat16(float(*this) / value); return *this; }
+};
+
+// type in which the values of a storage type are computed
+template <typename T> struct compute_type { typedef T type; };
+template <> struct compute_type<half> { typedef float type; };
+template <> struct compute_type<bfloat16> { typedef float type; };
+
+#endif
@@ -0,0 +1,19 @@
+#include <math.h>
+#include <stdlib.h>
+#include <string.h>
+#include "omp.h"
+#include "dll_export.h"
+#include "utilities.h"
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+DLL_EXPORT int parallel_project_joseph(const float *volume, float *projections, const float *angles, const int *row_slice, const float *row_weight, long nx, long ny, long nz, float dx, float dy, float x0, float y0, long na, long nv, long nu, float du, float s0, int nThreads);
+DLL_EXPORT int parallel_backproject_joseph(float *volume, const float *projections, const float *angles, const int *row_slice, const float *row_weight, long nx, long ny, long nz, float dx, float dy, float x0, float y0, long na, long nv, long nu, float du, float s0, int nThreads);
+DLL_EXPORT int parallel_backproject_interpolated(float *volume, const float *projections, const float *angles, const int *slice_row, const float *slice_weight, long nx, long ny, long nz, float dx, float dy, float x0, float y0, long na, long nv, long nu, float du, float s0, int nThreads);
+DLL_EXPORT int fdk_backproject(float *volume, const float *projections, const float *matrices, long nx, long ny, long nz, long na, long nv, long nu, long slab_size, int nThreads);
+
+#ifdef __cplusplus
+}
+#endif
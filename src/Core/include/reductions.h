@@ -0,0 +1,38 @@
+#include <math.h>
+#include <stdlib.h>
+#include <stdio.h>
+#include "omp.h"
+#include "dll_export.h"
+#include "utilities.h"
+#include "half.h"
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+DLL_EXPORT int sdot(const float * x, const float * y, double * out, int64 size, int nThreads);
+DLL_EXPORT int ddot(const double * x, const double * y, double * out, int64 size, int nThreads);
+DLL_EXPORT int ssquared_norm(const float * x, double * out, int64 size, int nThreads);
+DLL_EXPORT int dsquared_norm(const double * x, double * out, int64 size, int nThreads);
+DLL_EXPORT int ssum(const float * x, double * out, int64 size, int nThreads);
+DLL_EXPORT int dsum(const double * x, double * out, int64 size, int nThreads);
+DLL_EXPORT int sminmax(const float * x, float * min, float * max, int64 size, int nThreads);
+DLL_EXPORT int dminmax(const double * x, double * min, double * max, int64 size, int nThreads);
+DLL_EXPORT int ssum_axis(const float * x, float * out, int64 outer, int64 n, int64 inner, int nThreads);
+DLL_EXPORT int dsum_axis(const double * x, double * out, int64 outer, int64 n, int64 inner, int nThreads);
+DLL_EXPORT int spnorm2(const float ** x, int nblocks, float * out, int64 size, int nThreads);
+DLL_EXPORT int dpnorm2(const double ** x, int nblocks, double * out, int64 size, int nThreads);
+DLL_EXPORT int hdot(const uint16_t * x, const uint16_t * y, double * out, int64 size, int nThreads);
+DLL_EXPORT int hsquared_norm(const uint16_t * x, double * out, int64 size, int nThreads);
+DLL_EXPORT int hsum(const uint16_t * x, double * out, int64 size, int nThreads);
+DLL_EXPORT int hminmax(const uint16_t * x, float * min, float * max, int64 size, int nThreads);
+DLL_EXPORT int hsum_axis(const uint16_t * x, uint16_t * out, int64 outer, int64 n, int64 inner, int nThreads);
+DLL_EXPORT int bdot(const uint16_t * x, const uint16_t * y, double * out, int64 size, int nThreads);
+DLL_EXPORT int bsquared_norm(const uint16_t * x, double * out, int64 size, int nThreads);
+DLL_EXPORT int bsum(const uint16_t * x, double * out, int64 size, int nThreads);
+DLL_EXPORT int bminmax(const uint16_t * x, float * min, float * max, int64 size, int nThreads);
+DLL_EXPORT int bsum_axis(const uint16_t * x, uint16_t * out, int64 outer, int64 n, int64 inner, int nThreads);
+
+#ifdef __cplusplus
+}
+#endif
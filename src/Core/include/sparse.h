@@ -0,0 +1,14 @@
+#include <stdlib.h>
+#include "omp.h"
+#include "dll_export.h"
+#include "utilities.h"
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+DLL_EXPORT int scsr_matvec(const int64 *indptr, const int *indices, const float *data, const float *x, float *y, int64 nrows, int64 ncols, int64 nvec, int nThreads);
+
+#ifdef __cplusplus
+}
+#endif
@@ -0,0 +1,18 @@
+#include <string.h>
+#include <stdlib.h>
+#include <vector>
+#include "omp.h"
+#include "dll_export.h"
+#include "utilities.h"
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+DLL_EXPORT int stranspose(const float * in, float * out, const int64 * shape, const int * perm, int ndim, int nThreads);
+DLL_EXPORT int dtranspose(const double * in, double * out, const int64 * shape, const int * perm, int ndim, int nThreads);
+DLL_EXPORT int transpose_rows_inplace(char * data, const int64 * shape, const int * perm, int ndim, int64 row_bytes);
+
+#ifdef __cplusplus
+}
+#endif
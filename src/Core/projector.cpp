@@ -0,0 +1,365 @@
+#include "projector.h"
+
+// Parallel-beam projectors using Joseph's method.
+//
+// The volume is stored as (nz, ny, nx) and the projections as (na, nv, nu).
+// At angle theta the object is rotated counter-clockwise about the z axis, so
+// a voxel at (px, py) projects on the detector at
+//     px * cos(theta) - py * sin(theta) = s0 + t * du
+// where t is the (fractional) detector pixel index. Voxel centres are at
+// x0 + i * dx and y0 + j * dy.
+//
+// The rays are sampled once per row (or column) of voxels crossed, whichever
+// is closer to perpendicular to the ray, with linear interpolation along the
+// other axis. Detector row v interpolates between the volume slices
+// row_slice[v] and row_slice[v] + 1 with weights (1 - row_weight[v]) and row_weight[v].
+//
+// The backprojector is the exact transpose of the forward projector. Each thread
+// computes whole rows of the volume, gathering the rays crossing the row, so
+// that the threads never write to the same memory.
+
+static inline float slice_weight_for_row(const int *row_slice, const float *row_weight, long v, long k)
+{
+	float w = 0.f;
+	if (row_slice[v] == k)
+		w += 1.f - row_weight[v];
+	if (row_slice[v] + 1 == k)
+		w += row_weight[v];
+	return w;
+}
+
+static void project_plane(const float *img, float *out, float c, float s, float weight,
+	long nx, long ny, float dx, float dy, float x0, float y0, long nu, float du, float s0)
+{
+	if (fabsf(c) >= fabsf(s))
+	{
+		// step along y, interpolate along x
+		float w = weight * dy / fabsf(c);
+		float A = du / (c * dx);
+		for (long j = 0; j < ny; j++)
+		{
+			float py = y0 + j * dy;
+			float B = ((s0 + py * s) / c - x0) / dx;
+			const float *row = img + j * nx;
+			for (long t = 0; t < nu; t++)
+			{
+				float fi = A * t + B;
+				float fl = floorf(fi);
+				long i0 = (long)fl;
+				float f = fi - fl;
+				float val = 0.f;
+				if (i0 >= 0 && i0 < nx)
+					val += (1.f - f) * row[i0];
+				if (i0 + 1 >= 0 && i0 + 1 < nx)
+					val += f * row[i0 + 1];
+				out[t] += w * val;
+			}
+		}
+	}
+	else
+	{
+		// step along x, interpolate along y
+		float w = weight * dx / fabsf(s);
+		float C = -du / (s * dy);
+		for (long i = 0; i < nx; i++)
+		{
+			float px = x0 + i * dx;
+			float D = ((px * c - s0) / s - y0) / dy;
+			for (long t = 0; t < nu; t++)
+			{
+				float fj = C * t + D;
+				float fl = floorf(fj);
+				long j0 = (long)fl;
+				float f = fj - fl;
+				float val = 0.f;
+				if (j0 >= 0 && j0 < ny)
+					val += (1.f - f) * img[j0 * nx + i];
+				if (j0 + 1 >= 0 && j0 + 1 < ny)
+					val += f * img[(j0 + 1) * nx + i];
+				out[t] += w * val;
+			}
+		}
+	}
+}
+
+static void backproject_row(const float *proj, float *out, float c, float s, float weight, long j,
+	long nx, long ny, float dx, float dy, float x0, float y0, long nu, float du, float s0)
+{
+	// adds to row j of the plane the transpose of project_plane
+	if (fabsf(c) >= fabsf(s))
+	{
+		// each ray samples the row once, scatter along the row
+		float w = weight * dy / fabsf(c);
+		float A = du / (c * dx);
+		float B = ((s0 + (y0 + j * dy) * s) / c - x0) / dx;
+		for (long t = 0; t < nu; t++)
+		{
+			float fi = A * t + B;
+			float fl = floorf(fi);
+			long i0 = (long)fl;
+			float f = fi - fl;
+			float val = w * proj[t];
+			if (i0 >= 0 && i0 < nx)
+				out[i0] += (1.f - f) * val;
+			if (i0 + 1 >= 0 && i0 + 1 < nx)
+				out[i0 + 1] += f * val;
+		}
+	}
+	else
+	{
+		// gather the rays with |C * t + D_i - j| < 1 for each voxel i of the row
+		float w = weight * dx / fabsf(s);
+		float C = -du / (s * dy);
+		float invC = 1.f / C;
+		for (long i = 0; i < nx; i++)
+		{
+			float off = (((x0 + i * dx) * c - s0) / s - y0) / dy - j;
+			float lo = (-1.f - off) * invC;
+			float hi = (1.f - off) * invC;
+			if (lo > hi)
+			{
+				float tmp = lo;
+				lo = hi;
+				hi = tmp;
+			}
+			long tlo = (long)ceilf(lo);
+			long thi = (long)floorf(hi);
+			if (tlo < 0)
+				tlo = 0;
+			if (thi > nu - 1)
+				thi = nu - 1;
+
+			float sum = 0.f;
+			for (long t = tlo; t <= thi; t++)
+			{
+				float f = 1.f - fabsf(C * t + off);
+				if (f > 0.f)
+					sum += f * proj[t];
+			}
+			out[i] += w * sum;
+		}
+	}
+}
+
+DLL_EXPORT int parallel_project_joseph(const float *volume, float *projections, const float *angles, const int *row_slice, const float *row_weight, long nx, long ny, long nz, float dx, float dy, float x0, float y0, long na, long nv, long nu, float du, float s0, int nThreads)
+{
+	int nThreads_initial;
+	threads_setup(nThreads, &nThreads_initial);
+
+#pragma omp parallel for collapse(2) schedule(dynamic)
+	for (long a = 0; a < na; a++)
+	{
+		for (long v = 0; v < nv; v++)
+		{
+			float c = cosf(angles[a]);
+			float s = sinf(angles[a]);
+			float *out = projections + (a * nv + v) * nu;
+			memset(out, 0, nu * sizeof(float));
+
+			long k = row_slice[v];
+			float w = row_weight[v];
+			if (k >= 0 && k < nz && w < 1.f)
+				project_plane(volume + k * nx * ny, out, c, s, 1.f - w, nx, ny, dx, dy, x0, y0, nu, du, s0);
+			if (k + 1 >= 0 && k + 1 < nz && w > 0.f)
+				project_plane(volume + (k + 1) * nx * ny, out, c, s, w, nx, ny, dx, dy, x0, y0, nu, du, s0);
+		}
+	}
+
+	omp_set_num_threads(nThreads_initial);
+	return 0;
+}
+
+DLL_EXPORT int parallel_backproject_joseph(float *volume, const float *projections, const float *angles, const int *row_slice, const float *row_weight, long nx, long ny, long nz, float dx, float dy, float x0, float y0, long na, long nv, long nu, float du, float s0, int nThreads)
+{
+	int nThreads_initial;
+	threads_setup(nThreads, &nThreads_initial);
+
+	float *cosines = (float *)malloc(na * sizeof(float));
+	float *sines = (float *)malloc(na * sizeof(float));
+	for (long a = 0; a < na; a++)
+	{
+		cosines[a] = cosf(angles[a]);
+		sines[a] = sinf(angles[a]);
+	}
+
+#pragma omp parallel for collapse(2) schedule(dynamic)
+	for (long k = 0; k < nz; k++)
+	{
+		for (long j = 0; j < ny; j++)
+		{
+			float *out = volume + (k * ny + j) * nx;
+			memset(out, 0, nx * sizeof(float));
+
+			for (long v = 0; v < nv; v++)
+			{
+				float wv = slice_weight_for_row(row_slice, row_weight, v, k);
+				if (wv == 0.f)
+					continue;
+
+				for (long a = 0; a < na; a++)
+					backproject_row(projections + (a * nv + v) * nu, out, cosines[a], sines[a], wv, j, nx, ny, dx, dy, x0, y0, nu, du, s0);
+			}
+		}
+	}
+
+	free(cosines);
+	free(sines);
+
+	omp_set_num_threads(nThreads_initial);
+	return 0;
+}
+
+DLL_EXPORT int parallel_backproject_interpolated(float *volume, const float *projections, const float *angles, const int *slice_row, const float *slice_weight, long nx, long ny, long nz, float dx, float dy, float x0, float y0, long na, long nv, long nu, float du, float s0, int nThreads)
+{
+	// voxel-driven backprojection, linearly interpolating the detector at the
+	// projection of each voxel centre. Slice k samples the detector rows
+	// slice_row[k] and slice_row[k] + 1 with weights (1 - slice_weight[k]) and slice_weight[k].
+	int nThreads_initial;
+	threads_setup(nThreads, &nThreads_initial);
+
+	float *cosines = (float *)malloc(na * sizeof(float));
+	float *sines = (float *)malloc(na * sizeof(float));
+	for (long a = 0; a < na; a++)
+	{
+		cosines[a] = cosf(angles[a]);
+		sines[a] = sinf(angles[a]);
+	}
+
+#pragma omp parallel for collapse(2) schedule(dynamic)
+	for (long k = 0; k < nz; k++)
+	{
+		for (long j = 0; j < ny; j++)
+		{
+			float *out = volume + (k * ny + j) * nx;
+			memset(out, 0, nx * sizeof(float));
+
+			long v0 = slice_row[k];
+			float wz = slice_weight[k];
+			float w0 = (v0 >= 0 && v0 < nv) ? 1.f - wz : 0.f;
+			float w1 = (v0 + 1 >= 0 && v0 + 1 < nv) ? wz : 0.f;
+			if (w0 == 0.f && w1 == 0.f)
+				continue;
+
+			float py = y0 + j * dy;
+			for (long a = 0; a < na; a++)
+			{
+				const float *row0 = projections + (a * nv + v0) * nu;
+				const float *row1 = row0 + nu;
+				float A = cosines[a] * dx / du;
+				float B = (x0 * cosines[a] - py * sines[a] - s0) / du;
+				for (long i = 0; i < nx; i++)
+				{
+					float ft = A * i + B;
+					float fl = floorf(ft);
+					long t0 = (long)fl;
+					float f = ft - fl;
+					float val = 0.f;
+					if (t0 >= 0 && t0 < nu)
+					{
+						if (w0 != 0.f)
+							val += w0 * (1.f - f) * row0[t0];
+						if (w1 != 0.f)
+							val += w1 * (1.f - f) * row1[t0];
+					}
+					if (t0 + 1 >= 0 && t0 + 1 < nu)
+					{
+						if (w0 != 0.f)
+							val += w0 * f * row0[t0 + 1];
+						if (w1 != 0.f)
+							val += w1 * f * row1[t0 + 1];
+					}
+					out[i] += val;
+				}
+			}
+		}
+	}
+
+	free(cosines);
+	free(sines);
+
+	omp_set_num_threads(nThreads_initial);
+	return 0;
+}
+
+DLL_EXPORT int fdk_backproject(float *volume, const float *projections, const float *matrices, long nx, long ny, long nz, long na, long nv, long nu, long slab_size, int nThreads)
+{
+	// voxel-driven cone-beam backprojection with FDK distance weighting.
+	// matrices holds a 3x4 projection matrix per angle mapping the voxel index
+	// (i, j, k, 1) to (u * w, v * w, w), where (u, v) is the fractional detector
+	// pixel index of the voxel centre and w the depth of the voxel along the
+	// source direction relative to the rotation axis. Each angle contributes
+	// the bilinear interpolation of the projection at (u, v) weighted by 1 / w^2.
+	// The volume is processed in slabs of slab_size slices, so that the
+	// detector rows read by the threads stay in cache.
+	int nThreads_initial;
+	threads_setup(nThreads, &nThreads_initial);
+
+	if (slab_size < 1)
+		slab_size = nz;
+
+	for (long k_start = 0; k_start < nz; k_start += slab_size)
+	{
+		long k_stop = k_start + slab_size < nz ? k_start + slab_size : nz;
+
+#pragma omp parallel for collapse(2) schedule(dynamic)
+		for (long k = k_start; k < k_stop; k++)
+		{
+			for (long j = 0; j < ny; j++)
+			{
+				float *out = volume + (k * ny + j) * nx;
+				memset(out, 0, nx * sizeof(float));
+
+				for (long a = 0; a < na; a++)
+				{
+					const float *P = matrices + a * 12;
+					const float *proj = projections + a * nv * nu;
+
+					float bu = P[1] * j + P[2] * k + P[3];
+					float bv = P[5] * j + P[6] * k + P[7];
+					float bw = P[9] * j + P[10] * k + P[11];
+
+					for (long i = 0; i < nx; i++)
+					{
+						float w = P[8] * i + bw;
+						if (w <= 0.f)
+							continue;
+						float inv = 1.f / w;
+						float u = (P[0] * i + bu) * inv;
+						float v = (P[4] * i + bv) * inv;
+
+						float flu = floorf(u);
+						float flv = floorf(v);
+						long u0 = (long)flu;
+						long v0 = (long)flv;
+						if (u0 < -1 || u0 >= nu || v0 < -1 || v0 >= nv)
+							continue;
+						float fu = u - flu;
+						float fv = v - flv;
+
+						float val = 0.f;
+						if (v0 >= 0)
+						{
+							const float *row = proj + v0 * nu;
+							if (u0 >= 0)
+								val += (1.f - fv) * (1.f - fu) * row[u0];
+							if (u0 + 1 < nu)
+								val += (1.f - fv) * fu * row[u0 + 1];
+						}
+						if (v0 + 1 < nv)
+						{
+							const float *row = proj + (v0 + 1) * nu;
+							if (u0 >= 0)
+								val += fv * (1.f - fu) * row[u0];
+							if (u0 + 1 < nu)
+								val += fv * fu * row[u0 + 1];
+						}
+						out[i] += inv * inv * val;
+					}
+				}
+			}
+		}
+	}
+
+	omp_set_num_threads(nThreads_initial);
+	return 0;
+}
@@ -0,0 +1,309 @@
+#include "reductions.h"
+
+// all the reductions accumulate in double precision, also for float data.
+// Products are rounded to the data type before the accumulation, so that
+// dot(x, y) gives the same result as (x * y).sum(). The reduced precision
+// storage types half and bfloat16 are read as float and their products are
+// rounded to float.
+
+template <typename T>
+double dot_kernel(const T * x, const T * y, int64 size)
+{
+	double acc = 0.;
+	int64 i = 0;
+
+#pragma omp parallel for simd reduction(+:acc)
+	for (i = 0; i < size; i++)
+	{
+		acc += (double)(x[i] * y[i]);
+	}
+	return acc;
+}
+
+template <typename T>
+double squared_norm_kernel(const T * x, int64 size)
+{
+	double acc = 0.;
+	int64 i = 0;
+
+#pragma omp parallel for simd reduction(+:acc)
+	for (i = 0; i < size; i++)
+	{
+		acc += (double)(x[i] * x[i]);
+	}
+	return acc;
+}
+
+template <typename T>
+double sum_kernel(const T * x, int64 size)
+{
+	double acc = 0.;
+	int64 i = 0;
+
+#pragma omp parallel for simd reduction(+:acc)
+	for (i = 0; i < size; i++)
+	{
+		acc += (double)x[i];
+	}
+	return acc;
+}
+
+template <typename T, typename C>
+void minmax_kernel(const T * x, C * min, C * max, int64 size)
+{
+	// C is the type in which the values of T are compared
+	C gmin = x[0];
+	C gmax = x[0];
+	int has_nan = 0;
+	int64 i = 0;
+
+#pragma omp parallel for simd reduction(min:gmin) reduction(max:gmax) reduction(|:has_nan)
+	for (i = 0; i < size; i++)
+	{
+		C val = x[i];
+		gmin = val < gmin ? val : gmin;
+		gmax = val > gmax ? val : gmax;
+		has_nan |= (val != val);
+	}
+
+	if (has_nan)
+	{
+		gmin = (C)NAN;
+		gmax = (C)NAN;
+	}
+	*min = gmin;
+	*max = gmax;
+}
+
+template <typename T>
+void sum_axis_kernel(const T * x, T * out, int64 outer, int64 n, int64 inner)
+{
+	// x is viewed as an array of shape (outer, n, inner) and summed along the second axis
+	// work is split in tiles of the inner dimension so that the accumulators stay in cache
+	const int64 tile = 1024;
+	int64 ntiles = (inner + tile - 1) / tile;
+	int64 t = 0;
+
+#pragma omp parallel
+	{
+		double * acc = (double *)malloc(tile * sizeof(double));
+
+#pragma omp for
+		for (t = 0; t < outer * ntiles; t++)
+		{
+			int64 o = t / ntiles;
+			int64 start = (t % ntiles) * tile;
+			int64 stop = start + tile < inner ? start + tile : inner;
+			int64 len = stop - start;
+
+			for (int64 k = 0; k < len; k++)
+				acc[k] = 0.;
+
+			const T * src = x + o * n * inner + start;
+			for (int64 j = 0; j < n; j++)
+			{
+				const T * row = src + j * inner;
+				for (int64 k = 0; k < len; k++)
+					acc[k] += (double)row[k];
+			}
+
+			T * dst = out + o * inner + start;
+			for (int64 k = 0; k < len; k++)
+				dst[k] = (T)acc[k];
+		}
+		free(acc);
+	}
+}
+
+template <typename T>
+void pnorm2_kernel(const T ** x, int nblocks, T * out, int64 size)
+{
+	int64 i = 0;
+
+#pragma omp parallel for
+	for (i = 0; i < size; i++)
+	{
+		double acc = 0.;
+		for (int b = 0; b < nblocks; b++)
+		{
+			double val = (double)x[b][i];
+			acc += val * val;
+		}
+		out[i] = (T)sqrt(acc);
+	}
+}
+
+DLL_EXPORT int sdot(const float * x, const float * y, double * out, int64 size, int nThreads)
+{
+	int nThreads_initial;
+	threads_setup(nThreads, &nThreads_initial);
+
+	*out = dot_kernel(x, y, size);
+
+	omp_set_num_threads(nThreads_initial);
+	return 0;
+}
+DLL_EXPORT int ddot(const double * x, const double * y, double * out, int64 size, int nThreads)
+{
+	int nThreads_initial;
+	threads_setup(nThreads, &nThreads_initial);
+
+	*out = dot_kernel(x, y, size);
+
+	omp_set_num_threads(nThreads_initial);
+	return 0;
+}
+DLL_EXPORT int ssquared_norm(const float * x, double * out, int64 size, int nThreads)
+{
+	int nThreads_initial;
+	threads_setup(nThreads, &nThreads_initial);
+
+	*out = squared_norm_kernel(x, size);
+
+	omp_set_num_threads(nThreads_initial);
+	return 0;
+}
+DLL_EXPORT int dsquared_norm(const double * x, double * out, int64 size, int nThreads)
+{
+	int nThreads_initial;
+	threads_setup(nThreads, &nThreads_initial);
+
+	*out = squared_norm_kernel(x, size);
+
+	omp_set_num_threads(nThreads_initial);
+	return 0;
+}
+DLL_EXPORT int ssum(const float * x, double * out, int64 size, int nThreads)
+{
+	int nThreads_initial;
+	threads_setup(nThreads, &nThreads_initial);
+
+	*out = sum_kernel(x, size);
+
+	omp_set_num_threads(nThreads_initial);
+	return 0;
+}
+DLL_EXPORT int dsum(const double * x, double * out, int64 size, int nThreads)
+{
+	int nThreads_initial;
+	threads_setup(nThreads, &nThreads_initial);
+
+	*out = sum_kernel(x, size);
+
+	omp_set_num_threads(nThreads_initial);
+	return 0;
+}
+DLL_EXPORT int sminmax(const float * x, float * min, float * max, int64 size, int nThreads)
+{
+	if (size < 1)
+		return 1;
+
+	int nThreads_initial;
+	threads_setup(nThreads, &nThreads_initial);
+
+	minmax_kernel(x, min, max, size);
+
+	omp_set_num_threads(nThreads_initial);
+	return 0;
+}
+DLL_EXPORT int dminmax(const double * x, double * min, double * max, int64 size, int nThreads)
+{
+	if (size < 1)
+		return 1;
+
+	int nThreads_initial;
+	threads_setup(nThreads, &nThreads_initial);
+
+	minmax_kernel(x, min, max, size);
+
+	omp_set_num_threads(nThreads_initial);
+	return 0;
+}
+DLL_EXPORT int ssum_axis(const float * x, float * out, int64 outer, int64 n, int64 inner, int nThreads)
+{
+	int nThreads_initial;
+	threads_setup(nThreads, &nThreads_initial);
+
+	sum_axis_kernel(x, out, outer, n, inner);
+
+	omp_set_num_threads(nThreads_initial);
+	return 0;
+}
+DLL_EXPORT int dsum_axis(const double * x, double * out, int64 outer, int64 n, int64 inner, int nThreads)
+{
+	int nThreads_initial;
+	threads_setup(nThreads, &nThreads_initial);
+
+	sum_axis_kernel(x, out, outer, n, inner);
+
+	omp_set_num_threads(nThreads_initial);
+	return 0;
+}
+DLL_EXPORT int spnorm2(const float ** x, int nblocks, float * out, int64 size, int nThreads)
+{
+	int nThreads_initial;
+	threads_setup(nThreads, &nThreads_initial);
+
+	pnorm2_kernel(x, nblocks, out, size);
+
+	omp_set_num_threads(nThreads_initial);
+	return 0;
+}
+DLL_EXPORT int dpnorm2(const double ** x, int nblocks, double * out, int64 size, int nThreads)
+{
+	int nThreads_initial;
+	threads_setup(nThreads, &nThreads_initial);
+
+	pnorm2_kernel(x, nblocks, out, size);
+
+	omp_set_num_threads(nThreads_initial);
+	return 0;
+}
+
+// reduced precision storage, S is the storage type
+#define REDUCED_PRECISION_REDUCTIONS(prefix, S) \
+DLL_EXPORT int prefix##dot(const uint16_t * x, const uint16_t * y, double * out, int64 size, int nThreads) \
+{ \
+	int nThreads_initial; \
+	threads_setup(nThreads, &nThreads_initial); \
+	*out = dot_kernel((const S *)x, (const S *)y, size); \
+	omp_set_num_threads(nThreads_initial); \
+	return 0; \
+} \
+DLL_EXPORT int prefix##squared_norm(const uint16_t * x, double * out, int64 size, int nThreads) \
+{ \
+	int nThreads_initial; \
+	threads_setup(nThreads, &nThreads_initial); \
+	*out = squared_norm_kernel((const S *)x, size); \
+	omp_set_num_threads(nThreads_initial); \
+	return 0; \
+} \
+DLL_EXPORT int prefix##sum(const uint16_t * x, double * out, int64 size, int nThreads) \
+{ \
+	int nThreads_initial; \
+	threads_setup(nThreads, &nThreads_initial); \
+	*out = sum_kernel((const S *)x, size); \
+	omp_set_num_threads(nThreads_initial); \
+	return 0; \
+} \
+DLL_EXPORT int prefix##minmax(const uint16_t * x, float * min, float * max, int64 size, int nThreads) \
+{ \
+	if (size < 1) \
+		return 1; \
+	int nThreads_initial; \
+	threads_setup(nThreads, &nThreads_initial); \
+	minmax_kernel((const S *)x, min, max, size); \
+	omp_set_num_threads(nThreads_initial); \
+	return 0; \
+} \
+DLL_EXPORT int prefix##sum_axis(const uint16_t * x, uint16_t * out, int64 outer, int64 n, int64 inner, int nThreads) \
+{ \
+	int nThreads_initial; \
+	threads_setup(nThreads, &nThreads_initial); \
+	sum_axis_kernel((const S *)x, (S *)out, outer, n, inner); \
+	omp_set_num_threads(nThreads_initial); \
+	return 0; \
+}
+
+REDUCED_PRECISION_REDUCTIONS(h, half)
+REDUCED_PRECISION_REDUCTIONS(b, bfloat16)
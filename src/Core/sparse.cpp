@@ -0,0 +1,28 @@
+#include "sparse.h"
+
+// Product of a CSR matrix with nvec contiguous vectors: y[v] = A x[v].
+// The rows are independent, so they are distributed to the threads in
+// chunks and every output element is written once. The accumulation is
+// in double precision.
+
+DLL_EXPORT int scsr_matvec(const int64 *indptr, const int *indices, const float *data, const float *x, float *y, int64 nrows, int64 ncols, int64 nvec, int nThreads)
+{
+	int nThreads_initial;
+	threads_setup(nThreads, &nThreads_initial);
+
+#pragma omp parallel for collapse(2) schedule(dynamic, 256)
+	for (int64 v = 0; v < nvec; v++)
+	{
+		for (int64 r = 0; r < nrows; r++)
+		{
+			const float *xv = x + v * ncols;
+			double sum = 0.0;
+			for (int64 k = indptr[r]; k < indptr[r + 1]; k++)
+				sum += (double)data[k] * xv[indices[k]];
+			y[v * nrows + r] = (float)sum;
+		}
+	}
+
+	omp_set_num_threads(nThreads_initial);
+	return 0;
+}
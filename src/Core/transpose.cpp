@@ -0,0 +1,187 @@
+#include "transpose.h"
+
+// Permutes the axes of a C-contiguous array: axis i of out is axis perm[i] of in.
+// If the last axis is unchanged, rows are copied with memcpy. Otherwise the
+// two axes which are the fastest varying in input and output are copied in
+// TILE x TILE blocks, so that both the reads and the writes of a block stay in cache.
+
+#define TILE 32
+#define MAX_DIMS 16
+
+template <typename T>
+void transpose_kernel(const T * in, T * out, const int64 * shape, const int * perm, int ndim)
+{
+	int64 in_strides[MAX_DIMS];
+	int64 out_shape[MAX_DIMS];
+	int64 out_strides[MAX_DIMS];
+	int64 src_strides[MAX_DIMS];
+
+	in_strides[ndim - 1] = 1;
+	for (int k = ndim - 2; k >= 0; k--)
+		in_strides[k] = in_strides[k + 1] * shape[k + 1];
+
+	for (int k = 0; k < ndim; k++)
+	{
+		out_shape[k] = shape[perm[k]];
+		src_strides[k] = in_strides[perm[k]];
+	}
+	out_strides[ndim - 1] = 1;
+	for (int k = ndim - 2; k >= 0; k--)
+		out_strides[k] = out_strides[k + 1] * out_shape[k + 1];
+
+	int64 size = out_strides[0] * out_shape[0];
+	if (size == 0)
+		return;
+
+	if (perm[ndim - 1] == ndim - 1)
+	{
+		int64 row = shape[ndim - 1];
+		int64 nrows = size / row;
+
+#pragma omp parallel for
+		for (int64 r = 0; r < nrows; r++)
+		{
+			int64 rem = r;
+			int64 src = 0;
+			for (int k = ndim - 2; k >= 0; k--)
+			{
+				src += (rem % out_shape[k]) * src_strides[k];
+				rem /= out_shape[k];
+			}
+			memcpy(out + r * row, in + src, row * sizeof(T));
+		}
+		return;
+	}
+
+	// out axis along which the input is contiguous
+	int a = 0;
+	while (perm[a] != ndim - 1)
+		a++;
+
+	int64 ni = out_shape[ndim - 1];
+	int64 nj = out_shape[a];
+	int64 stride_i = src_strides[ndim - 1];
+	int64 stride_j = out_strides[a];
+	int64 tiles_i = (ni + TILE - 1) / TILE;
+	int64 tiles_j = (nj + TILE - 1) / TILE;
+	int64 nouter = size / (ni * nj);
+	int64 nwork = nouter * tiles_i * tiles_j;
+
+#pragma omp parallel for schedule(static)
+	for (int64 w = 0; w < nwork; w++)
+	{
+		int64 bj = w % tiles_j;
+		int64 bi = (w / tiles_j) % tiles_i;
+		int64 rem = w / (tiles_j * tiles_i);
+
+		int64 src = 0;
+		int64 dst = 0;
+		for (int k = ndim - 2; k >= 0; k--)
+		{
+			if (k == a)
+				continue;
+			int64 idx = rem % out_shape[k];
+			rem /= out_shape[k];
+			src += idx * src_strides[k];
+			dst += idx * out_strides[k];
+		}
+
+		const T * s = in + src;
+		T * d = out + dst;
+		int64 i1 = bi * TILE + TILE < ni ? bi * TILE + TILE : ni;
+		int64 j1 = bj * TILE + TILE < nj ? bj * TILE + TILE : nj;
+		for (int64 i = bi * TILE; i < i1; i++)
+			for (int64 j = bj * TILE; j < j1; j++)
+				d[j * stride_j + i] = s[i * stride_i + j];
+	}
+}
+
+DLL_EXPORT int stranspose(const float * in, float * out, const int64 * shape, const int * perm, int ndim, int nThreads)
+{
+	if (ndim < 1 || ndim > MAX_DIMS)
+		return 1;
+
+	int nThreads_initial;
+	threads_setup(nThreads, &nThreads_initial);
+
+	transpose_kernel(in, out, shape, perm, ndim);
+
+	omp_set_num_threads(nThreads_initial);
+	return 0;
+}
+DLL_EXPORT int dtranspose(const double * in, double * out, const int64 * shape, const int * perm, int ndim, int nThreads)
+{
+	if (ndim < 1 || ndim > MAX_DIMS)
+		return 1;
+
+	int nThreads_initial;
+	threads_setup(nThreads, &nThreads_initial);
+
+	transpose_kernel(in, out, shape, perm, ndim);
+
+	omp_set_num_threads(nThreads_initial);
+	return 0;
+}
+
+// Permutes in place the rows of row_bytes bytes of an array, shape and perm
+// describe the axes of the rows. The permutation is decomposed in cycles which
+// are followed with a single row buffer and a bit per row to mark visited rows.
+DLL_EXPORT int transpose_rows_inplace(char * data, const int64 * shape, const int * perm, int ndim, int64 row_bytes)
+{
+	if (ndim < 1 || ndim > MAX_DIMS)
+		return 1;
+
+	int64 in_strides[MAX_DIMS];
+	int64 out_shape[MAX_DIMS];
+	int64 src_strides[MAX_DIMS];
+
+	in_strides[ndim - 1] = 1;
+	for (int k = ndim - 2; k >= 0; k--)
+		in_strides[k] = in_strides[k + 1] * shape[k + 1];
+
+	int64 nrows = 1;
+	for (int k = 0; k < ndim; k++)
+	{
+		out_shape[k] = shape[perm[k]];
+		src_strides[k] = in_strides[perm[k]];
+		nrows *= shape[k];
+	}
+
+	char * buffer = (char *)malloc(row_bytes);
+	if (buffer == NULL)
+		return 1;
+	std::vector<bool> visited(nrows, false);
+
+	for (int64 start = 0; start < nrows; start++)
+	{
+		if (visited[start])
+			continue;
+
+		memcpy(buffer, data + start * row_bytes, row_bytes);
+		int64 cur = start;
+		while (true)
+		{
+			visited[cur] = true;
+
+			// row of the input which goes in position cur of the output
+			int64 rem = cur;
+			int64 src = 0;
+			for (int k = ndim - 1; k >= 0; k--)
+			{
+				src += (rem % out_shape[k]) * src_strides[k];
+				rem /= out_shape[k];
+			}
+
+			if (src == start)
+			{
+				memcpy(data + cur * row_bytes, buffer, row_bytes);
+				break;
+			}
+			memcpy(data + cur * row_bytes, data + src * row_bytes, row_bytes);
+			cur = src;
+		}
+	}
+
+	free(buffer);
+	return 0;
+}